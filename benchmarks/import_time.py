@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+time to import the package in a fresh interpreter, as short-lived worker
+processes do.
+
+    python benchmarks/import_time.py [repeat]
+"""
+import statistics
+import subprocess
+import sys
+import time
+
+STATEMENTS = [
+    "pass",
+    "import build_system_parser",
+    "from build_system_parser import Ninja",
+    "from build_system_parser import Make",
+    "from build_system_parser import CMake",
+    "from build_system_parser import find_build_system",
+]
+
+
+def measure(statement: str, repeat: int) -> float:
+    """
+    :return the median wall-clock time of `python -c statement`
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", statement], check=True)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    for s in STATEMENTS:
+        print(f"{measure(s, n) * 1000:7.1f} ms  {s}")
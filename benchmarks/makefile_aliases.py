@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+macro expansion and alias resolution of `parse_makefile_aliases` on
+generated Makefiles with thousands of variables, compared to the previous
+implementation, which substituted each macro via `re.sub` in up to 99
+passes over the whole file and re-queued unresolved aliases.
+
+    python benchmarks/makefile_aliases.py [100 1000 3000]
+
+The number is the count of variables, each referencing the previous one,
+and of aliases, each calling the previous one.
+"""
+import configparser
+import io
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# pylint: disable=wrong-import-position
+from build_system_parser.pymake._pymake import (parse_makefile_aliases, PymakeKeyError,
+                                                RE_MAKE_CMD, RE_MACRO_DEF, RE_MACRO)
+
+SIZES = [100, 1000, 3000]
+# the previous implementation is quadratic, larger sizes are skipped
+LEGACY_LIMIT = 1000
+
+
+def legacy_parse_makefile_aliases(filepath):
+    """
+    the previous implementation of `parse_makefile_aliases`
+    """
+    with io.open(filepath, mode='r', encoding="utf-8") as fd:
+        ini_lines = fd.read().replace('\r\n', '\n').replace('\\\n', '')
+        ini_lines = (RE_MAKE_CMD.sub('\t', i) for i in ini_lines.split('\n'))
+    ini_lines = ['[root]'] + list(ini_lines)
+
+    macros = dict(found for line in ini_lines
+                  for found in RE_MACRO_DEF.findall(line) if found)
+    ini_str = '\n'.join(ini_lines)
+    for _ in range(99):
+        for (m, expr) in macros.items():
+            ini_str = re.sub(r"\$\(%s\)" % m, expr, ini_str)
+        if not RE_MACRO.search(ini_str):
+            ini_str = '\n'.join(line for line in ini_str.splitlines()
+                                if not RE_MACRO_DEF.search(line))
+            break
+    else:
+        raise PymakeKeyError("No substitution for macros: " +
+                             str(set(RE_MACRO.findall(ini_str))))
+
+    config = configparser.RawConfigParser()
+    config.read_string(ini_str)
+    aliases = config.options('root')
+
+    commands = {}
+    default_alias = ''
+    for alias in aliases:
+        if alias.lower() in ['.phony']:
+            continue
+        if not default_alias:
+            default_alias = alias
+        commands[alias] = config.get('root', alias).lstrip('\n').split('\n')
+
+    aliases_todo = list(commands.keys())
+    commands_new = {}
+    while aliases_todo:
+        alias = aliases_todo.pop()
+        commands_new[alias] = []
+        for cmd in commands[alias]:
+            if cmd == alias:
+                pass
+            elif cmd in aliases:
+                if cmd in commands_new:
+                    commands_new[alias].extend(commands_new[cmd])
+                else:
+                    del commands_new[alias]
+                    aliases_todo.insert(0, alias)
+                    break
+            else:
+                commands_new[alias].append(cmd)
+    return commands_new, default_alias
+
+
+def generated_makefile(path: str, n: int) -> str:
+    """
+    writes a Makefile with `n` variables (nested up to 90 levels, the
+    previous implementation allowed 99) and `n` aliases, each calling the
+    one defined before it
+    :return its path
+    """
+    file = os.path.join(path, "Makefile")
+    with open(file, "w", encoding="utf-8") as f:
+        for i in range(n):
+            ref = f" $(V{i - 1})" if i % 90 else ""
+            f.write(f"V{i} = -DV{i}{ref}\n")
+        for i in range(n):
+            f.write(f"\nt{i}:\n\t@echo $(V{i % 90})\n")
+            if i:
+                f.write(f"\tt{i - 1}\n")
+    return file
+
+
+def measure(f, *args):
+    """
+    :return the result of `f(*args)` and its time in seconds
+    """
+    start = time.perf_counter()
+    ret = f(*args)
+    return ret, time.perf_counter() - start
+
+
+def main():
+    """
+    prints the times of both implementations for all sizes
+    """
+    sizes = [int(a) for a in sys.argv[1:]] or SIZES
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as d:
+            file = generated_makefile(d, n)
+            new, t_new = measure(parse_makefile_aliases, file)
+            line = f"{n:>6} variables and aliases: parse_makefile_aliases {t_new:7.3f}s"
+            if n <= LEGACY_LIMIT:
+                old, t_old = measure(legacy_parse_makefile_aliases, file)
+                assert old == new
+                line += f", previous implementation {t_old:7.3f}s"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
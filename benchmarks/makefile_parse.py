@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+parsing time of huge, kernel-like Makefile trees: a top level Makefile,
+which includes one Makefile per directory with variables, conditionals,
+static pattern rules, generated rules and pattern rules.
+
+    python benchmarks/makefile_parse.py [100 1000 5000]
+
+The number is the count of directories, each with 10 sources. `make -pnqr`
+(parsing only, the database is printed to /dev/null) is the reference.
+Additionally, the time to read the database (the backend of
+`Make(..., database=True)`) is measured. `parse_makefile_aliases` is only
+measured on the flat Makefile it supports.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# pylint: disable=wrong-import-position
+from build_system_parser.pymake.makefile import Makefile, parse_database
+from build_system_parser.pymake._pymake import parse_makefile_aliases
+
+SIZES = [100, 1000, 5000]
+FILES = 10
+
+TOP = """
+ARCH ?= x86
+CFLAGS := -O2 -Wall
+ifeq ($(ARCH),x86)
+  CFLAGS += -m64
+else
+  CFLAGS += -marm
+endif
+obj-y :=
+include $(patsubst %,%/Makefile.inc,$(DIRS))
+.PHONY: all clean
+all: vmlinux
+vmlinux: $(obj-y)
+\t$(LD) -o $@ $^
+%.o: %.c
+\t$(CC) $(CFLAGS) $(ccflags-$(@D)) -c $< -o $@
+clean:
+\trm -f $(obj-y) vmlinux
+"""
+
+DIR = """
+{d}-objs := {objs}
+ccflags-{d} := -I{d}/include -DMODULE_{d}
+ifdef CONFIG_{d}
+  ccflags-{d} += -DCONFIG
+endif
+obj-y += $({d}-objs)
+$({d}-objs): {d}/%.o: {d}/%.c {d}/include/{d}.h
+\t$(CC) $(CFLAGS) $(ccflags-{d}) -c $< -o $@
+$(eval {d}.a: $({d}-objs) ; $$(AR) rcs $$@ $$^)
+"""
+
+
+def kernel_tree(path: str, n: int) -> str:
+    """
+    writes a Makefile including `n` directory Makefiles
+    :return the path of the top level Makefile
+    """
+    dirs = [f"d{i}" for i in range(n)]
+    for d in dirs:
+        os.makedirs(os.path.join(path, d))
+        objs = " ".join(f"{d}/f{j}.o" for j in range(FILES))
+        with open(os.path.join(path, d, "Makefile.inc"), "w", encoding="utf-8") as f:
+            f.write(DIR.format(d=d, objs=objs))
+    with open(os.path.join(path, "Makefile"), "w", encoding="utf-8") as f:
+        f.write(f"DIRS := {' '.join(dirs)}\n" + TOP)
+    return os.path.join(path, "Makefile")
+
+
+def flat_makefile(path: str, n: int) -> str:
+    """
+    writes a Makefile `parse_makefile_aliases` understands: `n`
+    variables and `n` targets, each referencing a variable
+    :return its path
+    """
+    file = os.path.join(path, "Makefile.flat")
+    with open(file, "w", encoding="utf-8") as f:
+        for i in range(n):
+            f.write(f"V{i} = -DV{i}\n")
+        for i in range(n):
+            f.write(f"\nt{i}:\n\tcc $(V{i}) -o t{i} t{i}.c\n")
+    return file
+
+
+def measure(f, *args) -> float:
+    """
+    :return the time of `f(*args)` in seconds
+    """
+    start = time.perf_counter()
+    f(*args)
+    return time.perf_counter() - start
+
+
+def make_database(path: str, stdout=subprocess.DEVNULL) -> subprocess.CompletedProcess:
+    """
+    parses the Makefile with GNU make
+    """
+    return subprocess.run(["make", "-pnqr", "-f", path], cwd=os.path.dirname(path),
+                          env=dict(os.environ, LC_ALL="C"), stdout=stdout,
+                          stderr=subprocess.DEVNULL, check=False)
+
+
+def graph(path: str):
+    """
+    parses the Makefile and expands all recipes
+    """
+    m = Makefile(path)
+    for t in m.targets():
+        m.prerequisites(t)
+        m.recipe(t)
+
+
+def main():
+    """
+    prints the parsing times of all sizes
+    """
+    sizes = [int(a) for a in sys.argv[1:]] or SIZES
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as d:
+            top = kernel_tree(d, n)
+            lines = sum(1 for _ in open(top, encoding="utf-8")) + n * DIR.count("\n")
+            parse = measure(Makefile, top)
+            full = measure(graph, top)
+            make = measure(make_database, top)
+            dump = make_database(top, subprocess.PIPE).stdout.decode().splitlines()
+            database = measure(parse_database, dump, d)
+            print(f"{n:>6} dirs, {lines:>7} lines, {n * (FILES + 1):>7} targets: "
+                  f"parse {parse:6.2f}s, parse+recipes {full:6.2f}s, make -pnqr {make:6.2f}s, "
+                  f"read its {sum(len(x) + 1 for x in dump) / 2**20:.1f} MiB database "
+                  f"{database:6.2f}s")
+
+            flat = flat_makefile(d, n * FILES)
+            new = measure(Makefile, flat)
+            old = measure(parse_makefile_aliases, flat)
+            print(f"{'':>6} flat Makefile, {n * FILES:>7} targets: parse {new:6.2f}s, "
+                  f"parse_makefile_aliases {old:6.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+parsing time and memory of huge, Chromium-like ninja files: a top level
+`build.ninja` with a `subninja` per target, which sets long `defines`,
+`include_dirs` and `cflags`, compiles its sources, archives them and links
+some of them.
+
+    python benchmarks/ninja_parse.py [100 1000 10000]
+
+The number is the count of targets, each with 20 sources. `ninja -t
+targets all` (parsing plus printing all targets) is the reference. The
+memory is measured by `tracemalloc` in a second run: the graph in memory
+after the parse and the peak during it.
+"""
+import gc
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# pylint: disable=wrong-import-position
+from build_system_parser.ninjafile import NinjaFile
+
+SIZES = [100, 1000, 10000]
+FILES = 20
+
+RULES = """ninja_required_version = 1.7.2
+rule cc
+  command = clang -MMD -MF $out.d $defines $include_dirs $cflags $cflags_c -c $in -o $out
+  description = CC $out
+  depfile = $out.d
+  deps = gcc
+rule cxx
+  command = clang++ -MMD -MF $out.d $defines $include_dirs $cflags $cflags_cc -c $in -o $out
+  description = CXX $out
+  depfile = $out.d
+  deps = gcc
+rule alink
+  command = rm -f $out && ar rcsD $arflags $out @$rspfile
+  description = AR $out
+  rspfile = $out.rsp
+  rspfile_content = $in
+rule link
+  command = clang++ $ldflags -o $out -Wl,--start-group @$rspfile $solibs -Wl,--end-group $libs
+  description = LINK $out
+  rspfile = $out.rsp
+  rspfile_content = $in
+  pool = link_pool
+rule stamp
+  command = touch $out
+pool link_pool
+  depth = 4
+"""
+
+TARGET = """defines = {defines}
+include_dirs = {include_dirs}
+cflags = -fno-strict-aliasing -fstack-protector -funwind-tables -fPIC -pthread -O2 -g0
+cflags_cc = -std=c++20 -fno-exceptions -fno-rtti -fvisibility-inlines-hidden
+label_name = {name}
+target_out_dir = obj/{path}
+target_output_name = {name}
+
+"""
+
+
+def chromium_tree(path: str, n: int) -> str:
+    """
+    writes a `build.ninja` with `n` subninjas
+    :return its path
+    """
+    defines = " ".join(f"-DFEATURE_{i}=1" for i in range(80))
+    with open(os.path.join(path, "build.ninja"), "w", encoding="utf-8") as top:
+        top.write(RULES)
+        for t in range(n):
+            d = f"components/module{t % 100}/target{t}"
+            name = f"target{t}"
+            os.makedirs(os.path.join(path, "obj", d))
+            includes = " ".join(f"-I../../{d}/include{i}" for i in range(30))
+            objs = [f"obj/{d}/{name}/file{i}.o" for i in range(FILES)]
+            with open(os.path.join(path, "obj", d, f"{name}.ninja"), "w",
+                      encoding="utf-8") as f:
+                f.write(TARGET.format(defines=defines, include_dirs=includes,
+                                      name=name, path=d))
+                deps = f"obj/{d}/{name}.inputdeps.stamp"
+                f.write(f"build {deps}: stamp obj/gen/generated.stamp\n")
+                for i, obj in enumerate(objs):
+                    f.write(f"build {obj}: cxx ../../{d}/file{i}.cc || {deps}\n"
+                            f"  source_file_part = file{i}.cc\n"
+                            f"  source_name_part = file{i}\n")
+                lib = f"obj/{d}/lib{name}.a"
+                f.write(f"build {lib}: alink {' '.join(objs)} || {deps}\n"
+                        f"  arflags = -T\n  output_extension = .a\n\n")
+                if t % 10 == 0:
+                    f.write(f"build ./{name}: link {lib} | ../../build/linker.lds\n"
+                            f"  ldflags = -fuse-ld=lld -Wl,--gc-sections -pie\n"
+                            f"  libs = -ldl -lpthread -lrt\n  solibs =\n")
+            top.write(f"subninja obj/{d}/{name}.ninja\n")
+            if t % 10:
+                # the binary of the other targets has the same name
+                top.write(f"build {name}: phony obj/{d}/lib{name}.a\n")
+        top.write("build obj/gen/generated.stamp: stamp ../../build/gen.py\n")
+        top.write("build all: phony " + " ".join(f"target{t}" for t in range(n)) + "\n")
+        top.write("default all\n")
+    return os.path.join(path, "build.ninja")
+
+
+def size(path: str) -> int:
+    """
+    :return the size of all files below `path`
+    """
+    return sum(os.path.getsize(os.path.join(d, f))
+               for d, _, files in os.walk(path) for f in files)
+
+
+def measure(f, *args) -> float:
+    """
+    :return the time of `f(*args)` in seconds
+    """
+    start = time.perf_counter()
+    f(*args)
+    return time.perf_counter() - start
+
+
+def ninja_targets(path: str):
+    """
+    parses the ninja file with ninja itself
+    """
+    subprocess.run(["ninja", "-f", path, "-t", "targets", "all"], cwd=os.path.dirname(path),
+                   stdout=subprocess.DEVNULL, check=True)
+
+
+def commands(path: str):
+    """
+    parses the ninja file and evaluates all commands
+    """
+    for e in NinjaFile(path).edges:
+        e.command()
+
+
+def main():
+    """
+    prints the parsing times and the memory of all sizes
+    """
+    sizes = [int(a) for a in sys.argv[1:]] or SIZES
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as d:
+            top = chromium_tree(d, n)
+            mib = size(d) / 2**20
+            parse = measure(NinjaFile, top)
+            full = measure(commands, top)
+            ninja = measure(ninja_targets, top)
+
+            gc.collect()
+            tracemalloc.start()
+            graph = NinjaFile(top)
+            gc.collect()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{n:>6} targets, {len(graph.edges):>7} edges, {mib:7.1f} MiB: "
+                  f"parse {parse:6.2f}s ({mib / parse:5.1f} MiB/s), "
+                  f"parse+commands {full:6.2f}s, ninja -t targets {ninja:6.2f}s, "
+                  f"graph {current / 2**20:6.1f} MiB, peak {peak / 2**20:6.1f} MiB")
+            del graph
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+memory footprint of the targets of huge compile databases.
+
+    python benchmarks/targets_memory.py [10000 100000 1000000]
+"""
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# pylint: disable=wrong-import-position
+from build_system_parser.compile_commands import CompileCommands
+
+SIZES = [10000, 100000, 1000000]
+
+
+def compile_database(path: str, n: int) -> str:
+    """
+    writes a `compile_commands.json` with `n` entries
+    :return its path
+    """
+    file = os.path.join(path, "compile_commands.json")
+    with open(file, "w", encoding="utf-8") as f:
+        f.write("[")
+        for i in range(n):
+            src = f"src/module{i % 100}/file{i}.c"
+            obj = f"obj/module{i % 100}/file{i}.o"
+            entry = {"arguments": ["/usr/bin/cc", "-I/usr/include/foo", "-Iinclude",
+                                   "-DNDEBUG", "-O2", "-g", "-Wall", "-Wextra", "-fPIC",
+                                   "-c", src, "-o", obj],
+                     "directory": path, "file": src, "output": obj}
+            f.write(("," if i else "") + json.dumps(entry))
+        f.write("]")
+    return file
+
+
+def measure(n: int):
+    """
+    discovers `n` targets and prints the memory they occupy
+    """
+    with tempfile.TemporaryDirectory() as d:
+        file = compile_database(d, n)
+        gc.collect()
+        tracemalloc.start()
+        start = time.perf_counter()
+        targets = CompileCommands(file).targets()
+        elapsed = time.perf_counter() - start
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert len(targets) == n
+        print(f"{n:>8} targets: {current / 2**20:8.1f} MiB, {current / n:6.0f} B/target, "
+              f"peak {peak / 2**20:8.1f} MiB, discovery {elapsed:6.2f}s")
+
+
+if __name__ == "__main__":
+    for size in [int(a) for a in sys.argv[1:]] or SIZES:
+        measure(size)
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+compiler-flag autotuner: builds variants of a target with different compiler
+flags, benchmarks them and returns the fastest one.
+
+    from build_system_parser.autotune import Autotuner
+    space = {
+        "opt": ["-O2", "-O3"],
+        "arch": ["", "-march=native"],
+        "unroll": ["", "-funroll-loops"],
+        "lto": ["", "-flto"],
+    }
+    r = Autotuner(target, space, strategy="grid").run()
+    print(r.best.flags, r.best.median())
+"""
+import asyncio
+import itertools
+import logging
+import math
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Union, List, Dict, Sequence, Tuple
+
+from .benchmark import BenchmarkResult
+from .common import Target, Builder
+from .schedule import JobPool
+
+STRATEGIES = ("grid", "random", "greedy")
+
+
+class FlagSpace:
+    """
+    The search space of the autotuner. Each dimension is a discrete set of
+    options, e.g. `{"opt": ["-O2", "-O3"], "lto": ["", "-flto"]}`. An empty
+    option disables the dimension. An option can hold multiple flags. A
+    configuration selects a single option of each dimension.
+    """
+    def __init__(self, dimensions: Dict[str, Sequence[str]]):
+        """
+        :param dimensions: name of the dimension -> its options
+        """
+        assert dimensions
+        assert all(len(v) > 0 for v in dimensions.values())
+        self.dimensions: Dict[str, List[str]] = {k: list(v) for k, v in dimensions.items()}
+
+    def size(self) -> int:
+        """
+        :return the number of configurations
+        """
+        return math.prod(len(v) for v in self.dimensions.values())
+
+    def default(self) -> Dict[str, str]:
+        """
+        :return the configuration, which selects the first option of each
+            dimension
+        """
+        return {k: v[0] for k, v in self.dimensions.items()}
+
+    def grid(self) -> List[Dict[str, str]]:
+        """
+        :return all configurations
+        """
+        keys = list(self.dimensions.keys())
+        return [dict(zip(keys, values))
+                for values in itertools.product(*self.dimensions.values())]
+
+    def sample(self, n: int, rng: random.Random) -> List[Dict[str, str]]:
+        """
+        :param n: number of configurations
+        :param rng: source of randomness
+        :return `n` distinct random configurations, or all of them if the
+            space is smaller
+        """
+        if n >= self.size():
+            return self.grid()
+
+        ret, seen = [], set()
+        while len(ret) < n:
+            config = {k: rng.choice(v) for k, v in self.dimensions.items()}
+            key = tuple(config.values())
+            if key not in seen:
+                seen.add(key)
+                ret.append(config)
+        return ret
+
+    def neighbours(self, config: Dict[str, str], dimension: str) -> List[Dict[str, str]]:
+        """
+        :return all configurations, which differ from `config` only in
+            `dimension`. Including `config` itself.
+        """
+        return [{**config, dimension: o} for o in self.dimensions[dimension]]
+
+    @staticmethod
+    def flags(config: Dict[str, str], separator: str = " ") -> str:
+        """
+        :param config: a configuration
+        :param separator: see `Builder.FLAG_SEPARATOR`
+        :return the compiler flags of `config`
+        """
+        ret = []
+        for option in config.values():
+            ret += option.split()
+        return separator.join(ret)
+
+    def __repr__(self) -> str:
+        return f"FlagSpace({self.dimensions})"
+
+
+class Candidate:
+    """
+    A single configuration of the search space and its measurements.
+    """
+    def __init__(self, config: Dict[str, str], flags: str,
+                 builder: Builder, build_path: str):
+        """
+        :param config: the configuration
+        :param flags: the compiler flags of `config`
+        :param builder: the builder which builds the variant
+        :param build_path: build tree of the variant
+        """
+        self.config = config
+        self.flags = flags
+        self.builder = builder
+        self.build_path = build_path
+        self.target: Union[Target, None] = None
+
+        # false if the build or a run failed
+        self.success = True
+        # time in seconds the build took
+        self.build_time = 0.
+        self.result: Union[BenchmarkResult, None] = None
+
+    def samples(self) -> int:
+        """ :return the number of measured runs """
+        return len(self.result.samples) if self.result else 0
+
+    def median(self) -> float:
+        """
+        :return the median wall-clock time, or infinity if the candidate
+            failed or was never measured
+        """
+        if not self.success or not self.samples():
+            return math.inf
+        return self.result.median()
+
+    def __repr__(self) -> str:
+        if not self.success:
+            return f"'{self.flags}': failed"
+        return f"'{self.flags}': median={self.median():.6f}s n={self.samples()}"
+
+
+class TuneResult:
+    """
+    All evaluated candidates and the fastest one.
+    """
+    def __init__(self, best: Union[Candidate, None],
+                 candidates: List[Candidate],
+                 rounds: List[List[Candidate]]):
+        """
+        :param best: the winner of the search, or `None` if all failed
+        :param candidates: all evaluated candidates
+        :param rounds: the candidates measured in each round of successive
+            halving
+        """
+        self.best = best
+        self.candidates = candidates
+        self.rounds = rounds
+
+    def ranking(self) -> List[Candidate]:
+        """
+        NOTE: candidates pruned in an early round have fewer samples, hence
+            their median is less reliable.
+        :return the successful candidates, fastest first
+        """
+        ok = [c for c in self.candidates if c.success and c.samples()]
+        return sorted(ok, key=lambda c: c.median())
+
+    def __bool__(self):
+        return self.best is not None
+
+    def __repr__(self) -> str:
+        return "\n".join(str(c) for c in self.ranking())
+
+
+class Autotuner:
+    """
+    Searches the compiler flags of `target`, which minimize its median
+    wall-clock time.
+
+    Each configuration is build into its own build tree (`Builder.variant`)
+    and the builds run concurrently under a global budget of `jobs`. The
+    benchmarks always run one after another, so they do not interfere with
+    each other. The candidates are pruned via successive halving: all
+    candidates are measured `repeat` times, the best `1/eta` of them
+    survive and are measured `eta` times as often in the next round, until
+    a single one is left.
+
+    Builders without isolated build trees (`ISOLATED_VARIANTS`) build and
+    measure one candidate after another, and rebuild a survivor before it
+    is measured again.
+    """
+    def __init__(self, target: Target,
+                 space: Union[FlagSpace, Dict[str, Sequence[str]]],
+                 strategy: str = "grid",
+                 work_dir: Union[str, Path] = "",
+                 jobs: int = 0,
+                 repeat: int = 3,
+                 warmup: int = 1,
+                 eta: int = 2,
+                 samples: int = 8,
+                 seed: Union[int, None] = None,
+                 args: Union[List[str], None] = None,
+                 env: Union[Dict[str, str], None] = None,
+                 overwrite: bool = False):
+        """
+        :param target: the target to tune
+        :param space: the flags to search
+        :param strategy: one of:
+            - "grid": all configurations
+            - "random": `samples` random configurations
+            - "greedy": starting with the first option of each dimension,
+                tunes one dimension after another while all others are fixed.
+        :param work_dir: the build trees of the variants are created in
+            here. If not passed a temp directory is created.
+        :param jobs: global job budget of the builds. 0 = all available cores
+        :param repeat: number of runs of each candidate in the first round
+        :param warmup: number of runs before the first measurement of a
+            candidate
+        :param eta: only the best `1/eta` candidates survive a round
+        :param samples: number of configurations of the random strategy
+        :param seed: seed of the random strategy
+        :param args: command line arguments of the benchmarked runs
+        :param env: additional environment variables of the benchmarked runs
+        :param overwrite: if true, the flags overwrite the compiler flags
+            of the project (`flags`), otherwise they are appended (`add_flags`)
+        """
+        assert strategy in STRATEGIES, f"unknown strategy {strategy}"
+        assert repeat > 0 and warmup >= 0 and eta >= 2 and samples > 0
+        self.target = target
+        self.space = space if isinstance(space, FlagSpace) else FlagSpace(space)
+        self.strategy = strategy
+        self.work_dir = str(work_dir)
+        self.jobs = jobs
+        self.repeat = repeat
+        self.warmup = warmup
+        self.eta = eta
+        self.samples = samples
+        self.args = args
+        self.env = env
+        self.overwrite = overwrite
+        self.__rng = random.Random(seed)
+
+        self.__builder = target.builder()
+        assert self.__builder, "target is not bound to a builder"
+
+        # flags -> candidate
+        self.__candidates: Dict[str, Candidate] = {}
+        self.__rounds: List[List[Candidate]] = []
+
+        # the candidate which is currently build, if the variants share
+        # the build tree
+        self.__current: Union[Candidate, None] = None
+
+    def run(self) -> TuneResult:
+        """
+        NOTE: this must not be called from a running event loop. Use
+            `arun` instead.
+        :return all evaluated candidates and the fastest one
+        """
+        return asyncio.run(self.arun())
+
+    async def arun(self) -> TuneResult:
+        """
+        coroutine version of `run`.
+        """
+        if not self.work_dir:
+            self.work_dir = tempfile.mkdtemp(prefix="autotune")
+        os.makedirs(self.work_dir, exist_ok=True)
+
+        if self.strategy == "greedy":
+            best = None
+            config = self.space.default()
+            for dim, options in self.space.dimensions.items():
+                if len(options) < 2:
+                    continue
+                best = await self.__halve(self.space.neighbours(config, dim))
+                if not best:
+                    break
+                config = best.config
+            if best is None and not self.__candidates:
+                # a single configuration
+                best = await self.__halve([config])
+        elif self.strategy == "random":
+            best = await self.__halve(self.space.sample(self.samples, self.__rng))
+        else:
+            best = await self.__halve(self.space.grid())
+
+        return TuneResult(best, list(self.__candidates.values()), self.__rounds)
+
+    def __candidate(self, config: Dict[str, str]) -> Tuple[Candidate, bool]:
+        """
+        :return the candidate of `config` and true if it is new
+        """
+        flags = self.space.flags(config, self.__builder.FLAG_SEPARATOR)
+        if flags in self.__candidates:
+            return self.__candidates[flags], False
+
+        build_path = os.path.join(self.work_dir, f"variant{len(self.__candidates)}")
+        builder = self.__builder.variant(build_path) \
+            if self.__builder.ISOLATED_VARIANTS else self.__builder
+        c = Candidate(config, flags, builder, build_path)
+        self.__candidates[flags] = c
+        return c, True
+
+    async def __build(self, c: Candidate, jobs: int) -> bool:
+        """
+        builds the variant `c`
+        """
+        add_flags, flags = ("", c.flags) if self.overwrite else (c.flags, "")
+        if c.target is None:
+            # the discovery of a variant may configure its build tree
+            await c.builder.atargets()
+            c.target = c.builder.target(self.target.name())
+            if c.target is None:
+                logging.error("%s not available in %s", self.target.name(), c.build_path)
+                c.success = False
+                return False
+
+        start = time.perf_counter()
+        c.success = await c.builder.abuild(c.target, add_flags, flags, jobs)
+        c.build_time += time.perf_counter() - start
+        self.__current = c
+        return c.success
+
+    async def __build_all(self, candidates: List[Candidate]):
+        """
+        builds all candidates concurrently under the job budget
+        """
+        pool = JobPool(self.jobs)
+
+        async def build_one(c: Candidate, k: int):
+            try:
+                await self.__build(c, k)
+            finally:
+                await pool.release(k)
+
+        tasks = []
+        try:
+            for i, c in enumerate(candidates):
+                k = await pool.acquire(len(candidates) - i)
+                tasks.append(asyncio.ensure_future(build_one(c, k)))
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+    async def __measure(self, c: Candidate, repeat: int):
+        """
+        benchmarks the candidate `repeat` more times
+        """
+        if not c.success:
+            return
+        if not self.__builder.ISOLATED_VARIANTS and self.__current is not c:
+            if not await self.__build(c, self.jobs):
+                return
+
+        warmup = 0 if c.result else self.warmup
+        r = await c.builder.abenchmark(c.target, repeat, warmup, self.args, self.env)
+        if not r.success:
+            c.success = False
+            return
+        if c.result is None:
+            c.result = r
+        else:
+            c.result.samples += r.samples
+            c.result.output = r.output
+
+    async def __halve(self, configs: List[Dict[str, str]]) -> Union[Candidate, None]:
+        """
+        successive halving over `configs`
+        :return the best candidate, or `None` if all failed
+        """
+        alive = []
+        new = []
+        for config in configs:
+            c, is_new = self.__candidate(config)
+            if c not in alive:
+                alive.append(c)
+            if is_new:
+                new.append(c)
+
+        if self.__builder.ISOLATED_VARIANTS:
+            await self.__build_all(new)
+
+        repeat = self.repeat
+        while alive:
+            self.__rounds.append(list(alive))
+            for c in alive:
+                # candidates measured by a previous search (greedy
+                # strategy) only catch up
+                if c.samples() < repeat:
+                    await self.__measure(c, repeat - c.samples())
+
+            alive = sorted((c for c in alive if c.success), key=lambda c: c.median())
+            if len(alive) <= 1:
+                break
+            alive = alive[:math.ceil(len(alive) / self.eta)]
+            if len(alive) == 1:
+                break
+            repeat *= self.eta
+
+        return alive[0] if alive else None
+
+
+def autotune(target: Target,
+             space: Union[FlagSpace, Dict[str, Sequence[str]]],
+             strategy: str = "grid",
+             **kwargs) -> TuneResult:
+    """
+    simple helper function, see `Autotuner`.
+    """
+    return Autotuner(target, space, strategy, **kwargs).run()
@@ -1,15 +1,15 @@
 #!/usr/bin/env python3
 """ wrapper around `bazel`"""
-import logging
 import tempfile
 import re
 import os
 import itertools
-from subprocess import Popen, PIPE, STDOUT
 from pathlib import Path
-from typing import Union, List, Any
+from typing import Union, List, Any, Dict, Set
 
-from .common import Target, Builder, clean_lines, run_cmd
+from .common import Target, Builder
+from .execute import Command, Execution
+from .progress import ProgressParser, BazelProgressParser
 
 
 class Bazel(Builder):
@@ -18,6 +18,9 @@ class Bazel(Builder):
     """
     CMD = "bazel"
 
+    # every flag in `add_flags` is passed as a separate `--copt`
+    FLAG_SEPARATOR = ","
+
     # build_target: //main:hello-world
     # returns: {"label": "hello-world", "path": "bazel-out/k8-fastbuild/bin/main/hello-world"}
     get_build_path_cmd = ("bazel cquery ${build_target} --output=starlark "
@@ -58,9 +61,10 @@ class Bazel(Builder):
         self.__all_choices = Bazel.filter_choices(self.target_choices,
                                                   self.rule_choices,
                                                   target, rule)
-        self.__build_files = Bazel.find_build_files(self.__bazel_path)
-        assert self.__build_files
-
+        # `BUILD` file -> the targets of its package, see `_discover`
+        self.__packages: Union[Dict[str, List[Target]], None] = None
+        # all directories of the workspace
+        self.__dirs: Set[str] = set()
         # build path
         if build_path:
             self.__build_path: Path = build_path if isinstance(build_path, Path) \
@@ -69,30 +73,108 @@ class Bazel(Builder):
             t = tempfile.gettempdir()
             self.__build_path = Path(t)
 
+    def _discover(self, executions: List[Execution]):
+        """
+        walks the workspace and parses all `BUILD` files
+        """
+        self.__dirs = set()
+        self.__build_files = self.__walk(self.__bazel_path)
+        assert self.__build_files
+
+        self.__packages = {}
+        for f in self.__build_files:
+            self.__packages[f] = self.__package_targets(f)
+        self.__update_targets()
+        assert self._targets
+
+    def __walk(self, path: str) -> List[str]:
+        """
+        see `find_build_files`. Additionally, all visited directories are
+        remembered.
+        """
+        ret = []
+        for root, _, files in os.walk(path, topdown=True, followlinks=False):
+            self.__dirs.add(root)
+            if "BUILD" in files:
+                ret.append(os.path.join(root, "BUILD"))
+        return ret
+
+    def __package_targets(self, build_file: str) -> List[Target]:
+        """
+        :param build_file: the `BUILD` file of a package
+        :return the targets of the package
+        """
         # list of the form:
         #   [ // main: hello-world, hello-world],
         #   [ // main: hello-greet, hello-greet],
-        self.__targets = Bazel.bzlst(self.__build_files, self.__bazel_path, self.__all_choices)
-        assert self.__targets
-        self._targets = [Target(o[1], self.__build_path,
-                                [o[0]], self.build, self.run)
-            for o in self.__targets]
+        rules = Bazel.extract_bazel_rules(build_file, self.__bazel_path, self.__all_choices)
+        return [Target(o[1], self.__build_path, [o[0]], self.build, self.run)
+                for o in rules]
+
+    def __update_targets(self):
+        """
+        collects the targets of all packages
+        """
+        self.__build_files = list(self.__packages.keys())
+        self._targets = list(itertools.chain(*self.__packages.values()))
 
-    def build(self, target: Target,
-              add_flags: Union[str, List[str]] = "",
-              flags: str = "") -> bool :
+    def _rediscover(self, changed: List[str]) -> bool:
+        """
+        only the packages, whose `BUILD` file changed, are parsed again. New
+        `BUILD` files are searched only in the changed directories.
+        """
+        packages = self.__packages
+        if packages is None:
+            # the targets were restored from a `DiscoveryCache`
+            return False
+        self.__dirs = {d for d in self.__dirs if os.path.isdir(d)}
+        for path in changed:
+            if os.path.isdir(path):
+                # only new sub directories are searched for `BUILD` files
+                build = os.path.join(path, "BUILD")
+                files = [build] if os.path.isfile(build) else []
+                for e in os.scandir(path):
+                    if e.is_dir(follow_symlinks=False) and e.path not in self.__dirs:
+                        files += self.__walk(e.path)
+                for f in files:
+                    if f not in packages:
+                        packages[f] = self.__package_targets(f)
+            elif os.path.basename(path) == "BUILD" and os.path.isfile(path):
+                packages[path] = self.__package_targets(path)
+        for f in [f for f in packages if not os.path.isfile(f)]:
+            del packages[f]
+        self.__update_targets()
+        return True
+
+    def _discovery_key(self) -> Union[List, None]:
+        """
+        the workspace and the selected rules
+        """
+        return [self.__bazel_path, self.__build_path, self.__all_choices]
+
+    def _discovery_inputs(self) -> List[Union[str, Path]]:
+        """
+        every `BUILD` file and every directory of the workspace, so new
+        `BUILD` files are noticed
+        """
+        return sorted(self.__dirs) + self.__build_files
+
+    def _build_commands(self, target: Target,
+                        add_flags: Union[str, List[str]] = "",
+                        flags: str = "",
+                        jobs: Union[int, None] = None) -> List[Command]:
         """
         :param target: target to build
         :param add_flags: if passed will be appended to the original flags
         :param flags: if this flag is set, all compiler flags (even the original)
             ones will be overwritten. TODO not supported
-        :return true or false
+        :param jobs: overwrites the number of threads
         """
         # run bazel sync first, to make sure that all dependencies are there.
         # self.__run(["sync"])
 
         # next construct the build command
-        cmd = [Bazel.CMD, 'build', "--jobs", self.__nr_threads, 
+        cmd = [Bazel.CMD, 'build', "--jobs", str(jobs) if jobs else self.__nr_threads,
                target.build_commands()[0]]
 
         if isinstance(add_flags, str):
@@ -104,46 +186,32 @@ class Bazel(Builder):
         for f in add_flags:
             cmd += [f"--copt={f}"]
 
-        logging.debug(cmd)
-        with Popen(cmd, stdout=PIPE, stderr=STDOUT, universal_newlines=True,
-                   cwd=self.__bazel_path) as p:
-            p.wait()
-            assert p.stdout
-            data = p.stdout.readlines()
-            data = clean_lines(data)
-            if p.returncode != 0:
-                logging.error("couldnt build project: %s", data)
-                return False
-
-        target.is_build()
-        return True
+        # without a terminal, bazel prints its progress only now and then
+        if self._progress:
+            cmd += ["--curses=no", "--show_progress_rate_limit=1"]
+
+        return [Command(cmd, cwd=self.__bazel_path)]
 
-    def run(self, target: Target) -> List[str]:
+    def _progress_parser(self, target: Target) -> ProgressParser:
         """
-        runs the target
+        bazel prints `[finished / total] action` lines
         """
-        cmd = [Bazel.CMD, 'run', target.build_commands()[0]]
-        _, ret = run_cmd(cmd, self.__bazel_path)
-        return ret
+        _ = target
+        return BazelProgressParser()
 
-    def available(self) -> bool:
+    def _run_command(self, target: Target,
+                     args: Union[List[str], None] = None,
+                     env: Union[Dict[str, str], None] = None) -> Command:
         """
-        return a boolean value depending on cmake is available on the machine or not.
-        NOTE: this function will check whether the given command in the constructor
-        is available or not.
+        runs the target
         """
-        cmd = [Bazel.CMD, '--version']
-        logging.debug(cmd)
-        b, _ = run_cmd(cmd)
-        return b == 0
+        cmd = [Bazel.CMD, 'run', target.build_commands()[0]]
+        if args:
+            cmd += ["--"] + args
+        return Command(cmd, cwd=self.__bazel_path, env=env, tail=0)
 
-    def __version__(self):
+    def _parse_version(self, data: List[str]) -> Union[str, None]:
         """ returns the version of the installed/given `bazel` """
-        cmd = [Bazel.CMD, "--version"]
-        b, data = run_cmd(cmd)
-        if b != 0:
-            return None
-
         assert len(data) == 1
         data = data[0]
         ver = re.findall(r'\d.\d+.\d', data)
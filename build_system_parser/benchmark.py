@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+""" benchmarks a build target: timing samples and their statistics """
+import math
+import statistics
+import sys
+from typing import List, Dict, Union, Sequence
+
+from .execute import Execution
+
+
+def percentile(data: Sequence[float], p: float) -> float:
+    """
+    :param data: the samples
+    :param p: the percentile in [0, 100]
+    :return the `p`-th percentile of `data`, using linear interpolation
+        between the two closest ranks.
+    """
+    assert data
+    assert 0 <= p <= 100
+    d = sorted(data)
+    k = (len(d) - 1) * p / 100.
+    lo, hi = math.floor(k), math.ceil(k)
+    return d[lo] + (d[hi] - d[lo]) * (k - lo)
+
+
+def summarize(data: Sequence[float],
+              percentiles: Sequence[float] = (5, 25, 75, 95, 99)) -> Dict[str, float]:
+    """
+    :param data: the samples
+    :param percentiles: which percentiles to compute
+    :return min/max/median/mean/stddev and the percentiles of `data`
+    """
+    if not data:
+        return {}
+    ret = {
+        "min": min(data),
+        "max": max(data),
+        "median": statistics.median(data),
+        "mean": statistics.fmean(data),
+        "stddev": statistics.stdev(data) if len(data) > 1 else 0.,
+    }
+    for p in percentiles:
+        ret[f"p{p:g}"] = percentile(data, p)
+    return ret
+
+
+class Sample:
+    """
+    a single run of a benchmarked binary
+    """
+    def __init__(self, e: Execution):
+        """
+        :param e: the finished execution of the binary
+        """
+        self.returncode = e.returncode
+        # seconds
+        self.wall = e.wall_time
+        self.user = e.rusage.ru_utime if e.rusage else 0.
+        self.sys = e.rusage.ru_stime if e.rusage else 0.
+        # maximum resident set size in bytes
+        self.max_rss = 0
+        if e.rusage:
+            # linux reports KiB, macOS bytes
+            self.max_rss = e.rusage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+    def __repr__(self) -> str:
+        return f"wall={self.wall:.6f}s user={self.user:.6f}s sys={self.sys:.6f}s " \
+               f"rss={self.max_rss}"
+
+
+class BenchmarkResult:
+    """
+    All samples of a benchmark and their statistics. Warmup runs are not
+    part of the samples.
+    """
+    def __init__(self, target, samples: Union[List[Sample], None] = None):
+        """
+        :param target: the benchmarked `Target`
+        :param samples: the measured runs
+        """
+        self.target = target
+        self.samples: List[Sample] = samples if samples else []
+        self.success = True
+
+        # output of the last run
+        self.output: List[str] = []
+
+    def wall_times(self) -> List[float]:
+        """ :return the wall-clock time of each sample in seconds """
+        return [s.wall for s in self.samples]
+
+    def user_times(self) -> List[float]:
+        """ :return the user CPU time of each sample in seconds """
+        return [s.user for s in self.samples]
+
+    def sys_times(self) -> List[float]:
+        """ :return the system CPU time of each sample in seconds """
+        return [s.sys for s in self.samples]
+
+    def max_rss(self) -> int:
+        """ :return the maximum resident set size over all samples in bytes """
+        return max((s.max_rss for s in self.samples), default=0)
+
+    def min(self) -> float:
+        """ :return the fastest wall-clock time """
+        return min(self.wall_times())
+
+    def median(self) -> float:
+        """ :return the median wall-clock time """
+        return statistics.median(self.wall_times())
+
+    def mean(self) -> float:
+        """ :return the mean wall-clock time """
+        return statistics.fmean(self.wall_times())
+
+    def stddev(self) -> float:
+        """ :return the standard deviation of the wall-clock time """
+        w = self.wall_times()
+        return statistics.stdev(w) if len(w) > 1 else 0.
+
+    def percentile(self, p: float) -> float:
+        """ :return the `p`-th percentile of the wall-clock time """
+        return percentile(self.wall_times(), p)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        :return summaries (see `summarize`) of the wall, user and sys times
+        """
+        return {
+            "wall": summarize(self.wall_times()),
+            "user": summarize(self.user_times()),
+            "sys": summarize(self.sys_times()),
+        }
+
+    def __bool__(self):
+        return self.success
+
+    def __repr__(self) -> str:
+        if not self.samples:
+            return f"{self.target.name()}: no samples"
+        return f"{self.target.name()}: median={self.median():.6f}s " \
+               f"min={self.min():.6f}s stddev={self.stddev():.6f}s " \
+               f"n={len(self.samples)} rss={self.max_rss()}"
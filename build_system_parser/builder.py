@@ -6,7 +6,12 @@ from typing import Union
 from pathlib import Path
 
 from .common import Builder
-from . import Bazel, Cargo, CMake, CompileCommands, Make, Ninja
+from .bazel import Bazel
+from .cargo import Cargo
+from .cmake import CMake
+from .compile_commands import CompileCommands
+from .make import Make
+from .ninja import Ninja
 
 
 def find_build_system(f: Union[str, Path]) -> Union[Builder, None]:
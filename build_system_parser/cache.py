@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+content-addressed cache of build artifacts. A build is keyed on the hash of
+the input sources of the target, the effective compiler flags, the build
+command and the version of the toolchain. If a key is already in the cache,
+the artifacts are restored into the build tree and the build tool is not
+launched at all.
+
+    from build_system_parser.cache import ArtifactCache
+    B = Make("path/to/Makefile").use_cache(ArtifactCache(max_size=1 << 30))
+
+The cache is safe to be shared by many processes: entries are written into
+a private temporary directory and atomically renamed into place, evicted
+entries are atomically renamed away before they are deleted, and the
+eviction itself is serialized by an `flock` on the cache directory.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Union, List, Dict, Sequence, Iterable, Tuple
+
+from .toolchain import cache_root, tool_version
+
+# bump this, if the layout of an entry or the key changes
+VERSION = 1
+
+# file extensions, which are considered to be input sources of a build
+SOURCE_SUFFIXES = frozenset((
+    ".c", ".h", ".cc", ".cpp", ".cxx", ".c++", ".hh", ".hpp", ".hxx", ".h++",
+    ".inc", ".inl", ".ipp", ".tcc", ".s", ".S", ".asm", ".f", ".f90", ".cu",
+    ".cuh", ".m", ".mm", ".rs", ".go", ".mk", ".cmake", ".ninja", ".toml",
+    ".lock", ".ld", ".lds",
+))
+
+# file names, which are considered to be input sources of a build
+SOURCE_NAMES = frozenset((
+    "Makefile", "makefile", "GNUmakefile", "CMakeLists.txt", "build.ninja",
+    "Cargo.toml", "Cargo.lock", "BUILD", "BUILD.bazel", "WORKSPACE",
+))
+
+# environment variables, which change the result of a build
+ENV_VARS = ("CC", "CXX", "CPPFLAGS", "CFLAGS", "CXXFLAGS", "LDFLAGS",
+            "LDLIBS", "RUSTFLAGS")
+
+
+def default_cache_dir() -> Path:
+    """
+    :return `$XDG_CACHE_HOME/build_system_parser/artifacts`
+    """
+    return cache_root() / "artifacts"
+
+
+def is_source(path: Union[str, Path]) -> bool:
+    """
+    :return true if `path` looks like an input source of a build
+    """
+    p = Path(path)
+    return p.name in SOURCE_NAMES or p.suffix in SOURCE_SUFFIXES
+
+
+def source_files(root: Union[str, Path],
+                 exclude: Sequence[Union[str, Path]] = ()) -> List[Path]:
+    """
+    :param root: directory to search
+    :param exclude: directories which are skipped, e.g. the build tree
+    :return all input sources (see `is_source`) below `root`. Hidden
+        directories are skipped.
+    """
+    excluded = {os.path.abspath(e) for e in exclude}
+    ret = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith(".") and
+                             os.path.abspath(os.path.join(dirpath, d)) not in excluded)
+        ret += [Path(dirpath) / f for f in sorted(filenames) if is_source(f)]
+    return ret
+
+
+def file_digest(path: Union[str, Path]) -> str:
+    """
+    :return sha256 of the content of the file
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def build_key(inputs: Iterable[Union[str, Path]],
+              command: Sequence[str],
+              flags: Dict[str, str],
+              toolchain: Sequence[str]) -> str:
+    """
+    :param inputs: input sources of the target
+    :param command: everything which describes the build of the target
+    :param flags: the effective compiler flags
+    :param toolchain: the tools whose version influences the build
+    :return the cache key of a build
+    """
+    h = hashlib.sha256()
+    h.update(json.dumps({
+        "version": VERSION,
+        "command": [str(c) for c in command],
+        "flags": flags,
+        "toolchain": {t: tool_version(t) for t in toolchain},
+    }, sort_keys=True).encode())
+    for path in sorted({os.path.abspath(p) for p in inputs}):
+        h.update(path.encode() + b"\0")
+        h.update(file_digest(path).encode() if os.path.isfile(path) else b"-")
+    return h.hexdigest()
+
+
+class ArtifactCache:
+    """
+    Size-bounded, content-addressed store of build artifacts with
+    least-recently-used eviction.
+
+    Each entry is a directory `<path>/<key[:2]>/<key>`, which holds the
+    artifacts of a single build, named by their position. The modification
+    time of the entry is its last use.
+    """
+    def __init__(self, path: Union[str, Path, None] = None,
+                 max_size: int = 10 << 30):
+        """
+        :param path: directory of the cache. If `None` the default
+            (`default_cache_dir`) is used.
+        :param max_size: maximal size of all artifacts in bytes
+        """
+        assert max_size > 0
+        self.path = Path(path) if path else default_cache_dir()
+        self.max_size = max_size
+        os.makedirs(self.path, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+
+    def __entry(self, key: str) -> Path:
+        """
+        :return the directory of the entry `key`
+        """
+        return self.path / key[:2] / key
+
+    def __contains__(self, key: str) -> bool:
+        return self.__entry(key).is_dir()
+
+    def restore(self, key: str, outputs: Sequence[Union[str, Path]]) -> bool:
+        """
+        copies the artifacts of the entry `key` to `outputs`.
+        :param key: see `build_key`
+        :param outputs: where the artifacts are restored to
+        :return true on a hit
+        """
+        entry = self.__entry(key)
+        try:
+            files = sorted(os.listdir(entry), key=int)
+            if len(files) != len(outputs):
+                self.misses += 1
+                return False
+
+            for name, out in zip(files, outputs):
+                os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+                # write next to the output and rename it, so nobody sees a
+                # partially written artifact
+                fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(out)),
+                                           prefix=".restore")
+                os.close(fd)
+                try:
+                    # a fresh timestamp, so the restored artifact is newer
+                    # than its sources
+                    shutil.copyfile(entry / name, tmp)
+                    shutil.copymode(entry / name, tmp)
+                    os.replace(tmp, out)
+                except BaseException:
+                    os.unlink(tmp)
+                    raise
+            os.utime(entry)
+        except (FileNotFoundError, ValueError):
+            # not available or evicted concurrently
+            self.misses += 1
+            return False
+
+        self.hits += 1
+        return True
+
+    def store(self, key: str, outputs: Sequence[Union[str, Path]]) -> bool:
+        """
+        inserts the artifacts `outputs` as the entry `key`, and evicts the
+        least recently used entries if the cache is too large.
+        :param key: see `build_key`
+        :param outputs: the artifacts of the build
+        :return true if the entry was inserted
+        """
+        entry = self.__entry(key)
+        if entry.is_dir():
+            os.utime(entry)
+            return True
+
+        if not outputs or not all(os.path.isfile(o) for o in outputs):
+            return False
+        if sum(os.path.getsize(o) for o in outputs) > self.max_size:
+            return False
+
+        os.makedirs(entry.parent, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=entry.parent, prefix=".tmp")
+        try:
+            for i, out in enumerate(outputs):
+                shutil.copy2(out, os.path.join(tmp, str(i)))
+            os.rename(tmp, entry)
+        except OSError:
+            # another process inserted the same entry in the meantime
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not entry.is_dir():
+                raise
+
+        self.evict()
+        return True
+
+    def entries(self) -> List[Tuple[float, int, Path]]:
+        """
+        :return (last use, size, path) of each entry
+        """
+        ret = []
+        for shard in os.scandir(self.path):
+            if not shard.is_dir() or shard.name.startswith("."):
+                continue
+            for e in os.scandir(shard.path):
+                if e.name.startswith("."):
+                    continue
+                try:
+                    size = sum(f.stat().st_size for f in os.scandir(e.path))
+                    ret.append((e.stat().st_mtime, size, Path(e.path)))
+                except FileNotFoundError:
+                    pass
+        return ret
+
+    def size(self) -> int:
+        """
+        :return the size of all artifacts in bytes
+        """
+        return sum(s for _, s, _ in self.entries())
+
+    def evict(self, max_size: Union[int, None] = None):
+        """
+        removes the least recently used entries, until the cache is
+        smaller than `max_size`.
+        :param max_size: if `None` the `max_size` of the cache is used
+        """
+        max_size = self.max_size if max_size is None else max_size
+        with open(self.path / ".lock", "w", encoding="utf-8") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            entries = sorted(self.entries())
+            total = sum(s for _, s, _ in entries)
+            for _, size, path in entries:
+                if total <= max_size:
+                    break
+                # a concurrent `restore` either finds the complete entry
+                # or none at all
+                trash = path.parent / f".evict{os.getpid()}.{time.monotonic_ns()}"
+                try:
+                    os.rename(path, trash)
+                except FileNotFoundError:
+                    continue
+                shutil.rmtree(trash, ignore_errors=True)
+                total -= size
+
+    def clear(self):
+        """
+        removes all entries
+        """
+        self.evict(0)
+
+    def __repr__(self) -> str:
+        return f"ArtifactCache({self.path}, hits={self.hits}, misses={self.misses})"
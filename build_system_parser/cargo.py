@@ -5,12 +5,13 @@ import logging
 import re
 import json
 import os.path
-from subprocess import Popen, PIPE, STDOUT
-from typing import Union, List
+from typing import Union, List, Dict
 from os.path import join
 from pathlib import Path
 
-from .common import Target, Builder, check_if_file_or_path_containing, inject_env, run_cmd
+from .common import Target, Builder, check_if_file_or_path_containing, inject_env
+from .execute import Command, Execution
+from .progress import ProgressParser, CargoMessageParser
 
 
 class Cargo(Builder):
@@ -20,6 +21,9 @@ class Cargo(Builder):
 
     CMD = "cargo"
 
+    # every variant uses its own `--target-dir`
+    ISOLATED_VARIANTS = True
+
     def __init__(
         self,
         file: Union[str, Path],
@@ -33,8 +37,9 @@ class Cargo(Builder):
             - relative of absolute path to a directory containing a `Cargo.toml`
             the `path` can be a `str` or `Path`
         :param build_path:
-            path where the binary should be generated. If not passed
-            as an argument a random temp path will be chosen
+            path where the binary should be generated (`--target-dir`).
+            If not passed as an argument the target directory of the
+            project is used.
         :param cargo_cmd: path to the `cargo` executable
         :param nr_threads: number of threads to use to build the project
             0 = all available
@@ -44,7 +49,9 @@ class Cargo(Builder):
             Cargo.CMD = cargo_cmd
 
         assert(nr_threads >= 0)
+        self.__threads = nr_threads
         self.__nr_threads: str = "" if nr_threads == 0 else str(nr_threads)
+        self.__target_dir = str(build_path) if build_path else ""
 
         file_ = check_if_file_or_path_containing(file, "Cargo.toml")
         if not file_:
@@ -63,10 +70,17 @@ class Cargo(Builder):
         # only the path of the cargo.toml
         self.__path = self.__file.parent
 
+    def _discover(self, executions: List[Execution]):
+        """
+        parses the output of `cargo metadata`
+        """
         # first parse all metadata about the project
-        self.__metadata = self.__get_metadata()
+        self.__metadata = self.__get_metadata(executions[0])
         # next get the build path
-        self.__build_path = self.__metadata["target_directory"]
+        self.__build_path = self.__target_dir if self.__target_dir else \
+            self.__metadata["target_directory"]
+
+        self._targets = []
         for package in self.__metadata["packages"]:
             targets = package["targets"]
             for t in targets:
@@ -81,85 +95,107 @@ class Cargo(Builder):
                 )
                 self._targets.append(target)
 
-    def build(self,
-              target: Target,
-              add_flags: str = "", flags
-              : str = ""):
+    def _discovery_key(self) -> Union[List, None]:
+        """
+        the Cargo.toml and the target directory
+        """
+        return [self.__file, self.__target_dir, Cargo.CMD]
+
+    def _discovery_inputs(self) -> List[Union[str, Path]]:
+        """
+        the manifests and the lock file of the workspace, the sources of all
+        targets and the directories, in which cargo auto-discovers targets
+        """
+        root = self.__metadata.get("workspace_root", self.__path)
+        ret = [self.__file, join(root, "Cargo.toml"), join(root, "Cargo.lock")]
+        for package in self.__metadata["packages"]:
+            path = os.path.dirname(package["manifest_path"])
+            ret.append(package["manifest_path"])
+            ret += [join(path, d) for d in ("src", "src/bin", "examples", "tests", "benches")]
+            ret += [t["src_path"] for t in package["targets"]]
+        return ret
+
+    def variant(self, build_path: Union[str, Path]) -> "Cargo":
+        """
+        :param build_path: target directory of the variant
+        :return the same crate, which builds into `build_path`
+        """
+        return Cargo(self.__file, build_path, nr_threads=self.__threads)\
+            .use_jobserver(self._jobserver).use_cache(self._cache)
+
+    def __target_dir_args(self) -> List[str]:
+        """
+        :return the arguments which select the target directory
+        """
+        return ["--target-dir", self.__target_dir] if self.__target_dir else []
+
+    def _build_commands(self,
+                        target: Target,
+                        add_flags: str = "",
+                        flags: str = "",
+                        jobs: Union[int, None] = None) -> List[Command]:
         """
         these flags are injected into `RUSTFLAGS`
         :param target: to build
         :param add_flags: TODO
         :param flags: TODO
+        :param jobs: overwrites the number of threads
         """
-        assert isinstance(target, Target)
-        if self._error:
-            return False
-
         env = os.environ.copy()
         if add_flags or flags:
             inject_env(env, "RUSTFLAGS", add_flags, flags)
 
-        kind = target.kind
+        kind = target.kind()
         assert isinstance(kind, str)
-        cmd = [Cargo.CMD, "build", "--jobs", self.__nr_threads, "--" + kind, target.name()]
-        logging.debug(cmd)
-        with Popen(
-            cmd, stdin=PIPE, stdout=PIPE, stderr=STDOUT, close_fds=True, cwd=self.__path
-        ) as p:
-            p.wait()
-
-            # return the output of the make command only a little bit nicer
-            assert p.stdout
-            data = p.stdout.readlines()
-            data = [str(a).replace("b'", "").replace("\\n'", "").lstrip() for a in data]
-            if p.returncode != 0:
-                logging.error("ERROR Build %d: %s", p.returncode, data)
-                return False
-
-            # TODO copy back
-            target.is_build()
-        return True
-
-    def run(self, target: Target) -> List[str]:
+        js = self._active_jobserver()
+        cmd = [Cargo.CMD, "build", "--" + kind, target.name()] + self.__target_dir_args()
+        if not js:
+            cmd += ["--jobs", str(jobs) if jobs else self.__nr_threads]
+        # an artifact message per crate, see `_progress_parser`
+        if self._progress:
+            cmd.append("--message-format=json-render-diagnostics")
+        # TODO copy back
+        return [Command(cmd, cwd=self.__path, env=env, jobserver=js)]
+
+    def _progress_parser(self, target: Target) -> ProgressParser:
         """
-        runs the target
+        cargo reports each finished crate (`compiler-artifact`), but not the
+        number of crates. The total is the number of the last build.
         """
-        run_or_build = "run" if target.kind != "bench" else "bench"
-        cmd = [Cargo.CMD, run_or_build, target.name()]
-        _, r = run_cmd(cmd, cwd=self.__path)
-        return r
+        return CargoMessageParser(self._previous_steps(target))
 
-    def available(self) -> bool:
+    def _run_command(self, target: Target,
+                     args: Union[List[str], None] = None,
+                     env: Union[Dict[str, str], None] = None) -> Command:
         """
-        return a boolean value depending on `make` is available on the machine or not.
-        NOTE: this function will check whether the given command in the constructor
-        is available.
+        runs the target
         """
-        cmd = [Cargo.CMD, "--version"]
-        logging.debug(cmd)
-        with Popen(cmd, stdout=PIPE, stderr=STDOUT, universal_newlines=True) as p:
-            p.wait()
-            if p.returncode != 0:
-                self._error = True
-                return False
-        return True
+        run_or_build = "run" if target.kind() != "bench" else "bench"
+        cmd = [Cargo.CMD, run_or_build, target.name()] + self.__target_dir_args()
+        if args:
+            cmd += ["--"] + args
+        return Command(cmd, cwd=self.__path, env=env, tail=0)
 
-    def __version__(self) -> Union[str, None]:
+    def _parse_version(self, data: List[str]) -> Union[str, None]:
         """returns the version of the installed/given `cargo`"""
-        cmd = [Cargo.CMD, "--version"]
-        b, data = run_cmd(cmd)
-        if b != 0:
-            return None
-
         assert len(data) == 1
         data = data[0]
         ver = re.findall(r"\d.\d+.\d?", data)
         assert len(ver) >= 1
         return ver[0]
-    def __get_metadata(self) -> dict:
+
+    def _discovery_commands(self) -> List[Command]:
         """
         runs:
             cargo metadata --format-version=1 --no-deps
+        """
+        cmd = [Cargo.CMD, "metadata", "--format-version=1", "--no-deps"]
+        return [Command(cmd, cwd=self.__path, tail=0)]
+
+    @staticmethod
+    def __get_metadata(e: Execution) -> dict:
+        """
+        :param e: the finished `cargo metadata --format-version=1 --no-deps`
         :return 
         {
             "packages": [
@@ -233,9 +269,8 @@ class Cargo(Builder):
             "metadata": null
         }
         """
-        cmd = [Cargo.CMD, "metadata", "--format-version=1", "--no-deps"]
-        b, data = run_cmd(cmd, cwd=self.__path)
-        assert b == 0
+        assert e.ok()
+        data = e.output()
         assert len(data) == 1
         data = json.loads(data[0])
         return data
@@ -1,8 +1,133 @@
-from . import main as __main
+#!/usr/bin/env python3
+""" command-line interface of `build_system_parser` """
+
+import os
+import sys
+import argparse
+
+from . import builders
+# NOTE: the builders, `daemon` and `discovery` are only imported if the
+#   target is not built by a running daemon
+from .client import DaemonError, connect, build_env
+
+
+def build_with_daemon(args) -> bool:
+    """
+    builds the target via a running daemon
+    :return false if no daemon is running, or its environment differs
+    """
+    client = connect(args.socket)
+    if client is None:
+        return False
+    with client:
+        try:
+            r = client.call("build", builder=args.builder, target=args.target,
+                            path=os.path.abspath(args.path), build_env=build_env(),
+                            discovery_cache=not args.no_discovery_cache)
+        except DaemonError as e:
+            if "env" in e.response:
+                # the daemon would build with other compilers or flags
+                return False
+            if "names" in e.response:
+                print(f"Target '{args.target}' not found in available targets: "
+                      f"{e.response['names']}")
+            else:
+                print(f"Daemon error: {e}")
+            sys.exit(1)
+    if not r["success"]:
+        print(f"Failed to build target '{args.target}' using {args.builder}.")
+        sys.exit(1)
+    print(f"Successfully built target '{args.target}' using {args.builder}.")
+    return True
 
 
 def main():
-    __main()
+    """
+    Command-line interface for the build system parser.
+    Parses arguments, validates the target, and executes the build process.
+    """
+    parser = argparse.ArgumentParser(description="Universal Build CLI using build_system_parser")
+
+    parser.add_argument('--builder', '-b', choices=builders,
+                        help="Specify the build system to use.")
+    parser.add_argument('--target', '-t',
+                        help="Specify the target to build.")
+    parser.add_argument('--path', '-p',
+                        help="Path to the build file (e.g., Makefile, CMakeLists.txt).")
+    parser.add_argument('--no-discovery-cache', action='store_true',
+                        help="Always rediscover the targets, instead of reusing the "
+                             "ones of the last run if no build file changed.")
+    parser.add_argument('--serve', action='store_true',
+                        help="Run a build daemon, which keeps the builders warm. "
+                             "Subsequent invocations use it transparently.")
+    parser.add_argument('--socket', default=None,
+                        help="Socket of the build daemon.")
+    parser.add_argument('--no-daemon', action='store_true',
+                        help="Build in this process, even if a daemon is running.")
+    args = parser.parse_args()
+
+    if args.serve:
+        from .daemon import BuildDaemon  # pylint: disable=import-outside-toplevel
+        try:
+            BuildDaemon(args.socket).serve_forever()
+        except DaemonError as e:
+            print(e)
+            sys.exit(1)
+        except KeyboardInterrupt:
+            pass
+        return
+    if not (args.builder and args.target and args.path):
+        parser.error("the following arguments are required: --builder, --target, --path")
+
+    if not args.no_daemon and build_with_daemon(args):
+        return
+
+    # only the selected builder is imported
+    builder_map = {
+        'bazel': 'Bazel',
+        'make': 'Make',
+        'cmake': 'CMake',
+        'ninja': 'Ninja',
+        'cargo': 'Cargo',
+        'compile': 'Compile',
+        'compile_commands': 'CompileCommands'
+    }
+
+    builder_class = builder_map.get(args.builder)
+    if not builder_class:
+        print(f"Unsupported builder: {args.builder}")
+        sys.exit(1)
+
+    from .discovery import DiscoveryCache  # pylint: disable=import-outside-toplevel
+    try:
+        builder_class = getattr(sys.modules[__package__], builder_class)
+        builder = builder_class(args.path)
+        if not args.no_discovery_cache:
+            builder.use_discovery_cache(DiscoveryCache())
+        target = builder.target(args.target)
+        if not target:
+            names = [t.name() for t in builder.targets()]
+            print(f"Target '{args.target}' not found in available targets: {names}")
+            sys.exit(1)
+        if not builder.build(target):
+            print(f"Failed to build target '{args.target}' using {args.builder}.")
+            sys.exit(1)
+        print(f"Successfully built target '{args.target}' using {args.builder}.")
+    except FileNotFoundError as e:
+        print(f"Build file not found: {e}")
+        sys.exit(1)
+    except PermissionError as e:
+        print(f"Permission error: {e}")
+        sys.exit(1)
+    except ImportError as e:
+        print(f"Import error: {e}")
+        sys.exit(1)
+    except ValueError as e:
+        print(f"Value error: {e}")
+        sys.exit(1)
+    except RuntimeError as e:
+        print(f"Runtime error: {e}")
+        sys.exit(1)
 
 
 if __name__ == "__main__":
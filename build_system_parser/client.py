@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+client of the build daemon (see `daemon.py`). This module is cheap to
+import: it does not load any builder, so a CLI invocation served by the
+daemon does not pay for them.
+
+    from build_system_parser.client import request
+    r = request("build", builder="make", path="/abs/Makefile", target="prog")
+    if r is None:
+        ... no daemon is running, build in this process ...
+"""
+import json
+import os
+import socket
+import tempfile
+from pathlib import Path
+from typing import Union, Dict, Any
+
+# overwrites the default socket path
+SOCKET_ENV = "BUILD_SYSTEM_PARSER_SOCKET"
+
+# the variables of the environment, which change the result of a build:
+# `cache.ENV_VARS`, the tools found in `PATH` and the flags of a parent
+# make. A daemon only builds for clients with the same values.
+BUILD_ENV_VARS = ("CC", "CXX", "CPPFLAGS", "CFLAGS", "CXXFLAGS", "LDFLAGS",
+                  "LDLIBS", "RUSTFLAGS", "PATH", "MAKEFLAGS", "MFLAGS")
+
+
+def build_env() -> Dict[str, str]:
+    """
+    :return the variables of `BUILD_ENV_VARS`, which are set
+    """
+    return {k: os.environ[k] for k in BUILD_ENV_VARS if k in os.environ}
+
+
+def default_socket_path() -> Path:
+    """
+    :return `$BUILD_SYSTEM_PARSER_SOCKET`, or
+        `$XDG_RUNTIME_DIR/build_system_parser.sock`, or a per-user socket
+        in the temporary directory
+    """
+    path = os.environ.get(SOCKET_ENV)
+    if path:
+        return Path(path)
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime:
+        return Path(runtime) / "build_system_parser.sock"
+    return Path(tempfile.gettempdir()) / f"build_system_parser-{os.getuid()}.sock"
+
+
+class DaemonError(Exception):
+    """
+    the daemon answered a request with an error
+    """
+    def __init__(self, message: str, response: Union[Dict[str, Any], None] = None):
+        super().__init__(message)
+        self.response = response if response else {}
+
+
+class DaemonClient:
+    """
+    connection to a running `BuildDaemon`
+
+        with DaemonClient() as c:
+            c.call("build", builder="make", path="/abs/Makefile", target="prog")
+    """
+    def __init__(self, path: Union[str, Path, None] = None, timeout: Union[float, None] = None):
+        """
+        :param path: of the socket. If `None` `default_socket_path()` is used.
+        :param timeout: of each request in seconds. `None` waits forever.
+        :raise OSError if no daemon is listening, or the socket belongs
+            to another user
+        """
+        self.path = Path(path) if path else default_socket_path()
+        # the temporary directory is shared with other users
+        if os.stat(self.path).st_uid != os.getuid():
+            raise PermissionError(f"{self.path} is owned by another user")
+        self.__socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.__socket.connect(str(self.path))
+        except OSError:
+            self.__socket.close()
+            raise
+        self.__socket.settimeout(timeout)
+        self.__file = self.__socket.makefile("rwb")
+
+    def call(self, method: str, **params) -> Dict[str, Any]:
+        """
+        :param method: see the module documentation
+        :param params: of the request
+        :return the result of the request
+        :raise DaemonError if the daemon answered with an error
+        """
+        request = {"method": method, "params": params}
+        self.__file.write(json.dumps(request).encode() + b"\n")
+        self.__file.flush()
+        line = self.__file.readline()
+        if not line:
+            raise DaemonError("the daemon closed the connection")
+        response = json.loads(line)
+        if not response.get("ok"):
+            raise DaemonError(response.get("error", ""), response)
+        return response["result"]
+
+    def close(self):
+        """ closes the connection """
+        self.__file.close()
+        self.__socket.close()
+
+    def __enter__(self) -> "DaemonClient":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def connect(path: Union[str, Path, None] = None) -> Union[DaemonClient, None]:
+    """
+    :param path: of the socket. If `None` `default_socket_path()` is used.
+    :return a client, or `None` if no daemon is running
+    """
+    try:
+        return DaemonClient(path)
+    except OSError:
+        return None
+
+
+def is_running(path: Union[str, Path, None] = None) -> bool:
+    """
+    :return true if a daemon listens on `path`
+    """
+    c = connect(path)
+    if c is None:
+        return False
+    c.close()
+    return True
+
+
+def request(method: str, socket_path: Union[str, Path, None] = None,
+            **params) -> Union[Dict[str, Any], None]:
+    """
+    sends a single request to the daemon
+    :param socket_path: of the daemon. If `None` `default_socket_path()` is used.
+    :return the result, or `None` if no daemon is running
+    :raise DaemonError if the daemon answered with an error
+    """
+    c = connect(socket_path)
+    if c is None:
+        return None
+    with c:
+        return c.call(method, **params)
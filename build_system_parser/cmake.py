@@ -4,14 +4,21 @@ import logging
 import tempfile
 import re
 import os
-from subprocess import Popen, PIPE, STDOUT
 from pathlib import Path
-from typing import Union
+from typing import Union, List, Dict
 
 from .parse_cmake import parsing
+from . import toolchain
 from .make import Make
-from .common import Target, Builder, check_if_file_or_path_containing, inject_env, clean_lines
-from .parse_cmake import parsing
+from .common import Target, Builder, check_if_file_or_path_containing, inject_env
+from .execute import Command, Execution
+from .cache import source_files
+from .progress import ProgressParser, CMakeProgressParser, NINJA_STATUS
+from .cmake_fileapi import CodeModel, FileApiError, write_query
+
+# type of a target in the codemodel -> `Target.kind()`
+KINDS = {"EXECUTABLE": "bin", "STATIC_LIBRARY": "lib", "SHARED_LIBRARY": "lib",
+         "MODULE_LIBRARY": "lib", "OBJECT_LIBRARY": "lib", "INTERFACE_LIBRARY": "lib"}
 
 
 class CMake(Builder):
@@ -20,6 +27,9 @@ class CMake(Builder):
     """
     CMD = "cmake"
 
+    # every variant is configured in its own binary dir
+    ISOLATED_VARIANTS = True
+
     def __init__(self, cmake_file: Union[str, Path],
                  build_path: Union[str, Path] = "",
                  cmake_bin: str = "",
@@ -38,15 +48,13 @@ class CMake(Builder):
         """
         super().__init__()
 
-        self.__error = False
-
         self.make = Make.CMD
         if cmake_bin:
             CMake.CMD = cmake_bin
 
         cmake_file = check_if_file_or_path_containing(cmake_file, "CMakeLists.txt")
         if not cmake_file:
-            self.__error = True
+            self._error = True
             logging.error("CMakeLists.txt not available")
             return
 
@@ -57,8 +65,12 @@ class CMake(Builder):
         self.__path: Path = self.__cmakefile.parent
 
         assert(nr_threads >= 0)
+        self.__threads = nr_threads
         self.__nr_threads: str = "" if nr_threads == 0 else str(nr_threads)
 
+        # compiler flags the binary dir is currently configured with
+        self.__configured_flags: Union[str, None] = None
+
         # build path
         if build_path:
             self.__build_path: Path = build_path if isinstance(build_path, Path)\
@@ -67,9 +79,70 @@ class CMake(Builder):
             t = tempfile.gettempdir()
             self.__build_path = Path(t)
 
-        with open(cmake_file, "r", encoding="utf-8") as f:
+    def variant(self, build_path: Union[str, Path]) -> "CMake":
+        """
+        :param build_path: binary dir of the variant
+        :return the same project configured in `build_path`
+        """
+        return CMake(self.__cmakefile, build_path, nr_threads=self.__threads)\
+            .use_jobserver(self._jobserver).use_cache(self._cache)
+
+    def _discovery_commands(self) -> List[Command]:
+        """
+        generates the cmake project. The configure answers the query for
+        the codemodel of the File API.
+        """
+        write_query(self.__build_path)
+        return [Command([CMake.CMD, '-S', self.__path, "-B", self.__build_path])]
+
+    def _discover(self, executions: List[Execution]):
+        """
+        reads the targets from the codemodel of the File API: all targets
+        of all directories, with their artifacts, sources and compile
+        groups. If cmake does not support the File API (< 3.14), only the
+        top level CMakeLists.txt is parsed.
+        """
+        e = executions[0]
+        if not e.ok():
+            self._error = True
+            logging.error("couldn't create the cmake project: %s", e.output())
+            return
+
+        try:
+            model = self.codemodel()
+        except FileApiError as err:
+            logging.warning("no codemodel of %s, parsing %s: %s", self.__build_path,
+                            self.__cmakefile, err)
+            self.__parse_cmakelists()
+            return
+
+        self._targets = []
+        for t in model.targets:
+            build_path = t.artifacts[0] if t.artifacts else os.path.join(t.directory, t.name)
+            tmp = Target(t.name, build_path, [], self.build, self.run,
+                         kind=KINDS.get(t.type, ""), type=t.type,
+                         artifacts=t.artifacts, sources=t.sources,
+                         compile_groups=t.compile_groups,
+                         dependencies=[d.name for d in model.dependencies(t)])
+            self._targets.append(tmp)
+
+    def codemodel(self, configuration: Union[str, None] = None) -> CodeModel:
+        """
+        :param configuration: see `CodeModel`
+        :return the codemodel written by the last configure of the binary dir
+        :raise FileApiError if the binary dir was not configured with the query
+        """
+        return CodeModel(self.__build_path, configuration)
+
+    def __parse_cmakelists(self):
+        """
+        takes the first argument of each `add_library`/`add_executable` of
+        the top level CMakeLists.txt as target name
+        """
+        with open(self.__cmakefile, "r", encoding="utf-8") as f:
             cmake_data = f.read()
 
+        self._targets = []
         self.__internal_cmakefile = parsing.parse(cmake_data)
         for bla in self.__internal_cmakefile:
             try:
@@ -79,88 +152,145 @@ class CMake(Builder):
                                self.build, self.run)
                     self._targets.append(t)
             except (AttributeError, IndexError, TypeError) as e:
-                self.__error = True
-                logging.error("could not parse %s %s", cmake_file, e)
+                self._error = True
+                logging.error("could not parse %s %s", self.__cmakefile, e)
                 return
 
-        # generate the cmake project
-        cmd = [CMake.CMD, '-S', self.__path, "-B", self.__build_path]
-        logging.debug(cmd)
-        with Popen(cmd, stdout=PIPE, stderr=STDOUT, universal_newlines=True) as p:
-            p.wait()
-            if p.returncode != 0:
-                self.__error = True
-                assert p.stdout
-                logging.error("couldn't create the cmake project: %s", p.stdout.read())
-                return
+    def _rediscover(self, changed: List[str]) -> bool:
+        """
+        The targets are read from the codemodel, to which every
+        CMakeLists.txt and every `include()`d `*.cmake` file may add targets.
+        Hence, a change of any of them is discovered from scratch. Changes
+        of other files keep the targets.
+        """
+        return not any(os.path.basename(c) == "CMakeLists.txt" or c.endswith(".cmake")
+                       for c in changed)
+
+    def _discovery_key(self) -> Union[List, None]:
+        """
+        the CMakeLists.txt and the binary dir
+        """
+        return [self.__cmakefile, self.__build_path, CMake.CMD]
+
+    def _discovery_inputs(self) -> List[Union[str, Path]]:
+        """
+        all CMakeLists.txt and `*.cmake` files of the project
+        """
+        ret = [self.__cmakefile]
+        build_path = os.path.abspath(self.__build_path)
+        for root, dirs, files in os.walk(self.__path):
+            dirs[:] = [d for d in dirs if not d.startswith(".") and
+                       os.path.join(root, d) != build_path]
+            ret += [os.path.join(root, f) for f in files
+                    if f == "CMakeLists.txt" or f.endswith(".cmake")]
+        return ret
+
+    def capabilities(self) -> Dict:
+        """
+        `cmake --build` passes the jobserver on to the build tool of the
+        generator. Hence, the jobserver capabilities are the ones of it.
+        """
+        ret = dict(super().capabilities())
+        tool = toolchain.probe([self.__make_program(), "--version"])
+        ret.update((k, v) for k, v in tool.capabilities.items() if k.startswith("jobserver"))
+        return ret
 
-    def available(self) -> bool:
+    def __make_program(self) -> str:
         """
-        return a boolean value depending on cmake is available on the machine or not.
-        NOTE: this function will check whether the given command in the constructor
-        is available or not.
+        :return the build tool of the generator of the binary dir, `make`
+            if it is not configured yet
         """
-        cmd = [CMake.CMD, '--version']
-        logging.debug(cmd)
-        with Popen(cmd, stdout=PIPE, stderr=STDOUT, universal_newlines=True) as p:
-            p.wait()
-            if p.returncode != 0:
-                return False
-        return True
+        try:
+            with open(Path(self.__build_path, "CMakeCache.txt"), encoding="utf-8") as f:
+                for line in f:
+                    if line.startswith("CMAKE_MAKE_PROGRAM:"):
+                        return line.split("=", 1)[1].strip()
+        except (OSError, UnicodeDecodeError):
+            pass
+        return self.make
 
-    def build(self, target: Target, add_flags: str = "", flags: str = "") ->bool :
+    def _build_commands(self, target: Target,
+                        add_flags: str = "",
+                        flags: str = "",
+                        jobs: Union[int, None] = None) -> List[Command]:
         """
         :param target:
         :param add_flags:
         :param flags
+        :param jobs: overwrites the number of threads
         """
-        if self.__error:
-            return False
+        # the underlying build tool is a client of the jobserver
+        js = self._active_jobserver()
+        cmd = [CMake.CMD, '--build', self.__build_path]
+        if not js:
+            cmd += ['--parallel', str(jobs) if jobs else self.__nr_threads]
 
-        cmd = [CMake.CMD, '--build', self.__build_path, '--parallel', self.__nr_threads]
+        cmd += ['--target', target.name()]
 
         # set flags
         env = os.environ.copy()
         inject_env(env, "CFLAGS", add_flags, flags)
         inject_env(env, "CXXFLAGS", add_flags, flags)
+        # the status lines of the ninja generator, see `_progress_parser`
+        if self._progress:
+            env["NINJA_STATUS"] = NINJA_STATUS
+        ret = [Command(cmd, env=env, jobserver=js)]
+
+        # `CFLAGS` is only read by the first configuration of the binary dir.
+        # Hence, the compiler flags must be set in the cache.
+        if add_flags or flags or self.__configured_flags:
+            c_flags = env.get("CFLAGS", "") if add_flags or flags else ""
+            cxx_flags = env.get("CXXFLAGS", "") if add_flags or flags else ""
+            configure = [CMake.CMD, '-S', self.__path, "-B", self.__build_path,
+                         f"-DCMAKE_C_FLAGS={c_flags}",
+                         f"-DCMAKE_CXX_FLAGS={cxx_flags}"]
+            ret.insert(0, Command(configure))
+            self.__configured_flags = c_flags + cxx_flags
+        elif not os.path.isfile(os.path.join(self.__build_path, "CMakeCache.txt")):
+            # the targets were restored from a `DiscoveryCache`, hence the
+            # binary dir was not configured by this builder
+            ret = self._discovery_commands() + ret
+        return ret
 
-        logging.debug(cmd)
-        with Popen(cmd, stdout=PIPE, stderr=STDOUT, universal_newlines=True, env=env) as p:
-            p.wait()
-            assert p.stdout
-            data = p.stdout.readlines()
-            data = [str(a).replace("b'", "")
-                    .replace("\\n'", "")
-                    .lstrip() for a in data]
+    def _progress_parser(self, target: Target) -> ProgressParser:
+        """
+        the `[ 42%]` lines of the Makefile generator, or the status lines of
+        the ninja generator
+        """
+        _ = target
+        return CMakeProgressParser()
 
-            print(data)
-            if p.returncode != 0:
-                logging.error("couldnt build project: %s", data)
-                return False
+    def _cache_inputs(self, target: Target) -> List[Path]:
+        """
+        all sources of the project, except the binary dir
+        """
+        _ = target
+        return source_files(self.__path, [self.__build_path])
 
-        target.is_build()
-        return True
+    def _cache_outputs(self, target: Target) -> List[Path]:
+        """
+        all artifacts of the codemodel, e.g. the import library of a dll
+        """
+        artifacts = getattr(target, "artifacts", None)
+        if not artifacts:
+            return super()._cache_outputs(target)
+        return [Path(a) for a in artifacts]
+
+    def _cache_toolchain(self) -> List[str]:
+        """
+        the compilers and `cmake` itself
+        """
+        return super()._cache_toolchain() + [CMake.CMD]
 
-    def __version__(self):
+    def _parse_version(self, data: List[str]) -> Union[str, None]:
         """
             returns the version of the installed/given `cmake`
         """
-        cmd = [CMake.CMD, "--version"]
-        with Popen(cmd, stdin=PIPE, stdout=PIPE, stderr=STDOUT) as p:
-            p.wait()
-
-            assert p.stdout
-            data = p.stdout.readlines()
-            data = clean_lines(data)
-            if p.returncode != 0:
-                logging.error(cmd, "not available: %s", data)
-                return None
-
-            assert len(data) > 1
-            data = data[0]
-            ver = re.findall(r'\d.\d+.\d', data)
-            assert len(ver) == 1
-            return ver[0]
+        assert len(data) > 1
+        data = data[0]
+        ver = re.findall(r'\d.\d+.\d', data)
+        assert len(ver) == 1
+        return ver[0]
 
     def __str__(self):
         """ print only the name """
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+client of the CMake File API (cmake >= 3.14). A query file in the binary
+dir asks cmake to write the codemodel (version 2) during each configure.
+It lists every target of the project, including the ones of
+`add_subdirectory` trees, with its evaluated name, type, artifacts,
+sources and compile groups:
+
+    write_query("build")
+    subprocess.run(["cmake", "-S", ".", "-B", "build"])
+    for t in read_codemodel("build").targets:
+        print(t.name, t.type, t.artifacts)
+
+See https://cmake.org/cmake/help/latest/manual/cmake-file-api.7.html
+"""
+import json
+import os
+from pathlib import Path
+from typing import Union, List, Dict
+
+# name of the client, the replies of other clients are ignored
+CLIENT = "build_system_parser"
+API = Path(".cmake", "api", "v1")
+
+
+class FileApiError(Exception):
+    """
+    the reply is missing or invalid
+    """
+
+
+def write_query(build_path: Union[str, Path], client: str = CLIENT) -> Path:
+    """
+    asks for the codemodel. The query is answered by every configure of
+    `build_path`, including the ones `cmake --build` triggers.
+    :param build_path: the binary dir. It does not need to exist yet.
+    :param client: name of the client
+    :return the path of the query
+    """
+    query = Path(build_path, API, "query", f"client-{client}", "codemodel-v2")
+    query.parent.mkdir(parents=True, exist_ok=True)
+    query.touch()
+    return query
+
+
+def _load(path: Path) -> Dict:
+    """
+    :return the json object in `path`
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        raise FileApiError(f"could not read {path}: {e}") from e
+
+
+class CodeModelTarget:
+    """
+    a target of the codemodel. All paths are absolute.
+    """
+    __slots__ = ("name", "id", "type", "directory", "name_on_disk", "artifacts",
+                 "sources", "compile_groups", "dependencies")
+
+    def __init__(self, data: Dict, source: str, build: str, directory: str):
+        """
+        :param data: the target object of the reply
+        :param source: top level source dir
+        :param build: top level binary dir
+        :param directory: the binary dir of the target
+        """
+        self.name: str = data["name"]
+        self.id: str = data["id"]
+        # e.g. "EXECUTABLE", "STATIC_LIBRARY", "UTILITY"
+        self.type: str = data["type"]
+        self.directory = directory
+        self.name_on_disk: str = data.get("nameOnDisk", "")
+        self.artifacts = [os.path.join(build, a["path"]) for a in data.get("artifacts", [])]
+        self.sources = [os.path.join(source, s["path"]) for s in data.get("sources", [])]
+        # ids of the targets this one depends on
+        self.dependencies: List[str] = [d["id"] for d in data.get("dependencies", [])]
+
+        # the sources of a group are compiled with the same flags
+        self.compile_groups: List[Dict] = []
+        for g in data.get("compileGroups", []):
+            self.compile_groups.append({
+                "language": g.get("language", ""),
+                "flags": [f["fragment"] for f in g.get("compileCommandFragments", [])],
+                "includes": [i["path"] for i in g.get("includes", [])],
+                "defines": [d["define"] for d in g.get("defines", [])],
+                "sources": [self.sources[i] for i in g.get("sourceIndexes", [])],
+            })
+
+    def __repr__(self) -> str:
+        return f"CodeModelTarget({self.name!r}, {self.type!r})"
+
+
+class CodeModel:
+    """
+    the codemodel of a single configuration of the binary dir
+    """
+    def __init__(self, build_path: Union[str, Path],
+                 configuration: Union[str, None] = None,
+                 client: str = CLIENT):
+        """
+        reads the latest reply to `write_query`
+        :param build_path: the configured binary dir
+        :param configuration: e.g. "Release" of a multi-config generator.
+            If `None` the first one is read.
+        :param client: name of the client
+        :raise FileApiError if there is no valid reply
+        """
+        reply = Path(build_path, API, "reply")
+        # the latest index has the greatest name
+        try:
+            indexes = sorted(f for f in os.listdir(reply)
+                             if f.startswith("index-") and f.endswith(".json"))
+        except OSError as e:
+            raise FileApiError(f"no reply in {reply}: {e}") from e
+        if not indexes:
+            raise FileApiError(f"no reply in {reply}")
+        index = _load(reply / indexes[-1])
+
+        self.generator: str = index.get("cmake", {}).get("generator", {}).get("name", "")
+        self.version: str = index.get("cmake", {}).get("version", {}).get("string", "")
+        answer = index.get("reply", {}).get(f"client-{client}", {}).get("codemodel-v2")
+        if answer is None:
+            raise FileApiError(f"{reply / indexes[-1]} does not answer the query")
+        if "error" in answer:
+            raise FileApiError(answer["error"])
+        data = _load(reply / answer["jsonFile"])
+
+        self.source = self.build = self.configuration = ""
+        self.configurations: List[str] = []
+        self.targets: List[CodeModelTarget] = []
+        try:
+            self.__read(reply, data, configuration)
+        except (KeyError, IndexError, TypeError) as e:
+            raise FileApiError(f"invalid codemodel in {reply}: {e!r}") from e
+        self.__by_id = {t.id: t for t in self.targets}
+
+    def __read(self, reply: Path, data: Dict, configuration: Union[str, None]):
+        """
+        reads the codemodel `data` and its target objects
+        """
+        self.source = data["paths"]["source"]
+        self.build = data["paths"]["build"]
+        configurations = data["configurations"]
+        self.configurations = [c["name"] for c in configurations]
+        if configuration is None:
+            config = configurations[0]
+        elif configuration in self.configurations:
+            config = configurations[self.configurations.index(configuration)]
+        else:
+            raise FileApiError(f"unknown configuration {configuration}, "
+                               f"available: {self.configurations}")
+        self.configuration = config["name"]
+
+        directories = [os.path.normpath(os.path.join(self.build, d["build"]))
+                       for d in config["directories"]]
+        for t in config["targets"]:
+            self.targets.append(CodeModelTarget(_load(reply / t["jsonFile"]),
+                                                self.source, self.build,
+                                                directories[t["directoryIndex"]]))
+
+    def target(self, name: str) -> Union[CodeModelTarget, None]:
+        """
+        :return the target called `name`, or `None`
+        """
+        return next((t for t in self.targets if t.name == name), None)
+
+    def dependencies(self, target: CodeModelTarget) -> List[CodeModelTarget]:
+        """
+        :return the targets `target` directly depends on
+        """
+        return [self.__by_id[i] for i in target.dependencies if i in self.__by_id]
+
+
+def read_codemodel(build_path: Union[str, Path], **kwargs) -> CodeModel:
+    """
+    :param build_path: the configured binary dir
+    :param kwargs: see `CodeModel`
+    :return the codemodel of `build_path`
+    """
+    return CodeModel(build_path, **kwargs)
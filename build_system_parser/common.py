@@ -1,10 +1,44 @@
 #!/usr/bin/env python3
 """ contains all functions/classes which are needed by all builders """
+import asyncio
 import logging
 import os.path
-from typing import Union, Callable, List, Tuple
+import sys
+import threading
+import time
+from typing import Union, Callable, List, Tuple, Dict, Sequence
 from pathlib import Path
-from subprocess import Popen, PIPE, STDOUT
+
+from .execute import execute, Command, Execution, TAIL_LINES
+from . import jobserver, toolchain
+from .schedule import BuildResult, JobPool
+from .benchmark import BenchmarkResult, Sample
+from .cache import ArtifactCache, ENV_VARS, build_key
+from .index import TargetIndex
+from .discovery import DiscoveryCache, discovery_key, fingerprints, is_fresh
+from .progress import ProgressEvent, ProgressParser, ProgressTracker
+
+
+def intern_args(args: Sequence[str],
+                prefixes: Union[Dict[Tuple[str, ...], Tuple[str, ...]], None] = None) \
+        -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """
+    splits `args` into its leading options (everything before the first
+    non-option argument after the program) and the rest. All strings are
+    interned.
+    :param args: the command line of a target
+    :param prefixes: if set, equal prefixes are shared across all calls
+        with the same dictionary
+    :return the prefix and the rest of `args`
+    """
+    args = tuple(sys.intern(os.fspath(a)) for a in args)
+    if prefixes is None:
+        return args, ()
+    i = 1
+    while i < len(args) and args[i].startswith("-"):
+        i += 1
+    prefix = args[:i]
+    return prefixes.setdefault(prefix, prefix), args[i:]
 
 
 class Target:
@@ -13,40 +47,83 @@ class Target:
     :param build_path: full path (including file name) to the build result
             this is used to run/execute the final binary
     :param build_commands: list of commands to build the target
+
+    Huge projects have hundreds of thousands of targets. Hence, targets do
+    not have a `__dict__`: strings are interned, the build commands are
+    stored as (shared) tuples and the build/run functions of a builder are
+    stored as a single reference to the builder. Additional keyword
+    arguments are readable as attributes.
     """
+    __slots__ = ("__name", "__build_path", "__build_commands", "__build",
+                 "__builder", "__build_function", "__run_function", "__kind",
+                 "__extra_keys", "__extra_values")
+
+    # interned tuples of the names of the additional keyword arguments
+    __extra_names: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
     def __init__(self, name: str,
                  build_path: Union[str, Path],
-                 build_commands: List[str],
+                 build_commands: Sequence[str],
                  build_function: Union[Callable, None] = None,
                  run_function: Union[Callable, None] = None,
+                 kind: str = "",
                  **kwargs):
         """
         :param name: TODO
         :param build_path:
-        :param build_commands:
+        :param build_commands: either a list of arguments, or a
+            `(prefix, rest)` pair as returned by `intern_args`
         :param build_function:
         :param run_function:
+        :param kind: e.g. "bin", "lib", "test"
         """
-        self.__name = name
+        self.__name = sys.intern(name)
         self.__build_path = build_path
-        self.__build_commands = build_commands
+        if isinstance(build_commands, tuple) and len(build_commands) == 2 \
+                and isinstance(build_commands[0], tuple):
+            self.__build_commands = build_commands
+        else:
+            self.__build_commands = intern_args(build_commands)
 
         # if set to true: the target was build and the binary is
         # under `self.__build_path`
         self.__build = False
 
-        self.__build_function = build_function
-        self.__run_function = run_function
+        # the usual case: the target is build and run by its builder
+        builder = getattr(build_function, "__self__", None)
+        if isinstance(builder, Builder) and build_function.__name__ == "build" and \
+                getattr(run_function, "__self__", None) is builder and \
+                run_function.__name__ == "run":
+            self.__builder = builder
+            self.__build_function = self.__run_function = None
+        else:
+            self.__builder = None
+            self.__build_function = build_function
+            self.__run_function = run_function
+        self.__kind = sys.intern(kind)
 
-        for k, v in kwargs.items():
-            self.__dict__[k] = v
+        keys = tuple(kwargs.keys())
+        self.__extra_keys = Target.__extra_names.setdefault(keys, keys)
+        self.__extra_values = tuple(kwargs.values())
+
+    def __getattr__(self, name: str):
+        """
+        :return the additional keyword argument `name`
+        """
+        if name.startswith("_Target__"):
+            raise AttributeError(name)
+        try:
+            return self.__extra_values[self.__extra_keys.index(name)]
+        except ValueError:
+            raise AttributeError(f"'Target' object has no attribute '{name}'") from None
 
     def build_commands(self) -> List[str]:
         """
         :return: a list of str commands which can be executed
                 via cli to build the target
         """
-        return self.__build_commands
+        prefix, rest = self.__build_commands
+        return list(prefix + rest)
 
     def build_path(self):
         """
@@ -64,16 +141,35 @@ class Target:
         """ flags the Target, that it was build and ready to run """
         self.__build = True
 
+    def __fields(self) -> Dict:
+        ret = {"name": self.__name, "build_path": self.__build_path,
+               "build_commands": self.build_commands(), "kind": self.__kind}
+        ret.update(zip(self.__extra_keys, self.__extra_values))
+        return ret
+
+    def to_json(self) -> List:
+        """
+        :return a json serializable representation. The build and run
+            functions are not part of it.
+        """
+        prefix, rest = self.__build_commands
+        build_path = self.__build_path
+        return [self.__name, os.fspath(build_path) if build_path else "",
+                list(prefix + rest), self.__kind,
+                dict(zip(self.__extra_keys, self.__extra_values))]
+
     def __str__(self):
-        return str(self.__dict__)
+        return str(self.__fields())
 
     def __repr__(self) -> str:
-        return str(self.__dict__)
+        return str(self.__fields())
 
     def build(self) -> bool:
         """
         NOTE: no additional flags are passed
         """
+        if self.__builder:
+            return self.__builder.build(self)
         if not self.__build_function:
             logging.error("no build function")
             return False
@@ -85,56 +181,941 @@ class Target:
         :return: STDOUT of the binary
         """
         assert self.__build
+        if self.__builder:
+            return self.__builder.run(self)
         if not self.__run_function:
             logging.error("no run function")
             return False
         return self.__run_function(self)
 
+    def builder(self) -> Union["Builder", None]:
+        """
+        :return the `Builder` this target belongs to, or `None` if the
+            build function is not bound to a builder
+        """
+        if self.__builder:
+            return self.__builder
+        builder = getattr(self.__build_function, "__self__", None)
+        if not isinstance(builder, Builder):
+            builder = getattr(self.__run_function, "__self__", None)
+        return builder if isinstance(builder, Builder) else None
+
+    async def abuild(self) -> bool:
+        """
+        coroutine version of `build`.
+        NOTE: no additional flags are passed
+        """
+        if not self.__builder and not self.__build_function:
+            logging.error("no build function")
+            return False
+        builder = self.builder()
+        if not builder:
+            logging.error("build function is not bound to a builder")
+            return False
+        return await builder.abuild(self)
+
+    async def arun(self) -> Union[bool, List[str]]:
+        """
+        coroutine version of `run`.
+        :return: STDOUT of the binary
+        """
+        assert self.__build
+        if not self.__builder and not self.__run_function:
+            logging.error("no run function")
+            return False
+        builder = self.builder()
+        if not builder:
+            logging.error("run function is not bound to a builder")
+            return False
+        return await builder.arun(self)
+
+    def benchmark(self, repeat: int = 10,
+                  warmup: int = 1,
+                  args: Union[List[str], None] = None,
+                  env: Union[Dict[str, str], None] = None) -> BenchmarkResult:
+        """
+        runs the build executable `warmup + repeat` times and measures it.
+        :param repeat: number of measured runs
+        :param warmup: number of runs before the measurement
+        :param args: additional command line arguments
+        :param env: additional environment variables
+        :return the samples and their statistics
+        """
+        assert self.__build
+        builder = self.builder()
+        assert builder, "run function is not bound to a builder"
+        return builder.benchmark(self, repeat, warmup, args, env)
+
     def kind(self) -> str:
         """
-        :return either ["binary", "library", "test"]
+        :return the kind of the target as reported by the build system,
+            e.g. "bin", "lib", "test". "TODO" if unknown.
         """
-        return "TODO"
+        return self.__kind or "TODO"
 
 
 class Builder:
     """
     wrapper class of all the different project builders
     """
+    CMD = ""
+
+    # if true, different targets can be build concurrently
+    # without interfering with each other
+    PARALLEL_TARGETS = False
+
+    # if true, the builders returned by `variant` write into their own
+    # build tree. Hence, they can build concurrently with different flags.
+    ISOLATED_VARIANTS = False
+
+    # separator between multiple compiler flags in `add_flags`/`flags`
+    FLAG_SEPARATOR = " "
+
     def __init__(self):
         self._error = False
         self._targets = []
 
+        # the targets are discovered on first use, see `_ensure_discovered`
+        self._discovered = False
+        self.__discovery_lock = threading.Lock()
+
+        # index of `_targets`, which is updated as soon as the list changed.
+        # The generation is incremented whenever `_targets` is reassigned.
+        self.__index = TargetIndex()
+        self.__generation = 0
+        self.__indexed = -1
+        self.__index_lock = threading.Lock()
+
         # how many threads are used to build a target
         self._threads = 1
 
+        # if set, every build is a client of this jobserver. Otherwise, the
+        # process-wide jobserver is used, if one is running.
+        self._jobserver: Union[jobserver.JobServer, None] = None
+
+        # if set, build artifacts are restored from and stored in this cache
+        self._cache: Union[ArtifactCache, None] = None
+
+        # if set, the discovered targets are restored from and stored in this cache
+        self._discovery_cache: Union[DiscoveryCache, None] = None
+        # fingerprints of the inputs of the last discovery, see `stale`
+        self.__fingerprints: Union[List, None] = None
+
+        # subscribers to the progress of all builds, see `use_progress`
+        self._progress: List[Callable[[ProgressEvent], None]] = []
+        # target name -> number of steps of its last successful build
+        self.__steps: Dict[str, int] = {}
+
     def threads(self, t: int):
         """ set the number of threads to build a target """
         if t < 1:
             logging.error("wrong thread number")
             return self
 
-        self._threads = 1
+        self._threads = t
+        return self
+
+    def use_jobserver(self, js: Union[jobserver.JobServer, None]):
+        """
+        all builds of this builder will be clients of the jobserver `js`.
+        If `None` is passed, the process-wide jobserver is used.
+        """
+        self._jobserver = js
+        return self
+
+    def use_cache(self, cache: Union[ArtifactCache, None]):
+        """
+        all builds of this builder restore their artifacts from `cache` if
+        possible, and store them after a successful build. If `None` is
+        passed, the cache is disabled.
+        """
+        self._cache = cache
+        return self
+
+    def use_discovery_cache(self, cache: Union[DiscoveryCache, None]):
+        """
+        the targets are restored from `cache`, if none of the files, which
+        fed the last discovery, changed. Otherwise, the discovered targets
+        are stored in `cache`. If `None` is passed, the cache is disabled.
+        """
+        self._discovery_cache = cache
+        return self
+
+    def use_progress(self, callback: Union[Callable[[ProgressEvent], None], None]):
+        """
+        `callback` is called with a `ProgressEvent` when a build starts, for
+        each step of the build tool and when the build finished. It may be
+        called from any thread. A `ProgressStream` turns the events into an
+        async iterator. If `None` is passed, all callbacks are removed.
+        """
+        if callback is None:
+            self._progress = []
+        else:
+            self._progress.append(callback)
         return self
 
-    def run(self, target: Target) -> List[str]:
+    def variant(self, build_path: Union[str, Path]) -> "Builder":
+        """
+        :param build_path: the build tree of the variant
+        :return a builder of the same project, which builds into
+            `build_path`. If the builder does not support isolated build
+            trees (`ISOLATED_VARIANTS`) the builder itself is returned.
+        """
+        _ = build_path
+        return self
+
+    def _active_jobserver(self) -> Union[jobserver.JobServer, None]:
+        """
+        :return the jobserver, which must be passed to the build commands,
+            or `None` if the build tool is not a client of it. Then the
+            number of jobs must be passed to the tool instead.
+        """
+        js = self._jobserver or jobserver.get()
+        if not js:
+            return None
+        capabilities = self.capabilities()
+        if capabilities.get("jobserver", True) is False or \
+                capabilities.get(f"jobserver_{js.mode()}", True) is False:
+            return None
+        return js
+
+    def _discovery_commands(self) -> List[Command]:
+        """
+        :return the commands, whose output is needed to discover the
+            targets. Their executions are passed to `_discover`.
+        """
+        return []
+
+    def _discover(self, executions: List[Execution]):
+        """
+        fills `self._targets`
+        :param executions: the finished `_discovery_commands()`
+        """
+
+    def _discovery_key(self) -> Union[List, None]:
+        """
+        :return everything, which identifies the discovered targets besides
+            the `_discovery_inputs`, e.g. the path of the build file and the
+            build directory. `None` if the targets cannot be cached.
+        """
+        return None
+
+    def _discovery_inputs(self) -> List[Union[str, Path]]:
+        """
+        :return all files and directories, which fed the last discovery.
+            Called after `_discover`.
+        """
+        return []
+
+    def __discovery_cache_key(self) -> Union[str, None]:
+        """
+        :return the key of the targets in the `DiscoveryCache`, or `None`
+        """
+        if self._discovery_cache is None:
+            return None
+        key = self._discovery_key()
+        if key is None:
+            return None
+        return discovery_key([type(self).__name__] + key)
+
+    def __load_discovery(self) -> bool:
+        """
+        restores the targets from the `DiscoveryCache`
+        :return true on success
+        """
+        key = self.__discovery_cache_key()
+        if key is None:
+            return False
+        entry = self._discovery_cache.load(key)
+        if entry is None:
+            return False
+        data, self.__fingerprints = entry
+        prefixes = {}
+        self._targets = [Target(name, build_path, intern_args(args, prefixes),
+                                self.build, self.run, kind, **extra)
+                         for name, build_path, args, kind, extra in data]
+        self.__generation += 1
+        return True
+
+    def __store_discovery(self, start: int):
+        """
+        stores the discovered targets in the `DiscoveryCache`. The inputs
+        are only known after the discovery, hence an input, which was
+        modified after the discovery started, may not be reflected by the
+        targets. In this case the targets are not stored and are `stale`.
+        :param start: `time.time_ns()` before the discovery commands ran
+        """
+        key = self.__discovery_cache_key()
+        if key is None or self._error:
+            return
+        fps = fingerprints(self._discovery_inputs())
+        racy = [fp for fp in fps if fp[1] is not None and fp[1] >= start]
+        for fp in racy:
+            fp[1:] = [None, None, None]
+        self.__fingerprints = fps
+        if racy:
+            logging.warning("%s changed during the discovery, the targets are not cached",
+                            racy[0][0])
+            return
+        self._discovery_cache.store(key, fps, [t.to_json() for t in self._targets])
+
+    def stale(self) -> bool:
+        """
+        :return true if one of the files, which fed the discovery of the
+            targets, changed since. This is only tracked if a
+            `DiscoveryCache` is used, otherwise false is returned.
+        """
+        fps = self.__fingerprints
+        return fps is not None and not is_fresh(fps)
+
+    def _rediscover(self, changed: List[str]) -> bool:
+        """
+        updates `self._targets` after some of the `_discovery_inputs`
+        changed. Only the affected part of the project is re-discovered.
+        :param changed: absolute paths of the changed files and directories
+        :return false if not supported, a full discovery is done instead
+        """
+        _ = changed
+        return False
+
+    def discovery_inputs(self) -> List[Union[str, Path]]:
+        """
+        :return all files and directories, which fed the discovery of the
+            targets
+        """
+        self._ensure_discovered()
+        with self.__discovery_lock:
+            if self.__fingerprints is not None:
+                return [fp[0] for fp in self.__fingerprints]
+            return self._discovery_inputs()
+
+    def refresh(self, changed: Union[Sequence[Union[str, Path]], None] = None) \
+            -> Dict[str, List[Target]]:
+        """
+        re-discovers the targets after build files changed. If `changed`
+        is passed and the builder supports it (`_rediscover`), only the
+        affected part is re-discovered. Unchanged targets keep their
+        identity. If the build files are broken (e.g. while being edited),
+        the old targets are kept.
+        :param changed: the changed files and directories, see `discovery_inputs`
+        :return the "added", "removed" and "changed" targets
+        """
+        diff: Dict[str, List[Target]] = {"added": [], "removed": [], "changed": []}
+        if self._error:
+            return diff
+        with self.__discovery_lock:
+            old_targets = self._targets
+            old = {}
+            for t in old_targets:
+                old.setdefault(t.name(), t)
+            start = time.time_ns()
+            try:
+                if not (self._discovered and changed is not None and
+                        self._rediscover([os.path.abspath(c) for c in changed])):
+                    self._discover([c.execute() for c in self._discovery_commands()])
+            except Exception:
+                self._targets = old_targets
+                raise
+            finally:
+                self.__generation += 1
+            if self._error:
+                logging.error("could not re-discover the targets, keeping the old ones")
+                self._error = False
+                self._targets = old_targets
+                self.__generation += 1
+                return diff
+            self._discovered = True
+            self.__store_discovery(start)
+
+            new = {}
+            for t in self._targets:
+                new.setdefault(t.name(), t)
+        for name, t in new.items():
+            if name not in old:
+                diff["added"].append(t)
+            elif t is not old[name] and t.to_json() != old[name].to_json():
+                diff["changed"].append(t)
+        diff["removed"] = [t for name, t in old.items() if name not in new]
+        return diff
+
+    def discover(self) -> List[Target]:
+        """
+        (re-)discovers all targets. The `DiscoveryCache` is not consulted,
+        but updated.
+        :return the discovered targets
+        """
+        with self.__discovery_lock:
+            if not self._error:
+                start = time.time_ns()
+                self._discover([c.execute() for c in self._discovery_commands()])
+                self.__generation += 1
+                self.__store_discovery(start)
+            self._discovered = True
+        return self.targets()
+
+    async def adiscover(self) -> List[Target]:
+        """
+        coroutine version of `discover`.
+        """
+        if not self._error:
+            start = time.time_ns()
+            executions = [await c.aexecute() for c in self._discovery_commands()]
+            with self.__discovery_lock:
+                self._discover(executions)
+                self.__generation += 1
+                self.__store_discovery(start)
+        self._discovered = True
+        return self.targets()
+
+    def _ensure_discovered(self):
+        """
+        discovers the targets exactly once, on first use. Concurrent
+        callers wait for the first one.
+        """
+        if self._discovered:
+            return
+        with self.__discovery_lock:
+            if self._discovered:
+                return
+            if not self._error and not self.__load_discovery():
+                start = time.time_ns()
+                self._discover([c.execute() for c in self._discovery_commands()])
+                self.__generation += 1
+                self.__store_discovery(start)
+            self._discovered = True
+
+    async def _aensure_discovered(self):
+        """
+        coroutine version of `_ensure_discovered`. The discovery runs in a
+        worker thread, so the event loop is not blocked.
+        """
+        if not self._discovered:
+            await asyncio.to_thread(self._ensure_discovered)
+
+    def _prepare_commands(self) -> List[Command]:
+        """
+        :return the commands, which must be executed once before any
+            number of targets are build.
+        """
+        return []
+
+    def _build_commands(self, target: Target,
+                        add_flags: str = "",
+                        flags: str = "",
+                        jobs: Union[int, None] = None) -> List[Command]:
+        """
+        :param target: to build
+        :param add_flags: flags which are appended to the compiler flags
+        :param flags: flags which overwrite the compiler flags
+        :param jobs: number of jobs the build tool is allowed to use.
+            If `None` the number passed to the constructor is used.
+        :return the commands which build `target`. Commands with
+            `check=False` are allowed to fail.
+        """
+        _ = target, add_flags, flags, jobs
+        return []
+
+    def _build_finished(self, target: Target):
+        """
+        called after `target` was build successfully
+        """
+
+    def _build_failed(self, target: Target):
+        """
+        called after a command, which builds `target`, failed
+        """
+
+    def _progress_parser(self, target: Target) -> ProgressParser:
+        """
+        :return the parser of the output of the build commands of `target`.
+            The default one only reports the start and the end of a build.
+        """
+        _ = target
+        return ProgressParser()
+
+    def _previous_steps(self, target: Target) -> Union[int, None]:
+        """
+        :return the number of steps of the last successful build of `target`,
+            or `None` if it was not build by this builder. This is the
+            estimate of the total for build tools, which do not report it.
+        """
+        return self.__steps.get(target.name())
+
+    def __track(self, target: Union[Target, None]) -> Union[ProgressTracker, None]:
+        """
+        :return a tracker of the build of `target`, if anyone subscribed
+        """
+        if not self._progress or target is None:
+            return None
+        return ProgressTracker(target.name(), self._progress_parser(target),
+                               list(self._progress))
+
+    def __track_finished(self, tracker: Union[ProgressTracker, None], r: BuildResult):
+        """
+        emits the last event of the build `r`
+        """
+        if tracker is None:
+            return
+        if r.success and not r.cached:
+            self.__steps[tracker.target] = tracker.parser.done
+        tracker.finish(r.success)
+
+    def _run_command(self, target: Target,
+                     args: Union[List[str], None] = None,
+                     env: Union[Dict[str, str], None] = None) -> Command:
+        """
+        :param target: to run
+        :param args: additional command line arguments
+        :param env: environment of the process
+        :return the command which executes the `target`
+        """
+        file = os.path.abspath(target.build_path())
+        assert os.path.isfile(file)
+        return Command([file] + (args or []), env=env, tail=0)
+
+    def _cache_inputs(self, target: Target) -> Union[List[Path], None]:
+        """
+        :return the input sources of `target`, see `ArtifactCache`. If
+            `None` the target cannot be cached.
+        """
+        _ = target
+        return None
+
+    def _cache_outputs(self, target: Target) -> List[Path]:
+        """
+        :return the artifacts of `target`, which are stored in the cache
+        """
+        return [Path(target.build_path())]
+
+    def _cache_toolchain(self) -> List[str]:
+        """
+        :return the tools, whose version is part of the cache key
+        """
+        return [os.environ.get("CC", "cc"), os.environ.get("CXX", "c++")]
+
+    def _cache_key(self, target: Target,
+                   add_flags: str = "",
+                   flags: str = "") -> Union[str, None]:
+        """
+        :return the cache key of the build of `target`, or `None` if the
+            target cannot be cached.
+        """
+        if not self._cache:
+            return None
+        try:
+            inputs = self._cache_inputs(target)
+        except OSError as e:
+            logging.warning("could not collect the inputs of %s: %s", target.name(), e)
+            return None
+        if inputs is None:
+            return None
+
+        command = [type(self).__name__, target.name()] + \
+            [str(c) for c in target.build_commands()]
+        env = {k: os.environ[k] for k in ENV_VARS if k in os.environ}
+        env["add_flags"] = add_flags
+        env["flags"] = flags
+        return build_key(inputs, command, env, self._cache_toolchain())
+
+    def _cache_restore(self, target: Target, key: Union[str, None],
+                       jobs: int = 0) -> Union[BuildResult, None]:
+        """
+        :param key: see `_cache_key`
+        :return a successful `BuildResult` if the artifacts of `target`
+            were restored from the cache, otherwise `None`
+        """
+        if not self._cache or not key:
+            return None
+        r = BuildResult(target, jobs)
+        r.start = time.perf_counter()
+        if not self._cache.restore(key, self._cache_outputs(target)):
+            return None
+        r.end = time.perf_counter()
+        r.success = r.cached = True
+        target.is_build()
+        self.__track_finished(self.__track(target), r)
+        return r
+
+    def _cache_store(self, r: BuildResult, key: Union[str, None]):
+        """
+        stores the artifacts of the successful build `r` in the cache
+        """
+        if not self._cache or not key or not r.success:
+            return
+        try:
+            self._cache.store(key, self._cache_outputs(r.target))
+        except OSError as e:
+            logging.warning("could not cache %s: %s", r.target.name(), e)
+
+    def _version_command(self) -> List[str]:
+        """
+        :return the command which prints the version of the build tool
+        """
+        return [self.CMD, "--version"]
+
+    def _parse_version(self, data: List[str]) -> Union[str, None]:
+        """
+        :param data: output of `_version_command()`
+        :return the version
+        """
+        _ = data
+        return None
+
+    @staticmethod
+    def _check_build(target: Union[Target, None], c: Command, e: Execution) -> bool:
+        """
+        :return true if the build of `target` can continue after `c` finished
+        """
+        if e.ok():
+            return True
+        if not c.check:
+            # this is not a catastrophic failure
+            logging.warning("%s %d: %s", c, e.returncode, e.output())
+            return True
+
+        name = target.name() if target else str(c)
+        logging.error("could not build %s %d: %s", name, e.returncode, e.output())
+        return False
+
+    def execute_plan(self, target: Union[Target, None],
+                     commands: List[Command],
+                     jobs: int = 0) -> BuildResult:
+        """
+        executes the commands, which build `target`.
+        :param target: the target which is build by the commands. If the
+            commands succeed, the target is flagged as build.
+        :param commands: see `_build_commands`
+        :param jobs: number of jobs the commands were allowed to use
+        """
+        r = BuildResult(target, jobs)
+        tracker = self.__track(target)
+        on_line = tracker.line if tracker else None
+        r.start = time.perf_counter()
+        for c in commands:
+            e = c.execute(on_line)
+            r.executions.append(e)
+            if not self._check_build(target, c, e):
+                r.end = time.perf_counter()
+                if target:
+                    self._build_failed(target)
+                self.__track_finished(tracker, r)
+                return r
+
+        r.end = time.perf_counter()
+        r.success = True
+        if target:
+            target.is_build()
+            self._build_finished(target)
+        self.__track_finished(tracker, r)
+        return r
+
+    async def aexecute_plan(self, target: Union[Target, None],
+                            commands: List[Command],
+                            jobs: int = 0) -> BuildResult:
+        """
+        coroutine version of `execute_plan`.
+        """
+        r = BuildResult(target, jobs)
+        tracker = self.__track(target)
+        on_line = tracker.line if tracker else None
+        r.start = time.perf_counter()
+        for c in commands:
+            e = await c.aexecute(on_line)
+            r.executions.append(e)
+            if not self._check_build(target, c, e):
+                r.end = time.perf_counter()
+                if target:
+                    self._build_failed(target)
+                self.__track_finished(tracker, r)
+                return r
+
+        r.end = time.perf_counter()
+        r.success = True
+        if target:
+            target.is_build()
+            self._build_finished(target)
+        self.__track_finished(tracker, r)
+        return r
+
+    def build(self, target: Target,
+              add_flags: str = "",
+              flags: str = "",
+              jobs: Union[int, None] = None) -> bool:
+        """
+        builds the `target`. Additionally, this functions allows to either
+        overwrite all compiler flags if `flags` are set, or to append
+        `add_flags` to the compiler flags.
+        :param target: to build
+        :param add_flags: flags which are appended to the compiler flags
+        :param flags: flags which overwrite the compiler flags
+        :param jobs: number of jobs for this build. If `None` the number
+            passed to the constructor is used.
+        :return true on success, false on error
+        """
+        assert isinstance(target, Target)
+        self._ensure_discovered()
+        if self._error:
+            return False
+
+        key = self._cache_key(target, add_flags, flags)
+        if self._cache_restore(target, key, jobs or 0):
+            return True
+
+        cmds = self._prepare_commands() + self._build_commands(target, add_flags, flags, jobs)
+        r = self.execute_plan(target, cmds, jobs or 0)
+        self._cache_store(r, key)
+        return r.success
+
+    async def abuild(self, target: Target,
+                     add_flags: str = "",
+                     flags: str = "",
+                     jobs: Union[int, None] = None) -> bool:
+        """
+        coroutine version of `build`.
+        """
+        assert isinstance(target, Target)
+        await self._aensure_discovered()
+        if self._error:
+            return False
+
+        key = self._cache_key(target, add_flags, flags)
+        if self._cache_restore(target, key, jobs or 0):
+            return True
+
+        cmds = self._prepare_commands() + self._build_commands(target, add_flags, flags, jobs)
+        r = await self.aexecute_plan(target, cmds, jobs or 0)
+        self._cache_store(r, key)
+        return r.success
+
+    def build_many(self, targets: Union[List[Target], None] = None,
+                   jobs: int = 0,
+                   add_flags: str = "",
+                   flags: str = "") -> List[BuildResult]:
+        """
+        builds many targets under a global budget of `jobs`.
+        NOTE: this must not be called from a running event loop. Use
+            `abuild_many` instead.
+        :param targets: the targets to build. If `None` all targets are build
+        :param jobs: global job budget. 0 = all available cores
+        :param add_flags: flags which are appended to the compiler flags
+        :param flags: flags which overwrite the compiler flags
+        :return a `BuildResult` for each target, in the order of `targets`
+        """
+        return asyncio.run(self.abuild_many(targets, jobs, add_flags, flags))
+
+    async def abuild_many(self, targets: Union[List[Target], None] = None,
+                          jobs: int = 0,
+                          add_flags: str = "",
+                          flags: str = "") -> List[BuildResult]:
+        """
+        coroutine version of `build_many`.
+
+        If the builder allows concurrent builds of different targets
+        (`PARALLEL_TARGETS`), a target is started as soon as a job of the
+        budget is free (see `JobPool`). Otherwise, the targets are build one
+        after another and each one can use the whole budget.
+        """
+        if targets is None:
+            targets = await self.atargets()
+
+        pool = JobPool(jobs)
+        await self._aensure_discovered()
+        if self._error:
+            return [BuildResult(t, 0) for t in targets]
+
+        keys = [self._cache_key(t, add_flags, flags) for t in targets]
+        if not all(key and key in self._cache for key in keys):
+            # commands which are needed once before all targets are build
+            prepare = await self.aexecute_plan(None, self._prepare_commands(), pool.jobs)
+            if not prepare.success:
+                return [BuildResult(t, 0) for t in targets]
+
+        async def build(t: Target, key: Union[str, None], k: int) -> BuildResult:
+            r = self._cache_restore(t, key, k)
+            if r:
+                return r
+            r = await self.aexecute_plan(t, self._build_commands(t, add_flags, flags, k), k)
+            self._cache_store(r, key)
+            return r
+
+        if not self.PARALLEL_TARGETS:
+            return [await build(t, key, pool.jobs) for t, key in zip(targets, keys)]
+
+        async def build_one(t: Target, key: Union[str, None], k: int) -> BuildResult:
+            try:
+                return await build(t, key, k)
+            finally:
+                await pool.release(k)
+
+        tasks = []
+        try:
+            for i, (t, key) in enumerate(zip(targets, keys)):
+                k = await pool.acquire(len(targets) - i)
+                tasks.append(asyncio.ensure_future(build_one(t, key, k)))
+            return list(await asyncio.gather(*tasks))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+    def run(self, target: Target,
+            args: Union[List[str], None] = None,
+            env: Union[Dict[str, str], None] = None) -> List[str]:
         """
         runs the target
         :param target:
+        :param args: additional command line arguments
+        :param env: additional environment variables
         :return the output of the shell
         """
-        return run_file(target.build_path())
+        e = self._run_command(target, args, merge_env(env)).execute()
+        return [line.lstrip() for line in e.output()]
+
+    async def arun(self, target: Target,
+                   args: Union[List[str], None] = None,
+                   env: Union[Dict[str, str], None] = None) -> List[str]:
+        """
+        coroutine version of `run`.
+        """
+        e = await self._run_command(target, args, merge_env(env)).aexecute()
+        return [line.lstrip() for line in e.output()]
+
+    def benchmark(self, target: Target,
+                  repeat: int = 10,
+                  warmup: int = 1,
+                  args: Union[List[str], None] = None,
+                  env: Union[Dict[str, str], None] = None) -> BenchmarkResult:
+        """
+        runs the target `warmup + repeat` times and measures the wall-clock
+        time, the user/sys CPU time and the maximum resident set size of
+        each run. The warmup runs are not measured.
+        NOTE: for builders which run a target via the build tool (e.g.
+            `cargo run`, `bazel run`) the measurement includes the tool.
+        :param target: to benchmark
+        :param repeat: number of measured runs
+        :param warmup: number of runs before the measurement
+        :param args: additional command line arguments
+        :param env: additional environment variables
+        :return the samples and their statistics. If a run fails, the
+            benchmark stops and `success` is false.
+        """
+        assert repeat > 0 and warmup >= 0
+        r = BenchmarkResult(target)
+        env = merge_env(env)
+        for i in range(warmup + repeat):
+            c = self._run_command(target, args, env)
+            c.tail = TAIL_LINES
+            e = c.execute()
+            r.output = e.output()
+            if not e.ok():
+                logging.error("run %d of %s failed %d: %s", i, target.name(),
+                              e.returncode, e.output())
+                r.success = False
+                return r
+            if i >= warmup:
+                r.samples.append(Sample(e))
+
+        return r
+
+    async def abenchmark(self, target: Target,
+                         repeat: int = 10,
+                         warmup: int = 1,
+                         args: Union[List[str], None] = None,
+                         env: Union[Dict[str, str], None] = None) -> BenchmarkResult:
+        """
+        coroutine version of `benchmark`.
+        NOTE: the runs are executed in a worker thread, because the
+            resource usage of a process is lost if the event loop reaps it.
+        """
+        return await asyncio.to_thread(self.benchmark, target, repeat, warmup, args, env)
+
+    def tool(self) -> toolchain.Tool:
+        """
+        :return the probe of the build tool. The tool is probed only once
+            per process, see `toolchain.ToolchainRegistry`.
+        """
+        return toolchain.probe(self._version_command())
+
+    async def atool(self) -> toolchain.Tool:
+        """
+        coroutine version of `tool`.
+        """
+        return await toolchain.aprobe(self._version_command())
+
+    def available(self) -> bool:
+        """
+        return a boolean value depending on the build tool is available on
+        the machine or not.
+        """
+        return self.tool().available
+
+    async def aavailable(self) -> bool:
+        """
+        coroutine version of `available`.
+        """
+        return (await self.atool()).available
+
+    def capabilities(self) -> Dict:
+        """
+        :return the capabilities of the build tool, e.g. `jobserver`
+        """
+        return self.tool().capabilities
+
+    def __parse_tool(self, tool: toolchain.Tool) -> Union[str, None]:
+        """
+        :return the version of the probed build tool
+        """
+        if not tool.available:
+            logging.error("%s not available: %s", tool.cmd, tool.output)
+            return None
+        return self._parse_version(tool.output)
+
+    def __version__(self) -> Union[str, None]:
+        """
+        returns the version of the installed/given build tool
+        """
+        return self.__parse_tool(self.tool())
+
+    async def aversion(self) -> Union[str, None]:
+        """
+        coroutine version of `__version__`.
+        """
+        return self.__parse_tool(await self.atool())
 
     def targets(self) -> list[Target]:
         """
         returns a list of possible targets that are defined in the given
-        CMake file.
+        CMake file. The targets are discovered on the first call.
         """
+        self._ensure_discovered()
         if self._error:
             logging.error("error is present, cannot return anything")
             return []
         return self._targets
 
+    async def atargets(self) -> List[Target]:
+        """
+        coroutine version of `targets`.
+        """
+        await self._aensure_discovered()
+        return self.targets()
+
+    def index(self) -> TargetIndex:
+        """
+        :return the index of all targets. It is updated incrementally, if
+            the targets changed since the last call.
+        """
+        self._ensure_discovered()
+        with self.__index_lock:
+            # read before the targets: a concurrent `refresh` leaves the
+            # index outdated, so it is updated by the next call
+            generation = self.__generation
+            targets = self.targets()
+            if self.__indexed != generation:
+                self.__index.update(targets)
+                self.__indexed = generation
+            return self.__index
+
     def target(self, name: str) -> Union[Target, None]:
         """
         NOTE: this function fallbacks to the `in` operator if no exact match 
@@ -142,17 +1123,15 @@ class Builder:
         :param name: name of the executable/binary/library
         :return: the target with the name `name`
         """
-        for t in self.targets():
-            if name == t.name():
-                return t
+        return self.index().find(name)
 
-        # fallback
-        for t in self.targets():
-            if name in t.name():
-                return t
-
-        # should never be reached
-        return None
+    def targets_by_name(self, names: List[str]) -> List[Union[Target, None]]:
+        """
+        batched version of `target`
+        :param names: names of the executables/binaries/libraries
+        :return: for each name the target (see `target`) or `None`
+        """
+        return self.index().find_many(names)
 
     def is_valid_target(self, target: Union[str, Target]) -> bool:
         """
@@ -160,11 +1139,7 @@ class Builder:
         :return true/false: if the target name is valid or not
         """
         name = target if isinstance(target, str) else target.name()
-        for t in self.targets():
-            if name == t.name():
-                return True
-
-        return False
+        return name in self.index()
 
 
 def clean_lines(lines: Union[List[str], List[bytes]]) -> List[str]:
@@ -218,6 +1193,61 @@ def check_if_file_or_path_containing(n: Union[str, Path],
     return t[0]
 
 
+# build artifacts, which are never mirrored by `mirror_tree`
+ARTIFACT_SUFFIXES = (".o", ".obj", ".a", ".so", ".d", ".gcda", ".gcno", ".pyc")
+
+
+def mirror_tree(src: Union[str, Path], dst: Union[str, Path],
+                exclude_names: Sequence[str] = ()) -> int:
+    """
+    mirrors the directory `src` into `dst` via hardlinks (or symlinks, if
+    `src` and `dst` are on different file systems). No file content is
+    copied. An existing mirror is updated: new files are linked, and
+    hardlinks whose source was replaced (e.g. by an editor) are relinked.
+    Hidden directories, build artifacts (`ARTIFACT_SUFFIXES`) and
+    `exclude_names` are not mirrored.
+    NOTE: a build must not modify its sources in place, as the change
+        would be visible in `src`.
+    :param src: the source tree
+    :param dst: the mirror
+    :param exclude_names: file names, which are not mirrored. E.g. the
+        outputs of the build.
+    :return the number of (re-)linked files
+    """
+    src, dst = os.path.abspath(src), os.path.abspath(dst)
+    excluded = set(exclude_names)
+    ret = 0
+    for dirpath, dirnames, filenames in os.walk(src):
+        rel = os.path.relpath(dirpath, src)
+        target_dir = os.path.normpath(os.path.join(dst, rel))
+        # never mirror the mirror itself
+        dirnames[:] = [d for d in dirnames if not d.startswith(".") and
+                       os.path.join(dirpath, d) != dst]
+        os.makedirs(target_dir, exist_ok=True)
+
+        for name in filenames:
+            if name in excluded or name.endswith(ARTIFACT_SUFFIXES):
+                continue
+            s = os.path.join(dirpath, name)
+            d = os.path.join(target_dir, name)
+            try:
+                st = os.stat(s)
+                dt = os.lstat(d)
+                if os.path.islink(d) or (dt.st_ino, dt.st_dev) == (st.st_ino, st.st_dev):
+                    continue
+                # the source was replaced
+                os.unlink(d)
+            except FileNotFoundError:
+                pass
+
+            try:
+                os.link(s, d)
+            except OSError:
+                os.symlink(s, d)
+            ret += 1
+    return ret
+
+
 def run_file(file: Union[Path, str],
              cwd: Union[str,Path] = "") -> Tuple[int, list[str]]:
     """
@@ -240,22 +1270,27 @@ def run_cmd(cmd: List[str],
     """
     NOTE: this function does non perform any sanity checks
         like checking the return value
+    NOTE: the full output is kept in memory. Use `execute.execute` or
+        `execute.stream` for commands with a lot of output.
     :param cmd: runs it
     :param cwd: working directory
     :return returncode and list of str of the output
     """
-    if cwd == "":
-        cwd_ = None
-    else:
-        cwd_ = cwd
-
-    with Popen(cmd, stdin=PIPE, stdout=PIPE, stderr=STDOUT,
-               close_fds=True, cwd=cwd_) as p:
-        p.wait()
-        assert p.stdout
-        data = p.stdout.readlines()
-        data = clean_lines(data)
-        return p.returncode, data
+    e = execute(cmd, cwd=cwd, tail=0)
+    return e.returncode, [line.lstrip() for line in e.output()]
+
+
+def merge_env(env: Union[Dict[str, str], None] = None) -> Union[Dict[str, str], None]:
+    """
+    :param env: additional environment variables
+    :return the current environment updated by `env`, or `None` if
+        `env` is empty.
+    """
+    if not env:
+        return None
+    ret = os.environ.copy()
+    ret.update(env)
+    return ret
 
 
 def inject_env(env: dict, var: str, add_flags: str = "", flags: str = ""):
@@ -1,13 +1,12 @@
 #!/usr/bin/env python3
 """ wrapper around `cc` or actually any compile command """
-import logging
 import os.path
-from subprocess import Popen, PIPE, STDOUT
-from typing import Union
+from typing import Union, List
 import re
 import tempfile
 from pathlib import Path
-from .common import Target, Builder, clean_lines
+from .common import Target, Builder
+from .execute import Command
 
 
 class Compile(Builder):
@@ -15,6 +14,7 @@ class Compile(Builder):
     Abstraction of a cc
     """
     CMD = "cc"
+    PARALLEL_TARGETS = True
 
     def __init__(self, source_file: Union[str, Path],
                  build_path: Union[str, Path] = "",
@@ -58,19 +58,10 @@ class Compile(Builder):
                      run_function=self.run)
         self._targets.append(t)
 
-    def available(self) -> bool:
-        """
-        return a boolean value depending on `make` is available on the machine or not.
-        NOTE: this function will check whether the given command in the constructor
-        is available. 
-        """
-        cmd = [Compile.CMD, '--version']
-        logging.debug(cmd)
-        with  Popen(cmd, stdout=PIPE, stderr=STDOUT, universal_newlines=True) as p:
-            p.wait()
-            return p.returncode == 0
-
-    def build(self, target: Target, add_flags: str = "", flags: str = ""):
+    def _build_commands(self, target: Target,
+                        add_flags: str = "",
+                        flags: str = "",
+                        jobs: Union[int, None] = None) -> List[Command]:
         """
         builds the `target` of the Compilefile. Additionally, this functions
         allows to either overwrite all compiler flags in the `Compilefile`
@@ -86,33 +77,20 @@ class Compile(Builder):
         :param add_flags: additional compiler flags to append
         :param flags: compiler flags to replace the existing ones
         """
-        assert isinstance(target, Target)
-        if self._error:
-            return False
         # Note: The add_flags and flags parameters are defined for API compatibility
         # but are not currently used in this implementation
+        _ = target, add_flags, flags, jobs
+        return []
 
-        return True
-
-    def __version__(self) -> Union[str, None]:
+    def _parse_version(self, data: List[str]) -> Union[str, None]:
         """
-            returns the version of the installed/given `cmake`
+            returns the version of the installed/given `cc`
         """
-        cmd = [Compile.CMD, "--version"]
-        with Popen(cmd, stdin=PIPE, stdout=PIPE, stderr=STDOUT) as p:
-            p.wait()
-            assert p.stdout
-            data = p.stdout.readlines()
-            data = clean_lines(data)
-            if p.returncode != 0:
-                logging.error(cmd, "not available: {0}".format("\n".join(data)))
-                return None
-
-            assert len(data) > 1
-            data = data[0]
-            ver = re.findall(r'\d.\d', data)
-            assert len(ver) == 1
-            return ver[0]
+        assert len(data) > 1
+        data = data[0]
+        ver = re.findall(r'\d.\d', data)
+        assert len(ver) == 1
+        return ver[0]
 
     def __str__(self):
         return "compile runner"
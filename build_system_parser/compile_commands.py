@@ -5,18 +5,22 @@ wrapper around compile_commands.json
 import json
 import logging
 import os
+import sys
 import tempfile
-from typing import Union
-from subprocess import Popen, PIPE, STDOUT
+from typing import Union, List
 from pathlib import Path
 
-from .common import Target, Builder, clean_lines
+from .common import Target, Builder, intern_args
+from .execute import Command, Execution
+from .cache import source_files
 
 
 class CompileCommands(Builder):
     """
     wrapper for the compile_commands.json file
     """
+    # each target is compiled by a single, independent command
+    PARALLEL_TARGETS = True
 
     def __init__(self, file: Union[str, Path],
                  build_path: Union[str, Path] = "",
@@ -34,7 +38,6 @@ class CompileCommands(Builder):
             0 = all available
         """
         super().__init__()
-        self.__error = False
 
         assert(nr_threads >= 0)
         self.__nr_threads: str = "" if nr_threads == 0 else str(nr_threads)
@@ -46,23 +49,39 @@ class CompileCommands(Builder):
             t = tempfile.gettempdir()
             self.__build_path = Path(t)
 
+        # the targets are discovered lazily, maybe after the cwd changed
+        self.__file = os.path.abspath(file)
+
+    def _discover(self, executions: List[Execution]):
+        """
+        parses the compile_commands.json
+        """
+        _ = executions
         data = {}
         try:
-            with open(file) as f:
+            with open(self.__file) as f:
                 data = json.load(f)
         except Exception as e:
             logging.error(e)
-            self.__error = True
+            self._error = True
             return
 
-        for t in data:
-            path = Path(os.path.abspath(t["output"]))
-            source_path = Path(os.path.abspath(t["directory"]))
-            name = path.name
-            args = t["arguments"]
-            tmp = Target(name, os.path.join(self.__build_path, name), args,
+        # compile commands usually share their leading options
+        prefixes = {}
+        build_path = str(self.__build_path)
+        self._targets = []
+        # each entry is released as soon as its target exists
+        data.reverse()
+        while data:
+            t = data.pop()
+            source_path = sys.intern(os.path.abspath(t["directory"]))
+            name = os.path.basename(t["output"])
+            tmp = Target(name, os.path.join(build_path, name),
+                         intern_args(t["arguments"], prefixes),
                          self.build, self.run,
-                         source_path=source_path)
+                         source_path=source_path,
+                         output=os.path.join(source_path, t["output"]),
+                         file=os.path.join(source_path, t["file"]))
             self._targets.append(tmp)
 
     def available(self):
@@ -71,33 +90,35 @@ class CompileCommands(Builder):
         """
         return True
 
-    def build(self, target: Target,
-              add_flags: str = "",
-              flags: str = "") -> bool:
+    async def aavailable(self):
+        """
+        useless, because 'compile commands' is not a program
+        """
+        return True
+
+    def _cache_inputs(self, target: Target) -> List[Path]:
+        """
+        the compiled file and all sources of its directory
+        """
+        return [Path(target.file)] + source_files(target.source_path)
+
+    def _cache_outputs(self, target: Target) -> List[Path]:
+        """
+        the output of the compile command
+        """
+        return [Path(target.output)]
+
+    def _build_commands(self, target: Target,
+                        add_flags: str = "",
+                        flags: str = "",
+                        jobs: Union[int, None] = None) -> List[Command]:
         """
         :param target:
         :param add_flags:
         :param flags:
-        return  True on success,
-                False on error
         """
-        _ = add_flags
-        _ = flags
-        assert isinstance(target, Target)
-        if self.__error:
-            return False
-
+        _ = add_flags, flags, jobs
         tmp_build_path = target.source_path
         cmd = target.build_commands()
-
-        logging.debug(cmd)
-        with Popen(cmd, stdin=PIPE, stdout=PIPE, stderr=STDOUT,
-                   close_fds=True, cwd=tmp_build_path) as p:
-            p.wait()
-            assert p.stdout
-            data = p.stdout.readlines()
-            data = clean_lines(data)
-            if p.returncode != 0:
-                logging.error("could not build %s %s", cmd, data)
-                return False
-            return True
+        # each compile command occupies a single token of the jobserver
+        return [Command(cmd, cwd=tmp_build_path, jobserver=self._active_jobserver())]
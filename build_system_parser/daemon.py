@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+long-lived build daemon. It keeps the parsed builders, their target
+indexes, the toolchain probes and the caches in memory and serves requests
+over a Unix domain socket. Hence, back-to-back invocations of the CLI do
+not re-import, rediscover and re-probe.
+
+    build_system_parser --serve &
+    build_system_parser -b make -p path/to/Makefile -t target
+
+The protocol is line based: each request and each response is a single
+json object terminated by a newline. A connection may send any number of
+requests:
+
+    {"method": "build", "params": {"builder": "make", "path": "/abs/Makefile",
+                                   "target": "prog", "add_flags": "-O2",
+                                   "build_env": {"CC": "clang", "PATH": "..."},
+                                   "discovery_cache": false}}
+    {"ok": true, "result": {"success": true}}
+    {"ok": false, "error": "target 'x' not found", "names": ["prog"]}
+
+A request with a `build_env` (see `client.build_env`) is rejected with
+`"env": [differing variables]` if it differs from the one of the daemon,
+because the builds of the daemon would not match the ones of the client.
+`"discovery_cache": false` rediscovers the targets before the request.
+
+Methods: `ping`, `list`, `build`, `run`, `benchmark`, `shutdown`.
+The client side lives in `client.py`, which does not import the builders.
+"""
+import importlib
+import json
+import logging
+import os
+import socketserver
+import threading
+from pathlib import Path
+from typing import Union, Dict, Any, Tuple
+
+from .common import Builder, Target
+from .cache import ArtifactCache
+from .discovery import DiscoveryCache
+from .client import DaemonError, default_socket_path, is_running, build_env, \
+    BUILD_ENV_VARS
+
+# name of a builder in the protocol -> (module, class)
+BUILDERS = {
+    "bazel": (".bazel", "Bazel"),
+    "make": (".make", "Make"),
+    "cmake": (".cmake", "CMake"),
+    "ninja": (".ninja", "Ninja"),
+    "cargo": (".cargo", "Cargo"),
+    "compile_commands": (".compile_commands", "CompileCommands"),
+    "compile": (".compile", "Compile"),
+}
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """
+    serves all requests of a single connection
+    """
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                response = self.server.daemon.handle(request["method"],
+                                                     request.get("params", {}))
+            except DaemonError as e:
+                response = {"ok": False, "error": str(e), **e.response}
+            except (ValueError, KeyError, TypeError) as e:
+                response = {"ok": False, "error": f"invalid request: {e}"}
+            except Exception as e:  # pylint: disable=broad-except
+                logging.exception("request failed")
+                response = {"ok": False, "error": repr(e)}
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+            if response.get("shutdown"):
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, daemon: "BuildDaemon"):
+        self.daemon = daemon
+        super().__init__(path, _Handler)
+
+
+class BuildDaemon:
+    """
+    Serves build requests over a Unix domain socket. Each builder is
+    constructed once per (builder, path) and reused, until one of its build
+    files changes (see `Builder.stale`). Requests are served concurrently,
+    but the builds, runs and benchmarks of a single builder are serialized.
+    """
+    def __init__(self, path: Union[str, Path, None] = None,
+                 discovery_cache: Union[DiscoveryCache, None] = None,
+                 cache: Union[ArtifactCache, None] = None):
+        """
+        :param path: of the socket. If `None` `default_socket_path()` is used.
+        :param discovery_cache: used by all builders. If `None` the
+            default `DiscoveryCache` is used.
+        :param cache: if set, the artifacts of all builds are cached
+        """
+        self.path = Path(path) if path else default_socket_path()
+        self.discovery_cache = discovery_cache if discovery_cache else DiscoveryCache()
+        self.cache = cache
+
+        self.__lock = threading.Lock()
+        # (builder, path) -> (builder, lock serializing its builds)
+        self.__builders: Dict[Tuple[str, str], Tuple[Builder, threading.Lock]] = {}
+        self.__server: Union[_Server, None] = None
+        self.__thread: Union[threading.Thread, None] = None
+        # statistics
+        self.requests = 0
+
+    def __bind(self):
+        """
+        creates the socket. A leftover socket of a dead daemon is removed.
+        """
+        if self.path.exists():
+            if is_running(self.path):
+                raise DaemonError(f"a daemon is already listening on {self.path}")
+            os.unlink(self.path)
+        os.makedirs(self.path.parent, exist_ok=True)
+        old = os.umask(0o077)
+        try:
+            self.__server = _Server(str(self.path), self)
+        finally:
+            os.umask(old)
+
+    def serve_forever(self):
+        """
+        serves requests until `stop` is called or a `shutdown` request
+        arrives
+        """
+        if not self.__server:
+            self.__bind()
+        try:
+            self.__server.serve_forever()
+        finally:
+            self.__server.server_close()
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+    def start(self) -> "BuildDaemon":
+        """
+        serves requests in a background thread
+        """
+        self.__bind()
+        self.__thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        """
+        stops serving requests
+        """
+        if self.__server:
+            self.__server.shutdown()
+        if self.__thread:
+            self.__thread.join()
+
+    def builder(self, name: str, path: str) -> Tuple[Builder, threading.Lock]:
+        """
+        :param name: e.g. "make"
+        :param path: absolute path of the build file
+        :return the (cached) builder and the lock serializing its builds
+        """
+        if name not in BUILDERS:
+            raise DaemonError(f"unsupported builder: {name}")
+        with self.__lock:
+            entry = self.__builders.get((name, path))
+            if entry and not entry[0].stale():
+                return entry
+            module, cls = BUILDERS[name]
+            cls = getattr(importlib.import_module(module, __package__), cls)
+            b = cls(path).use_discovery_cache(self.discovery_cache).use_cache(self.cache)
+            entry = (b, threading.Lock())
+            self.__builders[(name, path)] = entry
+            return entry
+
+    @staticmethod
+    def __target(builder: Builder, name: str) -> Target:
+        """
+        :return the target `name` of `builder`
+        """
+        t = builder.target(name)
+        if not t:
+            raise DaemonError(f"target '{name}' not found",
+                              {"names": [t.name() for t in builder.targets()]})
+        return t
+
+    def handle(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        :param method: see the module documentation
+        :param params: of the request
+        :return the response
+        """
+        self.requests += 1
+        if method == "ping":
+            return {"ok": True, "result": {"pid": os.getpid(),
+                                           "builders": len(self.__builders),
+                                           "requests": self.requests}}
+        if method == "shutdown":
+            return {"ok": True, "result": {}, "shutdown": True}
+
+        env = params.get("build_env")
+        if env is not None:
+            own = build_env()
+            differs = [k for k in BUILD_ENV_VARS if env.get(k) != own.get(k)]
+            if differs:
+                raise DaemonError("the environment differs from the one of the daemon",
+                                  {"env": differs})
+
+        builder, lock = self.builder(params["builder"], params["path"])
+        if params.get("discovery_cache") is False:
+            with lock:
+                builder.refresh()
+        if method == "list":
+            return {"ok": True, "result": {"targets": [
+                {"name": t.name(), "kind": t.kind(), "build_path": str(t.build_path())}
+                for t in builder.targets()]}}
+
+        target = self.__target(builder, params["target"])
+        with lock:
+            if method == "build":
+                success = builder.build(target, params.get("add_flags", ""),
+                                        params.get("flags", ""), params.get("jobs"))
+                if success:
+                    target.is_build()
+                return {"ok": True, "result": {"success": success}}
+            if method == "run":
+                output = builder.run(target, params.get("args"), params.get("env"))
+                return {"ok": True, "result": {"output": output}}
+            if method == "benchmark":
+                r = builder.benchmark(target, params.get("repeat", 10),
+                                      params.get("warmup", 1), params.get("args"),
+                                      params.get("env"))
+                return {"ok": True, "result": {"success": r.success,
+                                               "samples": len(r.samples),
+                                               "stats": r.stats() if r.samples else {},
+                                               "output": r.output}}
+        raise DaemonError(f"unknown method: {method}")
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+persistent cache of the discovered targets. Discovering the targets of a
+project parses its build files or even runs the build tool (`cmake`,
+`ninja -t targets`, `cargo metadata`). The discovered targets are stored
+together with the fingerprints of all files, which fed the discovery
+(included Makefiles, every `BUILD` file, `Cargo.toml`/`Cargo.lock`, ...).
+A new process only needs to `stat` these files to reuse the targets.
+
+    from build_system_parser.discovery import DiscoveryCache
+    B = Make("path/to/Makefile").use_discovery_cache(DiscoveryCache())
+
+A fingerprint consists of the modification time, the size and the hash of
+the content of a file. If the modification time or size changed, the
+content is hashed, so touched but unchanged files do not invalidate the
+entry. Directories are fingerprinted by the names they contain, hence
+added or removed files (e.g. a new `BUILD` file) invalidate the entry.
+Files, which did not exist during the discovery, are invalid as soon as
+they appear.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Union, List, Dict, Iterable, Any, Tuple
+
+from .toolchain import cache_root
+
+# bump this, if the format of an entry changes
+VERSION = 1
+
+
+def default_cache_dir() -> Path:
+    """
+    :return `<cache_root()>/discovery`
+    """
+    return cache_root() / "discovery"
+
+
+def content_digest(path: str) -> str:
+    """
+    :param path: file or directory
+    :return the hash of the content of a file, or of the sorted names
+        in a directory
+    """
+    h = hashlib.sha256()
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            h.update(name.encode() + b"\0")
+        return h.hexdigest()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def fingerprint(path: Union[str, Path]) -> List[Any]:
+    """
+    :param path: file or directory
+    :return `[path, mtime_ns, size, digest]`. `mtime_ns`, `size` and
+        `digest` are `None` if the path does not exist.
+    """
+    path = os.path.abspath(path)
+    try:
+        st = os.stat(path)
+        return [path, st.st_mtime_ns, st.st_size, content_digest(path)]
+    except OSError:
+        return [path, None, None, None]
+
+
+def is_valid(fp: List[Any]) -> bool:
+    """
+    :param fp: a `fingerprint`
+    :return true if the file did not change since `fp` was taken
+    """
+    path, mtime, size, digest = fp
+    try:
+        st = os.stat(path)
+    except OSError:
+        return mtime is None
+    if mtime is None:
+        return False
+    if st.st_mtime_ns == mtime and st.st_size == size:
+        return True
+    try:
+        return content_digest(path) == digest
+    except OSError:
+        return False
+
+
+def fingerprints(paths: Iterable[Union[str, Path]]) -> List[List[Any]]:
+    """
+    :return the `fingerprint` of each distinct path
+    """
+    return [fingerprint(p) for p in dict.fromkeys(paths)]
+
+
+def is_fresh(fps: List[List[Any]]) -> bool:
+    """
+    :param fps: see `fingerprints`
+    :return true if none of the files changed
+    """
+    return all(is_valid(fp) for fp in fps)
+
+
+def discovery_key(key: Iterable[Any]) -> str:
+    """
+    :param key: everything, which identifies the builder, e.g. the path
+        of the build file and the build directory
+    :return the name of the entry
+    """
+    data = json.dumps([VERSION] + [os.fspath(k) if isinstance(k, Path) else k
+                                   for k in key])
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+class DiscoveryCache:
+    """
+    Stores the discovered targets of each builder in a json file
+    `<path>/<key>.json`. Many processes may share the cache: entries are
+    written into a temporary file and atomically renamed into place.
+    """
+    def __init__(self, path: Union[str, Path, None] = None):
+        """
+        :param path: directory of the cache. If `None`
+            `<cache_root()>/discovery` is used.
+        """
+        self.path = Path(path) if path else default_cache_dir()
+        # statistics
+        self.hits = 0
+        self.misses = 0
+
+    def __entry(self, key: str) -> Path:
+        return self.path / (key + ".json")
+
+    def __contains__(self, key: str) -> bool:
+        return self.__entry(key).is_file()
+
+    def load(self, key: str) -> Union[Tuple[List[Any], List[List[Any]]], None]:
+        """
+        :param key: see `discovery_key`
+        :return the stored targets (see `Target.to_json`) and the
+            fingerprints of the inputs, or `None` if there is no entry or
+            one of its inputs changed
+        """
+        try:
+            with open(self.__entry(key), encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        if data.get("version") != VERSION or not is_fresh(data["inputs"]):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data["targets"], data["inputs"]
+
+    def store(self, key: str, fingerprints: List[List[Any]],
+              targets: List[Any]) -> bool:
+        """
+        :param key: see `discovery_key`
+        :param fingerprints: of all files and directories, which fed the
+            discovery (see `fingerprints`)
+        :param targets: the discovered targets (see `Target.to_json`)
+        :return true if the entry was written
+        """
+        data: Dict[str, Any] = {
+            "version": VERSION,
+            "inputs": fingerprints,
+            "targets": targets,
+        }
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.path, prefix=".discovery")
+        except OSError:
+            return False
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.__entry(key))
+        except (OSError, TypeError, ValueError):
+            os.unlink(tmp)
+            return False
+        return True
+
+    def clear(self):
+        """
+        removes all entries
+        """
+        try:
+            for f in os.listdir(self.path):
+                if f.endswith(".json"):
+                    os.unlink(self.path / f)
+        except OSError:
+            pass
+
+    def __repr__(self) -> str:
+        return f"DiscoveryCache({self.path}, hits={self.hits}, misses={self.misses})"
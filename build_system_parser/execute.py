@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+""" streaming subprocess engine, which is shared by all builders """
+import asyncio
+import logging
+import os
+import signal
+import time
+from collections import deque
+from pathlib import Path
+from subprocess import Popen, PIPE, STDOUT, DEVNULL
+from typing import Union, List, Callable, Iterator, Optional, Dict, Sequence
+
+
+# default number of output lines which are kept in memory per process
+TAIL_LINES = 256
+
+
+def decode_line(raw: bytes) -> str:
+    """
+    :param raw: a single line as read from the pipe
+    :return the decoded line without the line terminator
+    """
+    return raw.decode("utf-8", errors="replace").rstrip("\r\n")
+
+
+def waitstatus_to_exitcode(status: int) -> int:
+    """
+    translates a status returned by `os.wait4` into a return code, which
+    has the same semantic as `Popen.returncode`:
+        - the exit code if the process exited normally
+        - the negative signal number if the process was killed
+    """
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    if os.WIFEXITED(status):
+        return os.WEXITSTATUS(status)
+    return status
+
+
+def kill_process_group(p: Popen):
+    """
+    kills the process `p` and all of its children. This works because
+    every process is started in its own session/process group.
+    """
+    if p.poll() is not None:
+        return
+    try:
+        os.killpg(p.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError, AttributeError):
+        p.kill()
+
+
+class Execution:
+    """
+    A single subprocess, whose merged stdout/stderr is consumed while
+    the process is running. Hence, a process can never block on a full
+    pipe, regardless how much output it generates.
+
+    Iterating over an `Execution` starts the process and yields each line
+    as soon as it arrives. Afterward `returncode`, `wall_time` and `rusage`
+    are set. Only the last `tail` lines are kept in memory.
+
+    If the iteration is aborted (exception, `close()`, ...) the process
+    and all its children are killed.
+    """
+    def __init__(self, cmd: Sequence[Union[str, Path]],
+                 cwd: Union[str, Path, None] = "",
+                 env: Union[Dict[str, str], None] = None,
+                 tail: int = TAIL_LINES,
+                 pass_fds: Sequence[int] = ()):
+        """
+        :param cmd: the command to execute
+        :param cwd: working directory. If empty the current one is used.
+        :param env: environment of the process. If `None` the current
+            environment is inherited.
+        :param tail: number of output lines to keep in memory. 0 = all
+        :param pass_fds: file descriptors which are inherited by the process
+        """
+        self.cmd: List[str] = [os.fspath(c) for c in cmd]
+        self.cwd = cwd if cwd else None
+        self.env = env
+        self.pass_fds = tuple(pass_fds)
+        self.tail: deque = deque(maxlen=tail if tail > 0 else None)
+
+        # are set after the process finished
+        self.returncode: Optional[int] = None
+        self.wall_time: float = 0.
+        self.rusage = None
+
+        self._started = False
+
+    def __iter__(self) -> Iterator[str]:
+        assert not self._started, "an `Execution` can only be run once"
+        self._started = True
+
+        logging.debug(self.cmd)
+        start = time.perf_counter()
+        with Popen(self.cmd, stdin=DEVNULL, stdout=PIPE, stderr=STDOUT,
+                   close_fds=True, cwd=self.cwd, env=self.env,
+                   pass_fds=self.pass_fds, start_new_session=True) as p:
+            assert p.stdout
+            try:
+                for raw in iter(p.stdout.readline, b""):
+                    line = decode_line(raw)
+                    self.tail.append(line)
+                    yield line
+            except BaseException:
+                # also catches `GeneratorExit` and `KeyboardInterrupt`
+                kill_process_group(p)
+                raise
+            finally:
+                self.__reap(p)
+                self.wall_time = time.perf_counter() - start
+
+    def __reap(self, p: Popen):
+        """
+        waits for the process and collects its resource usage
+        """
+        if hasattr(os, "wait4"):
+            try:
+                _, status, self.rusage = os.wait4(p.pid, 0)
+                p.returncode = waitstatus_to_exitcode(status)
+                self.returncode = p.returncode
+                return
+            except ChildProcessError:
+                pass
+
+        self.returncode = p.wait()
+
+    def wait(self, on_line: Union[Callable[[str], None], None] = None) -> "Execution":
+        """
+        runs the process until it finishes.
+        :param on_line: called for every line of output
+        :return self
+        """
+        for line in self:
+            if on_line:
+                on_line(line)
+        return self
+
+    def output(self) -> List[str]:
+        """
+        :return the last `tail` lines of output
+        """
+        return list(self.tail)
+
+    def ok(self) -> bool:
+        """
+        :return true if the process finished successfully
+        """
+        return self.returncode == 0
+
+    def __str__(self):
+        return f"{' '.join(self.cmd)}: {self.returncode} ({self.wall_time:.3f}s)"
+
+
+def execute(cmd: Sequence[Union[str, Path]],
+            cwd: Union[str, Path, None] = "",
+            env: Union[Dict[str, str], None] = None,
+            on_line: Union[Callable[[str], None], None] = None,
+            tail: int = TAIL_LINES,
+            pass_fds: Sequence[int] = ()) -> Execution:
+    """
+    runs `cmd` until it finishes, while streaming its output.
+    :param cmd: the command to execute
+    :param cwd: working directory
+    :param env: environment of the process
+    :param on_line: callback which is called for every line of output
+    :param tail: number of output lines to keep in memory. 0 = all
+    :param pass_fds: file descriptors which are inherited by the process
+    :return the finished `Execution`
+    """
+    return Execution(cmd, cwd=cwd, env=env, tail=tail,
+                     pass_fds=pass_fds).wait(on_line)
+
+
+def stream(cmd: Sequence[Union[str, Path]],
+           cwd: Union[str, Path, None] = "",
+           env: Union[Dict[str, str], None] = None,
+           tail: int = TAIL_LINES,
+           pass_fds: Sequence[int] = ()) -> Execution:
+    """
+    same as `execute` but does not start the process. Iterate over the
+    returned object to receive the output line by line, e.g.:
+        for line in stream(["make"]):
+            print(line)
+    """
+    return Execution(cmd, cwd=cwd, env=env, tail=tail, pass_fds=pass_fds)
+
+
+class AsyncExecution(Execution):
+    """
+    Same as `Execution`, but the process is driven by the running event
+    loop via `asyncio.create_subprocess_exec`. Use `async for` to receive
+    the output line by line, or `await run()`.
+
+    If the task is cancelled, the process and all its children are killed.
+    NOTE: `rusage` is not available, as the event loop reaps the process.
+    """
+
+    async def __aiter__(self):
+        assert not self._started, "an `Execution` can only be run once"
+        self._started = True
+
+        logging.debug(self.cmd)
+        start = time.perf_counter()
+        p = await asyncio.create_subprocess_exec(
+            *self.cmd, stdin=DEVNULL, stdout=PIPE, stderr=STDOUT,
+            close_fds=True, cwd=self.cwd, env=self.env,
+            pass_fds=self.pass_fds, start_new_session=True)
+        assert p.stdout
+        try:
+            while True:
+                try:
+                    raw = await p.stdout.readuntil(b"\n")
+                except asyncio.IncompleteReadError as e:
+                    # EOF
+                    raw = e.partial
+                except asyncio.LimitOverrunError as e:
+                    # very long line: pass it on in pieces
+                    raw = await p.stdout.read(e.consumed)
+
+                if not raw:
+                    break
+
+                line = decode_line(raw)
+                self.tail.append(line)
+                yield line
+
+            self.returncode = await p.wait()
+        except BaseException:
+            # also catches `asyncio.CancelledError` and `GeneratorExit`
+            if p.returncode is None:
+                try:
+                    os.killpg(p.pid, signal.SIGKILL)
+                except (ProcessLookupError, PermissionError):
+                    p.kill()
+                self.returncode = await asyncio.shield(p.wait())
+            raise
+        finally:
+            self.wall_time = time.perf_counter() - start
+
+    async def run(self, on_line: Union[Callable[[str], None], None] = None) -> "AsyncExecution":
+        """
+        runs the process until it finishes.
+        :param on_line: called for every line of output
+        :return self
+        """
+        async for line in self:
+            if on_line:
+                on_line(line)
+        return self
+
+
+async def aexecute(cmd: Sequence[Union[str, Path]],
+                   cwd: Union[str, Path, None] = "",
+                   env: Union[Dict[str, str], None] = None,
+                   on_line: Union[Callable[[str], None], None] = None,
+                   tail: int = TAIL_LINES,
+                   pass_fds: Sequence[int] = ()) -> AsyncExecution:
+    """
+    coroutine version of `execute`
+    """
+    return await AsyncExecution(cmd, cwd=cwd, env=env, tail=tail,
+                                pass_fds=pass_fds).run(on_line)
+
+
+class Command:
+    """
+    A command line together with everything that is needed to execute it.
+    Builders describe their work as a list of `Command`s, which can be
+    either executed blocking (`execute`) or by an event loop (`aexecute`).
+    """
+    def __init__(self, cmd: Sequence[Union[str, Path]],
+                 cwd: Union[str, Path, None] = "",
+                 env: Union[Dict[str, str], None] = None,
+                 check: bool = True,
+                 tail: int = TAIL_LINES,
+                 pass_fds: Sequence[int] = (),
+                 jobserver=None):
+        """
+        :param cmd: the command to execute
+        :param cwd: working directory
+        :param env: environment of the process
+        :param check: if true a failure of this command is fatal
+        :param tail: number of output lines to keep in memory. 0 = all
+        :param pass_fds: file descriptors which are inherited by the process
+        :param jobserver: a `JobServer`. If set, the process is a client of
+            the jobserver and is only started once a token is available.
+        """
+        self.cmd = cmd
+        self.cwd = cwd
+        self.env = env
+        self.check = check
+        self.tail = tail
+        self.pass_fds = pass_fds
+        self.jobserver = jobserver
+
+    def __env(self):
+        """
+        :return environment and file descriptors of the process
+        """
+        if not self.jobserver:
+            return self.env, self.pass_fds
+        return self.jobserver.env(self.env), \
+            tuple(self.pass_fds) + self.jobserver.pass_fds()
+
+    def execute(self, on_line: Union[Callable[[str], None], None] = None) -> Execution:
+        """
+        runs the command blocking
+        :param on_line: callback which is called for every line of output
+        """
+        env, pass_fds = self.__env()
+        if self.jobserver:
+            self.jobserver.acquire()
+        try:
+            return execute(self.cmd, cwd=self.cwd, env=env, on_line=on_line,
+                           tail=self.tail, pass_fds=pass_fds)
+        finally:
+            if self.jobserver:
+                self.jobserver.release()
+
+    async def aexecute(self, on_line: Union[Callable[[str], None], None] = None):
+        """
+        runs the command within the current event loop
+        :param on_line: callback which is called for every line of output
+        :return the finished `AsyncExecution`
+        """
+        env, pass_fds = self.__env()
+        if self.jobserver:
+            await self.jobserver.aacquire()
+        try:
+            return await aexecute(self.cmd, cwd=self.cwd, env=env, on_line=on_line,
+                                  tail=self.tail, pass_fds=pass_fds)
+        finally:
+            if self.jobserver:
+                self.jobserver.release()
+
+    def __str__(self):
+        return " ".join(os.fspath(c) for c in self.cmd)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+index of the targets of a builder: exact, substring and prefix lookups
+without scanning all targets.
+"""
+import bisect
+from typing import Union, List, Dict, Set, Iterable
+
+# length of the n-grams of the substring index
+GRAM = 3
+
+
+def grams(name: str) -> Set[str]:
+    """
+    :return all substrings of length `GRAM` of `name`
+    """
+    return {name[i:i + GRAM] for i in range(len(name) - GRAM + 1)}
+
+
+class TargetIndex:
+    """
+    Indexes targets by their name:
+        - a hash map for exact names
+        - a trigram index for substring queries. The candidates of a query
+          are the names, which contain all trigrams of the query. Queries
+          shorter than a trigram scan all names.
+        - a sorted list of names for prefix queries
+
+    If multiple targets match, the first one in the order of the indexed
+    list wins, the same as a linear scan would return.
+    """
+    def __init__(self, targets: Iterable = ()):
+        """
+        :param targets: the `Target`s to index
+        """
+        # name -> all targets with this name
+        self.__targets: Dict[str, List] = {}
+        # name -> position of its first target
+        self.__order: Dict[str, int] = {}
+        # trigram -> names containing it
+        self.__grams: Dict[str, Set[str]] = {}
+        # all names, sorted
+        self.__sorted: List[str] = []
+        self.update(list(targets))
+
+    def update(self, targets: List):
+        """
+        re-indexes `targets`. Only the names which were added or removed
+        since the last update are (un-)indexed.
+        :param targets: the `Target`s to index
+        """
+        new: Dict[str, List] = {}
+        order: Dict[str, int] = {}
+        for i, t in enumerate(targets):
+            name = t.name()
+            if name in new:
+                new[name].append(t)
+            else:
+                new[name] = [t]
+                order[name] = i
+
+        removed = self.__targets.keys() - new.keys()
+        added = new.keys() - self.__targets.keys()
+        for name in removed:
+            for g in grams(name):
+                names = self.__grams[g]
+                names.discard(name)
+                if not names:
+                    del self.__grams[g]
+        for name in added:
+            for g in grams(name):
+                self.__grams.setdefault(g, set()).add(name)
+
+        if removed or added:
+            self.__sorted = sorted(new.keys())
+        self.__targets = new
+        self.__order = order
+
+    def __len__(self) -> int:
+        return len(self.__targets)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.__targets
+
+    def get(self, name: str):
+        """
+        :return the first target named `name`, or `None`
+        """
+        t = self.__targets.get(name)
+        return t[0] if t else None
+
+    def __substring_names(self, query: str) -> List[str]:
+        """
+        :return all names containing `query`, unordered
+        """
+        if len(query) < GRAM:
+            return [n for n in self.__targets if query in n]
+        postings = sorted((self.__grams.get(g, set()) for g in grams(query)), key=len)
+        if not postings[0]:
+            return []
+        return [n for n in set.intersection(*postings) if query in n]
+
+    def substring(self, query: str) -> List:
+        """
+        :return the first target of each name containing `query`, in the
+            indexed order
+        """
+        names = sorted(self.__substring_names(query), key=self.__order.__getitem__)
+        return [self.__targets[n][0] for n in names]
+
+    def prefix(self, prefix: str) -> List:
+        """
+        :return the first target of each name starting with `prefix`, in
+            the indexed order
+        """
+        i = bisect.bisect_left(self.__sorted, prefix)
+        names = []
+        while i < len(self.__sorted) and self.__sorted[i].startswith(prefix):
+            names.append(self.__sorted[i])
+            i += 1
+        names.sort(key=self.__order.__getitem__)
+        return [self.__targets[n][0] for n in names]
+
+    def find(self, name: str):
+        """
+        :return the target named `name`. If there is none, the first
+            target whose name contains `name`, or `None`.
+        """
+        t = self.get(name)
+        if t is not None:
+            return t
+        names = self.__substring_names(name)
+        if not names:
+            return None
+        return self.__targets[min(names, key=self.__order.__getitem__)][0]
+
+    def find_many(self, names: Iterable[str]) -> List[Union[object, None]]:
+        """
+        :return `find` of each name
+        """
+        return [self.find(n) for n in names]
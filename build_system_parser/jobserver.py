@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+GNU make compatible jobserver, which is shared between all builds launched
+by this library. `make`, `ninja` (>= 1.13) and `cargo` are jobserver clients.
+A tool, which does not support the `mode` of the jobserver (e.g. ninja only
+joins a FIFO), is not a client and is limited by `-j` instead. Hence, the total parallelism of all concurrent builds stays within a single
+machine-wide limit.
+
+    from build_system_parser import jobserver
+    jobserver.start(64)
+    ... all builds share 64 jobs ...
+    jobserver.stop()
+"""
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+from typing import Union, Dict, Tuple
+
+from .schedule import default_jobs
+
+
+class JobServer:
+    """
+    Hosts the token pipe (or named FIFO) of a jobserver.
+
+    A jobserver with `jobs` slots holds `jobs` tokens. Before a client
+    process is launched, the library takes a token (`acquire`), which
+    represents the implicit token of the client. The client itself takes
+    additional tokens from the pipe for each additional parallel job and
+    returns them afterward. When the client exited, the token is returned
+    (`release`).
+    """
+    def __init__(self, jobs: int = 0, fifo: bool = False):
+        """
+        :param jobs: number of parallel jobs. 0 = all available cores
+        :param fifo: if true a named FIFO is used (`--jobserver-auth=fifo:PATH`,
+            GNU make >= 4.4, ninja >= 1.13). Otherwise an anonymous pipe is
+            used, which must be inherited by the clients
+            (`--jobserver-auth=R,W`, every GNU make version and cargo).
+        """
+        self.jobs = default_jobs(jobs)
+        self.__fifo: Union[str, None] = None
+        self.__tmpdir: Union[str, None] = None
+
+        if fifo:
+            self.__tmpdir = tempfile.mkdtemp(prefix="jobserver")
+            self.__fifo = os.path.join(self.__tmpdir, "fifo")
+            os.mkfifo(self.__fifo, 0o600)
+            # a single read-write descriptor keeps the FIFO alive
+            self.__r = self.__w = os.open(self.__fifo, os.O_RDWR)
+        else:
+            self.__r, self.__w = os.pipe()
+
+        os.write(self.__w, b"+" * self.jobs)
+
+    def mode(self) -> str:
+        """
+        :return "fifo" or "pipe". A client must support this mode, see the
+            `jobserver_fifo` and `jobserver_pipe` capabilities of the tools.
+        """
+        return "fifo" if self.__fifo else "pipe"
+
+    def makeflags(self) -> str:
+        """
+        :return the value of `MAKEFLAGS`, which turns a `make`, `ninja`,
+            or `cargo` process into a client of this jobserver.
+        """
+        if self.__fifo:
+            return f" -j --jobserver-auth=fifo:{self.__fifo}"
+        return f" -j --jobserver-fds={self.__r},{self.__w} " \
+               f"--jobserver-auth={self.__r},{self.__w}"
+
+    def env(self, env: Union[Dict[str, str], None] = None) -> Dict[str, str]:
+        """
+        :param env: environment of a client. If `None` the current one is used
+        :return copy of `env` including the jobserver information
+        """
+        env = dict(os.environ if env is None else env)
+        env["MAKEFLAGS"] = self.makeflags()
+        env.pop("MFLAGS", None)
+        env.pop("CARGO_MAKEFLAGS", None)
+        return env
+
+    def pass_fds(self) -> Tuple[int, ...]:
+        """
+        :return the file descriptors which must be inherited by the clients
+        """
+        if self.__fifo:
+            return ()
+        return self.__r, self.__w
+
+    def acquire(self):
+        """
+        blocks until a token is available and takes it
+        """
+        while True:
+            try:
+                if os.read(self.__r, 1):
+                    return
+            except InterruptedError:
+                pass
+
+    def release(self):
+        """
+        returns a token
+        """
+        if self.__w < 0:
+            # already closed
+            return
+        os.write(self.__w, b"+")
+
+    async def aacquire(self):
+        """
+        coroutine version of `acquire`.
+        """
+        fut = asyncio.get_running_loop().run_in_executor(None, self.acquire)
+        try:
+            await asyncio.shield(fut)
+        except asyncio.CancelledError:
+            # the token is returned as soon as the blocked read finished
+            fut.add_done_callback(lambda f: None if f.exception() else self.release())
+            raise
+
+    def close(self):
+        """
+        closes the jobserver. Running clients are not affected.
+        """
+        if self.__r < 0:
+            return
+        os.close(self.__r)
+        if self.__w != self.__r:
+            os.close(self.__w)
+        self.__r = self.__w = -1
+        if self.__tmpdir:
+            shutil.rmtree(self.__tmpdir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except (OSError, AttributeError):
+            pass
+
+    def __str__(self):
+        return f"jobserver({self.jobs}){self.makeflags()}"
+
+
+_lock = threading.Lock()
+_jobserver: Union[JobServer, None] = None
+
+
+def start(jobs: int = 0, fifo: bool = False) -> JobServer:
+    """
+    starts the process-wide jobserver, which is passed to every build
+    launched by this library.
+    :param jobs: number of parallel jobs. 0 = all available cores
+    :param fifo: see `JobServer`
+    """
+    global _jobserver
+    with _lock:
+        if _jobserver:
+            _jobserver.close()
+        _jobserver = JobServer(jobs, fifo)
+        return _jobserver
+
+
+def stop():
+    """
+    stops the process-wide jobserver
+    """
+    global _jobserver
+    with _lock:
+        if _jobserver:
+            _jobserver.close()
+        _jobserver = None
+
+
+def get() -> Union[JobServer, None]:
+    """
+    :return the process-wide jobserver, or `None` if none is running
+    """
+    return _jobserver
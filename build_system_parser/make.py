@@ -1,18 +1,50 @@
 #!/usr/bin/env python3
 """ wrapper around `make` """
+import json
 import logging
 import os.path
-from subprocess import Popen, PIPE, STDOUT
-from typing import Union
+from typing import Union, List
 from os import listdir
 from os.path import isfile, join
 import re
 import tempfile
 from pathlib import Path
 
-from .pymake._pymake import parse_makefile_aliases
+from .pymake.makefile import Makefile, MakefileError, parse_database
 from .common import (Target, Builder, check_if_file_or_path_containing,
-                     clean_lines, inject_env, run_cmd)
+                     inject_env, mirror_tree)
+from .execute import Command, Execution
+from .progress import ProgressParser, MakeTraceParser
+from .cache import source_files
+
+
+RE_INCLUDE = re.compile(r"^\s*-?s?include\s+(.*)$")
+
+
+def included_makefiles(makefile: Union[str, Path]) -> List[Path]:
+    """
+    :param makefile: path to a Makefile
+    :return `makefile` and all files it (recursively) includes. Names
+        containing variables are ignored.
+    """
+    makefile = Path(os.path.abspath(makefile))
+    ret, todo = [], [makefile]
+    while todo:
+        f = todo.pop()
+        if f in ret:
+            continue
+        ret.append(f)
+        try:
+            with open(f, encoding="utf-8") as fd:
+                lines = fd.read().splitlines()
+        except (OSError, UnicodeDecodeError):
+            continue
+        for line in lines:
+            m = RE_INCLUDE.match(line)
+            if m:
+                todo += [Path(makefile.parent, name) for name in m.group(1).split()
+                         if "$" not in name]
+    return ret
 
 
 class Make(Builder):
@@ -21,10 +53,19 @@ class Make(Builder):
     """
     CMD = "make"
 
+    # the flags the build tree was last built with are stored in this
+    # directory next to the build outputs
+    STAMP_DIR = ".build_system_parser"
+
+    # every variant builds in its own mirror of the source tree
+    ISOLATED_VARIANTS = True
+
     def __init__(self, makefile: Union[str, Path],
                  build_path: Union[str, Path] = "",
                  make_cmd: str = "make",
-                 nr_threads: int = 1):
+                 nr_threads: int = 1,
+                 clean: bool = False,
+                 database: bool = False):
         """
         :param makefile: can be one of the following:
             - relative or absolute path to a `Makefile`
@@ -36,15 +77,28 @@ class Make(Builder):
         :param make_cmd: path to the `make` executable
         :param nr_threads: number of threads to use to build the project
             0 = all available
+        :param clean: if true, every build runs `make clean` and rebuilds
+            all targets (`-B`). Otherwise, the build is incremental: a
+            rebuild is only forced if the compiler flags differ from the
+            ones the tree was last built with (see `STAMP_DIR`).
+        :param database: if true, the targets are read from the rule
+            database of `make -pnqr`, i.e. GNU make evaluates the Makefiles.
+            Otherwise, they are parsed by `pymake.makefile`.
         """
         super().__init__()
         self.make = Make.CMD
+        self.clean = clean
+        self.database = database
         if make_cmd:
             Make.CMD = make_cmd
 
         assert(nr_threads >= 0)
+        self.__threads = nr_threads
         self.__nr_threads: str = "" if nr_threads == 0 else str(nr_threads)
 
+        # the source tree, if this builder builds in a mirror of it
+        self.__mirror_of: Union[Path, None] = None
+
         makefile = check_if_file_or_path_containing(makefile, "Makefile")
         if not makefile:
             self._error = True
@@ -60,6 +114,12 @@ class Make(Builder):
         # only the path of the makefile
         self.__path = self.__makefile.parent
 
+        # target name -> (flags, forced) of the running build, see `__flags_changed`
+        self.__flags = {}
+
+        # the parsed Makefile, see `makefile()`
+        self.__graph: Union[Makefile, None] = None
+
         # build path
         if build_path:
             self.__build_path = build_path if isinstance(build_path, Path) else Path(build_path)
@@ -67,21 +127,115 @@ class Make(Builder):
             t = tempfile.gettempdir()
             self.__build_path = Path(t)
 
-        # __commands contains all targets
-        # while __default_command contains the name of the Target
-        # which is build if only `make` is typed into the console
-        self.__commands, self.__default_command = parse_makefile_aliases(self.__makefile)
+    def _discovery_commands(self) -> List[Command]:
+        """
+        prints the rule database of make, if requested
+        """
+        if not self.database:
+            return []
+        # the database is only printed in english. The whole output is kept
+        # in memory (`tail=0`), it is parsed once make finished.
+        env = dict(os.environ, LC_ALL="C")
+        return [Command([self.make, "-pnqr", "-f", self.__makefile], cwd=self.__path,
+                        env=env, check=False, tail=0)]
+
+    def _discover(self, executions: List[Execution]):
+        """
+        parses the Makefile or the rule database. Each explicit target
+        knows its prerequisites.
+        """
+        self.__graph = None
+        if executions:
+            self.__read_database(executions[0])
+            graph = self.__graph
+        else:
+            graph = self.makefile()
+        if graph is None:
+            self._error = True
+            return
 
-        for k, v in self.__commands.items():
+        self._targets = []
+        for name in graph.targets():
+            try:
+                recipe = graph.recipe(name)
+            except MakefileError as e:
+                # e.g. `$(error ...)`, which is only expanded by a build
+                logging.debug("could not expand the recipe of %s: %s", name, e)
+                recipe = []
             # TODO __path is not always correct, why not?
-            tmp = Target(k, join(self.__path, k), v,
+            tmp = Target(name, join(self.__path, name), recipe,
                          build_function=self.build,
-                         run_function=self.run)
+                         run_function=self.run,
+                         prerequisites=graph.prerequisites(name))
             self._targets.append(tmp)
 
-    def build(self, target: Target,
-              add_flags: str = "",
-              flags: str = "") -> bool:
+    def makefile(self) -> Union[Makefile, None]:
+        """
+        :return the dependency graph of the Makefile, or `None` if it
+            could not be parsed
+        """
+        if self.__graph is not None:
+            return self.__graph
+        if self.database:
+            self.__read_database(self._discovery_commands()[0].execute())
+            return self.__graph
+        try:
+            self.__graph = Makefile(self.__makefile, directory=self.__path)
+        except (OSError, UnicodeDecodeError, MakefileError) as e:
+            logging.error("could not parse %s: %s", self.__makefile, e)
+        return self.__graph
+
+    def __read_database(self, e: Execution):
+        """
+        :param e: the finished `make -pnqr`. It fails (`-q`) if the default
+            goal is not up-to-date, but the database is printed anyway.
+        """
+        try:
+            self.__graph = parse_database(e.output(), self.__path)
+        except MakefileError:
+            logging.error("could not read the database of %s: %s",
+                          self.__makefile, e.output()[:10])
+
+    def _discovery_key(self) -> Union[List, None]:
+        """
+        the Makefile, and the `make` printing the database
+        """
+        if self.database:
+            return [self.__makefile, "database", self.make]
+        return [self.__makefile]
+
+    def _discovery_inputs(self) -> List[Union[str, Path]]:
+        """
+        the Makefile and all included Makefiles, including the missing ones
+        """
+        if self.__graph is not None:
+            return self.__graph.files + self.__graph.missing
+        return included_makefiles(self.__makefile)
+
+    def variant(self, build_path: Union[str, Path]) -> "Make":
+        """
+        mirrors the source tree into `build_path` (see `mirror_tree`). The
+        mirror is reused and updated if it already exists.
+        :param build_path: the build tree of the variant
+        :return a builder, which builds in the mirror
+        """
+        build_path = Path(os.path.abspath(build_path))
+        mirror_tree(self.__path, build_path, self.__outputs())
+        m = Make(build_path / self.__makefile_name, build_path, self.make,
+                 self.__threads, self.clean, self.database)
+        m.__mirror_of = self.__path
+        return m.use_jobserver(self._jobserver).use_cache(self._cache)
+
+    def __outputs(self) -> List[str]:
+        """
+        :return the names of the targets, which are never mirrored
+        """
+        return [t.name() for t in self.targets()]
+
+    def _build_commands(self, target: Target,
+                        add_flags: str = "",
+                        flags: str = "",
+                        jobs: Union[int, None] = None) -> List[Command]:
         """
         builds the `target` of the Makefile. Additionally, this functions
         allows to either overwrite all compiler flags in the `Makefile`
@@ -92,26 +246,20 @@ class Make(Builder):
         NOTE: this only works if `CFLAGS` or `CXXFLAGS` are part of
         the build command
 
+        Unless the builder was constructed with `clean=True`, all targets
+        are only rebuild (`-B`) if the flags differ from the ones of the
+        last build of the tree. Prerequisites are shared between targets,
+        hence the flags are recorded per tree, not per target.
+        Otherwise, the timestamps of make decide what is rebuild.
+
         :param target: to build
         :param add_flags:
         :param flags
+        :param jobs: overwrites the number of threads
         """
-        assert isinstance(target, Target)
-        if self._error:
-            return False
-
-        command1 = [self.make, "clean"] if self.__makefile == "" else \
-                    [self.make, "-f", self.__makefile_name, "clean"]
-
-        # first clear the target
-        logging.debug(command1)
-        with Popen(command1, stdout=PIPE, stderr=STDOUT,
-                   cwd=self.__build_path) as p:
-            p.wait()
-            assert p.stdout
-            if p.returncode != 0:
-                # this is not a catastrophic failure
-                logging.warning("make clean %d: %s", p.returncode, p.stdout.read())
+        # pick up new or replaced sources
+        if self.__mirror_of:
+            mirror_tree(self.__mirror_of, self.__path, self.__outputs())
 
         # add CFLAGS/CXXFLAGS to the env
         # NOTE: this only works if `${CFLAGS}/${CXXFLAGS}` is part of the
@@ -122,11 +270,19 @@ class Make(Builder):
         inject_env(env, "CFLAGS", add_flags, flags)
         inject_env(env, "CXXFLAGS", add_flags, flags)
 
-        command2 = [self.make, target.name(), "-B", "-j", self.__nr_threads]
+        command2 = [self.make, target.name()]
+        if self.clean or self.__flags_changed(target, env):
+            command2.append("-B")
+        # every started recipe is traced, see `_progress_parser`
+        if self._progress:
+            command2.append("--trace")
 
-        # add threads
-        command2.append("-j")
-        command2.append(str(self._threads))
+        # add threads, unless the jobserver controls them
+        js = self._active_jobserver()
+        if not js and jobs:
+            command2 += ["-j", str(jobs)]
+        elif not js:
+            command2 += ["-j", self.__nr_threads, "-j", str(self._threads)]
 
         # add the path to the makefile
         command2.append("-f")
@@ -136,46 +292,103 @@ class Make(Builder):
         command2.append("-C")
         command2.append(self.__path)
 
-        logging.debug(command2)
-        with Popen(command2, stdin=PIPE, stdout=PIPE, stderr=STDOUT,
-                   close_fds=True, cwd=self.__build_path, env=env) as p:
-            p.wait()
+        return [Command(command2, cwd=self.__build_path, env=env, jobserver=js)]
 
-            # return the output of the make command only a little bit more nicer
-            assert p.stdout
-            data = p.stdout.readlines()
-            data = clean_lines(data)
-            if p.returncode != 0:
-                logging.error("ERROR Build %d: %s", p.returncode, data)
-                return False
+    def _progress_parser(self, target: Target) -> ProgressParser:
+        """
+        `make --trace` prints a line before each recipe. The total is the
+        number of targets with a recipe `target` depends on, which is an
+        upper bound, because an incremental build skips the up-to-date ones.
+        """
+        graph = self.makefile()
+        if graph is None:
+            return MakeTraceParser()
+        total = 0
+        for name in [target.name()] + graph.dependencies(target.name()):
+            try:
+                total += bool(graph.recipe(name))
+            except MakefileError:
+                total += 1
+        return MakeTraceParser(total)
+
+    def _cache_inputs(self, target: Target) -> List[Path]:
+        """
+        all sources next to the Makefile
+        """
+        _ = target
+        exclude = [self.__build_path] if self.__build_path != self.__path else []
+        return source_files(self.__path, exclude)
 
-        target.is_build()
-        return True
+    def __stamp(self) -> Path:
+        """
+        :return the path of the stamp file of the build tree
+        """
+        return self.__path / Make.STAMP_DIR / "flags"
+
+    def __flags_changed(self, target: Target, env: dict) -> bool:
+        """
+        compares the effective compiler flags of the build with the ones
+        the tree was last built with. The stamp is only updated once the
+        build ran, see `_build_finished` and `_build_failed`.
+        :return true if the target must be rebuild from scratch
+        """
+        flags = {k: env.get(k, "") for k in ("CFLAGS", "CXXFLAGS")}
+        try:
+            with open(self.__stamp(), encoding="utf-8") as f:
+                forced = json.load(f) != flags
+        except (OSError, ValueError):
+            forced = True
+        self.__flags[target.name()] = (flags, forced)
+        return forced
+
+    def _build_finished(self, target: Target):
+        """
+        records the flags the tree is built with
+        """
+        flags, _ = self.__flags.pop(target.name(), (None, False))
+        if flags is None:
+            return
+        stamp = self.__stamp()
+        try:
+            os.makedirs(stamp.parent, exist_ok=True)
+            with open(stamp, "w", encoding="utf-8") as f:
+                json.dump(flags, f)
+        except OSError as e:
+            logging.warning("could not write %s: %s", stamp, e)
+
+    def _build_failed(self, target: Target):
+        """
+        a failed forced build left a tree with mixed flags behind. Hence,
+        the stamp is removed, so the next build is forced, too.
+        """
+        _, forced = self.__flags.pop(target.name(), (None, False))
+        if not forced:
+            return
+        try:
+            os.unlink(self.__stamp())
+        except FileNotFoundError:
+            pass
 
-    def available(self) -> bool:
+    def _prepare_commands(self) -> List[Command]:
         """
-        return a boolean value depending on `make` is available on the machine or not.
-        NOTE: this function will check whether the given command in the constructor
-        is available.
+        first clear the targets, which is not a catastrophic failure
         """
-        cmd = [self.make, '--version']
-        logging.debug(cmd)
-        with Popen(cmd, stdout=PIPE, stderr=STDOUT,
-                   universal_newlines=True) as p:
-            p.wait()
-            if p.returncode != 0:
-                return False
-            return True
+        if not self.clean:
+            return []
+        command1 = [self.make, "clean"] if self.__makefile == "" else \
+                    [self.make, "-f", self.__makefile_name, "clean"]
+        return [Command(command1, cwd=self.__build_path, check=False)]
 
-    def __version__(self) -> Union[str, None]:
+    def _version_command(self) -> List[str]:
         """
-            returns the version of the installed/given `cmake`
+        NOTE: this checks the `make` command given in the constructor
         """
-        cmd = [self.make, "--version"]
-        b, data = run_cmd(cmd)
-        if b != 0:
-            return None
+        return [self.make, "--version"]
 
+    def _parse_version(self, data: List[str]) -> Union[str, None]:
+        """
+            returns the version of the installed/given `make`
+        """
         assert len(data) > 1
         data = data[0]
         ver = re.findall(r'\d.\d', data)
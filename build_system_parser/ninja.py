@@ -2,14 +2,47 @@
 """ wrapper around ninja """
 import logging
 import os.path
-from subprocess import Popen, PIPE, STDOUT
-from typing import Union, List
+from typing import Union, List, Dict, Tuple, Set, Iterable
 import re
 import tempfile
 from pathlib import Path
 
-from .common import (Target, Builder, check_if_file_or_path_containing,
-                    clean_lines, inject_env, run_cmd, run_file)
+from .common import Target, Builder, check_if_file_or_path_containing
+from .execute import Command, Execution
+from .ninjafile import NinjaFile, NinjaFileError
+from .ninjalog import NinjaLog, critical_path
+from .ninjadeps import NinjaDeps
+from .progress import ProgressParser, NinjaStatusParser, NINJA_STATUS
+from .cache import source_files, is_source
+
+
+RE_INCLUDE = re.compile(r"^(?:include|subninja)\s+(\S+)\s*$")
+
+
+def included_ninjafiles(ninjafile: Union[str, Path]) -> List[Path]:
+    """
+    :param ninjafile: path to a `build.ninja`
+    :return `ninjafile` and all files it (recursively) includes via
+        `include` or `subninja`. Names containing variables are ignored.
+    """
+    ninjafile = Path(os.path.abspath(ninjafile))
+    ret, todo = [], [ninjafile]
+    while todo:
+        f = todo.pop()
+        if f in ret:
+            continue
+        ret.append(f)
+        try:
+            with open(f, encoding="utf-8") as fd:
+                lines = fd.read().splitlines()
+        except (OSError, UnicodeDecodeError):
+            continue
+        for line in lines:
+            m = RE_INCLUDE.match(line)
+            if m and "$" not in m.group(1):
+                # paths are relative to the directory ninja is run in
+                todo.append(Path(ninjafile.parent, m.group(1)))
+    return ret
 
 
 class Ninja(Builder):
@@ -58,6 +91,19 @@ class Ninja(Builder):
         # only the path of the ninja file
         self.path = Path(ninjafile).parent
 
+        # the parsed ninja file, see `manifest()`
+        self.__graph: Union[NinjaFile, None] = None
+        # see `build_log()`
+        self.__log: Union[NinjaLog, None] = None
+        # see `deps_log()`
+        self.__deps: Union[NinjaDeps, None] = None
+        # file -> the edges which read it, see `affected_targets`
+        self.__readers: Union[Dict[str, list], None] = None
+        # the inputs of all non-phony edges
+        self.__read: Set[str] = set()
+        # the manifest the index was built from
+        self.__readers_of: Union[NinjaFile, None] = None
+
         # build path
         if build_path:
             self.__build_path = build_path if isinstance(build_path, Path) else Path(build_path)
@@ -65,75 +111,238 @@ class Ninja(Builder):
             t = tempfile.gettempdir()
             self.__build_path = Path(t)
 
-        command1 = [self.ninja, self.path, "-t", "targets", "all"]
-        b, data = run_cmd(command1, cwd=self.path)
-        assert b == 0
+    def _discovery_key(self) -> Union[List, None]:
+        """
+        the ninja file
+        """
+        return [os.path.abspath(self.ninjafile), self.__build_path]
 
-        for line in data:
-            # Skip malformed lines
-            if ':' not in line:
-                continue
+    def _discovery_inputs(self) -> List[Union[str, Path]]:
+        """
+        the ninja file and all included ninja files
+        """
+        if self.__graph is not None:
+            return list(self.__graph.files)
+        return included_ninjafiles(self.ninjafile)
+
+    def _discover(self, executions: List[Execution]):
+        """
+        parses the ninja file. Every output of an edge is a target, the
+        final outputs (which are no input of another edge) first. Hence,
+        `target()` prefers them for partial names. The commands are only
+        evaluated on demand, see `command`.
+        """
+        self.__graph = None
+        graph = self.manifest()
+        if graph is None:
+            self._error = True
+            return
 
-            name, type_ = line.split(':', 1)
-            name = name.strip()
-            type_ = type_.strip()
-            if type_ == "link":
-                tmp = Target(name, os.path.join(self.__build_path, name), [],
-                         build_function=self.build, run_function=self.run)
-                self._targets.append(tmp)
+        roots = graph.roots()
+        others = set(graph.targets()).difference(roots)
+        self._targets = []
+        for name in roots + [t for t in graph.targets() if t in others]:
+            edge = graph.edge(name)
+            tmp = Target(name, os.path.join(self.__build_path, name), [],
+                         build_function=self.build, run_function=self.run,
+                         rule=edge.rule.name, inputs=list(edge.inputs))
+            self._targets.append(tmp)
 
-    def available(self):
+    def manifest(self) -> Union[NinjaFile, None]:
         """
-        return a boolean value depending on `ninja` is available on the machine or not.
+        :return the build graph of the ninja file, or `None` if it could
+            not be parsed
+        """
+        if self.__graph is None:
+            try:
+                self.__graph = NinjaFile(self.ninjafile)
+            except NinjaFileError as e:
+                logging.error("could not parse %s: %s", self.ninjafile, e)
+        return self.__graph
 
-        NOTE: this function will check weather the given command in the constructor
-        is available. 
+    def command(self, target: Target) -> str:
+        """
+        :return the evaluated command of the edge, which builds `target`,
+            "" for phony edges and unknown targets
+        """
+        graph = self.manifest()
+        edge = graph.edge(target.name()) if graph else None
+        return edge.command() if edge else ""
+
+    def build_log(self) -> NinjaLog:
+        """
+        :return the `.ninja_log` of the build directory (`$builddir` or the
+            directory of the ninja file). It is updated on each call, only
+            the lines appended by the builds in the meantime are read.
+        """
+        if self.__log is None:
+            graph = self.manifest()
+            builddir = graph.variable("builddir") if graph else ""
+            self.__log = NinjaLog(Path(self.path, builddir, ".ninja_log"))
+        self.__log.update()
+        return self.__log
+
+    def deps_log(self) -> NinjaDeps:
+        """
+        :return the `.ninja_deps` of the build directory, i.e. the headers
+            of each output. It is updated on each call, only the records
+            appended by the builds in the meantime are read.
         """
-        cmd = [self.ninja, '--version']
-        logging.debug(cmd)
-        with Popen(cmd, stdout=PIPE, stderr=STDOUT,
-                   universal_newlines=True) as p:
-            p.wait()
-            if p.returncode != 0:
-                return False
-            return True
+        if self.__deps is None:
+            graph = self.manifest()
+            builddir = graph.variable("builddir") if graph else ""
+            self.__deps = NinjaDeps(Path(self.path, builddir, ".ninja_deps"))
+        if self.__deps.update():
+            self.__readers = None
+        return self.__deps
 
-    def build(self, target: Target, add_flags: str = "", flags: str = ""):
+    def __absolute(self, path: str) -> str:
+        """
+        :param path: as written by ninja, relative to the ninja file
+        """
+        return os.path.normpath(os.path.join(self.path, path))
+
+    def __readers_index(self, graph: NinjaFile) -> Dict[str, list]:
+        """
+        :return absolute path -> the edges, which are out of date if the
+            file changed: its explicit and implicit inputs and its headers
+            recorded in the `.ninja_deps`. Order-only inputs never trigger
+            a rebuild.
+        """
+        deps = self.deps_log()
+        if self.__readers is not None and self.__readers_of is graph:
+            return self.__readers
+        readers: Dict[str, list] = {}
+        self.__read = set()
+        for edge in graph.edges:
+            for f in edge.inputs + edge.implicit:
+                readers.setdefault(self.__absolute(f), []).append(edge)
+            if edge.rule.name != "phony":
+                self.__read.update(edge.all_inputs())
+        for output in deps.outputs():
+            edge = graph.edge(output)
+            if edge is None:
+                continue
+            for f in deps.deps(output):
+                readers.setdefault(self.__absolute(f), []).append(edge)
+        self.__readers, self.__readers_of = readers, graph
+        return readers
+
+    def affected_targets(self, changed_files: Iterable[Union[str, Path]],
+                         final: bool = True) -> List[Target]:
+        """
+        the targets, which ninja rebuilds after `changed_files` changed,
+        e.g. the files of a commit. Besides the inputs in the ninja file,
+        the headers recorded in the `.ninja_deps` are followed. Hence, the
+        result is only complete after the first build of the tree.
+        :param changed_files: relative to the current directory or absolute
+        :param final: if true, only the artifacts (e.g. linked binaries),
+            i.e. the outputs no other non-phony edge reads, are returned
+        :return the affected targets in the order of `targets()`
+        """
+        graph = self.manifest()
+        if graph is None:
+            return []
+        readers = self.__readers_index(graph)
+
+        affected: Set[str] = set()
+        seen = set()
+        todo = [os.path.abspath(f) for f in changed_files]
+        while todo:
+            for edge in readers.get(todo.pop(), ()):
+                if edge in seen:
+                    continue
+                seen.add(edge)
+                for output in edge.all_outputs():
+                    affected.add(output)
+                    todo.append(self.__absolute(output))
+
+        if final:
+            affected = {o for o in affected if o not in self.__read and
+                        graph.edge(o).rule.name != "phony"}
+        return [t for t in self.targets() if t.name() in affected]
+
+    def critical_path(self, targets: Union[List[str], None] = None) -> Tuple[int, List[str]]:
+        """
+        :param targets: defaults to the targets ninja builds without arguments
+        :return the duration in milliseconds and the outputs of the longest
+            chain of edges of the last builds, see `ninjalog.critical_path`
+        """
+        graph = self.manifest()
+        if graph is None:
+            return 0, []
+        return critical_path(self.build_log(), graph, targets)
+
+    def _build_commands(self, target: Target,
+                        add_flags: str = "",
+                        flags: str = "",
+                        jobs: Union[int, None] = None) -> List[Command]:
         """
         TODO flags not supported and build path is not used
         :param target: The target to build
         :param add_flags: Additional compiler flags (not currently used)
         :param flags: Compiler flags that override existing ones (not currently used)
+        :param jobs: overwrites the number of threads
         """
-        if self._error:
-            return False
-            
         # Note: The add_flags and flags parameters are defined for API compatibility
         # but are not currently used in this implementation
-            
-        cmd = [Ninja.CMD, "-j", self.__nr_threads, target.name()]
-        b, _ = run_cmd(cmd, cwd=self.path)
-        if b != 0:
-            return b
+        # NOTE: an explicit `-j` disables the jobserver client of ninja
+        js = self._active_jobserver()
+        cmd = [self.ninja, target.name()]
+        if not js:
+            cmd += ["-j", str(jobs) if jobs else self.__nr_threads]
+        # the status lines are parsed by `_progress_parser`
+        env = dict(os.environ, NINJA_STATUS=NINJA_STATUS) if self._progress else None
+        return [Command(cmd, cwd=self.path, env=env, jobserver=js)]
 
-        target.is_build()
-        return True
+    def _progress_parser(self, target: Target) -> ProgressParser:
+        """
+        ninja prints `[finished/total] description` after each edge
+        """
+        _ = target
+        return NinjaStatusParser()
 
-    def run(self, target: Target) -> List[str]:
+    def _run_command(self, target: Target,
+                     args: Union[List[str], None] = None,
+                     env: Union[Dict[str, str], None] = None) -> Command:
         """ runs the target """
         # TODO the build path seems to be arbitrary
-        _, r = run_file(self.path / target.name(), cwd=self.path)
-        return r
+        file = os.path.abspath(self.path / target.name())
+        assert os.path.isfile(file)
+        return Command([file] + (args or []), cwd=self.path, env=env, tail=0)
+
+    def _cache_inputs(self, target: Target) -> List[Path]:
+        """
+        the inputs of `target` (`ninja -t inputs`), the headers recorded in
+        `.ninja_deps` and all sources next to the ninja file.
+        NOTE: headers are only known after the first build of the tree
+        """
+        ret = source_files(self.path)
+        e = Command([self.ninja, "-t", "inputs", target.name()], cwd=self.path,
+                    tail=0).execute()
+        files = [line.strip() for line in e.output()] if e.ok() else []
+        for f in files + self.deps_log().files():
+            if f and is_source(f):
+                ret.append(self.path / f)
+        return [f for f in ret if f.is_file()]
 
-    def __version__(self):
+    def _cache_outputs(self, target: Target) -> List[Path]:
         """
-            returns the version of the installed/given `cmake`
+        the binary is written next to the ninja file
         """
-        cmd = [Ninja.CMD, "--version"]
-        b, data = run_cmd(cmd)
-        if b != 0:
-            return None
+        return [Path(self.path) / target.name()]
 
+    def _version_command(self) -> List[str]:
+        """
+        NOTE: this function will check weather the given command in the constructor
+        is available.
+        """
+        return [self.ninja, "--version"]
+
+    def _parse_version(self, data: List[str]) -> Union[str, None]:
+        """
+            returns the version of the installed/given `ninja`
+        """
         assert len(data) == 1
         data = data[0]
         ver = re.findall(r'\d.\d+.\d+', data)
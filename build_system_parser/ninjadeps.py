@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+reader of the `.ninja_deps`, the binary log in which ninja records the
+dependencies, which the compiler discovered (`deps = gcc|msvc`), i.e. the
+headers of each object file:
+
+    deps = NinjaDeps("out/.ninja_deps")
+    deps.update()  # reads only the records appended since the last call
+    deps.deps("obj/a.o"), deps.dependents(["../src/a.h"])
+
+The format (v3 and v4) is a header `# ninjadeps\\n` and a 32 bit version,
+followed by records, each prefixed by its 32 bit size:
+    - a path: the path padded with `\\0` to a multiple of 4 bytes and the
+      bitwise complement of its id. The ids are assigned in order.
+    - deps (the highest bit of the size is set): the id of the output, its
+      mtime (32 bit in v3, 64 bit in v4) and the ids of its dependencies.
+Later deps of an output replace the earlier ones.
+"""
+import logging
+import os
+import struct
+from pathlib import Path
+from typing import Union, List, Dict, Set, Iterable
+
+MAGIC = b"# ninjadeps\n"
+VERSIONS = (3, 4)
+# ninja rejects larger records
+MAX_RECORD_SIZE = (1 << 19) - 1
+
+
+class NinjaDeps:
+    """
+    Incremental reader of a `.ninja_deps`. `update` only reads the records
+    ninja appended since the last call. If ninja recompacted (rewrote) the
+    log in the meantime, it is read again from the start.
+    """
+    def __init__(self, path: Union[str, Path]):
+        """
+        :param path: of the `.ninja_deps`. It does not need to exist yet.
+        """
+        self.path = Path(path)
+        self.version: Union[int, None] = None
+        # id -> path
+        self.paths: List[str] = []
+
+        # output -> (mtime, dependencies)
+        self.__deps: Dict[str, tuple] = {}
+        # dependency -> outputs, see `dependents`
+        self.__reverse: Union[Dict[str, Set[str]], None] = None
+        self.__inode: Union[int, None] = None
+        self.__offset = 0
+
+    def __reset(self):
+        self.version = None
+        self.paths = []
+        self.__deps = {}
+        self.__reverse = None
+        self.__inode = None
+        self.__offset = 0
+
+    def update(self) -> List[str]:
+        """
+        reads all records appended since the last call
+        :return the outputs, whose dependencies changed
+        """
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            self.__reset()
+            return []
+        if st.st_ino != self.__inode or st.st_size < self.__offset:
+            self.__reset()
+            self.__inode = st.st_ino
+        if st.st_size == self.__offset:
+            return []
+
+        with open(self.path, "rb") as f:
+            f.seek(self.__offset)
+            data = f.read()
+        if self.__offset == 0:
+            header = len(MAGIC) + 4
+            if len(data) < header:
+                return []
+            if not data.startswith(MAGIC):
+                logging.warning("%s is not a ninja deps log", self.path)
+                self.__offset = st.st_size
+                return []
+            self.version = struct.unpack_from("<i", data, len(MAGIC))[0]
+            self.__offset = header
+            data = data[header:]
+        if self.version not in VERSIONS:
+            logging.warning("unsupported version of %s: %s", self.path, self.version)
+            self.__offset = st.st_size
+            return []
+        return self.__parse(data)
+
+    def __parse(self, data: bytes) -> List[str]:
+        """
+        reads all complete records of `data`. A record ninja is still
+        writing is read by the next call.
+        :return the outputs, whose dependencies changed
+        """
+        ret = []
+        paths = self.paths
+        mtime_size = 8 if self.version == 4 else 4
+        pos, end = 0, len(data)
+        while pos + 4 <= end:
+            size = struct.unpack_from("<I", data, pos)[0]
+            is_deps = size >> 31
+            size &= 0x7FFFFFFF
+            if size > MAX_RECORD_SIZE or size % 4:
+                logging.warning("%s is corrupt at byte %d", self.path, self.__offset + pos)
+                break
+            if pos + 4 + size > end:
+                break
+            record = data[pos + 4:pos + 4 + size]
+            pos += 4 + size
+
+            if not is_deps:
+                # the id is stored as checksum
+                checksum = struct.unpack_from("<I", record, size - 4)[0]
+                if checksum != ~len(paths) & 0xFFFFFFFF:
+                    logging.warning("%s is corrupt at byte %d", self.path,
+                                    self.__offset + pos - size - 4)
+                    break
+                paths.append(record[:size - 4].rstrip(b"\0")
+                             .decode("utf-8", errors="surrogateescape"))
+                continue
+
+            count = (size - 4 - mtime_size) // 4
+            ids = struct.unpack_from(f"<{count}i", record, 4 + mtime_size)
+            output = struct.unpack_from("<i", record)[0]
+            mtime = struct.unpack_from("<q" if mtime_size == 8 else "<i", record, 4)[0]
+            if output >= len(paths) or any(i >= len(paths) for i in ids):
+                logging.warning("%s is corrupt at byte %d", self.path,
+                                self.__offset + pos - size - 4)
+                break
+            out = paths[output]
+            self.__deps[out] = (mtime, [paths[i] for i in ids])
+            ret.append(out)
+
+        self.__offset += pos
+        if ret:
+            self.__reverse = None
+        return ret
+
+    def outputs(self) -> List[str]:
+        """
+        :return all outputs with recorded dependencies
+        """
+        return list(self.__deps)
+
+    def deps(self, output: str) -> List[str]:
+        """
+        :return the dependencies of `output` recorded by its last build
+        """
+        entry = self.__deps.get(output)
+        return list(entry[1]) if entry else []
+
+    def mtime(self, output: str) -> Union[int, None]:
+        """
+        :return the mtime of `output` when its dependencies were recorded
+        """
+        entry = self.__deps.get(output)
+        return entry[0] if entry else None
+
+    def files(self) -> List[str]:
+        """
+        :return all dependencies of all outputs
+        """
+        return list(dict.fromkeys(d for _, deps in self.__deps.values() for d in deps))
+
+    def dependents(self, files: Iterable[str]) -> List[str]:
+        """
+        :param files: e.g. changed headers, as they are recorded by ninja
+        :return all outputs, which directly depend on one of `files`
+        """
+        if self.__reverse is None:
+            self.__reverse = {}
+            for output, (_, deps) in self.__deps.items():
+                for d in deps:
+                    self.__reverse.setdefault(d, set()).add(output)
+        ret: Set[str] = set()
+        for f in files:
+            ret.update(self.__reverse.get(f, ()))
+        return sorted(ret)
@@ -0,0 +1,557 @@
+#!/usr/bin/env python3
+"""
+streaming parser of `build.ninja` files. The file is read line by line the
+same way `ninja` reads it and the result is the build graph: each edge
+knows its rule, its explicit and implicit outputs and its explicit,
+implicit, order-only and validation inputs.
+
+    from build_system_parser.ninjafile import parse_ninjafile
+    n = parse_ninjafile("path/to/build.ninja")
+    e = n.edge("prog")
+    e.inputs, e.implicit, e.order_only, e.command()
+
+Supported: `rule`, `build`, `pool`, `default`, `include`, `subninja`,
+top level, rule and build variables with the scoping rules of ninja, `$`
+escapes and line continuations.
+
+Huge manifests (hundreds of MiB) are never read into memory at once. Each
+path is stored once (all edges share the same string), the variables of
+an edge are only stored if it has some and the commands are only
+evaluated on request (see `Edge.command`).
+"""
+import os
+import re
+import sys
+from pathlib import Path
+from typing import Union, List, Dict, Tuple, Iterable, Callable
+
+# the variables a rule may define
+RULE_VARIABLES = {
+    "command", "depfile", "dyndep", "description", "deps", "generator", "pool",
+    "restat", "rspfile", "rspfile_content", "msvc_deps_prefix",
+}
+
+# `$name`, `${name}`, the escaped characters and everything else (an error)
+RE_ESCAPE = re.compile(r"\$(?:\{([a-zA-Z0-9_.-]+)\}|([a-zA-Z0-9_-]+)|([$ :])|(.?))")
+# a path (including its escapes), a separator or spaces
+RE_PATH = re.compile(r"((?:[^$ :|]|\$.)+)|(\|\||\|@|\||:)| +")
+# (group, separator) -> next group of the paths of a `build` statement
+SEPARATORS = {
+    (0, "|"): 1, (0, ":"): 2, (1, ":"): 2, (2, "|"): 3, (2, "||"): 4, (3, "||"): 4,
+    (2, "|@"): 5, (3, "|@"): 5, (4, "|@"): 5,
+}
+# `.` and `..` components or an empty component
+RE_DOT = re.compile(r"(?:^|/)\.\.?(?:/|$)|//")
+SEPARATOR_WORDS = {"|", "||", "|@", ":"}
+RE_NAME = re.compile(r"^[a-zA-Z0-9_.-]+$")
+# characters, which are never quoted in commands
+RE_SHELL_SAFE = re.compile(r"^[a-zA-Z0-9_+,./-]*$")
+
+
+class NinjaFileError(Exception):
+    """
+    raised for invalid ninja files
+    """
+
+
+def _evaluate(text: str, lookup: Callable[[str], str]) -> str:
+    """
+    :param text: with `$` escapes
+    :param lookup: value of a variable
+    :return the evaluated `text`
+    """
+    if "$" not in text:
+        return text
+
+    def replace(m) -> str:
+        name = m.group(1) or m.group(2)
+        if name:
+            return lookup(name)
+        if m.group(3):
+            return m.group(3)
+        raise NinjaFileError(f"bad $-escape: {text!r}")
+    return RE_ESCAPE.sub(replace, text)
+
+
+def _canonical(path: str) -> str:
+    """
+    :return the path without `.` and `..` components, as ninja stores it.
+        Leading `..` components are kept.
+    """
+    if "/." not in path and "//" not in path and not path.startswith("."):
+        return path
+    start = 0
+    while path.startswith("../", start):
+        start += 3
+    if RE_DOT.search(path[start:] if start else path):
+        return os.path.normpath(path)
+    return path
+
+
+def _shell_escape(path: str) -> str:
+    """
+    :return `path` quoted for `/bin/sh`, if necessary
+    """
+    if RE_SHELL_SAFE.match(path):
+        return path
+    return "'" + path.replace("'", "'\\''") + "'"
+
+
+class Scope:
+    """
+    the variables and rules of a ninja file. `subninja` files have their
+    own scope, whose parent is the scope of the including file.
+    """
+    __slots__ = ("variables", "rules", "parent")
+
+    def __init__(self, parent: Union["Scope", None] = None):
+        self.variables: Dict[str, str] = {}
+        self.rules: Dict[str, Rule] = {}
+        self.parent = parent
+
+    def lookup(self, name: str) -> str:
+        """
+        :return the value of the variable `name` or "" if it is undefined
+        """
+        scope = self
+        while scope is not None:
+            value = scope.variables.get(name)
+            if value is not None:
+                return value
+            scope = scope.parent
+        return ""
+
+    def rule(self, name: str) -> Union["Rule", None]:
+        """
+        :return the rule `name` of this or an enclosing scope
+        """
+        scope = self
+        while scope is not None:
+            rule = scope.rules.get(name)
+            if rule is not None:
+                return rule
+            scope = scope.parent
+        return None
+
+
+class Rule:
+    """
+    a `rule`. Its variables are stored unevaluated, because they are
+    evaluated in the scope of each edge.
+    """
+    __slots__ = ("name", "variables")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.variables: Dict[str, str] = {}
+
+    def __repr__(self) -> str:
+        return f"Rule({self.name!r})"
+
+
+PHONY = Rule("phony")
+
+
+class Edge:
+    """
+    a `build` statement:
+
+        build outputs | implicit_outputs: rule inputs | implicit || order_only |@ validations
+    """
+    __slots__ = ("rule", "outputs", "implicit_outputs", "inputs", "implicit",
+                 "order_only", "validations", "variables", "scope")
+
+    def __init__(self, rule: Rule, outputs: Tuple[str, ...],
+                 implicit_outputs: Tuple[str, ...], inputs: Tuple[str, ...],
+                 implicit: Tuple[str, ...], order_only: Tuple[str, ...],
+                 validations: Tuple[str, ...],
+                 variables: Union[Dict[str, str], None], scope: Scope):
+        self.rule = rule
+        self.outputs = outputs
+        self.implicit_outputs = implicit_outputs
+        self.inputs = inputs
+        self.implicit = implicit
+        self.order_only = order_only
+        self.validations = validations
+        # the evaluated variables of the edge, `None` if it has none
+        self.variables = variables
+        self.scope = scope
+
+    def all_outputs(self) -> Tuple[str, ...]:
+        """
+        :return the explicit and implicit outputs
+        """
+        return self.outputs + self.implicit_outputs
+
+    def all_inputs(self) -> Tuple[str, ...]:
+        """
+        :return the explicit, implicit and order-only inputs
+        """
+        return self.inputs + self.implicit + self.order_only
+
+    def variable(self, name: str) -> str:
+        """
+        evaluates a variable the way ninja does: `$in`, `$in_newline` and
+        `$out`, the variables of the edge, the variables of its rule
+        (evaluated in the scope of the edge) and the enclosing scopes.
+        :param name: e.g. "command"
+        :return its value or "" if it is undefined
+        """
+        return self.__lookup(name, [])
+
+    def __lookup(self, name: str, stack: List[str]) -> str:
+        if name == "in":
+            return " ".join(_shell_escape(p) for p in self.inputs)
+        if name == "in_newline":
+            return "\n".join(_shell_escape(p) for p in self.inputs)
+        if name == "out":
+            return " ".join(_shell_escape(p) for p in self.outputs)
+        if self.variables is not None and name in self.variables:
+            return self.variables[name]
+        value = self.rule.variables.get(name)
+        if value is not None:
+            if name in stack:
+                raise NinjaFileError("cycle in rule variables: " +
+                                     " -> ".join(stack + [name]))
+            stack.append(name)
+            value = _evaluate(value, lambda n: self.__lookup(n, stack))
+            stack.pop()
+            return value
+        return self.scope.lookup(name)
+
+    def command(self) -> str:
+        """
+        :return the evaluated command, "" for phony edges
+        """
+        return self.variable("command")
+
+    def __repr__(self) -> str:
+        return f"Edge({self.rule.name!r}, {list(self.outputs)!r})"
+
+
+class NinjaFile:
+    """
+    the build graph of a `build.ninja` and all files it includes.
+    """
+    def __init__(self, path: Union[str, Path, None] = None,
+                 directory: Union[str, Path, None] = None):
+        """
+        :param path: of the `build.ninja`. If `None` nothing is parsed,
+            see `parse` and `parse_string`.
+        :param directory: ninja is run in, `include` and `subninja` are
+            relative to it. Defaults to the directory of `path`.
+        """
+        if directory is None:
+            directory = os.path.dirname(os.path.abspath(path)) if path else os.getcwd()
+        self.directory = str(directory)
+
+        # all parsed files
+        self.files: List[str] = []
+        self.scope = Scope()
+        self.edges: List[Edge] = []
+        # name -> depth
+        self.pools: Dict[str, int] = {"console": 1}
+        # the targets of the `default` statements
+        self.defaults: List[str] = []
+
+        # output -> edge producing it
+        self.__producers: Dict[str, Edge] = {}
+        # path as written (or evaluated) -> canonical path. Hence, each
+        # path is only stored once.
+        self.__paths: Dict[str, str] = {}
+        # the values of the variables of the edges, each only stored once
+        self.__strings: Dict[str, str] = {}
+        self.scope.rules["phony"] = PHONY
+
+        if path is not None:
+            self.parse(os.path.abspath(path))
+
+    def parse(self, path: Union[str, Path], scope: Union[Scope, None] = None):
+        """
+        parses the ninja file `path`
+        :param path: absolute or relative to `directory`
+        :param scope: the variables and rules are added to. Defaults to the
+            top level scope.
+        """
+        path = os.path.join(self.directory, os.fspath(path))
+        try:
+            # ninja does not care about the encoding
+            with open(path, encoding="utf-8", errors="surrogateescape") as fd:
+                self.files.append(path)
+                self.__parse_lines(fd, path, scope or self.scope)
+        except OSError as e:
+            raise NinjaFileError(f"loading '{path}': {e.strerror}") from e
+
+    def parse_string(self, text: str, name: str = "<string>"):
+        """
+        parses `text` as if it was a ninja file
+        """
+        self.__parse_lines(text.splitlines(True), name, self.scope)
+
+    def variable(self, name: str) -> str:
+        """
+        :return the value of the top level variable `name`
+        """
+        return self.scope.lookup(name)
+
+    def edge(self, output: str) -> Union[Edge, None]:
+        """
+        :return the edge producing `output` or `None` if `output` is a
+            source (or unknown)
+        """
+        return self.__producers.get(output)
+
+    def targets(self) -> List[str]:
+        """
+        :return all outputs in the order of their edges
+        """
+        return list(self.__producers)
+
+    def roots(self) -> List[str]:
+        """
+        :return all outputs, which are not the input of any edge. These are
+            built by `ninja` if there is no `default` statement.
+        """
+        used = set()
+        for e in self.edges:
+            used.update(e.inputs)
+            used.update(e.implicit)
+            used.update(e.order_only)
+            used.update(e.validations)
+        return [t for t in self.__producers if t not in used]
+
+    def default_targets(self) -> List[str]:
+        """
+        :return the targets `ninja` builds without arguments
+        """
+        return list(self.defaults) if self.defaults else self.roots()
+
+    def __path(self, text: str, lookup: Callable[[str], str]) -> str:
+        """
+        :return the evaluated, canonical and shared path
+        """
+        if "$" in text:
+            text = _evaluate(text, lookup)
+        path = self.__paths.get(text)
+        if path is None:
+            path = _canonical(text)
+            path = self.__paths.setdefault(path, path)
+            self.__paths[text] = path
+        return path
+
+    def __parse_lines(self, lines: Iterable[str], name: str, scope: Scope):
+        """
+        :param lines: of a ninja file, including the line terminators
+        :param name: of the file, used in the error messages
+        :param scope: of the file
+        """
+        # the statement, whose indented variables are read:
+        # (line number, "rule", Rule), (line number, "pool", [name, variables])
+        # or (line number, "build", [text, variables])
+        block = None
+        lineno = 0
+        lines = iter(lines)
+        for line in lines:
+            lineno += 1
+            start = lineno
+            line = line.rstrip("\r\n")
+            while line.endswith("$") and (len(line) - len(line.rstrip("$"))) % 2:
+                lineno += 1
+                line = line[:-1] + next(lines, "").rstrip("\r\n").lstrip(" ")
+
+            stripped = line.lstrip(" ")
+            if stripped.startswith("#"):
+                continue
+            include = None
+            try:
+                if stripped and len(stripped) != len(line):
+                    if block is None:
+                        raise NinjaFileError("unexpected indent")
+                    self.__block_variable(block, stripped, scope)
+                    continue
+                if block is not None:
+                    start, finished, block = block[0], block, None
+                    self.__finish(finished, scope)
+                    start = lineno
+                if not stripped:
+                    continue
+
+                word, _, rest = line.partition(" ")
+                if word == "build":
+                    block = (lineno, "build", [rest, {}])
+                elif word == "rule":
+                    block = (lineno, "rule", self.__rule(rest.strip(), scope))
+                elif word == "pool":
+                    block = (lineno, "pool", [rest.strip(), {}])
+                elif word == "default":
+                    self.defaults += self.__defaults(rest, scope.lookup)
+                elif word == "include":
+                    include = (_evaluate(rest.strip(), scope.lookup), scope)
+                elif word == "subninja":
+                    include = (_evaluate(rest.strip(), scope.lookup), Scope(scope))
+                else:
+                    key, value = self.__assignment(line)
+                    value = _evaluate(value, scope.lookup)
+                    scope.variables[key] = self.__strings.setdefault(value, value)
+            except NinjaFileError as e:
+                raise NinjaFileError(f"{name}:{start}: {e}") from None
+            if include:
+                self.parse(*include)
+        if block is not None:
+            try:
+                self.__finish(block, scope)
+            except NinjaFileError as e:
+                raise NinjaFileError(f"{name}:{block[0]}: {e}") from None
+
+    @staticmethod
+    def __assignment(line: str) -> Tuple[str, str]:
+        """
+        :return the name and the unevaluated value of `name = value`
+        """
+        key, eq, value = line.partition("=")
+        key = key.strip()
+        if not eq or not RE_NAME.match(key):
+            raise NinjaFileError(f"expected '=' or a statement: {line!r}")
+        return key, value.lstrip(" ")
+
+    def __block_variable(self, block: Tuple, line: str, scope: Scope):
+        """
+        adds the indented variable `line` to the statement `block`
+        """
+        key, value = self.__assignment(line)
+        _, kind, data = block
+        if kind == "rule":
+            if key not in RULE_VARIABLES:
+                raise NinjaFileError(f"unexpected variable '{key}'")
+            data.variables[key] = value
+        else:
+            # evaluated in the scope of the file, not of the edge
+            value = _evaluate(value, scope.lookup)
+            data[1][sys.intern(key)] = self.__strings.setdefault(value, value)
+
+    @staticmethod
+    def __rule(name: str, scope: Scope) -> Rule:
+        """
+        :return the new rule `name` of `scope`
+        """
+        if not RE_NAME.match(name):
+            raise NinjaFileError(f"invalid rule name '{name}'")
+        if name in scope.rules:
+            raise NinjaFileError(f"duplicate rule '{name}'")
+        rule = Rule(name)
+        scope.rules[name] = rule
+        return rule
+
+    def __defaults(self, text: str, lookup: Callable[[str], str]) -> List[str]:
+        """
+        :return the paths of the `default` statement
+        """
+        ret = []
+        for path, separator in RE_PATH.findall(text):
+            if separator:
+                raise NinjaFileError(f"unexpected '{separator}'")
+            if path:
+                ret.append(self.__path(path, lookup))
+        for t in ret:
+            if t not in self.__producers:
+                raise NinjaFileError(f"unknown target '{t}'")
+        return ret
+
+    def __finish(self, block: Tuple, scope: Scope):
+        """
+        adds the `build` or `pool` statement, once all its variables are read
+        """
+        _, kind, data = block
+        if kind == "build":
+            self.__edge(data[0], data[1], scope)
+        elif kind == "pool":
+            pool, variables = data
+            if pool in self.pools:
+                raise NinjaFileError(f"duplicate pool '{pool}'")
+            try:
+                self.pools[pool] = int(variables["depth"])
+            except (KeyError, ValueError):
+                raise NinjaFileError(f"invalid depth of pool '{pool}'") from None
+
+    @staticmethod
+    def __groups(text: str, escaped: bool) -> List[List[str]]:
+        """
+        :param text: of the `build` statement after `build`
+        :param escaped: if `text` contains `$`
+        :return the unevaluated outputs, implicit outputs, rule and inputs,
+            implicit inputs, order-only inputs and validations
+        """
+        # without escapes and with spaces around all `|`, splitting is
+        # sufficient. This is checked by counting the `|` of the separators.
+        if escaped:
+            words = [p or sep for p, sep in RE_PATH.findall(text) if p or sep]
+        else:
+            words = text.replace(":", " : ").split()
+        groups = [[], [], [], [], [], []]
+        current = bars = 0
+        group = groups[0]
+        for w in words:
+            if w in SEPARATOR_WORDS:
+                current = SEPARATORS.get((current, w), -1)
+                if current < 0:
+                    raise NinjaFileError(f"unexpected '{w}'")
+                group = groups[current]
+                bars += w.count("|")
+            else:
+                group.append(w)
+        if not escaped and bars != text.count("|"):
+            return NinjaFile.__groups(text, True)
+        return groups
+
+    def __edge(self, text: str, variables: Dict[str, str], scope: Scope):
+        """
+        adds the edge of the `build` statement
+        :param text: of the statement after `build`
+        :param variables: evaluated variables of the edge
+        :param scope: of the ninja file
+        """
+        if variables:
+            def lookup(n: str) -> str:
+                return variables[n] if n in variables else scope.lookup(n)
+        else:
+            variables = None
+            lookup = scope.lookup
+
+        escaped = "$" in text
+        groups = self.__groups(text, escaped)
+        if not groups[0]:
+            raise NinjaFileError("expected a path")
+        if not groups[2]:
+            raise NinjaFileError("expected ':' and a rule name")
+
+        rule_name = groups[2].pop(0)
+        rule = scope.rule(rule_name)
+        if rule is None:
+            raise NinjaFileError(f"unknown build rule '{rule_name}'")
+        pool = variables.get("pool") if variables else None
+        if pool and pool not in self.pools:
+            raise NinjaFileError(f"unknown pool name '{pool}'")
+
+        path, paths = self.__path, self.__paths
+        if escaped:
+            groups = [tuple([path(p, lookup) for p in g]) if g else () for g in groups]
+        else:
+            groups = [tuple([paths.get(p) or path(p, lookup) for p in g]) if g else ()
+                      for g in groups]
+        outputs, implicit_outputs, inputs, implicit, order_only, validations = groups
+        e = Edge(rule, outputs, implicit_outputs, inputs, implicit, order_only,
+                 validations, variables, scope)
+        producers = self.__producers
+        for output in outputs + implicit_outputs:
+            if producers.setdefault(output, e) is not e:
+                raise NinjaFileError(f"multiple rules generate {output}")
+        self.edges.append(e)
+
+
+def parse_ninjafile(path: Union[str, Path], **kwargs) -> NinjaFile:
+    """
+    :param path: of the `build.ninja`
+    :param kwargs: see `NinjaFile`
+    :return the parsed ninja file
+    """
+    return NinjaFile(path, **kwargs)
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+reader of the `.ninja_log`, in which ninja records the start and the end
+of each edge it ran, and analyses on top of it: the durations of the
+outputs, the slowest edges, the parallelism over time and the critical
+path through the build graph.
+
+    log = NinjaLog("out/.ninja_log")
+    log.update()  # reads only the lines appended since the last call
+    log.durations(), log.slowest(10), log.parallelism()
+    critical_path(log, parse_ninjafile("out/build.ninja"))
+
+The formats v5 (ninja < 1.12), v6 (1.12) and v7 (>= 1.13) have the same
+columns: start and end in milliseconds since the start of the ninja
+invocation, the mtime of the output, the output and the hash of the
+command. v4 (the command instead of its hash) is read, too.
+
+The invocations of ninja are not delimited in the log. A new one starts,
+if the end of an entry lies before the one of the previous entry (ninja
+appends the entries in the order they finish), or, for v6 and v7, if the
+wall clock time the invocation started at lies after the end of the
+previous invocation. These versions record the time the edge started (in
+nanoseconds) as the mtime, hence the invocation started at mtime - start.
+"""
+import heapq
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Union, List, Dict, Tuple, Iterable
+
+from .ninjafile import NinjaFile
+
+RE_HEADER = re.compile(r"^# ninja log v(\d+)$")
+VERSIONS = (4, 5, 6, 7)
+# the mtimes are taken from a coarse clock (the jiffies of the kernel), the
+# invocations of ninja follow each other within a few milliseconds. Hence,
+# the start of an invocation is only known up to this many milliseconds.
+CLOCK_SLACK = 10
+
+
+class LogEntry:
+    """
+    a single run of an edge. All outputs of an edge share the entry.
+    """
+    __slots__ = ("outputs", "start", "end", "mtime", "hash", "build")
+
+    def __init__(self, output: str, start: int, end: int, mtime: int,
+                 hash_: str, build: int):
+        """
+        :param output: the first output of the edge
+        :param start: in milliseconds since the start of the ninja invocation
+        :param end: in milliseconds since the start of the ninja invocation
+        :param mtime: of the output, as recorded by ninja
+        :param hash_: of the command (the command itself in v4)
+        :param build: the number of the ninja invocation within the log
+        """
+        self.outputs = [output]
+        self.start = start
+        self.end = end
+        self.mtime = mtime
+        self.hash = hash_
+        self.build = build
+
+    def duration(self) -> int:
+        """
+        :return the duration of the edge in milliseconds
+        """
+        return self.end - self.start
+
+    def __repr__(self) -> str:
+        return f"LogEntry({self.outputs!r}, {self.start}, {self.end})"
+
+
+class NinjaLog:
+    """
+    Incremental reader of a `.ninja_log`. `update` only reads the lines
+    ninja appended since the last call. If ninja recompacted (rewrote) the
+    log in the meantime, it is read again from the start.
+    """
+    def __init__(self, path: Union[str, Path]):
+        """
+        :param path: of the `.ninja_log`. It does not need to exist yet.
+        """
+        self.path = Path(path)
+        self.version: Union[int, None] = None
+        # all runs of all edges in the order of the log
+        self.entries: List[LogEntry] = []
+
+        # output -> its latest entry
+        self.__latest: Dict[str, LogEntry] = {}
+        self.__inode: Union[int, None] = None
+        self.__offset = 0
+        self.__builds = 0
+        self.__last_end = 0
+        # wall clock time in milliseconds the current invocation started at
+        self.__origin: Union[int, None] = None
+
+    def __reset(self):
+        self.version = None
+        self.entries = []
+        self.__latest = {}
+        self.__inode = None
+        self.__offset = 0
+        self.__builds = 0
+        self.__last_end = 0
+        self.__origin = None
+
+    def update(self) -> List[LogEntry]:
+        """
+        reads all lines appended since the last call
+        :return the new entries
+        """
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            self.__reset()
+            return []
+        if st.st_ino != self.__inode or st.st_size < self.__offset:
+            self.__reset()
+            self.__inode = st.st_ino
+        if st.st_size == self.__offset:
+            return []
+
+        with open(self.path, "rb") as f:
+            f.seek(self.__offset)
+            data = f.read()
+        # a line ninja is still writing is read by the next call
+        end = data.rfind(b"\n") + 1
+        self.__offset += end
+        return self.__parse(data[:end].decode("utf-8", errors="surrogateescape")
+                            .splitlines())
+
+    def __parse(self, lines: Iterable[str]) -> List[LogEntry]:
+        """
+        :return the entries of the `lines`
+        """
+        ret = []
+        last = self.entries[-1] if self.entries else None
+        for line in lines:
+            if line.startswith("#"):
+                m = RE_HEADER.match(line)
+                if m:
+                    self.version = int(m.group(1))
+                    if self.version not in VERSIONS:
+                        logging.warning("unsupported version of %s: %d",
+                                        self.path, self.version)
+                continue
+            if self.version not in VERSIONS:
+                continue
+            fields = line.split("\t", 4)
+            if len(fields) != 5:
+                continue
+            try:
+                start, end, mtime = int(fields[0]), int(fields[1]), int(fields[2])
+            except ValueError:
+                continue
+            output, hash_ = fields[3], fields[4]
+            # the times start at 0 with each invocation of ninja
+            origin = mtime // 1000000 - start if self.version >= 6 and mtime > 0 else None
+            if end < self.__last_end or (
+                    origin is not None and self.__origin is not None and
+                    origin - self.__origin > max(self.__last_end - CLOCK_SLACK, CLOCK_SLACK)):
+                self.__builds += 1
+                self.__origin = origin
+            elif origin is not None:
+                # the output of a `restat` edge may keep its older mtime
+                self.__origin = origin if self.__origin is None else max(self.__origin, origin)
+            self.__last_end = end
+
+            # the outputs of an edge are written one after the other
+            if last is not None and last.build == self.__builds and \
+                    (last.start, last.end, last.hash) == (start, end, hash_):
+                last.outputs.append(output)
+            else:
+                last = LogEntry(output, start, end, mtime, hash_, self.__builds)
+                self.entries.append(last)
+                ret.append(last)
+            self.__latest[output] = last
+        return ret
+
+    def entry(self, output: str) -> Union[LogEntry, None]:
+        """
+        :return the latest entry of `output`, `None` if it was never built
+        """
+        return self.__latest.get(output)
+
+    def durations(self) -> Dict[str, int]:
+        """
+        :return output -> the duration in milliseconds of its latest build
+        """
+        return {o: e.end - e.start for o, e in self.__latest.items()}
+
+    def last_build(self) -> List[LogEntry]:
+        """
+        :return the entries of the last invocation of ninja
+        """
+        if not self.entries:
+            return []
+        build = self.entries[-1].build
+        ret = []
+        for e in reversed(self.entries):
+            if e.build != build:
+                break
+            ret.append(e)
+        ret.reverse()
+        return ret
+
+    def slowest(self, n: int = 10,
+                entries: Union[List[LogEntry], None] = None) -> List[LogEntry]:
+        """
+        :param n: number of edges
+        :param entries: defaults to the last build
+        :return the `n` slowest edges, the slowest first
+        """
+        entries = self.last_build() if entries is None else entries
+        return heapq.nlargest(n, entries, key=LogEntry.duration)
+
+    def parallelism(self, entries: Union[List[LogEntry], None] = None) \
+            -> List[Tuple[int, int]]:
+        """
+        :param entries: defaults to the last build
+        :return (time in milliseconds, number of running edges from then on)
+            for each time the number changes
+        """
+        entries = self.last_build() if entries is None else entries
+        events: Dict[int, int] = {}
+        for e in entries:
+            events[e.start] = events.get(e.start, 0) + 1
+            events[e.end] = events.get(e.end, 0) - 1
+        ret, running = [], 0
+        for t in sorted(events):
+            if events[t]:
+                running += events[t]
+                ret.append((t, running))
+        return ret
+
+    def average_parallelism(self, entries: Union[List[LogEntry], None] = None) -> float:
+        """
+        :param entries: defaults to the last build
+        :return the sum of the durations of all edges divided by the wall
+            time. Compared to the number of jobs, this is the utilization.
+        """
+        entries = self.last_build() if entries is None else entries
+        if not entries:
+            return 0.
+        wall = max(e.end for e in entries) - min(e.start for e in entries)
+        busy = sum(e.end - e.start for e in entries)
+        return busy / wall if wall else 0.
+
+
+def critical_path(log: NinjaLog, graph: NinjaFile,
+                  targets: Union[List[str], None] = None) -> Tuple[int, List[str]]:
+    """
+    the longest chain of edges, weighted by the durations of their latest
+    runs, which leads to one of the `targets`. No number of jobs builds the
+    targets faster.
+    :param log: the build log
+    :param graph: the build graph
+    :param targets: defaults to the targets ninja builds without arguments
+    :return the duration of the path in milliseconds and the outputs along
+        it, starting with the first edge
+    """
+    durations = log.durations()
+    # edge -> (duration of the longest path ending with it, its predecessor)
+    done = {}
+    # the edges on the stack, ninja rejects cycles only once it builds them
+    visiting = set()
+    best = (0, None)
+    for target in graph.default_targets() if targets is None else targets:
+        root = graph.edge(target)
+        if root is None:
+            continue
+        stack = [(root, False)]
+        while stack:
+            edge, expanded = stack.pop()
+            if edge in done:
+                continue
+            inputs = [e for e in map(graph.edge, edge.all_inputs()) if e is not None]
+            if not expanded:
+                if edge in visiting:
+                    continue
+                visiting.add(edge)
+                stack.append((edge, True))
+                stack += [(e, False) for e in inputs if e not in done]
+                continue
+            visiting.discard(edge)
+            cost = next((durations[o] for o in edge.all_outputs() if o in durations), 0)
+            before = max(((done[e][0], e) for e in inputs if e in done),
+                         key=lambda x: x[0], default=(0, None))
+            done[edge] = (before[0] + cost, before[1])
+        if done[root][0] >= best[0]:
+            best = (done[root][0], root)
+
+    path = []
+    edge = best[1]
+    while edge is not None:
+        path.append(edge.outputs[0])
+        edge = done[edge][1]
+    path.reverse()
+    return best[0], path
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+structured progress of running builds. Each builder translates the output
+of its build tool into `ProgressEvent`s:
+    - ninja: the status lines, whose format is pinned via `NINJA_STATUS`
+    - make: the `--trace` lines. The total is estimated from the Makefile.
+    - cargo: the json messages (`--message-format=json-render-diagnostics`)
+    - bazel: the `[n / m]` progress lines
+    - cmake: the `[ n%]` lines of the Makefile generator or the ninja status
+
+Consumers subscribe with a callback (`Builder.use_progress`), or iterate
+over a `ProgressStream`:
+
+    stream = ProgressStream(stall_timeout=60)
+    b.use_progress(stream)
+    asyncio.ensure_future(b.abuild(t))
+    async for event in stream:
+        print(event.done, event.total, event.action, event.eta, event.stalled)
+
+An event is emitted once a build starts, for each line which changes the
+progress and once the build finished.
+"""
+import asyncio
+import json
+import re
+import time
+from typing import Union, List, Callable
+
+# `NINJA_STATUS` of all ninja builds. This is the default of ninja, but
+# the environment of the user may overwrite it.
+NINJA_STATUS = "[%f/%t] "
+
+RE_NINJA = re.compile(r"^\[(\d+)/(\d+)\] (.*)$")
+RE_BAZEL = re.compile(r"^\[([\d,]+) / ([\d,]+)\] (.*)$")
+RE_PERCENT = re.compile(r"^\[\s*(\d+)%\] (.*)$")
+# make 4.3: `Makefile:3: update target 'prog' due to: a.o` or
+# `Makefile:3: target 'prog' does not exist`
+RE_MAKE_TRACE = re.compile(r"^(?:.*?:\d+: )?(?:update )?target '(.+)' (?:due to|does not exist)")
+
+
+class ProgressEvent:
+    """
+    the progress of a single build
+    """
+    __slots__ = ("target", "done", "total", "action", "elapsed", "eta",
+                 "finished", "success", "stalled", "time")
+
+    def __init__(self, target: str, done: int, total: Union[int, None], action: str,
+                 elapsed: float, finished: bool = False,
+                 success: Union[bool, None] = None, stalled: bool = False):
+        """
+        :param target: name of the target which is build
+        :param done: number of finished steps (edges, actions, crates, ...)
+        :param total: number of all steps, `None` if unknown
+        :param action: the current action, e.g. "CC foo.o"
+        :param elapsed: seconds since the start of the build
+        :param finished: true for the last event of a build
+        :param success: of the finished build, otherwise `None`
+        :param stalled: true if there was no progress for a while, see
+            `ProgressStream`
+        """
+        self.target = target
+        self.done = done
+        self.total = total
+        self.action = action
+        self.elapsed = elapsed
+        self.finished = finished
+        self.success = success
+        self.stalled = stalled
+        # `time.perf_counter()` of the event
+        self.time = time.perf_counter()
+
+        # the remaining seconds, extrapolated from the rate so far
+        self.eta: Union[float, None] = None
+        if finished:
+            self.eta = 0.
+        elif total and 0 < done <= total:
+            self.eta = elapsed / done * (total - done)
+
+    def fraction(self) -> Union[float, None]:
+        """
+        :return the finished fraction of the build, `None` if unknown
+        """
+        if self.finished:
+            return 1.
+        if not self.total:
+            return None
+        return min(self.done / self.total, 1.)
+
+    def __repr__(self) -> str:
+        return f"{self.target}: {self.done}/{self.total} {self.action!r}"
+
+
+class ProgressParser:
+    """
+    translates the output lines of a build tool into progress. The base
+    class does not understand any output.
+    """
+    def __init__(self, total: Union[int, None] = None):
+        """
+        :param total: number of steps, if known upfront
+        """
+        self.done = 0
+        self.total = total
+        self.action = ""
+
+    def parse(self, line: str) -> bool:
+        """
+        :param line: of the output
+        :return true if the progress changed
+        """
+        _ = line
+        return False
+
+
+class NinjaStatusParser(ProgressParser):
+    """
+    the status lines of ninja (`NINJA_STATUS`): `[finished/total] description`
+    """
+    def parse(self, line: str) -> bool:
+        m = RE_NINJA.match(line)
+        if not m:
+            return False
+        self.done, self.total, self.action = int(m.group(1)), int(m.group(2)), m.group(3)
+        return True
+
+
+class BazelProgressParser(ProgressParser):
+    """
+    the progress lines of bazel: `[1,234 / 5,678] Compiling foo.cc; 3s ...`
+    """
+    def parse(self, line: str) -> bool:
+        m = RE_BAZEL.match(line)
+        if not m:
+            return False
+        self.done = int(m.group(1).replace(",", ""))
+        self.total = int(m.group(2).replace(",", ""))
+        self.action = m.group(3)
+        return True
+
+
+class MakeTraceParser(ProgressParser):
+    """
+    the lines of `make --trace`. Each line starts a target, the total is an
+    estimate (see `Make._progress_parser`).
+    """
+    def parse(self, line: str) -> bool:
+        m = RE_MAKE_TRACE.match(line)
+        if not m:
+            return False
+        self.done += 1
+        if self.total is not None and self.done > self.total:
+            self.total = self.done
+        self.action = m.group(1)
+        return True
+
+
+class CargoMessageParser(ProgressParser):
+    """
+    the json messages of `cargo build --message-format=json-render-diagnostics`.
+    Each artifact (including fresh ones) is a step.
+    """
+    def parse(self, line: str) -> bool:
+        if not line.startswith("{"):
+            return False
+        try:
+            message = json.loads(line)
+        except ValueError:
+            return False
+        if message.get("reason") != "compiler-artifact":
+            return False
+        self.done += 1
+        if self.total is not None and self.done > self.total:
+            self.total = self.done
+        self.action = message.get("target", {}).get("name", "")
+        return True
+
+
+class CMakeProgressParser(NinjaStatusParser):
+    """
+    the `[ 42%] Building C object ...` lines of the Makefile generator, or
+    the status lines of the ninja generator
+    """
+    def parse(self, line: str) -> bool:
+        m = RE_PERCENT.match(line)
+        if not m:
+            return super().parse(line)
+        self.done, self.total, self.action = int(m.group(1)), 100, m.group(2)
+        return True
+
+
+class ProgressTracker:
+    """
+    feeds the output of a running build into a `ProgressParser` and passes
+    the resulting events to all callbacks
+    """
+    def __init__(self, target: str, parser: ProgressParser,
+                 callbacks: List[Callable[[ProgressEvent], None]]):
+        """
+        :param target: name of the target
+        :param parser: of the build tool
+        :param callbacks: called with each event
+        """
+        self.target = target
+        self.parser = parser
+        self.callbacks = callbacks
+        self.start = time.perf_counter()
+        self.__emit()
+
+    def __emit(self, finished: bool = False, success: Union[bool, None] = None):
+        p = self.parser
+        event = ProgressEvent(self.target, p.done, p.total, p.action,
+                              time.perf_counter() - self.start, finished, success)
+        for callback in self.callbacks:
+            callback(event)
+
+    def line(self, line: str):
+        """
+        :param line: of the output of the build
+        """
+        if self.parser.parse(line):
+            self.__emit()
+
+    def finish(self, success: bool):
+        """
+        emits the last event of the build
+        """
+        self.__emit(True, success)
+
+
+class ProgressStream:
+    """
+    An async iterator over the events of the builds, which is subscribed as
+    a callback. The callback may be called from any thread. The iteration
+    ends once `builds` builds finished.
+
+    If `stall_timeout` is set and no event arrived within this many
+    seconds, the last event is repeated with `stalled=True`.
+    """
+    def __init__(self, builds: int = 1, stall_timeout: Union[float, None] = None):
+        """
+        :param builds: number of builds to follow
+        :param stall_timeout: in seconds
+        """
+        self.builds = builds
+        self.stall_timeout = stall_timeout
+        self.__queue: asyncio.Queue = asyncio.Queue()
+        try:
+            self.__loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.__loop = None
+
+    def __call__(self, event: ProgressEvent):
+        loop = self.__loop
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        if loop is not None and current is not loop:
+            loop.call_soon_threadsafe(self.__queue.put_nowait, event)
+        else:
+            self.__queue.put_nowait(event)
+
+    async def __aiter__(self):
+        self.__loop = asyncio.get_running_loop()
+        finished, last = 0, None
+        while finished < self.builds:
+            try:
+                event = await asyncio.wait_for(self.__queue.get(), self.stall_timeout)
+            except asyncio.TimeoutError:
+                if last is not None:
+                    yield ProgressEvent(last.target, last.done, last.total, last.action,
+                                        time.perf_counter() - last.time + last.elapsed,
+                                        stalled=True)
+                continue
+            finished += event.finished
+            last = event
+            yield event
@@ -4,3 +4,4 @@ parser of makefiles
 """
 
 from ._pymake import __author__, PymakeTypeError, PymakeKeyError
+from .makefile import Makefile, MakefileError, parse_makefile
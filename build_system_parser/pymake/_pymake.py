@@ -11,13 +11,15 @@ import shlex
 from subprocess import check_call
 
 __author__ = {"github.com/": ["casperdcl", "lrq3000"]}
-__all__ = ['PymakeTypeError', 'PymakeKeyError',
-           'parse_makefile_aliases', 'execute_makefile_commands']
+__all__ = ['PymakeTypeError', 'PymakeKeyError', 'expand_macros',
+           'resolve_aliases', 'parse_makefile_aliases',
+           'execute_makefile_commands']
 
 
 RE_MAKE_CMD = re.compile(r'^\t(@\+?)(make)?')
 RE_MACRO_DEF = re.compile(r"^(\S+)\s*\:?\=\s*(.*?)$")
 RE_MACRO = re.compile(r"\$\(\s*\S+\s*\)")
+RE_MACRO_REF = re.compile(r"\$\(([^$()]+)\)")
 
 
 class PymakeTypeError(TypeError):
@@ -32,6 +34,141 @@ class PymakeKeyError(KeyError):
     """
 
 
+def expand_macros(text, macros):
+    '''
+    Substitute all macro references `$(NAME)` in a single pass. The value
+    of each macro is expanded once (memoized), macros are resolved in
+    topological order of their references.
+
+    Parameters
+    ----------
+    text  : str
+    macros  : dict
+        Maps each macro to its unexpanded value.
+
+    Returns
+    -------
+    text  : str
+        With all references of defined macros substituted.
+    undefined  : set
+        References to undefined macros, which are kept as they are.
+    '''
+    expanded = {}
+    undefined = set()
+    # macros, whose value is being expanded -> their remaining references
+    visiting = {}
+
+    def resolve(name):
+        # iterative depth-first search, so long chains of macros do not
+        # exhaust the stack
+        stack = [name]
+        while stack:
+            macro = stack[-1]
+            if macro in expanded:
+                stack.pop()
+                continue
+            if macro not in visiting:
+                visiting[macro] = iter(RE_MACRO_REF.findall(macros[macro]))
+            for ref in visiting[macro]:
+                if ref in macros and ref not in expanded:
+                    if ref in visiting:
+                        raise PymakeKeyError("Recursive macro: " + ref)
+                    stack.append(ref)
+                    break
+            else:
+                expanded[macro] = substitute(macros[macro])
+                del visiting[macro]
+                stack.pop()
+        return expanded[name]
+
+    def lookup(name):
+        if name in expanded:
+            return expanded[name]
+        if name in macros:
+            if name in visiting:
+                # a computed reference, e.g. `$($(X))`
+                raise PymakeKeyError("Recursive macro: " + name)
+            return resolve(name)
+        undefined.add("$(%s)" % name)
+        return "$(%s)" % name
+
+    def substitute(value):
+        if "$(" not in value:
+            return value
+        out = []
+        i = 0
+        while True:
+            j = value.find("$(", i)
+            if j < 0:
+                out.append(value[i:])
+                break
+            out.append(value[i:j])
+            # matching parenthesis, references may be nested: `$($(X))`
+            depth, k = 1, j + 2
+            while depth and k < len(value):
+                depth += {"(": 1, ")": -1}.get(value[k], 0)
+                k += 1
+            if depth:
+                out.append(value[j:])
+                break
+            name = value[j + 2:k - 1]
+            out.append(lookup(substitute(name) if "$(" in name else name))
+            i = k
+        return "".join(out)
+
+    return substitute(text), undefined
+
+
+def resolve_aliases(commands):
+    '''
+    Substitute aliases in commands (depth-first). A command, which is the
+    name of another alias, is replaced by the commands of this alias.
+    The aliases are resolved in topological order.
+
+    Parameters
+    ----------
+    commands  : dict
+        Maps each alias to a list of commands.
+
+    Returns
+    -------
+    commands  : dict
+        Maps each alias to a list of commands without aliases.
+    '''
+    resolved = {}
+    for root in commands:
+        if root in resolved:
+            continue
+        # alias -> index of the next command to visit
+        stack = {root: 0}
+        while stack:
+            alias = next(reversed(stack))
+            cmds = commands[alias]
+            i = stack[alias]
+            while i < len(cmds):
+                cmd = cmds[i]
+                i += 1
+                if cmd != alias and cmd in commands and cmd not in resolved:
+                    if cmd in stack:
+                        raise PymakeKeyError("Circular alias: " + cmd)
+                    stack[alias] = i
+                    stack[cmd] = 0
+                    break
+            else:
+                new = []
+                for cmd in cmds:
+                    # Ignore self-referencing (alias points to itself)
+                    if cmd == alias:
+                        continue
+                    if cmd in commands:
+                        new.extend(resolved[cmd])
+                    else:
+                        new.append(cmd)
+                resolved[alias] = new
+                del stack[alias]
+    return {alias: resolved[alias] for alias in commands}
+
+
 def parse_makefile_aliases(filepath):
     '''
     Parse a makefile to find commands and substitute variables. Expects a
@@ -53,19 +190,12 @@ def parse_makefile_aliases(filepath):
     # Substitute macros
     macros = dict(found for line in ini_lines
                   for found in RE_MACRO_DEF.findall(line) if found)
-    ini_str = '\n'.join(ini_lines)
-    # allow finite amount of nesting
-    for _ in range(99):
-        for (m, expr) in getattr(macros, 'iteritems', macros.items)():
-            ini_str = re.sub(r"\$\(%s\)" % m, expr, ini_str)
-        if not RE_MACRO.search(ini_str):
-            # Strip macro definitions for rest of parsing
-            ini_str = '\n'.join(line for line in ini_str.splitlines()
-                                if not RE_MACRO_DEF.search(line))
-            break
-    else:
-        raise PymakeKeyError("No substitution for macros: " +
-                             str(set(RE_MACRO.findall(ini_str))))
+    ini_str, undefined = expand_macros('\n'.join(ini_lines), macros)
+    if undefined:
+        raise PymakeKeyError("No substitution for macros: " + str(undefined))
+    # Strip macro definitions for rest of parsing
+    ini_str = '\n'.join(line for line in ini_str.splitlines()
+                        if not RE_MACRO_DEF.search(line))
 
     config = configparser.RawConfigParser()
     config.read_string(ini_str)
@@ -82,32 +212,7 @@ def parse_makefile_aliases(filepath):
         commands[alias] = config.get('root', alias).lstrip('\n').split('\n')
 
     # Command substitution (depth-first).
-    # If this is not possible because an alias points to another alias,
-    # then stop and put the current alias back in the queue to be
-    # processed again later (bottom-up).
-
-    aliases_todo = list(commands.keys())
-    commands_new = {}
-    while aliases_todo:
-        alias = aliases_todo.pop()
-        commands_new[alias] = []
-        for cmd in commands[alias]:
-            # Ignore self-referencing (alias points to itself)
-            if cmd == alias:
-                pass
-            elif cmd in aliases:
-                # Append substituted full commands
-                if cmd in commands_new:
-                    commands_new[alias].extend(commands_new[cmd])
-                # Delay substituting another alias until it is substituted
-                else:
-                    del commands_new[alias]
-                    aliases_todo.insert(0, alias)
-                    break
-            # Full command (no aliases)
-            else:
-                commands_new[alias].append(cmd)
-    commands = commands_new
+    commands = resolve_aliases(commands)
     # Prepending prefix to avoid conflicts with standard setup.py commands
     # for alias in list(commands.keys()):
     #     commands['make_'+alias] = commands.pop(alias)
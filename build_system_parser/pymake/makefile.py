@@ -0,0 +1,1435 @@
+#!/usr/bin/env python3
+"""
+streaming parser of GNU Makefiles. Contrary to `parse_makefile_aliases`,
+which reads a Makefile as an INI file, the Makefile is read line by line
+the same way `make` reads it and the result is the dependency graph:
+target -> prerequisites -> recipe.
+
+    from build_system_parser.pymake.makefile import parse_makefile
+    m = parse_makefile("path/to/Makefile")
+    m.targets(), m.prerequisites("prog"), m.recipe("prog"), m.dependencies("all")
+
+Supported:
+    - recursive (`=`), simple (`:=`, `::=`), conditional (`?=`), appending
+      (`+=`) and shell (`!=`) assignments, `define`/`endef`, `override`,
+      `export`, `undefine`, target and pattern specific variables
+    - `$(X)`, `${X}`, `$X`, substitution references `$(X:.c=.o)`,
+      computed variable names and the functions of GNU make, including
+      `call`, `foreach`, `eval` and `wildcard`
+    - `ifeq`/`ifneq`/`ifdef`/`ifndef`/`else`/`endif`
+    - `include`, `-include` and `sinclude`
+    - explicit, double-colon, pattern and static pattern rules, order-only
+      prerequisites and `.PHONY`
+
+Alternatively, GNU make itself evaluates the Makefiles and prints its rule
+database (`make -pnqr`), which is read by `Makefile.read_database`.
+
+Not supported: the built-in implicit rules (like `make -r`), implicit rule
+chains, the inheritance of target specific variables by prerequisites,
+`vpath`, `.SECONDEXPANSION` and `.RECIPEPREFIX`. `$(shell ...)` is
+only executed if requested, otherwise it expands to nothing.
+
+Variables are expanded by a single pass over the text. The values of
+recursive variables are memoized, together with the versions of all
+variables they depend on. Hence, each variable is only expanded again if
+one of its dependencies was assigned in the meantime.
+"""
+import glob
+import logging
+import os
+import re
+import subprocess
+from pathlib import Path
+from typing import Union, List, Dict, Set, Tuple, Iterable, Mapping, Callable
+
+# targets with a special meaning, which are never built
+SPECIAL_TARGETS = {
+    ".PHONY", ".SUFFIXES", ".DEFAULT", ".PRECIOUS", ".INTERMEDIATE",
+    ".NOTINTERMEDIATE", ".SECONDARY", ".SECONDEXPANSION", ".DELETE_ON_ERROR",
+    ".IGNORE", ".LOW_RESOLUTION_TIME", ".SILENT", ".EXPORT_ALL_VARIABLES",
+    ".NOTPARALLEL", ".ONESHELL", ".POSIX", ".WAIT",
+}
+
+# variables `make -r` defines
+DEFAULT_VARIABLES = {
+    "AR": "ar", "ARFLAGS": "rv", "AS": "as", "CC": "cc", "CXX": "g++",
+    "CPP": "$(CC) -E", "FC": "f77", "LD": "ld", "LEX": "lex", "YACC": "yacc",
+    "RM": "rm -f", "MAKE": "make", "SHELL": "/bin/sh",
+}
+
+CONDITIONALS = {"ifeq", "ifneq", "ifdef", "ifndef", "else", "endif"}
+MODIFIERS = {"override", "export", "unexport", "private"}
+# automatic variables, see `Makefile.recipe`
+AUTOMATIC = "@<^+?*|%"
+# name, which marks memoized expansions as invalid, if they have side effects
+IMPURE = "\0"
+
+# sections of the database `make -p` prints
+DB_VARIABLES = "# Variables"
+DB_PATTERN_VARIABLES = "# Pattern-specific Variable Values"
+DB_IMPLICIT = "# Implicit Rules"
+DB_FILES = "# Files"
+DB_SECTIONS = {DB_VARIABLES, DB_PATTERN_VARIABLES, "# Directories", DB_IMPLICIT,
+               DB_FILES, "# VPATH Search Paths"}
+# `# CFLAGS := -O2` of a pattern specific variable
+RE_DB_VARIABLE = re.compile(r"^# (\S+) (=|:=|::=|\+=|\?=) ?(.*)$")
+
+
+class MakefileError(Exception):
+    """
+    the Makefile is invalid, or `$(error ...)` was expanded
+    """
+
+
+class Rule:
+    """
+    all rules of a single explicit target, or a single pattern rule
+    """
+    __slots__ = ("targets", "prerequisites", "order_only", "recipes",
+                 "double_colon", "stem")
+
+    def __init__(self, targets: List[str], double_colon: bool = False):
+        """
+        :param targets: the name of the explicit target, or the target
+            patterns of a pattern rule
+        :param double_colon: true for `target::` rules
+        """
+        self.targets = targets
+        self.prerequisites: List[str] = []
+        self.order_only: List[str] = []
+        # the unexpanded recipe of each rule of this target
+        self.recipes: List[List[str]] = []
+        self.double_colon = double_colon
+        # stem of a static pattern rule
+        self.stem = ""
+
+    def recipe(self) -> List[str]:
+        """
+        :return the unexpanded recipe. Double-colon rules execute all
+            recipes, otherwise the last one wins.
+        """
+        if self.double_colon:
+            return [line for r in self.recipes for line in r]
+        for r in reversed(self.recipes):
+            if r:
+                return r
+        return []
+
+    def __repr__(self) -> str:
+        return f"Rule({' '.join(self.targets)}: {' '.join(self.prerequisites)})"
+
+
+def _close(text: str, start: int, opening: str, closing: str) -> int:
+    """
+    :param start: first character after the opening parenthesis
+    :return the index of the matching closing parenthesis
+    """
+    depth = 1
+    i = start
+    while True:
+        c = text.find(closing, i)
+        if c < 0:
+            raise MakefileError(f"unterminated variable reference: {text}")
+        o = text.find(opening, i, c)
+        if o >= 0:
+            depth += 1
+            i = o + 1
+            continue
+        depth -= 1
+        if depth == 0:
+            return c
+        i = c + 1
+
+
+def _find(text: str, chars: str, start: int = 0) -> int:
+    """
+    :return the index of the first character of `chars` in `text`, which
+        is not part of a variable reference, or -1
+    """
+    if "$" not in text:
+        found = [i for i in (text.find(c, start) for c in chars) if i >= 0]
+        return min(found) if found else -1
+    i, n = start, len(text)
+    while i < n:
+        c = text[i]
+        if c == "$" and i + 1 < n:
+            nxt = text[i + 1]
+            if nxt == "(":
+                i = _close(text, i + 2, "(", ")") + 1
+                continue
+            if nxt == "{":
+                i = _close(text, i + 2, "{", "}") + 1
+                continue
+            i += 2
+            continue
+        if c in chars:
+            return i
+        i += 1
+    return -1
+
+
+def _split_args(text: str, n: int) -> List[str]:
+    """
+    splits the arguments of a function at the commas, which are not part
+    of a variable reference. The last of the `n` arguments contains all
+    remaining commas.
+    """
+    ret = []
+    while len(ret) < n - 1:
+        i = _find(text, ",")
+        if i < 0:
+            break
+        ret.append(text[:i])
+        text = text[i + 1:]
+    ret.append(text)
+    return ret
+
+
+def _strip_comment(line: str) -> str:
+    """
+    removes a comment, `\\#` is a literal `#`
+    """
+    i = line.find("#")
+    while i >= 0:
+        j = i
+        while j > 0 and line[j - 1] == "\\":
+            j -= 1
+        if (i - j) % 2 == 0:
+            line = line[:i]
+            break
+        line = line[:i - 1] + line[i:]
+        i = line.find("#", i)
+    return line
+
+
+def match(pattern: str, word: str) -> Union[str, None]:
+    """
+    :param pattern: containing a single `%`
+    :return the stem of `word`, or `None` if it does not match
+    """
+    i = pattern.find("%")
+    if i < 0:
+        return "" if pattern == word else None
+    prefix, suffix = pattern[:i], pattern[i + 1:]
+    if len(word) >= len(prefix) + len(suffix) and word.startswith(prefix) \
+            and word.endswith(suffix):
+        return word[len(prefix):len(word) - len(suffix)]
+    return None
+
+
+def patsubst(pattern: str, replacement: str, word: str) -> str:
+    """
+    `$(patsubst pattern,replacement,word)` of a single word
+    """
+    stem = match(pattern, word)
+    if stem is None:
+        return word
+    i = replacement.find("%")
+    if i < 0 or "%" not in pattern:
+        return replacement
+    return replacement[:i] + stem + replacement[i + 1:]
+
+
+def _dir(word: str) -> str:
+    i = word.rfind("/")
+    return word[:i + 1] if i >= 0 else "./"
+
+
+def _notdir(word: str) -> str:
+    return word[word.rfind("/") + 1:]
+
+
+def _suffix(word: str) -> Union[str, None]:
+    name = _notdir(word)
+    i = name.rfind(".")
+    return name[i:] if i >= 0 else None
+
+
+def _basename(word: str) -> str:
+    i = word.rfind(".")
+    return word[:i] if i > word.rfind("/") else word
+
+
+class Makefile:
+    """
+    dependency graph of a Makefile. Rules of explicit targets are merged:
+    the prerequisites of all rules of a target are collected, the recipe
+    of the last rule with a recipe wins.
+    """
+    def __init__(self, path: Union[str, Path, None] = None,
+                 variables: Union[Mapping[str, str], None] = None,
+                 environ: Union[Mapping[str, str], None] = None,
+                 shell: bool = False,
+                 directory: Union[str, Path, None] = None):
+        """
+        :param path: the Makefile to parse
+        :param variables: overrides, e.g. `make CC=clang`
+        :param environ: the environment `make` runs in. If `None` the
+            environment is ignored, so the result only depends on the
+            Makefiles.
+        :param shell: if true, `$(shell ...)` and `!=` are executed
+        :param directory: the directory `make` runs in, defaults to the one
+            of `path`. Included files are relative to it.
+        """
+        if directory is None:
+            directory = os.path.dirname(os.path.abspath(path)) if path else os.getcwd()
+        self.directory = os.path.abspath(directory)
+        self.shell = shell
+        # all parsed Makefiles, and included ones, which do not exist
+        self.files: List[str] = []
+        self.missing: List[str] = []
+        self.__files: Set[str] = set()
+        self.phony: Set[str] = set()
+        # special target -> its prerequisites
+        self.special: Dict[str, List[str]] = {}
+        self.default_goal = ""
+
+        # name -> (value, recursive)
+        self.variables: Dict[str, Tuple[str, bool]] = {}
+        self.__overrides: Set[str] = set()
+        # name -> number of assignments
+        self.__versions: Dict[str, int] = {}
+        # name -> (value, {dependency: version})
+        self.__memo: Dict[str, Tuple[str, Dict[str, int]]] = {}
+        # the variables, which are currently expanded
+        self.__expanding: List[str] = []
+        # names each running expansion depends on
+        self.__deps: List[Set[str]] = []
+
+        self.__rules: Dict[str, Rule] = {}
+        self.__patterns: List[Rule] = []
+        # target -> [(name, operator, value)]. A target specific variable
+        # does not make its target an explicit one.
+        self.__target_variables: Dict[str, List[Tuple[str, str, str]]] = {}
+        # (pattern, name, operator, value)
+        self.__pattern_variables: List[Tuple[str, str, str, str]] = []
+
+        # parser state: the recipe of the current rule, the conditionals
+        self.__recipe: Union[List[str], None] = None
+        self.__conditionals: List[List[bool]] = []
+        self.__parsing: List[str] = []
+
+        self.__functions: Dict[str, Callable[[str, Union[Dict, None]], str]] = {
+            "subst": self.__subst, "patsubst": self.__patsubst,
+            "strip": self.__strip, "findstring": self.__findstring,
+            "filter": self.__filter, "filter-out": self.__filter_out,
+            "sort": self.__sort, "word": self.__word, "wordlist": self.__wordlist,
+            "words": self.__words, "firstword": self.__firstword,
+            "lastword": self.__lastword, "dir": self.__map(_dir),
+            "notdir": self.__map(_notdir), "suffix": self.__map(_suffix),
+            "basename": self.__map(_basename), "addsuffix": self.__addsuffix,
+            "addprefix": self.__addprefix, "join": self.__join,
+            "wildcard": self.__wildcard, "realpath": self.__realpath,
+            "abspath": self.__abspath, "if": self.__if, "or": self.__or,
+            "and": self.__and, "foreach": self.__foreach, "call": self.__call,
+            "value": self.__value, "origin": self.__origin,
+            "flavor": self.__flavor, "eval": self.__eval, "shell": self.__shell,
+            "error": self.__error, "warning": self.__warning, "info": self.__info,
+        }
+
+        for name, value in DEFAULT_VARIABLES.items():
+            self.__set(name, value, True)
+        for name, value in (environ or {}).items():
+            self.__set(name, value, False)
+        for name, value in (variables or {}).items():
+            self.__set(name, value, False)
+            self.__overrides.add(name)
+        self.__set("CURDIR", self.directory, False)
+        self.__set("MAKEFILE_LIST", "", False)
+
+        if path is not None:
+            self.parse(path)
+
+    # ------------------------------------------------------------------
+    # variables
+    # ------------------------------------------------------------------
+    def __set(self, name: str, value: str, recursive: bool):
+        self.variables[name] = (value, recursive)
+        self.__versions[name] = self.__versions.get(name, 0) + 1
+
+    def assign(self, name: str, op: str, value: str, override: bool = False):
+        """
+        :param name: of the variable
+        :param op: `=`, `:=`, `::=`, `?=`, `+=` or `!=`
+        :param value: unexpanded value
+        :param override: the assignment is prefixed with `override`
+        """
+        if name in self.__overrides and not override:
+            return
+        old = self.variables.get(name)
+        if op == "=":
+            self.__set(name, value, True)
+        elif op in (":=", "::="):
+            self.__set(name, self.expand(value), False)
+        elif op == "?=":
+            if old is None:
+                self.__set(name, value, True)
+        elif op == "+=":
+            if old is None:
+                self.__set(name, value, True)
+            elif old[1]:
+                self.__set(name, old[0] + " " + value if old[0] else value, True)
+            else:
+                value = self.expand(value)
+                self.__set(name, old[0] + " " + value if old[0] else value, False)
+        elif op == "!=":
+            self.__set(name, self.__run(self.expand(value)), False)
+        else:
+            raise MakefileError(f"invalid assignment operator {op}")
+        if override:
+            self.__overrides.add(name)
+
+    def variable(self, name: str) -> Union[str, None]:
+        """
+        :return the expanded value of a variable, or `None` if it is undefined
+        """
+        if name not in self.variables:
+            return None
+        return self.__lookup(name, None)
+
+    def __lookup(self, name: str, local: Union[Dict[str, str], None]) -> str:
+        """
+        :return the expanded value of the variable `name`. `local` contains
+            the automatic variables, the arguments of `call`, ...
+        """
+        if self.__deps:
+            self.__deps[-1].add(name)
+        if local is not None and name in local:
+            return local[name]
+        var = self.variables.get(name)
+        if var is None:
+            if local is not None and len(name) == 2 and name[0] in AUTOMATIC:
+                # `$(@D)`, `$(@F)`, ...
+                words = self.__lookup(name[0], local).split()
+                if name[1] == "D":
+                    return " ".join(_dir(w)[:-1] or "/" for w in words)
+                if name[1] == "F":
+                    return " ".join(_notdir(w) for w in words)
+            return ""
+        value, recursive = var
+        if not recursive or "$" not in value:
+            return value
+
+        memo = self.__memo.get(name)
+        if memo is not None:
+            deps = memo[1]
+            if (local is None or deps.keys().isdisjoint(local)) and \
+                    all(self.__versions.get(d, 0) == v for d, v in deps.items()):
+                if self.__deps:
+                    self.__deps[-1].update(deps)
+                return memo[0]
+
+        if name in self.__expanding:
+            raise MakefileError(f"Recursive variable '{name}' references itself "
+                                f"(eventually): {' -> '.join(self.__expanding + [name])}")
+        self.__expanding.append(name)
+        self.__deps.append(set())
+        try:
+            value = self.expand(value, local)
+        finally:
+            self.__expanding.pop()
+            deps = self.__deps.pop()
+        deps.add(name)
+        if self.__deps:
+            self.__deps[-1].update(deps)
+        if IMPURE not in deps and (local is None or deps.isdisjoint(local)):
+            self.__memo[name] = (value, {d: self.__versions.get(d, 0) for d in deps})
+        return value
+
+    def expand(self, text: str, local: Union[Dict[str, str], None] = None) -> str:
+        """
+        expands all variable references and functions in `text`
+        :param local: additional variables, e.g. the automatic ones
+        """
+        if "$" not in text:
+            return text
+        out = []
+        i, n = 0, len(text)
+        while True:
+            j = text.find("$", i)
+            if j < 0 or j + 1 >= n:
+                out.append(text[i:] if j < 0 else text[i:j])
+                break
+            out.append(text[i:j])
+            c = text[j + 1]
+            if c == "(" or c == "{":
+                k = _close(text, j + 2, c, ")" if c == "(" else "}")
+                out.append(self.__reference(text[j + 2:k], local))
+                i = k + 1
+            elif c == "$":
+                out.append("$")
+                i = j + 2
+            else:
+                out.append(self.__lookup(c, local))
+                i = j + 2
+        return "".join(out)
+
+    def __reference(self, ref: str, local: Union[Dict[str, str], None]) -> str:
+        """
+        :param ref: the text between `$(` and `)`
+        """
+        for k, c in enumerate(ref):
+            if c in " \t":
+                f = self.__functions.get(ref[:k])
+                if f is not None:
+                    return f(ref[k + 1:].lstrip(" \t"), local)
+                break
+            if c in "$:":
+                break
+        if "$" in ref:
+            ref = self.expand(ref, local)
+        colon = ref.find(":")
+        if colon >= 0:
+            eq = ref.find("=", colon)
+            if eq >= 0:
+                # substitution reference `$(var:a=b)`
+                a, b = ref[colon + 1:eq], ref[eq + 1:]
+                if "%" not in a:
+                    a, b = "%" + a, "%" + b
+                value = self.__lookup(ref[:colon], local)
+                return " ".join(patsubst(a, b, w) for w in value.split())
+        return self.__lookup(ref, local)
+
+    # ------------------------------------------------------------------
+    # functions
+    # ------------------------------------------------------------------
+    def __args(self, text: str, n: int, local) -> List[str]:
+        return [self.expand(a, local) for a in _split_args(text, n)]
+
+    def __subst(self, text, local):
+        a, b, s = self.__args(text, 3, local)
+        return s.replace(a, b) if a else s + b
+
+    def __patsubst(self, text, local):
+        a, b, s = self.__args(text, 3, local)
+        return " ".join(patsubst(a, b, w) for w in s.split())
+
+    def __strip(self, text, local):
+        return " ".join(self.expand(text, local).split())
+
+    def __findstring(self, text, local):
+        a, s = self.__args(text, 2, local)
+        return a if a in s else ""
+
+    def __filter(self, text, local, keep: bool = True):
+        patterns, s = self.__args(text, 2, local)
+        patterns = patterns.split()
+        exact = {p for p in patterns if "%" not in p}
+        wild = [p for p in patterns if "%" in p]
+        return " ".join(w for w in s.split() if
+                        (w in exact or any(match(p, w) is not None for p in wild)) == keep)
+
+    def __filter_out(self, text, local):
+        return self.__filter(text, local, False)
+
+    def __sort(self, text, local):
+        return " ".join(sorted(set(self.expand(text, local).split())))
+
+    def __word(self, text, local):
+        n, s = self.__args(text, 2, local)
+        words = s.split()
+        n = int(n.strip())
+        return words[n - 1] if 0 < n <= len(words) else ""
+
+    def __wordlist(self, text, local):
+        a, b, s = self.__args(text, 3, local)
+        return " ".join(s.split()[int(a.strip()) - 1:int(b.strip())])
+
+    def __words(self, text, local):
+        return str(len(self.expand(text, local).split()))
+
+    def __firstword(self, text, local):
+        words = self.expand(text, local).split()
+        return words[0] if words else ""
+
+    def __lastword(self, text, local):
+        words = self.expand(text, local).split()
+        return words[-1] if words else ""
+
+    def __map(self, f: Callable[[str], Union[str, None]]):
+        def function(text, local):
+            return " ".join(r for r in (f(w) for w in self.expand(text, local).split())
+                            if r is not None)
+        return function
+
+    def __addsuffix(self, text, local):
+        a, s = self.__args(text, 2, local)
+        return " ".join(w + a for w in s.split())
+
+    def __addprefix(self, text, local):
+        a, s = self.__args(text, 2, local)
+        return " ".join(a + w for w in s.split())
+
+    def __join(self, text, local):
+        a, b = self.__args(text, 2, local)
+        a, b = a.split(), b.split()
+        n = max(len(a), len(b))
+        a += [""] * (n - len(a))
+        b += [""] * (n - len(b))
+        return " ".join(x + y for x, y in zip(a, b))
+
+    def __path(self, word: str) -> str:
+        return os.path.join(self.directory, word)
+
+    def __wildcard(self, text, local):
+        ret = []
+        for pattern in self.expand(text, local).split():
+            for p in sorted(glob.glob(self.__path(pattern))):
+                ret.append(p if os.path.isabs(pattern) else
+                           os.path.relpath(p, self.directory))
+        return " ".join(ret)
+
+    def __realpath(self, text, local):
+        return " ".join(os.path.realpath(self.__path(w))
+                        for w in self.expand(text, local).split()
+                        if os.path.exists(self.__path(w)))
+
+    def __abspath(self, text, local):
+        return " ".join(os.path.abspath(self.__path(w))
+                        for w in self.expand(text, local).split())
+
+    def __if(self, text, local):
+        args = _split_args(text, 3)
+        if self.expand(args[0], local).strip():
+            return self.expand(args[1], local) if len(args) > 1 else ""
+        return self.expand(args[2], local) if len(args) > 2 else ""
+
+    def __or(self, text, local):
+        for a in _split_args(text, 1 << 30):
+            value = self.expand(a, local).strip()
+            if value:
+                return value
+        return ""
+
+    def __and(self, text, local):
+        value = ""
+        for a in _split_args(text, 1 << 30):
+            value = self.expand(a, local).strip()
+            if not value:
+                return ""
+        return value
+
+    def __foreach(self, text, local):
+        var, words, body = _split_args(text, 3)
+        var = self.expand(var, local).strip()
+        local = dict(local or {})
+        ret = []
+        for w in self.expand(words, local).split():
+            local[var] = w
+            ret.append(self.expand(body, local))
+        return " ".join(ret)
+
+    def __call(self, text, local):
+        args = _split_args(text, 1 << 30)
+        name = self.expand(args[0], local).strip()
+        if name in self.__functions:
+            return self.__functions[name](",".join(args[1:]), local)
+        if self.__deps:
+            self.__deps[-1].add(name)
+        var = self.variables.get(name)
+        if var is None:
+            return ""
+        new = {k: v for k, v in (local or {}).items() if not k.isdigit()}
+        new["0"] = name
+        for i, a in enumerate(args[1:], 1):
+            new[str(i)] = self.expand(a, local)
+        if not var[1]:
+            return var[0]
+        if name in self.__expanding:
+            raise MakefileError(f"Recursive variable '{name}' references itself (eventually)")
+        self.__expanding.append(name)
+        try:
+            return self.expand(var[0], new)
+        finally:
+            self.__expanding.pop()
+
+    def __value(self, text, local):
+        name = self.expand(text, local).strip()
+        if self.__deps:
+            self.__deps[-1].add(name)
+        var = self.variables.get(name)
+        return var[0] if var else ""
+
+    def __origin(self, text, local):
+        name = self.expand(text, local).strip()
+        if self.__deps:
+            self.__deps[-1].add(name)
+        if local is not None and name in local:
+            return "automatic"
+        if name not in self.variables:
+            return "undefined"
+        if name in self.__overrides:
+            return "override"
+        if name in DEFAULT_VARIABLES and self.__versions[name] == 1:
+            return "default"
+        return "file"
+
+    def __flavor(self, text, local):
+        name = self.expand(text, local).strip()
+        if self.__deps:
+            self.__deps[-1].add(name)
+        var = self.variables.get(name)
+        if var is None:
+            return "undefined"
+        return "recursive" if var[1] else "simple"
+
+    def __impure(self):
+        for deps in self.__deps:
+            deps.add(IMPURE)
+
+    def __eval(self, text, local):
+        self.__impure()
+        recipe = self.__recipe
+        self.__parse_lines(self.expand(text, local).split("\n"), "<eval>")
+        self.__recipe = recipe
+        return ""
+
+    def __run(self, cmd: str) -> str:
+        """
+        :return the output of the shell command `cmd` with newlines
+            replaced by spaces
+        """
+        self.__impure()
+        if not self.shell:
+            return ""
+        p = subprocess.run(["/bin/sh", "-c", cmd], cwd=self.directory, check=False,
+                           stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        return p.stdout.rstrip("\n").replace("\n", " ")
+
+    def __shell(self, text, local):
+        return self.__run(self.expand(text, local))
+
+    def __error(self, text, local):
+        raise MakefileError(self.expand(text, local))
+
+    def __warning(self, text, local):
+        logging.warning("%s", self.expand(text, local))
+        return ""
+
+    def __info(self, text, local):
+        logging.info("%s", self.expand(text, local))
+        return ""
+
+    # ------------------------------------------------------------------
+    # parser
+    # ------------------------------------------------------------------
+    def parse(self, path: Union[str, Path]):
+        """
+        reads the Makefile `path`, relative paths are relative to the
+        directory `make` runs in
+        """
+        path = os.path.join(self.directory, os.fspath(path))
+        if path in self.__parsing:
+            raise MakefileError(f"{path} includes itself")
+        with open(path, encoding="utf-8", errors="surrogateescape") as f:
+            text = f.read()
+        if path not in self.__files:
+            self.__files.add(path)
+            self.files.append(path)
+        value = self.variables["MAKEFILE_LIST"][0]
+        self.__set("MAKEFILE_LIST", (value + " " if value else "") +
+                   os.path.relpath(path, self.directory), False)
+        self.__parsing.append(path)
+        try:
+            self.parse_string(text, path)
+        finally:
+            self.__parsing.pop()
+
+    def parse_string(self, text: str, name: str = "<string>"):
+        """
+        reads a Makefile from a string
+        :param name: of the Makefile in error messages
+        """
+        depth = len(self.__conditionals)
+        self.__recipe = None
+        self.__parse_lines(text.replace("\r\n", "\n").split("\n"), name)
+        self.__recipe = None
+        if len(self.__conditionals) != depth:
+            del self.__conditionals[depth:]
+            raise MakefileError(f"{name}: missing 'endif'")
+
+    def read_database(self, lines: Iterable[str]) -> bool:
+        """
+        reads the rule database `make -pnqr` printed. The variables,
+        pattern rules and explicit targets are the ones `make` evaluated,
+        only the recipes are expanded by this class.
+        :param lines: of the output, without line terminators
+        :return false if `lines` contains no database
+        """
+        found = False
+        section = ""
+        origin = ""
+        # the explicit rule and recipe the following lines belong to
+        rule: Union[Rule, None] = None
+        recipe: Union[List[str], None] = None
+        not_target = False
+        # a file, which is not a target, e.g. an included Makefile
+        missing = ""
+        # name and body of a `define`
+        define: Union[str, None] = None
+        body: List[str] = []
+        pattern = ""
+        for line in lines:
+            if define is not None:
+                if line == "endef":
+                    if origin != "automatic":
+                        self.__set(define, "\n".join(body), True)
+                    define = None
+                else:
+                    body.append(line)
+                continue
+            if not line:
+                rule = recipe = None
+                continue
+
+            c = line[0]
+            if c == "\t":
+                if recipe is not None:
+                    if recipe and recipe[-1].endswith("\\"):
+                        recipe[-1] += "\n" + line[1:]
+                    else:
+                        recipe.append(line[1:].lstrip(" "))
+                continue
+
+            if c == "#":
+                if line in DB_SECTIONS:
+                    section = line
+                    found = True
+                elif section == DB_FILES:
+                    if line.startswith("#  recipe to execute"):
+                        if rule is not None:
+                            recipe = []
+                            rule.recipes.append(recipe)
+                    elif line == "# Not a target:":
+                        not_target = True
+                    elif line.startswith("#  Phony target"):
+                        if rule is not None:
+                            self.phony.add(rule.targets[0])
+                    elif line.startswith("#  Implicit/static pattern stem: '"):
+                        if rule is not None:
+                            rule.stem = line[34:-1]
+                    elif line == "#  Failed to be updated." and missing:
+                        self.missing.append(os.path.join(self.directory, missing))
+                elif section == DB_VARIABLES:
+                    origin = line[2:]
+                elif section == DB_PATTERN_VARIABLES and pattern:
+                    m = RE_DB_VARIABLE.match(line)
+                    if m:
+                        self.__pattern_variables.append((pattern, *m.groups()))
+                elif section == DB_IMPLICIT and line.startswith("#  recipe to execute"):
+                    if self.__patterns:
+                        recipe = self.__patterns[-1].recipes[0]
+                continue
+
+            if section == DB_FILES:
+                if not_target:
+                    missing = line[:-1] if line.endswith(":") else ""
+                    not_target = False
+                    rule = None
+                else:
+                    missing = ""
+                    rule = self.__database_rule(line)
+                recipe = None
+            elif section == DB_VARIABLES:
+                if line.startswith("define "):
+                    define, body = line[7:].strip(), []
+                    continue
+                assignment = self.__assignment(line)
+                if assignment and origin != "automatic":
+                    name, op, value = assignment
+                    self.__set(name.strip(), value, op == "=")
+            elif section == DB_PATTERN_VARIABLES:
+                pattern = line.rstrip(":").strip()
+            elif section == DB_IMPLICIT:
+                i = _find(line, ":")
+                if i > 0:
+                    r = Rule(line[:i].split(), line.startswith(":", i + 1))
+                    prerequisites = line[i + 1:].lstrip(":").split()
+                    if "|" in prerequisites:
+                        k = prerequisites.index("|")
+                        r.order_only = prerequisites[k + 1:]
+                        prerequisites = prerequisites[:k]
+                    r.prerequisites = prerequisites
+                    r.recipes.append([])
+                    self.__patterns.append(r)
+                recipe = None
+
+        makefiles = self.variables.get("MAKEFILE_LIST")
+        for f in (makefiles[0].split() if makefiles else []):
+            path = os.path.join(self.directory, f)
+            if path not in self.__files:
+                self.__files.add(path)
+                self.files.append(path)
+        var = self.variables.get(".DEFAULT_GOAL")
+        if var:
+            self.default_goal = var[0].strip()
+        return found
+
+    def __database_rule(self, line: str) -> Union[Rule, None]:
+        """
+        a rule in the `# Files` section of the database. The prerequisites
+        of all rules of a target are already merged, except for
+        double-colon rules.
+        :return the rule of the target, `None` for special targets and
+            target specific variables
+        """
+        i = _find(line, ":")
+        if i <= 0:
+            return None
+        target = line[:i]
+        double_colon = line.startswith(":", i + 1)
+        rest = line[i + 2 if double_colon else i + 1:]
+        assignment = self.__assignment(rest)
+        if assignment:
+            name, op, value = assignment
+            self.__target_variables.setdefault(target, []).append((name.strip(), op, value))
+            return None
+        prerequisites = rest.split()
+        order_only: List[str] = []
+        if "|" in prerequisites:
+            k = prerequisites.index("|")
+            prerequisites, order_only = prerequisites[:k], prerequisites[k + 1:]
+        if target in SPECIAL_TARGETS:
+            self.special.setdefault(target, []).extend(prerequisites)
+            if target == ".PHONY":
+                self.phony.update(prerequisites)
+            return None
+        r = self.__explicit(target, double_colon)
+        r.prerequisites += prerequisites
+        r.order_only += order_only
+        return r
+
+    def __active(self) -> bool:
+        return not self.__conditionals or self.__conditionals[-1][0]
+
+    def __parse_lines(self, lines: List[str], name: str):
+        """
+        reads the logical lines of a Makefile
+        """
+        i, n = 0, len(lines)
+        # name, operator, override flag, body of a `define`
+        define: Union[Tuple[str, str, bool, bool], None] = None
+        body: List[str] = []
+        nested = 0
+        while i < n:
+            start = i
+            line = lines[i]
+            i += 1
+
+            if define is not None:
+                word = line.strip().split(None, 1)
+                word = word[0] if word else ""
+                if word == "define":
+                    nested += 1
+                elif word == "endef":
+                    if nested:
+                        nested -= 1
+                    else:
+                        var, op, override, active = define
+                        define = None
+                        if active:
+                            self.assign(var, op, "\n".join(body), override)
+                        continue
+                if body and body[-1].endswith("\\") and \
+                        (len(body[-1]) - len(body[-1].rstrip("\\"))) % 2 == 1:
+                    body[-1] = body[-1][:-1].rstrip() + " " + line.lstrip()
+                else:
+                    body.append(line)
+                continue
+
+            if line.startswith("\t") and self.__recipe is not None:
+                # recipe line: backslash-newlines are passed to the shell
+                while line.endswith("\\") and i < n and \
+                        (len(line) - len(line.rstrip("\\"))) % 2 == 1:
+                    nxt = lines[i]
+                    i += 1
+                    line += "\n" + (nxt[1:] if nxt.startswith("\t") else nxt)
+                if self.__active():
+                    self.__recipe.append(line[1:])
+                continue
+
+            # join continuation lines
+            if line.endswith("\\"):
+                parts = [line]
+                while parts[-1].endswith("\\") and \
+                        (len(parts[-1]) - len(parts[-1].rstrip("\\"))) % 2 == 1 and i < n:
+                    parts[-1] = parts[-1][:-1].rstrip()
+                    parts.append(lines[i].lstrip())
+                    i += 1
+                line = " ".join(p for p in parts if p)
+
+            if "#" in line:
+                line = _strip_comment(line)
+            stripped = line.strip()
+            if not stripped:
+                continue
+
+            words = stripped.split(None, 1)
+            word = words[0]
+            rest = words[1] if len(words) > 1 else ""
+            if word in CONDITIONALS:
+                self.__conditional(word, rest, name, start)
+                continue
+            if word == "define" or (word in MODIFIERS and rest.split(None, 1)[0] == "define"):
+                override = word == "override"
+                if word != "define":
+                    rest = rest[6:].strip()
+                op = "="
+                for o in ("::=", ":=", "+=", "?=", "!=", "="):
+                    if rest.endswith(o):
+                        rest, op = rest[:-len(o)].strip(), o
+                        break
+                define = (self.expand(rest).strip(), op, override, self.__active())
+                body, nested = [], 0
+                continue
+            if not self.__active():
+                continue
+
+            self.__recipe = None
+            try:
+                self.__line(line.lstrip(), word, rest)
+            except MakefileError as e:
+                raise MakefileError(f"{name}:{start + 1}: {e}") from None
+
+        if define is not None:
+            raise MakefileError(f"{name}: missing 'endef'")
+
+    def __conditional(self, word: str, rest: str, name: str, lineno: int):
+        """
+        evaluates `ifeq`, `ifneq`, `ifdef`, `ifndef`, `else` and `endif`
+        """
+        stack = self.__conditionals
+        if word == "endif":
+            if not stack:
+                raise MakefileError(f"{name}:{lineno + 1}: extraneous 'endif'")
+            stack.pop()
+            return
+        if word == "else":
+            if not stack:
+                raise MakefileError(f"{name}:{lineno + 1}: extraneous 'else'")
+            top = stack[-1]
+            if top[1] or not top[2]:
+                top[0] = False
+                return
+            value = True
+            if rest:
+                words = rest.split(None, 1)
+                value = self.__condition(words[0], words[1] if len(words) > 1 else "")
+            top[0] = top[1] = value
+            return
+        parent = self.__active()
+        value = parent and self.__condition(word, rest)
+        stack.append([value, value, parent])
+
+    def __condition(self, word: str, rest: str) -> bool:
+        """
+        :return the value of the condition `word rest`
+        """
+        if word in ("ifdef", "ifndef"):
+            var = self.variables.get(self.expand(rest).strip())
+            return (var is not None and var[0] != "") == (word == "ifdef")
+        if word not in ("ifeq", "ifneq"):
+            raise MakefileError(f"invalid conditional {word}")
+        rest = rest.strip()
+        if rest.startswith("("):
+            end = rest.rfind(")")
+            args = _split_args(rest[1:end], 2)
+            if len(args) != 2:
+                raise MakefileError(f"invalid syntax in conditional: {rest}")
+            a, b = args[0].strip(), args[1].strip()
+        else:
+            quoted = []
+            while rest and rest[0] in "\"'" and len(quoted) < 2:
+                end = rest.find(rest[0], 1)
+                if end < 0:
+                    break
+                quoted.append(rest[1:end])
+                rest = rest[end + 1:].strip()
+            if len(quoted) != 2:
+                raise MakefileError(f"invalid syntax in conditional: {rest}")
+            a, b = quoted
+        return (self.expand(a) == self.expand(b)) == (word == "ifeq")
+
+    def __line(self, line: str, word: str, rest: str):
+        """
+        a logical line, which is neither a recipe nor a conditional
+        """
+        if word in ("include", "-include", "sinclude"):
+            self.__include(rest, word == "include")
+            return
+        if word in ("vpath", "load", "-load"):
+            return
+        if word == "undefine":
+            name = self.expand(rest).strip()
+            if self.variables.pop(name, None) is not None:
+                self.__versions[name] += 1
+            return
+
+        override = modified = False
+        while word in MODIFIERS and rest:
+            override |= word == "override"
+            modified = True
+            line = rest
+            words = rest.split(None, 1)
+            word = words[0]
+            rest = words[1] if len(words) > 1 else ""
+        if word in MODIFIERS or word == "undefine":
+            return
+
+        assignment = self.__assignment(line)
+        if assignment:
+            name, op, value = assignment
+            self.assign(self.expand(name).strip(), op, value, override)
+            return
+        if _find(line, ":") >= 0:
+            self.__rule(line)
+            return
+        if modified:
+            # `export VAR`
+            return
+        # e.g. `$(eval ...)` or `$(foreach ...)`, which may expand to a rule
+        expanded = self.expand(line).strip()
+        if expanded:
+            if ":" in expanded:
+                self.__rule(expanded.replace("$", "$$"))
+            else:
+                raise MakefileError(f"missing separator: {line}")
+
+    @staticmethod
+    def __assignment(line: str) -> Union[Tuple[str, str, str], None]:
+        """
+        :return `(name, operator, value)` if `line` is an assignment
+        """
+        i = _find(line, ":=")
+        if i < 0:
+            return None
+        if line[i] == "=":
+            if i > 0 and line[i - 1] in "+?!":
+                return line[:i - 1], line[i - 1] + "=", line[i + 1:].lstrip()
+            return line[:i], "=", line[i + 1:].lstrip()
+        if line.startswith("=", i + 1):
+            return line[:i], ":=", line[i + 2:].lstrip()
+        if line.startswith(":=", i + 1):
+            return line[:i], "::=", line[i + 3:].lstrip()
+        return None
+
+    def __include(self, text: str, required: bool):
+        """
+        parses the included Makefiles
+        """
+        for f in self.expand(text).split():
+            path = os.path.join(self.directory, f)
+            if not os.path.isfile(path):
+                if path not in self.missing:
+                    self.missing.append(path)
+                if required:
+                    logging.warning("included Makefile %s does not exist", path)
+                continue
+            if path in self.__parsing:
+                raise MakefileError(f"{path} includes itself")
+            self.parse(path)
+
+    def __rule(self, line: str):
+        """
+        parses `targets: prerequisites`, `targets: target-pattern: prereq-patterns`
+        and `targets: variable = value`
+        """
+        i = _find(line, ":")
+        # grouped targets `a b &: c` are built by a single recipe
+        targets = self.expand(line[:i].rstrip().rstrip("&")).split()
+        double_colon = line.startswith(":", i + 1)
+        rest = line[i + 2 if double_colon else i + 1:]
+
+        recipe: List[str] = []
+        semicolon = _find(rest, ";")
+        if semicolon >= 0:
+            recipe.append(rest[semicolon + 1:].lstrip())
+            rest = rest[:semicolon]
+
+        assignment = self.__assignment(rest)
+        if assignment:
+            name, op, value = assignment
+            words = name.split()
+            while words and words[0] in MODIFIERS:
+                words.pop(0)
+            name = self.expand(" ".join(words)).strip()
+            for t in targets:
+                if "%" in t:
+                    self.__pattern_variables.append((t, name, op, value))
+                else:
+                    self.__target_variables.setdefault(t, []).append((name, op, value))
+            return
+        if not targets:
+            self.__recipe = recipe
+            return
+
+        static = _find(rest, ":")
+        pattern = ""
+        if static >= 0:
+            pattern = self.expand(rest[:static]).strip()
+            rest = rest[static + 1:]
+        prerequisites = self.expand(rest).split()
+        order_only: List[str] = []
+        if "|" in prerequisites:
+            k = prerequisites.index("|")
+            prerequisites, order_only = prerequisites[:k], prerequisites[k + 1:]
+
+        self.__recipe = recipe
+        if pattern:
+            for t in targets:
+                stem = match(pattern, t)
+                if stem is None:
+                    logging.warning("target %s does not match the pattern %s", t, pattern)
+                    continue
+                r = self.__explicit(t, double_colon)
+                r.prerequisites += [patsubst("%", p, stem) if "%" in p else p
+                                    for p in prerequisites]
+                r.order_only += [patsubst("%", p, stem) if "%" in p else p
+                                 for p in order_only]
+                r.recipes.append(recipe)
+                r.stem = stem
+            self.__goal(targets)
+            return
+
+        patterns = [t for t in targets if "%" in t]
+        if patterns:
+            r = Rule(patterns, double_colon)
+            r.prerequisites = prerequisites
+            r.order_only = order_only
+            r.recipes.append(recipe)
+            self.__patterns.append(r)
+        for t in targets:
+            if "%" in t:
+                continue
+            if t in SPECIAL_TARGETS:
+                self.special.setdefault(t, []).extend(prerequisites)
+                if t == ".PHONY":
+                    self.phony.update(prerequisites)
+                continue
+            r = self.__explicit(t, double_colon)
+            r.prerequisites += prerequisites
+            r.order_only += order_only
+            r.recipes.append(recipe)
+        self.__goal(targets)
+
+    def __explicit(self, target: str, double_colon: bool) -> Rule:
+        r = self.__rules.get(target)
+        if r is None:
+            r = self.__rules[target] = Rule([target], double_colon)
+        return r
+
+    def __goal(self, targets: List[str]):
+        if self.default_goal:
+            return
+        for t in targets:
+            if "%" not in t and (not t.startswith(".") or "/" in t):
+                self.default_goal = t
+                return
+
+    # ------------------------------------------------------------------
+    # graph
+    # ------------------------------------------------------------------
+    def targets(self) -> List[str]:
+        """
+        :return all explicit targets in the order of their first rule
+        """
+        return list(self.__rules.keys())
+
+    def patterns(self) -> List[Rule]:
+        """
+        :return all pattern rules
+        """
+        return list(self.__patterns)
+
+    def goal(self) -> str:
+        """
+        :return the target `make` builds without arguments
+        """
+        var = self.variables.get(".DEFAULT_GOAL")
+        return self.expand(var[0]).strip() if var else self.default_goal
+
+    def rule(self, target: str) -> Union[Rule, None]:
+        """
+        :return the explicit rules of `target`, or `None`
+        """
+        return self.__rules.get(target)
+
+    def __exists(self, name: str) -> bool:
+        return name in self.__rules or os.path.exists(self.__path(name))
+
+    def implicit(self, target: str) -> Union[Tuple[Rule, str], None]:
+        """
+        searches a pattern rule for `target`, whose prerequisites exist or
+        are explicit targets.
+        :return the pattern rule with the shortest stem and the stem, or `None`
+        """
+        best = None
+        for r in self.__patterns:
+            if not r.recipe():
+                continue
+            for p in r.targets:
+                t, d = target, ""
+                if "/" not in p and "/" in target:
+                    d, t = target[:target.rfind("/") + 1], _notdir(target)
+                stem = match(p, t)
+                if stem is None or (best and len(stem) >= len(best[1])):
+                    continue
+                if all(self.__exists(d + patsubst("%", q, stem) if "%" in q else q)
+                       for q in r.prerequisites):
+                    best = (r, stem, d)
+        if best is None:
+            return None
+        return best[0], best[2] + best[1]
+
+    def __resolve(self, target: str) -> Tuple[List[str], List[str], List[str], str]:
+        """
+        :return the prerequisites, order-only prerequisites, the unexpanded
+            recipe and the stem of `target`
+        """
+        r = self.__rules.get(target)
+        prerequisites = list(r.prerequisites) if r else []
+        order_only = list(r.order_only) if r else []
+        recipe = r.recipe() if r else []
+        stem = r.stem if r else ""
+        if not recipe and target not in self.phony:
+            found = self.implicit(target)
+            if found:
+                p, stem = found
+                d = stem[:stem.rfind("/") + 1] if "/" not in p.targets[0] else ""
+                s = stem[len(d):]
+                prerequisites = [d + patsubst("%", q, s) if "%" in q else q
+                                 for q in p.prerequisites] + prerequisites
+                order_only += [d + patsubst("%", q, s) if "%" in q else q
+                               for q in p.order_only]
+                recipe = p.recipe()
+        return list(dict.fromkeys(prerequisites)), order_only, recipe, stem
+
+    def prerequisites(self, target: str) -> List[str]:
+        """
+        :return the prerequisites of `target`, including the ones of the
+            matching pattern rule, if the target has no recipe
+        """
+        return self.__resolve(target)[0]
+
+    def order_only(self, target: str) -> List[str]:
+        """
+        :return the order-only prerequisites of `target`
+        """
+        return self.__resolve(target)[1]
+
+    def recipe(self, target: str) -> List[str]:
+        """
+        :return the expanded commands of `target`. The prefixes `@`, `-`
+            and `+` are removed.
+        """
+        prerequisites, order_only, recipe, stem = self.__resolve(target)
+        if not recipe:
+            return []
+        r = self.__rules.get(target)
+        local = {"@": target, "<": prerequisites[0] if prerequisites else "",
+                 "^": " ".join(prerequisites), "?": " ".join(prerequisites),
+                 "|": " ".join(order_only), "*": stem,
+                 "+": " ".join(r.prerequisites) if r else " ".join(prerequisites)}
+        for pattern, name, op, value in self.__pattern_variables:
+            if match(pattern, target) is not None:
+                self.__local(local, name, op, value)
+        for name, op, value in self.__target_variables.get(target, []):
+            self.__local(local, name, op, value)
+
+        ret = []
+        for line in recipe:
+            cmd = ""
+            for part in self.expand(line, local).split("\n"):
+                # each line is a command, unless it ends with a backslash
+                cmd = cmd + "\n" + part if cmd else part.lstrip().lstrip("@-+").lstrip()
+                if not cmd.endswith("\\"):
+                    if cmd.strip():
+                        ret.append(cmd.rstrip())
+                    cmd = ""
+            if cmd.strip():
+                ret.append(cmd.rstrip())
+        return ret
+
+    def __local(self, local: Dict[str, str], name: str, op: str, value: str):
+        """
+        applies a target specific variable
+        """
+        defined = name in local or name in self.variables
+        if op == "?=" and defined:
+            return
+        value = self.expand(value, local)
+        if op == "+=" and defined:
+            old = self.__lookup(name, local)
+            value = old + " " + value if old else value
+        local[name] = value
+
+    def dependencies(self, target: str) -> List[str]:
+        """
+        :return all targets and files `target` (transitively) depends on.
+            Each one is listed after its own prerequisites. Circular
+            dependencies are dropped, as `make` does.
+        """
+        ret: List[str] = []
+        done = {target}
+        stack = [(target, iter(self.prerequisites(target) + self.order_only(target)))]
+        while stack:
+            for p in stack[-1][1]:
+                if p not in done:
+                    done.add(p)
+                    stack.append((p, iter(self.prerequisites(p) + self.order_only(p))))
+                    break
+            else:
+                t, _ = stack.pop()
+                if stack:
+                    ret.append(t)
+        return ret
+
+    def dependents(self, names: Iterable[str]) -> List[str]:
+        """
+        :param names: targets or files, e.g. changed sources
+        :return all targets, which (transitively) depend on one of `names`:
+            the explicit ones in the order of `targets()`, followed by the
+            ones built by pattern rules, e.g. the object files
+        """
+        # the resolved prerequisites of every target reachable from an
+        # explicit one, hence the edges of pattern rules are included
+        reverse: Dict[str, List[str]] = {}
+        reachable = list(self.__rules)
+        seen = set(reachable)
+        for t in reachable:
+            for p in self.prerequisites(t):
+                reverse.setdefault(p, []).append(t)
+                if p not in seen:
+                    seen.add(p)
+                    reachable.append(p)
+        todo = list(names)
+        found: Set[str] = set()
+        while todo:
+            for t in reverse.get(todo.pop(), ()):
+                if t not in found:
+                    found.add(t)
+                    todo.append(t)
+        return [t for t in reachable if t in found]
+
+
+def parse_database(lines: Iterable[str], directory: Union[str, Path, None] = None,
+                   shell: bool = False) -> Makefile:
+    """
+    :param lines: the output of `make -pnqr`
+    :param directory: the directory `make` ran in
+    :param shell: see `Makefile`
+    :return the rule database
+    """
+    m = Makefile(directory=directory, shell=shell)
+    if not m.read_database(lines):
+        raise MakefileError("the output contains no rule database")
+    return m
+
+
+def parse_makefile(path: Union[str, Path], **kwargs) -> Makefile:
+    """
+    :param path: of the Makefile
+    :param kwargs: see `Makefile`
+    :return the parsed Makefile
+    """
+    return Makefile(path, **kwargs)
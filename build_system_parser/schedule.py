@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+""" schedules the build of many targets under a global job budget """
+import asyncio
+import os
+from typing import List
+
+from .execute import Execution
+
+
+class BuildResult:
+    """
+    result of building a single target
+    """
+    def __init__(self, target, jobs: int):
+        """
+        :param target: the `Target` which was build
+        :param jobs: number of jobs the build was allowed to use
+        """
+        self.target = target
+        self.jobs = jobs
+        self.success = False
+        # true if the artifacts were restored from an `ArtifactCache`
+        self.cached = False
+
+        # `time.perf_counter()` timestamps
+        self.start: float = 0.
+        self.end: float = 0.
+
+        # all executed commands
+        self.executions: List[Execution] = []
+
+    def wall_time(self) -> float:
+        """
+        :return the time in seconds the build took
+        """
+        return self.end - self.start
+
+    def output(self) -> List[str]:
+        """
+        :return the (tail of the) output of the last executed command
+        """
+        if not self.executions:
+            return []
+        return self.executions[-1].output()
+
+    def __bool__(self):
+        return self.success
+
+    def __repr__(self) -> str:
+        name = self.target.name() if self.target else ""
+        return f"{name}: {self.success} ({self.wall_time():.3f}s, -j{self.jobs})"
+
+
+def default_jobs(jobs: int = 0) -> int:
+    """
+    :param jobs: 0 = all available cores
+    :return the number of jobs to use
+    """
+    if jobs > 0:
+        return jobs
+    return os.cpu_count() or 1
+
+
+class JobPool:
+    """
+    A global budget of jobs, which is shared between concurrent builds.
+    Each build acquires an equal share of the free jobs, and returns them
+    after it finished. Hence, the first builds of a large batch are build
+    with few jobs each, while the last ones are able to use the whole budget.
+    """
+    def __init__(self, jobs: int = 0):
+        """
+        :param jobs: size of the budget. 0 = all available cores
+        """
+        self.jobs = default_jobs(jobs)
+        self.__free = self.jobs
+        self.__cond = asyncio.Condition()
+
+    async def acquire(self, pending: int = 1) -> int:
+        """
+        waits until at least a single job is free.
+        :param pending: number of builds which are waiting for jobs,
+            including the calling one.
+        :return the number of acquired jobs
+        """
+        async with self.__cond:
+            await self.__cond.wait_for(lambda: self.__free > 0)
+            k = min(self.__free, max(1, self.__free // max(1, pending)))
+            self.__free -= k
+            return k
+
+    async def release(self, k: int):
+        """
+        returns `k` jobs to the budget
+        """
+        async with self.__cond:
+            self.__free += k
+            self.__cond.notify_all()
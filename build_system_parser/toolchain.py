@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+process-wide registry of the installed build tools. Each binary is probed
+(`<tool> --version`) only once per process, regardless how many builders
+are constructed. The results are persisted on disk, keyed by the path,
+inode, size and modification time of the binary. Hence, a new
+process only probes tools, which were installed or updated in the meantime.
+
+    from build_system_parser import toolchain
+    tool = toolchain.probe(["cmake", "--version"])
+    print(tool.available, tool.output, tool.capabilities)
+"""
+import asyncio
+import fcntl
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Union, List, Dict, Sequence, Callable, Any, Tuple
+
+from .execute import Command
+
+# bump this, if the format of the persisted probes changes
+VERSION = 2
+
+
+def cache_root() -> Path:
+    """
+    :return `$XDG_CACHE_HOME/build_system_parser`
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(Path.home(), ".cache")
+    return Path(base) / "build_system_parser"
+
+
+def parse_version(output: Sequence[str]) -> Tuple[int, ...]:
+    """
+    :param output: output of `<tool> --version`
+    :return the first version number in `output`, e.g. `(4, 3)`
+    """
+    for line in output:
+        m = re.search(r"(\d+)\.(\d+)(?:\.(\d+))?", line)
+        if m:
+            return tuple(int(x) for x in m.groups() if x is not None)
+    return ()
+
+
+def make_capabilities(tool: "Tool") -> Dict[str, Any]:
+    """ GNU make >= 4.0 is a jobserver client, >= 4.4 supports FIFOs """
+    v = parse_version(tool.output)
+    return {"jobserver": v >= (4, 0), "jobserver_pipe": v >= (4, 0),
+            "jobserver_fifo": v >= (4, 4)}
+
+
+def ninja_capabilities(tool: "Tool") -> Dict[str, Any]:
+    """ ninja >= 1.13 is a jobserver client, but only joins a FIFO on POSIX """
+    v = parse_version(tool.output)
+    return {"jobserver": v >= (1, 13), "jobserver_pipe": False,
+            "jobserver_fifo": v >= (1, 13)}
+
+
+def cargo_capabilities(tool: "Tool") -> Dict[str, Any]:
+    """ cargo is a jobserver client """
+    _ = tool
+    return {"jobserver": True, "jobserver_pipe": True, "jobserver_fifo": False}
+
+
+def cmake_capabilities(tool: "Tool") -> Dict[str, Any]:
+    """ the output of `cmake -E capabilities` """
+    e = Command([tool.path, "-E", "capabilities"], check=False, tail=0).execute()
+    ret: Dict[str, Any] = {"jobserver": True}
+    if e.ok():
+        try:
+            ret.update(json.loads("".join(e.output())))
+        except ValueError:
+            pass
+    return ret
+
+
+# name of the binary -> function computing its capabilities
+CAPABILITIES: Dict[str, Callable[["Tool"], Dict[str, Any]]] = {
+    "make": make_capabilities,
+    "gmake": make_capabilities,
+    "ninja": ninja_capabilities,
+    "cargo": cargo_capabilities,
+    "cmake": cmake_capabilities,
+}
+
+
+class Tool:
+    """
+    result of probing a single binary
+    """
+    def __init__(self, cmd: Sequence[str], path: str = ""):
+        """
+        :param cmd: the version command, e.g. `["make", "--version"]`
+        :param path: the absolute path of the binary. Empty if it was not found.
+        """
+        self.cmd = list(cmd)
+        self.path = path
+        self.available = False
+        self.returncode = -1
+        # output of the version command
+        self.output: List[str] = []
+        self.capabilities: Dict[str, Any] = {}
+
+    def version(self) -> Tuple[int, ...]:
+        """
+        :return the version number, e.g. `(4, 3)`
+        """
+        return parse_version(self.output)
+
+    def to_json(self) -> Dict[str, Any]:
+        """ :return a json serializable representation """
+        return {"cmd": self.cmd, "path": self.path, "available": self.available,
+                "returncode": self.returncode, "output": self.output,
+                "capabilities": self.capabilities}
+
+    @staticmethod
+    def from_json(data: Dict[str, Any]) -> "Tool":
+        """ inverse of `to_json` """
+        t = Tool(data["cmd"], data["path"])
+        t.available = data["available"]
+        t.returncode = data["returncode"]
+        t.output = data["output"]
+        t.capabilities = data["capabilities"]
+        return t
+
+    def __repr__(self) -> str:
+        return f"Tool({self.path or self.cmd[0]}, available={self.available})"
+
+
+def resolve(binary: str) -> Union[Tuple[str, Tuple[int, int, int]], None]:
+    """
+    :param binary: name or path of a binary
+    :return the absolute path and its identity (inode, size, mtime), or
+        `None` if the binary does not exist
+    """
+    path = shutil.which(binary)
+    if not path:
+        return None
+    # NOTE: symlinks are not resolved, as e.g. `rustup` dispatches on the
+    #   name of the binary. The identity is the one of the link target.
+    path = os.path.abspath(path)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return path, (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+class ToolchainRegistry:
+    """
+    Memoizes the probes of all binaries. Concurrent probes of the same
+    binary (threads or coroutines) wait for a single probe.
+    NOTE: proxies, which dispatch to another binary (e.g. the `cargo` of
+        `rustup`), are only re-probed if the proxy itself changes. Call
+        `clear()` after switching the toolchain.
+    """
+    def __init__(self, file: Union[str, Path, None] = None, persist: bool = True):
+        """
+        :param file: the probes are persisted in this json file. If `None`
+            `<cache_root()>/toolchains.json` is used.
+        :param persist: if false, nothing is read from or written to disk
+        """
+        self.file = Path(file) if file else cache_root() / "toolchains.json"
+        self.persist = persist
+        # number of executed probes
+        self.probes = 0
+
+        self.__lock = threading.Lock()
+        # key -> lock, which serializes the probes of a single binary
+        self.__locks: Dict[str, threading.Lock] = {}
+        # key -> (identity, tool)
+        self.__tools: Dict[str, Tuple[Any, Tool]] = {}
+        self.__loaded = False
+
+    def __load(self):
+        """
+        reads the persisted probes
+        """
+        self.__loaded = True
+        if not self.persist:
+            return
+        try:
+            with open(self.file, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != VERSION:
+            return
+        for key, (identity, tool) in data.get("tools", {}).items():
+            self.__tools.setdefault(key, (tuple(identity), Tool.from_json(tool)))
+
+    def __save(self, key: str, identity: Tuple[int, int, int], tool: Tool):
+        """
+        merges the probe into the persisted file. Other processes may
+        write the same file concurrently.
+        """
+        if not self.persist:
+            return
+        try:
+            os.makedirs(self.file.parent, exist_ok=True)
+            with open(str(self.file) + ".lock", "w", encoding="utf-8") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    with open(self.file, encoding="utf-8") as f:
+                        data = json.load(f)
+                    if data.get("version") != VERSION:
+                        raise ValueError
+                except (OSError, ValueError):
+                    data = {"version": VERSION, "tools": {}}
+                data["tools"][key] = [list(identity), tool.to_json()]
+
+                fd, tmp = tempfile.mkstemp(dir=self.file.parent, prefix=".toolchains")
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(data, f)
+                os.replace(tmp, self.file)
+        except OSError:
+            pass
+
+    def probe(self, cmd: Sequence[str]) -> Tool:
+        """
+        :param cmd: the version command of the tool, e.g. `["make", "--version"]`
+        :return the (memoized) result of the command
+        """
+        cmd = [os.fspath(c) for c in cmd]
+        resolved = resolve(cmd[0])
+        if resolved is None:
+            return Tool(cmd)
+        path, identity = resolved
+        key = "\0".join([path] + cmd[1:])
+
+        with self.__lock:
+            if not self.__loaded:
+                self.__load()
+            cached = self.__tools.get(key)
+            if cached and cached[0] == identity:
+                return cached[1]
+            lock = self.__locks.setdefault(key, threading.Lock())
+
+        with lock:
+            cached = self.__tools.get(key)
+            if cached and cached[0] == identity:
+                return cached[1]
+
+            tool = Tool(cmd, path)
+            try:
+                e = Command([path] + cmd[1:], check=False, tail=0).execute()
+                tool.returncode = e.returncode
+                tool.available = e.ok()
+                tool.output = [line.lstrip() for line in e.output()]
+            except OSError:
+                pass
+            name = os.path.basename(cmd[0])
+            if tool.available and name in CAPABILITIES:
+                tool.capabilities = CAPABILITIES[name](tool)
+            self.probes += 1
+
+            with self.__lock:
+                self.__tools[key] = (identity, tool)
+            self.__save(key, identity, tool)
+            return tool
+
+    async def aprobe(self, cmd: Sequence[str]) -> Tool:
+        """
+        coroutine version of `probe`.
+        """
+        return await asyncio.to_thread(self.probe, cmd)
+
+    def clear(self):
+        """
+        forgets all probes, including the persisted ones
+        """
+        with self.__lock:
+            self.__tools.clear()
+            self.__loaded = True
+        if self.persist:
+            try:
+                os.unlink(self.file)
+            except FileNotFoundError:
+                pass
+
+
+_registry = ToolchainRegistry()
+
+
+def registry() -> ToolchainRegistry:
+    """
+    :return the process-wide registry
+    """
+    return _registry
+
+
+def use_registry(r: ToolchainRegistry):
+    """
+    replaces the process-wide registry
+    """
+    global _registry
+    _registry = r
+
+
+def probe(cmd: Sequence[str]) -> Tool:
+    """
+    probes `cmd` via the process-wide registry, see `ToolchainRegistry.probe`
+    """
+    return _registry.probe(cmd)
+
+
+async def aprobe(cmd: Sequence[str]) -> Tool:
+    """
+    coroutine version of `probe`.
+    """
+    return await _registry.aprobe(cmd)
+
+
+def tool_version(tool: str) -> str:
+    """
+    :param tool: e.g. `cc`
+    :return the first line of `tool --version`, or an empty string if
+        the tool is not available.
+    """
+    t = probe([tool, "--version"])
+    return t.output[0] if t.output else ""
@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""
+watches the build files of builders and keeps their targets up to date.
+Only the files and directories, which fed the discovery of a builder, are
+watched (see `Builder.discovery_inputs`). If some of them change, only the
+affected part of the project is re-discovered (see `Builder.refresh`), e.g.
+the changed Bazel package. Subscribers are notified about added, removed
+and changed targets.
+
+    from build_system_parser.watch import Watcher
+    w = Watcher([Make("path/to/Makefile")])
+    w.subscribe(lambda e: print(e.kind, e.target.name()))
+    w.start()
+    ...
+    w.stop()
+
+On Linux inotify is used (via ctypes). Otherwise, or if the inotify watches
+are exhausted, the watched paths are polled via `stat`.
+"""
+import ctypes
+import errno
+import logging
+import os
+import select
+import struct
+import threading
+import time
+from typing import Union, List, Dict, Set, Callable, Iterable, Tuple
+
+from .common import Builder, Target
+
+# see `man 7 inotify`
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# events, which change the entries of a directory
+DIR_EVENTS = IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | DIR_EVENTS | \
+    IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+
+EVENT = struct.Struct("iIII")
+
+
+def _libc():
+    """
+    :return libc, if it supports inotify, otherwise `None`
+    """
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+    except OSError:
+        return None
+    if not hasattr(libc, "inotify_init1"):
+        return None
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    return libc
+
+
+class PollingBackend:
+    """
+    detects changes by comparing the `stat` of all watched paths
+    """
+    def __init__(self, interval: float = 0.2):
+        """
+        :param interval: between two polls in seconds
+        """
+        self.interval = interval
+        # path -> (mtime, size, inode) or `None` if it does not exist
+        self.__snapshot: Dict[str, Union[Tuple[int, int, int], None]] = {}
+
+    @staticmethod
+    def __stat(path: str) -> Union[Tuple[int, int, int], None]:
+        try:
+            st = os.stat(path)
+            return st.st_mtime_ns, st.st_size, st.st_ino
+        except OSError:
+            return None
+
+    def set_paths(self, paths: Set[str]):
+        """
+        :param paths: absolute paths to watch. The state of already watched
+            paths is kept, so no change is lost.
+        """
+        self.__snapshot = {p: self.__snapshot[p] if p in self.__snapshot
+                           else self.__stat(p) for p in paths}
+
+    def wait(self, timeout: float) -> Set[str]:
+        """
+        :param timeout: in seconds
+        :return the changed paths. Empty if nothing changed within `timeout`.
+        """
+        end = time.monotonic() + timeout
+        while True:
+            changed = set()
+            for p, old in self.__snapshot.items():
+                new = self.__stat(p)
+                if new != old:
+                    self.__snapshot[p] = new
+                    changed.add(p)
+            remaining = end - time.monotonic()
+            if changed or remaining <= 0:
+                return changed
+            time.sleep(min(self.interval, remaining))
+
+    def close(self):
+        """ nothing to release """
+
+
+class InotifyBackend:
+    """
+    watches the directories containing the watched paths via inotify. Hence,
+    files which are replaced (e.g. by editors writing a temporary file and
+    renaming it) or which do not exist yet are noticed.
+    """
+    def __init__(self):
+        """
+        :raise OSError if inotify is not available
+        """
+        self.__libc = _libc()
+        if self.__libc is None:
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self.__fd = self.__libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.__fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.__paths: Set[str] = set()
+        # watch descriptor -> directory and vice versa
+        self.__dirs: Dict[int, str] = {}
+        self.__wds: Dict[str, int] = {}
+
+    @staticmethod
+    def __watched_dir(path: str) -> str:
+        """
+        :return the closest existing directory containing `path`
+        """
+        d = os.path.dirname(path)
+        while d != os.path.dirname(d) and not os.path.isdir(d):
+            d = os.path.dirname(d)
+        return d
+
+    def set_paths(self, paths: Set[str]):
+        """
+        :param paths: absolute paths to watch
+        :raise OSError if the inotify watches are exhausted
+        """
+        self.__paths = set(paths)
+        dirs = {self.__watched_dir(p) for p in paths}
+        dirs |= {p for p in paths if os.path.isdir(p)}
+        for d in dirs - self.__wds.keys():
+            wd = self.__libc.inotify_add_watch(self.__fd, os.fsencode(d), WATCH_MASK)
+            if wd < 0:
+                e = ctypes.get_errno()
+                if e in (errno.ENOENT, errno.ENOTDIR):
+                    continue
+                raise OSError(e, f"inotify_add_watch {d} failed")
+            self.__dirs[wd] = d
+            self.__wds[d] = wd
+        for d in self.__wds.keys() - dirs:
+            wd = self.__wds.pop(d)
+            del self.__dirs[wd]
+            self.__libc.inotify_rm_watch(self.__fd, wd)
+
+    def __changed(self, d: str, name: str, mask: int) -> Set[str]:
+        """
+        :return the watched paths affected by an event
+        """
+        if mask & IN_Q_OVERFLOW:
+            return set(self.__paths)
+        ret = set()
+        if d in self.__paths and mask & DIR_EVENTS:
+            ret.add(d)
+        if name:
+            p = os.path.join(d, name)
+            if p in self.__paths:
+                ret.add(p)
+            if mask & DIR_EVENTS:
+                # a (not yet) existing parent of watched paths
+                prefix = p + os.sep
+                ret |= {w for w in self.__paths if w.startswith(prefix)}
+        elif mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+            prefix = d + os.sep
+            ret |= {w for w in self.__paths if w == d or w.startswith(prefix)}
+        return ret
+
+    def wait(self, timeout: float) -> Set[str]:
+        """
+        :param timeout: in seconds
+        :return the changed paths. Empty if nothing changed within `timeout`.
+        """
+        changed: Set[str] = set()
+        end = time.monotonic() + timeout
+        while True:
+            r, _, _ = select.select([self.__fd], [], [], max(0., end - time.monotonic()))
+            if not r:
+                return changed
+            try:
+                data = os.read(self.__fd, 1 << 16)
+            except BlockingIOError:
+                continue
+            i = 0
+            while i + EVENT.size <= len(data):
+                wd, mask, _, length = EVENT.unpack_from(data, i)
+                i += EVENT.size
+                name = os.fsdecode(data[i:i + length].rstrip(b"\0"))
+                i += length
+                d = self.__dirs.get(wd)
+                if mask & IN_IGNORED:
+                    if d is not None:
+                        del self.__dirs[wd]
+                        self.__wds.pop(d, None)
+                    continue
+                if d is not None or mask & IN_Q_OVERFLOW:
+                    changed |= self.__changed(d or "", name, mask)
+            if changed:
+                return changed
+
+    def close(self):
+        """ releases the inotify descriptor """
+        if self.__fd >= 0:
+            os.close(self.__fd)
+            self.__fd = -1
+
+
+class TargetEvent:
+    """
+    a target of a watched builder was added, removed or changed
+    """
+    ADDED = "added"
+    REMOVED = "removed"
+    CHANGED = "changed"
+
+    def __init__(self, kind: str, target: Target, builder: Builder):
+        self.kind = kind
+        self.target = target
+        self.builder = builder
+
+    def __repr__(self) -> str:
+        return f"TargetEvent({self.kind}, {self.target.name()})"
+
+
+class Watcher:
+    """
+    Watches the build files of any number of builders. Either call `poll`
+    regularly, or let a background thread do it (`start`/`stop`).
+    """
+    def __init__(self, builders: Iterable[Builder] = (),
+                 polling: bool = False,
+                 interval: float = 0.2,
+                 settle: float = 0.05):
+        """
+        :param builders: to watch, see `watch`
+        :param polling: if true, the paths are polled even if inotify is
+            available
+        :param interval: between two polls in seconds, if polling is used
+        :param settle: after the first change, further changes are collected
+            for `settle` seconds. Hence, a burst of writes (e.g. by an editor
+            or `git checkout`) triggers a single re-discovery.
+        """
+        self.interval = interval
+        self.settle = settle
+        self.__backend: Union[InotifyBackend, PollingBackend]
+        try:
+            if polling:
+                raise OSError
+            self.__backend = InotifyBackend()
+        except OSError:
+            self.__backend = PollingBackend(interval)
+
+        self.__lock = threading.RLock()
+        # builder -> the watched paths of it
+        self.__builders: Dict[Builder, Set[str]] = {}
+        self.__subscribers: List[Callable[[TargetEvent], None]] = []
+        self.__thread: Union[threading.Thread, None] = None
+        self.__stop = threading.Event()
+        for b in builders:
+            self.watch(b)
+
+    def backend(self) -> str:
+        """
+        :return "inotify" or "polling"
+        """
+        return "inotify" if isinstance(self.__backend, InotifyBackend) else "polling"
+
+    def __update_paths(self):
+        """
+        passes the watched paths of all builders to the backend. Falls back
+        to polling if the inotify watches are exhausted.
+        """
+        paths = set().union(*self.__builders.values())
+        try:
+            self.__backend.set_paths(paths)
+        except OSError as e:
+            logging.warning("%s, falling back to polling", e)
+            self.__backend.close()
+            self.__backend = PollingBackend(self.interval)
+            self.__backend.set_paths(paths)
+
+    @staticmethod
+    def __paths(builder: Builder) -> Set[str]:
+        return {os.path.abspath(p) for p in builder.discovery_inputs()}
+
+    def watch(self, builder: Builder) -> "Watcher":
+        """
+        watches the build files of `builder`. Its targets are discovered,
+        if this did not happen yet.
+        """
+        paths = self.__paths(builder)
+        with self.__lock:
+            self.__builders[builder] = paths
+            self.__update_paths()
+        return self
+
+    def unwatch(self, builder: Builder):
+        """
+        stops watching the build files of `builder`
+        """
+        with self.__lock:
+            self.__builders.pop(builder, None)
+            self.__update_paths()
+
+    def subscribe(self, callback: Callable[[TargetEvent], None]):
+        """
+        :param callback: is called for each `TargetEvent`. If the watcher
+            runs in the background, it is called in its thread.
+        """
+        with self.__lock:
+            self.__subscribers.append(callback)
+
+    def poll(self, timeout: float = 0.) -> List[TargetEvent]:
+        """
+        waits until some watched paths changed, re-discovers the affected
+        builders and notifies all subscribers.
+        :param timeout: in seconds
+        :return all events. Empty if nothing changed within `timeout`.
+        """
+        with self.__lock:
+            changed = self.__backend.wait(timeout)
+            if not changed:
+                return []
+            if self.settle:
+                time.sleep(self.settle)
+                changed |= self.__backend.wait(0.)
+
+            events = []
+            for builder, paths in list(self.__builders.items()):
+                hits = sorted(changed & paths)
+                if not hits:
+                    continue
+                try:
+                    diff = builder.refresh(hits)
+                except Exception:  # pylint: disable=broad-except
+                    logging.exception("could not re-discover %s", builder)
+                    continue
+                for kind in (TargetEvent.REMOVED, TargetEvent.ADDED, TargetEvent.CHANGED):
+                    events += [TargetEvent(kind, t, builder) for t in diff[kind]]
+                self.__builders[builder] = self.__paths(builder)
+            self.__update_paths()
+            subscribers = list(self.__subscribers)
+
+        for e in events:
+            for callback in subscribers:
+                callback(e)
+        return events
+
+    def start(self) -> "Watcher":
+        """
+        polls in a background thread
+        """
+        self.__stop.clear()
+
+        def run():
+            while not self.__stop.is_set():
+                self.poll(self.interval)
+
+        self.__thread = threading.Thread(target=run, daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        """
+        stops the background thread
+        """
+        self.__stop.set()
+        if self.__thread:
+            self.__thread.join()
+            self.__thread = None
+
+    def close(self):
+        """
+        stops watching
+        """
+        self.stop()
+        self.__backend.close()
+
+    def __enter__(self) -> "Watcher":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def watch(builders: Iterable[Builder],
+          callback: Callable[[TargetEvent], None],
+          polling: bool = False) -> Watcher:
+    """
+    :return a running `Watcher` of `builders`, which calls `callback` for
+        each `TargetEvent`
+    """
+    w = Watcher(builders, polling)
+    w.subscribe(callback)
+    return w.start()
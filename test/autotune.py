@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+""" test autotune.py """
+import os
+import random
+import tempfile
+
+from build_system_parser.autotune import Autotuner, FlagSpace, autotune
+from build_system_parser.cmake import CMake
+from build_system_parser.make import Make
+
+from .helpers import CMAKELISTS, write
+
+SOURCE = """
+#include <stdio.h>
+
+int main(void) {
+    unsigned long s = 0;
+    for (unsigned long i = 0; i < 20000000ul; i++) {
+        s += (i * i) ^ (s >> 3);
+    }
+    printf("%lu\\n", s);
+    return 0;
+}
+"""
+
+MAKEFILE = """
+prog: prog.c
+\tcc ${CFLAGS} -o prog prog.c
+
+clean:
+\trm -f prog
+"""
+
+
+def write_project(d: str, name: str, content: str):
+    """ writes the source and the build file into `d` """
+    write(os.path.join(d, "prog.c"), SOURCE)
+    write(os.path.join(d, name), content)
+
+
+def test_flag_space():
+    """ tests the search space """
+    s = FlagSpace({"opt": ["-O2", "-O3"], "arch": ["", "-march=native"],
+                   "lto": ["", "-flto -fuse-linker-plugin"]})
+    assert s.size() == 8
+    grid = s.grid()
+    assert len(grid) == 8
+    assert len({tuple(c.values()) for c in grid}) == 8
+    assert s.default() == {"opt": "-O2", "arch": "", "lto": ""}
+
+    sample = s.sample(5, random.Random(42))
+    assert len(sample) == 5
+    assert len({tuple(c.values()) for c in sample}) == 5
+    assert len(s.sample(100, random.Random(42))) == 8
+
+    n = s.neighbours(s.default(), "opt")
+    assert [c["opt"] for c in n] == ["-O2", "-O3"]
+
+    config = {"opt": "-O3", "arch": "", "lto": "-flto -fuse-linker-plugin"}
+    assert s.flags(config) == "-O3 -flto -fuse-linker-plugin"
+    assert s.flags(config, ",") == "-O3,-flto,-fuse-linker-plugin"
+
+
+def test_autotune_cmake():
+    """ isolated variants are build concurrently """
+    with tempfile.TemporaryDirectory() as d, \
+            tempfile.TemporaryDirectory() as w:
+        write_project(d, "CMakeLists.txt", CMAKELISTS)
+        c = CMake(d, build_path=os.path.join(w, "build"))
+        t = c.target("prog")
+
+        space = {"opt": ["-O0", "-O2"], "unroll": ["", "-funroll-loops"]}
+        r = Autotuner(t, space, "grid", work_dir=w, jobs=4, repeat=3).run()
+        assert r
+        assert len(r.candidates) == 4
+        assert [len(x) for x in r.rounds] == [4, 2]
+        assert "-O2" in r.best.flags
+        assert r.best.samples() == 6
+        assert r.best.result.stats()["wall"]["median"] == r.best.median()
+        assert r.ranking()[0].median() <= r.ranking()[-1].median()
+
+        # each variant has its own build tree
+        assert len({x.build_path for x in r.candidates}) == 4
+        for x in r.candidates:
+            assert x.builder is not c
+            assert os.path.isfile(os.path.join(x.build_path, "prog"))
+
+
+def test_autotune_make():
+    """ variants build in mirrors of the source tree """
+    with tempfile.TemporaryDirectory() as d, \
+            tempfile.TemporaryDirectory() as w:
+        write_project(d, "Makefile", MAKEFILE)
+        m = Make(d, build_path=d)
+        t = m.target("prog")
+
+        space = {"opt": ["-O0", "-O2"], "pic": ["", "-fPIC"]}
+        r = autotune(t, space, "greedy", repeat=2, warmup=0,
+                     work_dir=os.path.join(w, "greedy"))
+        assert r
+        # the default configuration is shared by both dimensions
+        assert len(r.candidates) == 3
+        assert r.best.config["opt"] == "-O2"
+        assert all(x.builder is not m for x in r.candidates)
+        assert not os.path.exists(os.path.join(d, "prog"))
+
+        r = autotune(t, space, "random", samples=2, seed=1, repeat=2,
+                     work_dir=os.path.join(w, "random"))
+        assert r
+        assert len(r.candidates) == 2
+
+        # a broken configuration is skipped
+        r = autotune(t, {"opt": ["-O2", "-fno-such-flag"]}, repeat=1,
+                     work_dir=os.path.join(w, "broken"))
+        assert r
+        assert r.best.flags == "-O2"
+        assert [x.success for x in r.candidates] == [True, False]
+
+
+if __name__ == "__main__":
+    test_flag_space()
+    test_autotune_cmake()
+    test_autotune_make()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+""" test benchmark.py """
+import json
+import os
+import tempfile
+
+from build_system_parser.benchmark import percentile, summarize
+from build_system_parser.compile_commands import CompileCommands
+
+SOURCE = """
+#include <stdlib.h>
+
+int main(int argc, char **argv) {
+    const size_t n = 64u << 20;
+    volatile char *p = malloc(n);
+    for (size_t i = 0; i < n; i += 1024) {
+        p[i] = argc;
+    }
+    int ret = p[n - 1024] != argc;
+    free((void *)p);
+    return ret;
+}
+"""
+
+
+def test_statistics():
+    """ tests the statistic helpers """
+    data = [4., 1., 3., 2., 5.]
+    assert percentile(data, 0) == 1.
+    assert percentile(data, 50) == 3.
+    assert percentile(data, 100) == 5.
+    assert percentile(data, 25) == 2.
+    assert percentile([1., 2.], 50) == 1.5
+
+    s = summarize(data)
+    assert s["min"] == 1. and s["max"] == 5.
+    assert s["median"] == 3. and s["mean"] == 3.
+    assert abs(s["stddev"] - 1.5811) < 1e-3
+    assert s["p25"] == 2.
+
+
+def test_benchmark():
+    """ benchmarks a small binary """
+    with tempfile.TemporaryDirectory() as d:
+        src = os.path.join(d, "bench.c")
+        out = os.path.join(d, "bench")
+        with open(src, "w", encoding="utf-8") as f:
+            f.write(SOURCE)
+        file = os.path.join(d, "compile_commands.json")
+        with open(file, "w", encoding="utf-8") as f:
+            json.dump([{"arguments": ["cc", "-O2", "-o", out, src], "directory": d,
+                        "file": src, "output": out}], f)
+
+        c = CompileCommands(file, build_path=d)
+        t = c.target("bench")
+        assert t.build()
+
+        r = t.benchmark(repeat=5, warmup=2, args=["x", "y"])
+        assert r.success
+        assert len(r.samples) == 5
+        assert all(s.wall > 0 for s in r.samples)
+        assert r.min() <= r.median() <= r.percentile(100)
+        assert r.max_rss() >= 64 << 20
+        stats = r.stats()
+        assert set(stats.keys()) == {"wall", "user", "sys"}
+        assert stats["wall"]["min"] == r.min()
+
+        # a failing run stops the benchmark
+        r = c.benchmark(t, repeat=3, warmup=0, args=["x"] * 300)
+        assert not r.success
+
+
+if __name__ == "__main__":
+    test_statistics()
+    test_benchmark()
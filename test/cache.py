@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+""" test cache.py """
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+from build_system_parser.cache import ArtifactCache, build_key, source_files
+from build_system_parser.compile_commands import CompileCommands
+from build_system_parser.make import Make
+
+from .helpers import INCREMENTAL_MAKEFILE, write
+
+
+def read_log(d: str) -> int:
+    """ number of builds launched by make """
+    with open(os.path.join(d, "log"), encoding="utf-8") as f:
+        return len(f.readlines())
+
+
+def test_cache_lru():
+    """ tests store/restore and the LRU eviction """
+    with tempfile.TemporaryDirectory() as d:
+        cache = ArtifactCache(os.path.join(d, "cache"), max_size=3000)
+        files = []
+        for i in range(4):
+            f = os.path.join(d, f"a{i}")
+            write(f, str(i) * 1000)
+            files.append(f)
+
+        for i in range(3):
+            assert cache.store(f"key{i}", [files[i]])
+            # distinct modification times
+            os.utime(cache.path / "ke" / f"key{i}", (i, i))
+        assert cache.size() == 3000
+
+        # key0 is used, hence key1 is the least recently used one
+        out = os.path.join(d, "out", "a0")
+        assert cache.restore("key0", [out])
+        with open(out, encoding="utf-8") as f:
+            assert f.read() == "0" * 1000
+        assert cache.hits == 1
+
+        assert cache.store("key3", [files[3]])
+        assert "key1" not in cache
+        assert "key0" in cache and "key2" in cache and "key3" in cache
+        assert cache.size() <= cache.max_size
+
+        assert not cache.restore("key1", [out])
+        assert cache.misses == 1
+        # the number of artifacts must match
+        assert not cache.restore("key0", [out, out])
+
+        cache.clear()
+        assert cache.size() == 0
+
+
+def test_build_key():
+    """ the key must change with the inputs, flags and command """
+    with tempfile.TemporaryDirectory() as d:
+        src = os.path.join(d, "main.c")
+        write(src, "int main(void) { return 0; }\n")
+        write(os.path.join(d, "main.o"), "")
+        assert [str(f) for f in source_files(d)] == [src]
+
+        k = build_key([src], ["cc", "main.c"], {"CFLAGS": "-O2"}, ["cc"])
+        assert k == build_key([src], ["cc", "main.c"], {"CFLAGS": "-O2"}, ["cc"])
+        assert k != build_key([src], ["cc", "main.c"], {"CFLAGS": "-O3"}, ["cc"])
+        assert k != build_key([src], ["cc", "-c", "main.c"], {"CFLAGS": "-O2"}, ["cc"])
+        write(src, "int main(void) { return 1; }\n")
+        assert k != build_key([src], ["cc", "main.c"], {"CFLAGS": "-O2"}, ["cc"])
+
+
+def worker(path: str, n: int):
+    """ stores, restores and evicts entries concurrently """
+    cache = ArtifactCache(path, max_size=10000)
+    with tempfile.TemporaryDirectory() as d:
+        src = os.path.join(d, "src")
+        out = os.path.join(d, "out")
+        for i in range(50):
+            key = f"key{(n + i) % 20:02d}"
+            write(src, key * 100)
+            cache.store(key, [src])
+            if cache.restore(key, [out]):
+                with open(out, encoding="utf-8") as f:
+                    assert f.read() == key * 100
+
+
+def test_cache_concurrent():
+    """ many processes share a single cache """
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "cache")
+        ctx = multiprocessing.get_context("fork")
+        procs = [ctx.Process(target=worker, args=(path, n)) for n in range(4)]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+        assert all(p.exitcode == 0 for p in procs)
+        assert ArtifactCache(path).size() <= 10000
+
+
+def test_cache_make():
+    """ a cache hit must not launch make """
+    with tempfile.TemporaryDirectory() as d, \
+            tempfile.TemporaryDirectory() as c:
+        write(os.path.join(d, "prog.c"), "int main(void) { return 0; }\n")
+        write(os.path.join(d, "Makefile"), INCREMENTAL_MAKEFILE)
+        cache = ArtifactCache(c)
+        m = Make(d, build_path=d).use_cache(cache)
+        t = m.target("prog")
+        prog = os.path.join(d, "prog")
+
+        assert m.build(t)
+        assert read_log(d) == 1
+        os.remove(prog)
+
+        assert m.build(t)
+        assert read_log(d) == 1
+        assert os.access(prog, os.X_OK)
+        assert cache.hits == 1
+
+        # other flags are a miss
+        assert m.build(t, "-O2")
+        assert read_log(d) == 2
+
+        # changed sources are a miss
+        time.sleep(0.01)
+        write(os.path.join(d, "prog.c"), "int main(void) { return 1; }\n")
+        assert m.build(t)
+        assert read_log(d) == 3
+
+
+def test_cache_build_many():
+    """ restored targets are flagged as cached """
+    with tempfile.TemporaryDirectory() as d, \
+            tempfile.TemporaryDirectory() as c:
+        data = []
+        for i in range(4):
+            src = os.path.join(d, f"main{i}.c")
+            write(src, f"int main(void) {{ return {i}; }}\n")
+            out = os.path.join(d, f"main{i}")
+            data.append({"arguments": ["cc", "-o", out, src], "directory": d,
+                         "file": src, "output": out})
+        file = os.path.join(d, "compile_commands.json")
+        write(file, json.dumps(data))
+
+        cc = CompileCommands(file).use_cache(ArtifactCache(c))
+        results = cc.build_many(jobs=2)
+        assert all(r.success and not r.cached for r in results)
+
+        for i in range(4):
+            os.remove(os.path.join(d, f"main{i}"))
+        results = cc.build_many(jobs=2)
+        assert all(r.success and r.cached for r in results)
+        assert not any(r.executions for r in results)
+        for i in range(4):
+            assert os.path.isfile(os.path.join(d, f"main{i}"))
+
+
+if __name__ == "__main__":
+    test_cache_lru()
+    test_build_key()
+    test_cache_concurrent()
+    test_cache_make()
+    test_cache_build_many()
@@ -1,13 +1,29 @@
 #!/usr/bin/env python3
 """ tests for the cli interface """
+import subprocess
+import sys
+
+
+def run(*args):
+    """ runs the cli """
+    return subprocess.run([sys.executable, "-m", "build_system_parser.cli"] + list(args),
+                          capture_output=True, text=True, check=False)
 
 
 def test_simple():
     """ if this fails something fishy is going on """
-    # TODO not implemented
+    p = run("-b", "make", "-p", "test/make/Makefile", "-t", "simple")
+    assert p.returncode == 0
+    assert "Successfully built target 'simple'" in p.stdout
+
 
-    pass
+def test_missing_target():
+    """ an unknown target lists the available ones """
+    p = run("-b", "make", "-p", "test/make/Makefile", "-t", "does_not_exist")
+    assert p.returncode == 1
+    assert "'simple'" in p.stdout
 
 
 if __name__ == "__main__":
     test_simple()
+    test_missing_target()
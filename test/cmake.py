@@ -2,6 +2,9 @@
 """ tests for cmake.py """
 
 import os
+import tempfile
+import threading
+from build_system_parser.cache import ArtifactCache
 from build_system_parser.cmake import CMake
 
 
@@ -27,6 +30,46 @@ def test_cmake_build():
     t.run()
 
 
+def test_cmake_lazy():
+    """ the project is configured once, on first use """
+    with tempfile.TemporaryDirectory() as d:
+        c = CMake("test/cmake/CMakeLists.txt", build_path=d)
+        assert not os.path.exists(os.path.join(d, "CMakeCache.txt"))
+        assert c.available()
+        assert not os.path.exists(os.path.join(d, "CMakeCache.txt"))
+
+        calls = []
+        discover = c._discover
+
+        def counting_discover(executions):
+            calls.append(executions)
+            discover(executions)
+
+        c._discover = counting_discover
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(c.targets()))
+                   for _ in range(16)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(calls) == 1
+        assert all(len(r) == 1 for r in results)
+        assert os.path.exists(os.path.join(d, "CMakeCache.txt"))
+
+
+def test_cmake_variant():
+    """ variants share the jobserver and the artifact cache """
+    with tempfile.TemporaryDirectory() as d:
+        cache = ArtifactCache(os.path.join(d, "cache"))
+        c = CMake("test/cmake/CMakeLists.txt", build_path=os.path.join(d, "0"))
+        v = c.use_cache(cache).variant(os.path.join(d, "1"))
+        assert v._cache is cache
+        assert v.build(v.target("simple"), "")
+        assert len(cache.entries()) == 1
+
+
 def test_all():
     """ parser all CMakeLists test files """
     dir_ = "test/cmake/files"
@@ -43,4 +86,6 @@ def test_all():
 if __name__ == "__main__":
     test_cmake_runner()
     test_cmake_build()
+    test_cmake_lazy()
+    test_cmake_variant()
     test_all()
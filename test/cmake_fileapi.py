@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+""" test cmake_fileapi.py """
+import os
+import subprocess
+import tempfile
+
+import pytest
+
+from build_system_parser.cmake import CMake
+from build_system_parser.cmake_fileapi import CodeModel, FileApiError, write_query
+
+CMAKELISTS = """cmake_minimum_required(VERSION 3.10)
+project(demo C)
+add_subdirectory(util)
+add_executable(${PROJECT_NAME} main.c)
+target_link_libraries(${PROJECT_NAME} PRIVATE util)
+add_custom_target(docs COMMAND echo docs)
+"""
+
+UTIL = """add_library(util STATIC util.c)
+target_include_directories(util PUBLIC include)
+target_compile_definitions(util PUBLIC UTIL=1)
+set_target_properties(util PROPERTIES OUTPUT_NAME myutil)
+"""
+
+SOURCES = {
+    "CMakeLists.txt": CMAKELISTS,
+    "util/CMakeLists.txt": UTIL,
+    "util/include/util.h": "int util(void);\n",
+    "util/util.c": '#include "util.h"\nint util(void) { return UTIL - 1; }\n',
+    "main.c": '#include "util.h"\nint main(void) { return util(); }\n',
+}
+
+
+def project(d: str) -> str:
+    """
+    writes the project
+    :return the source dir
+    """
+    src = os.path.join(d, "src")
+    for name, content in SOURCES.items():
+        path = os.path.join(src, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+    return src
+
+
+def test_codemodel():
+    """ the reply of the local cmake """
+    with tempfile.TemporaryDirectory() as d:
+        src, build = project(d), os.path.join(d, "build")
+        with pytest.raises(FileApiError):
+            CodeModel(build)
+
+        write_query(build)
+        subprocess.run(["cmake", "-S", src, "-B", build], check=True,
+                       stdout=subprocess.DEVNULL)
+        model = CodeModel(build)
+        assert model.source == src and model.build == build
+        assert model.configurations == [""]
+        assert sorted(t.name for t in model.targets) == ["demo", "docs", "util"]
+
+        demo = model.target("demo")
+        assert demo.type == "EXECUTABLE"
+        assert demo.artifacts == [os.path.join(build, "demo")]
+        assert demo.sources == [os.path.join(src, "main.c")]
+        assert [t.name for t in model.dependencies(demo)] == ["util"]
+
+        util = model.target("util")
+        assert util.type == "STATIC_LIBRARY"
+        assert util.directory == os.path.join(build, "util")
+        assert util.artifacts == [os.path.join(build, "util", "libmyutil.a")]
+        group = util.compile_groups[0]
+        assert group["language"] == "C" and group["defines"] == ["UTIL=1"]
+        assert group["includes"] == [os.path.join(src, "util", "include")]
+        assert group["sources"] == [os.path.join(src, "util", "util.c")]
+
+        assert model.target("docs").type == "UTILITY"
+        assert model.target("docs").artifacts == []
+        with pytest.raises(FileApiError):
+            CodeModel(build, "Release")
+
+
+def test_cmake_codemodel_targets():
+    """ `CMake` knows the targets of all directories and their artifacts """
+    with tempfile.TemporaryDirectory() as d:
+        src, build = project(d), os.path.join(d, "build")
+        c = CMake(src, build)
+        assert sorted(t.name() for t in c.targets()) == ["demo", "docs", "util"]
+        demo = c.target("demo")
+        assert demo.build_path() == os.path.join(build, "demo")
+        assert demo.kind() == "bin" and demo.type == "EXECUTABLE"
+        assert demo.dependencies == ["util"]
+        assert c.target("util").kind() == "lib"
+        assert c.target("docs").type == "UTILITY"
+
+        assert c.build(demo)
+        assert os.access(demo.build_path(), os.X_OK)
+        assert c.build(c.target("util"))
+        assert os.path.isfile(c.target("util").build_path())
+
+        # a target of a subdirectory is discovered
+        with open(os.path.join(src, "util", "CMakeLists.txt"), "a", encoding="utf-8") as f:
+            f.write("add_executable(tool ../main.c)\ntarget_link_libraries(tool util)\n")
+        diff = c.refresh([os.path.join(src, "util", "CMakeLists.txt")])
+        assert [t.name() for t in diff["added"]] == ["tool"]
+        assert c.target("tool").build_path() == os.path.join(build, "util", "tool")
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+""" test the `Target` of common.py """
+import json
+import os
+import tempfile
+import tracemalloc
+
+from build_system_parser.common import Target, intern_args
+from build_system_parser.compile_commands import CompileCommands
+
+
+def test_target():
+    """ the compact target must behave like a plain object """
+    def build(target):
+        return target.name() == "a"
+
+    t = Target("a", "/tmp/a", ["cc", "-O2", "-c", "a.c"], build, kind="bin", file="a.c")
+    assert t.name() == "a"
+    assert t.build_path() == "/tmp/a"
+    assert t.build_commands() == ["cc", "-O2", "-c", "a.c"]
+    assert t.kind() == "bin"
+    assert t.file == "a.c"
+    assert t.build()
+    assert t.builder() is None
+    assert "a.c" in repr(t)
+    assert not hasattr(t, "missing")
+    assert Target("b", "", []).kind() == "TODO"
+
+    prefixes = {}
+    p1, r1 = intern_args(["cc", "-O2", "-c", "a.c", "-o", "a.o"], prefixes)
+    p2, r2 = intern_args(["cc", "-O2", "-c", "b.c", "-o", "b.o"], prefixes)
+    assert p1 is p2 and p1 == ("cc", "-O2", "-c")
+    assert r1 == ("a.c", "-o", "a.o") and r2 == ("b.c", "-o", "b.o")
+    assert Target("b", "", (p2, r2)).build_commands() == \
+        ["cc", "-O2", "-c", "b.c", "-o", "b.o"]
+
+
+def test_target_memory():
+    """ the targets of a compile database must be small """
+    with tempfile.TemporaryDirectory() as d:
+        n = 10000
+        data = [{"arguments": ["cc", "-Iinclude", "-DNDEBUG", "-O2", "-Wall", "-c",
+                               f"src/file{i}.c", "-o", f"obj/file{i}.o"],
+                 "directory": d, "file": f"src/file{i}.c", "output": f"obj/file{i}.o"}
+                for i in range(n)]
+        file = os.path.join(d, "compile_commands.json")
+        with open(file, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        del data
+
+        tracemalloc.start()
+        cc = CompileCommands(file)
+        targets = cc.targets()
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert len(targets) == n
+        assert current / n < 1024
+
+        t = targets[-1]
+        assert t.builder() is cc
+        assert t.build_commands()[-3:] == [f"src/file{n - 1}.c", "-o", f"obj/file{n - 1}.o"]
+        assert t.file == os.path.join(d, f"src/file{n - 1}.c")
+
+
+if __name__ == "__main__":
+    test_target()
+    test_target_memory()
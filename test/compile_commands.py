@@ -1,5 +1,8 @@
 #!/usr/bin/env python3
 """ test compiler_commands.json"""
+import os
+import tempfile
+
 from build_system_parser.compile_commands import CompileCommands
 
 
@@ -11,6 +14,18 @@ def test_compile_commands_runner():
     assert len(c.targets()) == 1
 
 
+def test_compile_commands_cwd():
+    """ a relative path is resolved by the constructor, not by the discovery """
+    c = CompileCommands("test/compile_commands.json")
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as d:
+        os.chdir(d)
+        try:
+            assert len(c.targets()) == 1
+        finally:
+            os.chdir(cwd)
+
+
 def test_compile_commands_build():
     """ test the .build() function """
     c = CompileCommands("test/compile_commands.json")
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+""" test daemon.py """
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from build_system_parser.cache import ENV_VARS
+from build_system_parser.client import DaemonClient, DaemonError, connect, is_running, \
+    request, build_env, BUILD_ENV_VARS
+from build_system_parser.daemon import BuildDaemon
+from build_system_parser.discovery import DiscoveryCache
+
+from .helpers import MAKEFILE, write
+
+PROG = """#include <stdio.h>
+int main(void) { printf("hello\\n"); return 0; }
+"""
+
+
+def cli(*args, env=None):
+    """ runs the cli """
+    return subprocess.run([sys.executable, "-m", "build_system_parser.cli"] + list(args),
+                          capture_output=True, text=True, check=False, env=env)
+
+
+def test_daemon():
+    """ builders are reused across requests and connections """
+    with tempfile.TemporaryDirectory() as d:
+        write(os.path.join(d, "prog.c"), PROG)
+        write(os.path.join(d, "Makefile"), MAKEFILE)
+        sock = os.path.join(d, "daemon.sock")
+        daemon = BuildDaemon(sock, DiscoveryCache(os.path.join(d, "cache"))).start()
+        try:
+            assert is_running(sock)
+            path = os.path.join(d, "Makefile")
+            with DaemonClient(sock) as c:
+                assert [t["name"] for t in c.call("list", builder="make", path=path)
+                        ["targets"]] == ["prog"]
+                assert c.call("build", builder="make", path=path, target="prog")["success"]
+                assert c.call("run", builder="make", path=path, target="prog")["output"] \
+                    == ["hello"]
+                r = c.call("benchmark", builder="make", path=path, target="prog", repeat=3)
+                assert r["success"] and r["samples"] == 3 and r["stats"]["wall"]["median"] > 0
+
+                try:
+                    c.call("build", builder="make", path=path, target="missing")
+                    assert False
+                except DaemonError as e:
+                    assert e.response["names"] == ["prog"]
+                try:
+                    c.call("build", builder="unknown", path=path, target="prog")
+                    assert False
+                except DaemonError as e:
+                    assert "unsupported" in str(e)
+
+                # the daemon does not build with another environment
+                env = dict(build_env(), CFLAGS="-O3 -fsomething")
+                assert c.call("build", builder="make", path=path, target="prog",
+                              build_env=build_env(), discovery_cache=False)["success"]
+                try:
+                    c.call("build", builder="make", path=path, target="prog", build_env=env)
+                    assert False
+                except DaemonError as e:
+                    assert e.response["env"] == ["CFLAGS"]
+
+            # concurrent clients share a single builder
+            def worker():
+                with DaemonClient(sock) as c:
+                    assert c.call("build", builder="make", path=path, target="prog")["success"]
+
+            threads = [threading.Thread(target=worker) for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            assert request("ping", sock)["builders"] == 1
+
+            # a changed Makefile is rediscovered
+            time.sleep(0.01)
+            write(path, MAKEFILE + "\nclean:\n\trm -f prog\n")
+            names = [t["name"] for t in request("list", sock, builder="make", path=path)
+                     ["targets"]]
+            assert sorted(names) == ["clean", "prog"]
+
+            # a second daemon must not steal the socket
+            try:
+                BuildDaemon(sock).start()
+                assert False
+            except DaemonError:
+                pass
+        finally:
+            daemon.stop()
+        assert not is_running(sock)
+        assert connect(sock) is None
+        assert request("ping", sock) is None
+
+
+def test_daemon_cli():
+    """ the cli uses a running daemon, and falls back to building itself """
+    with tempfile.TemporaryDirectory() as d:
+        write(os.path.join(d, "prog.c"), PROG)
+        write(os.path.join(d, "Makefile"), MAKEFILE)
+        sock = os.path.join(d, "daemon.sock")
+
+        p = cli("-b", "make", "-p", d, "-t", "prog", "--socket", sock)
+        assert p.returncode == 0, p.stdout + p.stderr
+
+        server = subprocess.Popen([sys.executable, "-m", "build_system_parser.cli",
+                                   "--serve", "--socket", sock])
+        try:
+            for _ in range(100):
+                if is_running(sock):
+                    break
+                time.sleep(0.05)
+            p = cli("-b", "make", "-p", d, "-t", "prog", "--socket", sock)
+            assert p.returncode == 0, p.stdout + p.stderr
+            p = cli("-b", "make", "-p", d, "-t", "missing", "--socket", sock)
+            assert p.returncode == 1 and "'prog'" in p.stdout
+            assert request("ping", sock)["requests"] == 3
+
+            # another environment is built in this process
+            p = cli("-b", "make", "-p", d, "-t", "prog", "--socket", sock,
+                    env=dict(os.environ, CFLAGS="-O1 -fsomething"))
+            assert p.returncode == 0, p.stdout + p.stderr
+            assert request("ping", sock)["requests"] == 5
+            request("shutdown", sock)
+            server.wait(10)
+        finally:
+            server.kill()
+        assert not os.path.exists(sock)
+
+
+def test_daemon_build_env():
+    """ every variable, which changes a cached build, is compared """
+    assert set(ENV_VARS) <= set(BUILD_ENV_VARS)
+    assert "PATH" in BUILD_ENV_VARS
+
+
+if __name__ == "__main__":
+    test_daemon()
+    test_daemon_cli()
+    test_daemon_build_env()
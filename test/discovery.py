@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+""" test discovery.py """
+import os
+import shutil
+import tempfile
+import time
+
+from build_system_parser.bazel import Bazel
+from build_system_parser.cmake import CMake
+from build_system_parser.discovery import DiscoveryCache
+from build_system_parser.make import Make, included_makefiles
+from build_system_parser.ninja import Ninja
+
+from .helpers import CMAKELISTS, MAKEFILE, write
+
+NINJA = """include rules.ninja
+build prog: link prog.c
+"""
+
+RULES = """rule link
+  command = cc -o $out $in
+"""
+
+
+def names(builder) -> list:
+    """ names of all targets """
+    return [t.name() for t in builder.targets()]
+
+
+def test_discovery_make():
+    """ the targets are reused until the Makefile changes """
+    with tempfile.TemporaryDirectory() as d, \
+            tempfile.TemporaryDirectory() as c:
+        write(os.path.join(d, "prog.c"), "int main(void) { return 0; }\n")
+        write(os.path.join(d, "Makefile"), MAKEFILE)
+        cache = DiscoveryCache(c)
+
+        assert names(Make(d).use_discovery_cache(cache)) == ["prog"]
+        assert (cache.hits, cache.misses) == (0, 1)
+
+        m = Make(d).use_discovery_cache(cache)
+        assert names(m) == ["prog"]
+        assert cache.hits == 1
+        t = m.target("prog")
+        assert t.builder() is m
+        assert m.build(t)
+        assert os.access(os.path.join(d, "prog"), os.X_OK)
+
+        # touched, but unchanged
+        os.utime(os.path.join(d, "Makefile"), (1, 1))
+        assert names(Make(d).use_discovery_cache(cache)) == ["prog"]
+        assert cache.hits == 2
+
+        write(os.path.join(d, "Makefile"), MAKEFILE + "\nclean:\n\trm -f prog\n")
+        assert sorted(names(Make(d).use_discovery_cache(cache))) == ["clean", "prog"]
+        assert cache.misses == 2
+
+        # an explicit rediscovery ignores the cache
+        m = Make(d).use_discovery_cache(cache)
+        assert sorted(t.name() for t in m.discover()) == ["clean", "prog"]
+        assert cache.hits == 2
+
+
+class RacyMake(Make):
+    """ the Makefile is edited while it is parsed """
+    def _discover(self, executions):
+        """ writes the Makefile after it was parsed """
+        super()._discover(executions)
+        time.sleep(0.01)
+        write(self._discovery_inputs()[0], MAKEFILE + "\nclean:\n\trm -f prog\n")
+
+
+def test_discovery_race():
+    """ the targets of a Makefile, which changed during the discovery, are not stored """
+    with tempfile.TemporaryDirectory() as d, \
+            tempfile.TemporaryDirectory() as c:
+        write(os.path.join(d, "Makefile"), MAKEFILE)
+        cache = DiscoveryCache(c)
+        m = RacyMake(d).use_discovery_cache(cache)
+        assert names(m) == ["prog"]
+        assert m.stale()
+        assert sorted(names(Make(d).use_discovery_cache(cache))) == ["clean", "prog"]
+        assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_included_makefiles():
+    """ includes are followed recursively """
+    with tempfile.TemporaryDirectory() as d:
+        write(os.path.join(d, "Makefile"), "include a.mk $(B).mk\n-include b.mk\n")
+        write(os.path.join(d, "a.mk"), "sinclude b.mk\n")
+        assert sorted(f.name for f in included_makefiles(os.path.join(d, "Makefile"))) == \
+            ["Makefile", "a.mk", "b.mk"]
+
+
+def test_discovery_ninja():
+    """ included ninja files invalidate the targets """
+    with tempfile.TemporaryDirectory() as d, \
+            tempfile.TemporaryDirectory() as c:
+        write(os.path.join(d, "prog.c"), "int main(void) { return 0; }\n")
+        write(os.path.join(d, "build.ninja"), NINJA)
+        write(os.path.join(d, "rules.ninja"), RULES)
+        cache = DiscoveryCache(c)
+        file = os.path.join(d, "build.ninja")
+
+        assert names(Ninja(file).use_discovery_cache(cache)) == ["prog"]
+        n = Ninja(file).use_discovery_cache(cache)
+        assert names(n) == ["prog"]
+        assert (cache.hits, cache.misses) == (1, 1)
+        assert n.build(n.target("prog"))
+
+        write(os.path.join(d, "rules.ninja"), RULES + "  description = CC $out\n")
+        assert names(Ninja(file).use_discovery_cache(cache)) == ["prog"]
+        assert cache.misses == 2
+
+
+def test_discovery_bazel():
+    """ a new `BUILD` file invalidates the targets """
+    with tempfile.TemporaryDirectory() as d, \
+            tempfile.TemporaryDirectory() as c:
+        path = os.path.join(d, "stage2")
+        shutil.copytree("test/bazel/stage2", path, symlinks=True)
+        cache = DiscoveryCache(c)
+
+        expected = names(Bazel(path).use_discovery_cache(cache))
+        assert expected
+        assert names(Bazel(path).use_discovery_cache(cache)) == expected
+        assert cache.hits == 1
+
+        os.makedirs(os.path.join(path, "lib"))
+        write(os.path.join(path, "lib", "BUILD"),
+              'cc_library(\n    name = "lib",\n    srcs = ["lib.cc"],\n)\n')
+        assert names(Bazel(path).use_discovery_cache(cache)) == expected + ["lib"]
+        assert cache.misses == 2
+
+
+def test_discovery_cmake():
+    """ a restored project is configured by its first build """
+    with tempfile.TemporaryDirectory() as d, \
+            tempfile.TemporaryDirectory() as c:
+        write(os.path.join(d, "prog.c"), "int main(void) { return 0; }\n")
+        write(os.path.join(d, "CMakeLists.txt"), CMAKELISTS)
+        build = os.path.join(d, "build")
+        cache = DiscoveryCache(c)
+
+        assert names(CMake(d, build).use_discovery_cache(cache)) == ["prog"]
+        shutil.rmtree(build)
+
+        cm = CMake(d, build).use_discovery_cache(cache)
+        assert names(cm) == ["prog"]
+        assert cache.hits == 1
+        assert not os.path.exists(build)
+        assert cm.build(cm.target("prog"))
+        assert os.access(os.path.join(build, "prog"), os.X_OK)
+
+
+if __name__ == "__main__":
+    test_discovery_make()
+    test_discovery_race()
+    test_included_makefiles()
+    test_discovery_ninja()
+    test_discovery_bazel()
+    test_discovery_cmake()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+""" test execute.py """
+import asyncio
+import sys
+import time
+
+from build_system_parser.execute import Execution, execute, stream, aexecute
+
+
+def test_execute():
+    """ if this fails something fishy is going on """
+    e = execute([sys.executable, "-c", "print('hello'); print('world')"])
+    assert e.ok()
+    assert e.output() == ["hello", "world"]
+    assert e.wall_time > 0
+    assert e.rusage is not None
+
+
+def test_execute_returncode():
+    """ the return code must be passed through """
+    e = execute([sys.executable, "-c", "import sys; sys.exit(3)"])
+    assert not e.ok()
+    assert e.returncode == 3
+
+
+def test_execute_large_output():
+    """ output larger than the pipe buffer must not deadlock """
+    lines = []
+    e = execute([sys.executable, "-c", "for i in range(200000): print(i)"],
+                on_line=lines.append, tail=10)
+    assert e.ok()
+    assert len(lines) == 200000
+    assert e.output() == [str(i) for i in range(199990, 200000)]
+
+
+def test_stream():
+    """ lines must be received while the process is still running """
+    cmd = [sys.executable, "-u", "-c",
+           "import time; print('first'); time.sleep(2); print('second')"]
+    start = time.perf_counter()
+    lines = []
+    for line in stream(cmd):
+        lines.append((line, time.perf_counter() - start))
+
+    assert [line for line, _ in lines] == ["first", "second"]
+    assert lines[0][1] < lines[1][1] - 1
+
+
+def test_stream_abort():
+    """ an aborted stream must kill the process """
+    cmd = [sys.executable, "-u", "-c",
+           "import time; print('first', flush=True); time.sleep(60)"]
+    start = time.perf_counter()
+    e = Execution(cmd)
+    it = iter(e)
+    assert next(it) == "first"
+    it.close()
+    assert e.returncode is not None
+    assert e.returncode < 0
+    assert time.perf_counter() - start < 30
+
+
+def test_aexecute():
+    """ tests the coroutine version of `execute` """
+    async def main():
+        cmd = [sys.executable, "-c", "for i in range(100000): print(i)"]
+        return await asyncio.gather(*[aexecute(cmd, tail=1) for _ in range(4)])
+
+    for e in asyncio.run(main()):
+        assert e.ok()
+        assert e.output() == ["99999"]
+
+
+def test_aexecute_cancel():
+    """ a cancelled execution must kill the process group """
+    cmd = [sys.executable, "-c", "import time; time.sleep(60)"]
+
+    async def main():
+        task = asyncio.ensure_future(aexecute(cmd))
+        await asyncio.sleep(0.5)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            return True
+        return False
+
+    start = time.perf_counter()
+    assert asyncio.run(main())
+    assert time.perf_counter() - start < 30
+
+
+if __name__ == "__main__":
+    test_execute()
+    test_execute_returncode()
+    test_execute_large_output()
+    test_stream()
+    test_stream_abort()
+    test_aexecute()
+    test_aexecute_cancel()
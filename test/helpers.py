@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+""" helpers and fixtures shared by the tests """
+import os
+
+# builds `prog` from `prog.c`
+MAKEFILE = """
+prog: prog.c
+\tcc -o prog prog.c
+"""
+
+# appends a line to `log` for each build of `prog`
+INCREMENTAL_MAKEFILE = """
+prog: prog.c
+\t@echo build >> log
+\tcc ${CFLAGS} -o prog prog.c
+
+clean:
+\trm -f prog
+"""
+
+# builds `prog` from `prog.c`
+CMAKELISTS = """cmake_minimum_required(VERSION 3.10)
+project(prog C)
+add_executable(prog prog.c)
+"""
+
+
+def write(path: str, content: str, mode: str = "w"):
+    """ simple helper, the parent directories are created """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, mode, encoding="utf-8") as f:
+        f.write(content)
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+""" guards the import time of the package """
+import json
+import subprocess
+import sys
+
+# modules, which must never be loaded by `from build_system_parser import Ninja`
+HEAVY = ["argparse", "build_system_parser.bazel", "build_system_parser.cargo",
+         "build_system_parser.cmake", "build_system_parser.make",
+         "build_system_parser.compile", "build_system_parser.compile_commands",
+         "build_system_parser.parse_cmake", "build_system_parser.pymake",
+         "build_system_parser.autotune"]
+
+
+def loaded_modules(statement: str) -> list:
+    """ the modules loaded by `statement` in a fresh interpreter """
+    code = f"import sys, json\n{statement}\nprint(json.dumps(sorted(sys.modules)))"
+    p = subprocess.run([sys.executable, "-c", code], capture_output=True,
+                       text=True, check=True)
+    return json.loads(p.stdout)
+
+
+def test_lazy_import():
+    """ only the used builder is imported """
+    modules = loaded_modules("import build_system_parser")
+    assert not [m for m in modules if m.startswith("build_system_parser.")]
+
+    modules = loaded_modules("from build_system_parser import Ninja")
+    assert "build_system_parser.ninja" in modules
+    assert "build_system_parser.common" in modules
+    assert not [m for m in HEAVY if m in modules]
+
+    modules = loaded_modules("from build_system_parser import Make")
+    assert "build_system_parser.pymake" in modules
+    assert "build_system_parser.cmake" not in modules
+
+
+def test_lazy_attributes():
+    """ the lazy attributes behave like eagerly imported ones """
+    import build_system_parser  # pylint: disable=import-outside-toplevel
+    from build_system_parser.cmake import CMake  # pylint: disable=import-outside-toplevel
+    assert build_system_parser.CMake is CMake
+    assert "find_build_system" in dir(build_system_parser)
+    try:
+        _ = build_system_parser.DoesNotExist
+        assert False
+    except AttributeError:
+        pass
+
+
+if __name__ == "__main__":
+    test_lazy_import()
+    test_lazy_attributes()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+""" test index.py and the target lookup of the builders """
+import json
+import os
+import random
+import tempfile
+
+from build_system_parser.common import Target
+from build_system_parser.compile_commands import CompileCommands
+from build_system_parser.index import TargetIndex
+
+
+def linear_find(targets, name):
+    """ the reference implementation """
+    for t in targets:
+        if name == t.name():
+            return t
+    for t in targets:
+        if name in t.name():
+            return t
+    return None
+
+
+def test_index():
+    """ the index must return the same targets as a linear scan """
+    rng = random.Random(1)
+    parts = ["lib", "core", "test", "main", "util", "io", "net", "x"]
+    targets = [Target("_".join(rng.choices(parts, k=rng.randint(1, 4))), "", [])
+               for _ in range(2000)]
+    index = TargetIndex(targets)
+
+    queries = ["_".join(rng.choices(parts, k=rng.randint(1, 3))) for _ in range(200)]
+    queries += ["", "o", "e_", "missing", "lib_core_test_main_util"]
+    for q in queries:
+        assert index.find(q) is linear_find(targets, q)
+        assert index.substring(q) == \
+            [index.get(n) for n in dict.fromkeys(t.name() for t in targets if q in t.name())]
+        assert index.prefix(q) == \
+            [index.get(n) for n in dict.fromkeys(t.name() for t in targets
+                                                 if t.name().startswith(q))]
+
+    # incremental update
+    targets = targets[100:] + [Target("brand_new", "", [])]
+    index.update(targets)
+    for q in queries + ["brand", "new"]:
+        assert index.find(q) is linear_find(targets, q)
+    assert "brand_new" in index
+
+
+def test_targets_by_name():
+    """ batched lookups on a large compile database """
+    with tempfile.TemporaryDirectory() as d:
+        n = 20000
+        data = [{"arguments": ["cc", "-c", f"src/module{i}/file{i}.c"], "directory": d,
+                 "file": f"src/module{i}/file{i}.c", "output": f"file{i}.o"}
+                for i in range(n)]
+        file = os.path.join(d, "compile_commands.json")
+        with open(file, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+        c = CompileCommands(file)
+        assert c.is_valid_target("file42.o")
+        assert not c.is_valid_target("file42")
+        assert c.target("file42.o").name() == "file42.o"
+
+        names = [f"file{i}.o" for i in range(0, n, 7)] + ["le1999", "missing"]
+        found = c.targets_by_name(names)
+        assert [t.name() for t in found[:-2]] == names[:-2]
+        assert found[-2].name() == "file1999.o"
+        assert found[-1] is None
+
+        # a new list of targets with the same length is indexed again
+        data[42]["output"] = "renamed.o"
+        with open(file, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        c.refresh()
+        assert c.target("renamed.o").name() == "renamed.o"
+        assert not c.is_valid_target("file42.o")
+
+
+if __name__ == "__main__":
+    test_index()
+    test_targets_by_name()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+""" test jobserver.py """
+import asyncio
+import os
+import tempfile
+import threading
+
+from build_system_parser import jobserver
+from build_system_parser.jobserver import JobServer
+from build_system_parser.make import Make
+from build_system_parser.ninja import Ninja
+
+MAKEFILE = """
+all: a b c d
+
+a b c d:
+\t@echo "start $@ $$(date +%s.%N)" >> log
+\t@sleep 0.5
+\t@echo "end $@ $$(date +%s.%N)" >> log
+
+clean:
+\trm -f log
+"""
+
+NINJA = """rule job
+  command = echo "start $out $$(date +%s.%N)" >> log && sleep 0.5 && """ \
+    """echo "end $out $$(date +%s.%N)" >> log && touch $out
+build a: job
+build b: job
+build c: job
+build d: job
+build all: phony a b c d
+"""
+
+
+def max_parallelism(log: str) -> int:
+    """ computes the maximal number of concurrent jobs from the log """
+    events = []
+    with open(log, encoding="utf-8") as f:
+        for line in f:
+            kind, _, t = line.split()
+            events.append((float(t), 1 if kind == "start" else -1))
+
+    ret, cur = 0, 0
+    for _, e in sorted(events):
+        cur += e
+        ret = max(ret, cur)
+    return ret
+
+
+def test_tokens():
+    """ the jobserver must hold exactly `jobs` tokens """
+    with JobServer(3) as js:
+        for _ in range(3):
+            js.acquire()
+
+        t = threading.Thread(target=js.acquire, daemon=True)
+        t.start()
+        t.join(0.2)
+        assert t.is_alive()
+        js.release()
+        t.join(5)
+        assert not t.is_alive()
+
+
+def test_makeflags():
+    """ tests the environment passed to clients """
+    with JobServer(2) as js:
+        env = js.env({"MAKEFLAGS": "-j8"})
+        assert "--jobserver-auth=" in env["MAKEFLAGS"]
+        assert "-j8" not in env["MAKEFLAGS"]
+        assert len(js.pass_fds()) == 2
+
+    with JobServer(2, fifo=True) as js:
+        assert "fifo:" in js.makeflags()
+        assert js.pass_fds() == ()
+
+
+def test_make_jobserver():
+    """ concurrent builds must share the jobs of the jobserver """
+    with tempfile.TemporaryDirectory() as d1, \
+            tempfile.TemporaryDirectory() as d2:
+        for d in (d1, d2):
+            with open(os.path.join(d, "Makefile"), "w", encoding="utf-8") as f:
+                f.write(MAKEFILE)
+
+        js = jobserver.start(2)
+        try:
+            m1, m2 = Make(d1, build_path=d1), Make(d2, build_path=d2)
+
+            async def main():
+                return await asyncio.gather(m1.abuild(m1.target("all")),
+                                            m2.abuild(m2.target("all")))
+
+            assert all(asyncio.run(main()))
+        finally:
+            jobserver.stop()
+
+        with open(os.path.join(d1, "log"), encoding="utf-8") as f1, \
+                open(os.path.join(d2, "log"), encoding="utf-8") as f2, \
+                open(os.path.join(d1, "all"), "w", encoding="utf-8") as out:
+            out.write(f1.read() + f2.read())
+        assert max_parallelism(os.path.join(d1, "all")) <= js.jobs
+
+
+def test_ninja_jobserver():
+    """ ninja only joins a FIFO jobserver, otherwise `-j` limits it """
+    with tempfile.TemporaryDirectory() as d:
+        with open(os.path.join(d, "build.ninja"), "w", encoding="utf-8") as f:
+            f.write(NINJA)
+        n = Ninja(os.path.join(d, "build.ninja"), nr_threads=4)
+        with JobServer(2) as js:
+            assert js.mode() == "pipe"
+            cmd = n.use_jobserver(js)._build_commands(n.target("all"))[0]
+            assert cmd.jobserver is None and cmd.cmd[-2:] == ["-j", "4"]
+
+        with JobServer(2, fifo=True) as js:
+            assert js.mode() == "fifo"
+            cmd = n.use_jobserver(js)._build_commands(n.target("all"))[0]
+            assert cmd.jobserver is js and "-j" not in cmd.cmd
+            assert n.build(n.target("all"))
+        assert max_parallelism(os.path.join(d, "log")) <= 2
+
+
+if __name__ == "__main__":
+    test_tokens()
+    test_makeflags()
+    test_make_jobserver()
+    test_ninja_jobserver()
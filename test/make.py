@@ -1,8 +1,13 @@
 #!/usr/bin/env python3
 """ test make.py """
+import asyncio
 import os
+import tempfile
+import time
 from build_system_parser.make import Make
 
+from .helpers import INCREMENTAL_MAKEFILE
+
 TEST_PATH = "test/make/"
 
 def test_make():
@@ -46,6 +51,139 @@ def test_make_target_build_run():
     if ret is False:
         assert ret
 
+def test_make_async():
+    """ tests the coroutine versions of the builder """
+    async def main():
+        m = Make(TEST_PATH + "Makefile")
+        assert await m.aavailable()
+        assert await m.aversion() == m.__version__()
+        assert len(await m.adiscover()) == 5
+        t = m.target("simple")
+        assert await m.abuild(t, "-O2")
+        assert await t.abuild()
+        return await t.arun()
+
+    assert asyncio.run(main()) is not False
+
+
+def test_make_incremental():
+    """ only changed flags or sources trigger a rebuild """
+    with tempfile.TemporaryDirectory() as d:
+        with open(os.path.join(d, "prog.c"), "w", encoding="utf-8") as f:
+            f.write("int main(void) { return 0; }\n")
+        with open(os.path.join(d, "Makefile"), "w", encoding="utf-8") as f:
+            f.write(INCREMENTAL_MAKEFILE)
+
+        def builds() -> int:
+            with open(os.path.join(d, "log"), encoding="utf-8") as f:
+                return len(f.readlines())
+
+        m = Make(d, build_path=d)
+        t = m.target("prog")
+        assert m.build(t)
+        assert m.build(t)
+        assert builds() == 1
+
+        assert m.build(t, "-O2")
+        assert m.build(t, "-O2")
+        assert builds() == 2
+        assert os.path.isfile(os.path.join(d, Make.STAMP_DIR, "flags"))
+
+        # a failed build must be forced the next time
+        assert not m.build(t, flags="-fno-such-flag")
+        assert m.build(t, "-O2")
+        assert builds() == 4
+
+        time.sleep(0.01)
+        os.utime(os.path.join(d, "prog.c"))
+        assert m.build(t, "-O2")
+        assert builds() == 5
+
+        m = Make(d, build_path=d, clean=True)
+        t = m.target("prog")
+        assert m.build(t, "-O2")
+        assert m.build(t, "-O2")
+        assert builds() == 7
+
+
+SHARED_MAKEFILE = """
+a: common.o
+\tcp common.o a
+b: common.o
+\tcp common.o b
+common.o:
+\techo "${CFLAGS}" > common.o
+"""
+
+
+def test_make_shared_prerequisites():
+    """ the flags are recorded per tree, a shared prerequisite is rebuilt """
+    with tempfile.TemporaryDirectory() as d:
+        with open(os.path.join(d, "Makefile"), "w", encoding="utf-8") as f:
+            f.write(SHARED_MAKEFILE)
+
+        def content(name: str) -> str:
+            with open(os.path.join(d, name), encoding="utf-8") as f:
+                return f.read().strip()
+
+        m = Make(d, build_path=d)
+        assert m.build(m.target("a"), flags="-O2")
+        assert m.build(m.target("b"), flags="-O3")
+        assert content("b") == "-O3"
+        assert m.build(m.target("a"), flags="-O2")
+        assert content("a") == "-O2" and content("common.o") == "-O2"
+
+
+VARIANT_MAKEFILE = """
+prog: prog.c
+\t@echo "start $$(date +%s.%N)" >> log
+\t@sleep 0.3
+\techo "${CFLAGS}" > prog
+\t@echo "end $$(date +%s.%N)" >> log
+"""
+
+
+def test_make_variants():
+    """ variants build concurrently in mirrors of the source tree """
+    with tempfile.TemporaryDirectory() as d, \
+            tempfile.TemporaryDirectory() as w:
+        src = os.path.join(d, "prog.c")
+        with open(src, "w", encoding="utf-8") as f:
+            f.write("int main(void) { return 0; }\n")
+        with open(os.path.join(d, "Makefile"), "w", encoding="utf-8") as f:
+            f.write(VARIANT_MAKEFILE)
+
+        m = Make(d, build_path=d)
+        variants = [m.variant(os.path.join(w, str(i))) for i in range(4)]
+        assert os.stat(os.path.join(w, "0", "prog.c")).st_ino == os.stat(src).st_ino
+
+        async def main():
+            return await asyncio.gather(*[v.abuild(v.target("prog"), f"-O{i}")
+                                          for i, v in enumerate(variants)])
+
+        start = time.perf_counter()
+        assert all(asyncio.run(main()))
+        assert time.perf_counter() - start < 4 * 0.3
+
+        for i in range(4):
+            with open(os.path.join(w, str(i), "prog"), encoding="utf-8") as f:
+                assert f.read().strip() == f"-O{i}"
+        # the source tree is untouched
+        assert sorted(os.listdir(d)) == ["Makefile", "prog.c"]
+
+        # a replaced source is picked up by the reused mirror
+        time.sleep(0.01)
+        os.unlink(src)
+        with open(src, "w", encoding="utf-8") as f:
+            f.write("int main(void) { return 1; }\n")
+        v = m.variant(os.path.join(w, "0"))
+        assert v.build(v.target("prog"), "-O0")
+        with open(os.path.join(w, "0", "prog.c"), encoding="utf-8") as f:
+            assert "return 1" in f.read()
+        with open(os.path.join(w, "0", "log"), encoding="utf-8") as f:
+            assert len(f.readlines()) == 4
+
+
 def test_all():
     """ parser all Makefile test files """
     dir_ = "test/cmake/files"
@@ -64,4 +202,7 @@ if __name__ == "__main__":
     test_make_path()
     test_make_build()
     test_make_target_build_run()
+    test_make_async()
+    test_make_incremental()
+    test_make_variants()
     test_all()
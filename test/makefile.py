@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+""" test pymake """
+import os
+import subprocess
+import tempfile
+
+import pytest
+
+from build_system_parser.discovery import DiscoveryCache
+from build_system_parser.make import Make
+from build_system_parser.pymake.makefile import Makefile, MakefileError, parse_database
+from build_system_parser.pymake._pymake import (PymakeKeyError, expand_macros,
+                                                resolve_aliases, parse_makefile_aliases)
+
+MAKEFILE = """
+# comment
+include common.mk
+-include missing.mk
+SRCS := $(wildcard src/*.c)
+OBJS = $(SRCS:.c=.o)
+MODE ?= release
+ifeq ($(MODE),release)
+  OPT = -O3
+else ifeq ($(MODE),debug)
+  OPT = -O0
+else
+  OPT = -O1
+endif
+ifdef UNDEFINED
+  OPT += -g
+endif
+define greet
+echo hello $(1)
+endef
+.PHONY: all clean
+all: prog
+prog: $(OBJS) | out
+\t$(CC) $(CFLAGS) $(OPT) -o $@ $^
+\t@$(call greet,$(@F))
+%.o: %.c inc/x.h
+\t$(CC) -c $(CFLAGS) $< -o $@
+out: ; mkdir -p $@
+lib: CFLAGS += -fPIC
+lib: src/a.o
+\tar rcs $@ $(filter %.o,$^)
+$(foreach n,1 2,$(eval gen$(n): ; echo $(n)))
+src/a.o src/b.o: inc/x.h
+clean::
+\trm -f prog
+clean::
+\trm -rf out
+"""
+
+
+def project(d: str, makefile: str = MAKEFILE) -> str:
+    """
+    writes a small project
+    :return the path of the Makefile
+    """
+    for f in ("src/a.c", "src/b.c", "inc/x.h"):
+        os.makedirs(os.path.dirname(os.path.join(d, f)), exist_ok=True)
+        with open(os.path.join(d, f), "w", encoding="utf-8") as fd:
+            fd.write("")
+    with open(os.path.join(d, "common.mk"), "w", encoding="utf-8") as f:
+        f.write("CFLAGS ?= -O2\nCFLAGS += \\\n  -Wall\n")
+    with open(os.path.join(d, "Makefile"), "w", encoding="utf-8") as f:
+        f.write(makefile)
+    return os.path.join(d, "Makefile")
+
+
+def test_makefile_graph():
+    """ the graph of a Makefile using most features """
+    with tempfile.TemporaryDirectory() as d:
+        m = Makefile(project(d))
+        assert m.targets() == ["all", "prog", "out", "lib", "gen1", "gen2",
+                               "src/a.o", "src/b.o", "clean"]
+        assert m.goal() == "all"
+        assert m.phony == {"all", "clean"}
+        assert m.files == [os.path.join(d, "Makefile"), os.path.join(d, "common.mk")]
+        assert m.missing == [os.path.join(d, "missing.mk")]
+
+        assert m.prerequisites("prog") == ["src/a.o", "src/b.o"]
+        assert m.order_only("prog") == ["out"]
+        assert m.recipe("prog") == ["cc -O2 -Wall -O3 -o prog src/a.o src/b.o",
+                                    "echo hello prog"]
+        # the recipe of the pattern rule
+        assert m.prerequisites("src/a.o") == ["src/a.c", "inc/x.h"]
+        assert m.recipe("src/a.o") == ["cc -c -O2 -Wall src/a.c -o src/a.o"]
+        # target specific variables
+        assert m.recipe("lib") == ["ar rcs lib src/a.o"]
+        assert m.recipe("gen2") == ["echo 2"]
+        assert m.recipe("clean") == ["rm -f prog", "rm -rf out"]
+
+        assert m.dependencies("all") == ["src/a.c", "inc/x.h", "src/a.o",
+                                         "src/b.c", "src/b.o", "out", "prog"]
+        assert m.dependents(["src/b.c"]) == ["all", "prog", "src/b.o"]
+
+
+def test_makefile_variables():
+    """ flavors, overrides and the conditionals """
+    with tempfile.TemporaryDirectory() as d:
+        m = Makefile(project(d), variables={"MODE": "debug"})
+        assert m.variable("OPT") == "-O0"
+        assert m.variable("OBJS") == "src/a.o src/b.o"
+        assert m.variable("UNDEFINED") is None
+
+        m = Makefile(project(d), environ={"UNDEFINED": "1", "MODE": "other"})
+        assert m.variable("OPT") == "-O1 -g"
+
+    m = Makefile()
+    m.parse_string("A = $(B)\nB = 1\nC := $(A)\nB = 2\n"
+                   "D = ${A} $$HOME $(A:1=x) $(subst 2,3,$(A))\n"
+                   "override E = e\nexport F := f\n"
+                   "G = a \\\n    b # comment \\\n  continued\n")
+    assert m.variable("C") == "1"
+    assert m.variable("D") == "2 $HOME 2 3"
+    assert m.variable("E") == "e"
+    assert m.variable("F") == "f"
+    assert m.variable("G") == "a b "
+    # memoized values are invalidated by assignments
+    m.parse_string("B = 4\n")
+    assert m.variable("D") == "4 $HOME 4 4"
+
+
+def test_makefile_static_pattern():
+    """ static pattern rules and automatic variables """
+    m = Makefile()
+    m.parse_string("OBJS = a.o sub/b.o\n"
+                   "$(OBJS): %.o: %.c | dir\n"
+                   "\t$(CC) -c $< -o $@ # $* $(@D) $(@F) $|\n")
+    assert m.prerequisites("sub/b.o") == ["sub/b.c"]
+    assert m.recipe("sub/b.o") == ["cc -c sub/b.c -o sub/b.o # sub/b sub b.o dir"]
+
+
+def test_makefile_pattern_dependents():
+    """ the dependents are found across pattern rules """
+    with tempfile.TemporaryDirectory() as d:
+        m = Makefile(project(d, "prog: a.o\n\tcc -o $@ $^\n%.o: %.c\n\tcc $(CFLAGS) -c $<\n"
+                                "a.o: CFLAGS += -O3\nb.o: CFLAGS = -O1\n"))
+        with open(os.path.join(d, "a.c"), "w", encoding="utf-8") as f:
+            f.write("")
+        # a target specific variable does not add a target
+        assert m.targets() == ["prog"]
+        assert m.dependents(["a.c"]) == ["prog", "a.o"]
+        assert m.dependents(["b.c"]) == []
+        assert m.recipe("a.o") == ["cc -O3 -c a.c"]
+
+        env = dict(os.environ, LC_ALL="C")
+        out = subprocess.run(["make", "-pnqr", "-f", m.files[0]], cwd=d, env=env,
+                             check=False, stdout=subprocess.PIPE, text=True).stdout
+        db = parse_database(out.splitlines(), d)
+        assert "b.o" not in db.targets()
+        assert db.recipe("a.o") == m.recipe("a.o")
+
+
+def test_makefile_errors():
+    """ invalid Makefiles """
+    with pytest.raises(MakefileError):
+        Makefile().parse_string("A = $(B)\nB = $(A)\nC := $(A)\n")
+    with pytest.raises(MakefileError):
+        Makefile().parse_string("ifeq (a,b)\nA = 1\n")
+    with pytest.raises(MakefileError):
+        Makefile().parse_string("$(error stop)\n")
+    with pytest.raises(MakefileError):
+        Makefile().parse_string("not a rule\n")
+
+
+def test_make_prerequisites():
+    """ the targets of `Make` know their prerequisites """
+    with tempfile.TemporaryDirectory() as d:
+        m = Make(project(d))
+        assert m.target("prog").prerequisites == ["src/a.o", "src/b.o"]
+        assert m.target("prog").build_commands()[0] == "cc -O2 -Wall -O3 -o prog src/a.o src/b.o"
+        assert m.makefile().dependents(["src/a.c"]) == ["all", "prog", "lib", "src/a.o"]
+
+
+def test_expand_macros():
+    """ single pass, memoized macro expansion """
+    macros = {"A": "$(B) b", "B": "c", "N": "A"}
+    assert expand_macros("a $(A) $($(N)) $(U)", macros) == ("a c b c b $(U)", {"$(U)"})
+    with pytest.raises(PymakeKeyError):
+        expand_macros("$(A)", {"A": "$(B)", "B": "$(A)"})
+    with pytest.raises(PymakeKeyError):
+        expand_macros("$(A)", {"A": "$($(N))", "N": "A"})
+    # long chains do not exhaust the stack
+    chain = {f"V{i}": f"$(V{i - 1})" if i else "x" for i in range(10000)}
+    assert expand_macros("$(V9999)", chain)[0] == "x"
+
+
+def test_resolve_aliases():
+    """ topological alias resolution """
+    commands = {"all": ["build", "test"], "build": ["cc x", "build"], "test": ["build", "./x"]}
+    assert resolve_aliases(commands) == {"all": ["cc x", "cc x", "./x"],
+                                         "build": ["cc x"], "test": ["cc x", "./x"]}
+    with pytest.raises(PymakeKeyError):
+        resolve_aliases({"a": ["b"], "b": ["a"]})
+
+
+def test_parse_makefile_aliases():
+    """ the INI based parser """
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "Makefile")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("CC = gcc\nFLAGS = $(OPT) -Wall\nOPT = -O2\n\n"
+                    "build:\n\t$(CC) $(FLAGS) x.c\n\nall:\n\tbuild\n\t./a.out\n")
+        commands, default = parse_makefile_aliases(path)
+        assert default == "build"
+        assert commands == {"build": ["gcc -O2 -Wall x.c"],
+                            "all": ["gcc -O2 -Wall x.c", "./a.out"]}
+
+
+def test_parse_database():
+    """ the rule database of `make -pnqr` results in the same graph """
+    with tempfile.TemporaryDirectory() as d:
+        path = project(d, MAKEFILE + "grp1 grp2 &: ; touch grp1 grp2\n")
+        m = Makefile(path)
+        env = dict(os.environ, LC_ALL="C")
+        out = subprocess.run(["make", "-pnqr", "-f", path], cwd=d, env=env, check=False,
+                             stdout=subprocess.PIPE, text=True).stdout
+        db = parse_database(out.splitlines(), d)
+        assert sorted(db.targets()) == sorted(m.targets())
+        for t in m.targets():
+            assert db.prerequisites(t) == m.prerequisites(t)
+            assert db.order_only(t) == m.order_only(t)
+            assert db.recipe(t) == m.recipe(t)
+        assert db.goal() == "all"
+        assert db.phony == {"all", "clean"}
+        assert db.files == m.files
+        assert db.missing == m.missing
+
+    with pytest.raises(MakefileError):
+        parse_database(["make: *** No rule to make target 'x'.  Stop."])
+
+
+def test_make_database():
+    """ the database backend is cached separately """
+    with tempfile.TemporaryDirectory() as d:
+        path = project(d)
+        cache = DiscoveryCache(os.path.join(d, "cache"))
+        m = Make(path, database=True).use_discovery_cache(cache)
+        assert m.target("src/a.o").prerequisites == ["src/a.c", "inc/x.h"]
+        assert m.target("lib").build_commands() == ["ar rcs lib src/a.o"]
+        assert sorted(m.discovery_inputs()) == sorted(
+            os.path.join(d, f) for f in ("Makefile", "common.mk", "missing.mk"))
+
+        assert Make(path).use_discovery_cache(cache).targets()
+        assert cache.hits == 0
+        m = Make(path, database=True).use_discovery_cache(cache)
+        assert m.target("src/a.o").prerequisites == ["src/a.c", "inc/x.h"]
+        assert cache.hits == 1
+        assert m.makefile().recipe("src/b.o") == ["cc -c -O2 -Wall src/b.c -o src/b.o"]
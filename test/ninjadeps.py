@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+""" test ninjadeps.py """
+import os
+import struct
+import subprocess
+import tempfile
+
+from build_system_parser.ninja import Ninja
+from build_system_parser.ninjadeps import NinjaDeps
+
+from .helpers import write
+
+NINJA = """builddir = out
+rule cc
+  command = cc -MMD -MF $out.d -Iinclude -c $in -o $out
+  depfile = $out.d
+  deps = gcc
+rule link
+  command = cc -o $out $in
+rule gen
+  command = cp $in $out
+build include/gen.h: gen gen.h.in
+build out/m.o: cc m.c || include/gen.h
+build out/n.o: cc n.c || include/gen.h
+build out/common.o: cc common.c
+build m: link out/m.o out/common.o
+build n: link out/n.o out/common.o
+build all: phony m n
+"""
+
+SOURCES = {
+    "include/a.h": "#define A 1\n",
+    "include/b.h": "#define B 2\n",
+    "include/common.h": "int common(void);\n",
+    "gen.h.in": "#define GEN 3\n",
+    "m.c": '#include "a.h"\n#include "common.h"\n#include "gen.h"\n'
+           "int main(void) { return common() + A + GEN; }\n",
+    "n.c": '#include "b.h"\n#include "common.h"\nint main(void) { return common() + B; }\n',
+    "common.c": '#include "common.h"\nint common(void) { return 0; }\n',
+}
+
+
+def record(data: bytes, deps: bool = False) -> bytes:
+    """ a record of the deps log """
+    size = len(data) | (1 << 31 if deps else 0)
+    return struct.pack("<I", size) + data
+
+
+def path(name: str, i: int) -> bytes:
+    """ the path record of the id `i` """
+    data = name.encode()
+    data += b"\0" * (-len(data) % 4)
+    return record(data + struct.pack("<I", ~i & 0xFFFFFFFF))
+
+
+def test_ninjadeps():
+    """ a hand written log, read in pieces """
+    with tempfile.TemporaryDirectory() as d:
+        log = os.path.join(d, ".ninja_deps")
+        deps = NinjaDeps(log)
+        assert deps.update() == []
+
+        data = b"# ninjadeps\n" + struct.pack("<i", 4) + path("a.o", 0) + \
+            path("a.c", 1) + path("x.h", 2) + \
+            record(struct.pack("<iqii", 0, 123, 1, 2), True) + \
+            path("b.o", 3) + record(struct.pack("<iqi", 3, 5, 2), True)
+        # a record ninja is still writing
+        with open(log, "wb") as f:
+            f.write(data[:-3])
+        assert deps.update() == ["a.o"]
+        assert deps.deps("a.o") == ["a.c", "x.h"] and deps.mtime("a.o") == 123
+        with open(log, "ab") as f:
+            f.write(data[-3:])
+        assert deps.update() == ["b.o"]
+        assert deps.dependents(["x.h"]) == ["a.o", "b.o"]
+
+        # the later deps replace the earlier ones
+        with open(log, "ab") as f:
+            f.write(record(struct.pack("<iqi", 0, 124, 1), True))
+        assert deps.update() == ["a.o"]
+        assert deps.dependents(["x.h"]) == ["b.o"]
+        assert deps.files() == ["a.c", "x.h"]
+
+        # an invalid id
+        with open(log, "ab") as f:
+            f.write(record(struct.pack("<iqi", 9, 1, 1), True))
+        assert deps.update() == []
+        assert deps.outputs() == ["a.o", "b.o"]
+
+
+def test_ninja_affected_targets():
+    """ the headers recorded by a real build """
+    with tempfile.TemporaryDirectory() as d:
+        for name, content in SOURCES.items():
+            write(os.path.join(d, name), content)
+        write(os.path.join(d, "build.ninja"), NINJA)
+        n = Ninja(os.path.join(d, "build.ninja"))
+        assert n.build(n.target("all"))
+
+        # the same deps as `ninja -t deps`
+        deps = n.deps_log()
+        assert sorted(deps.outputs()) == ["out/common.o", "out/m.o", "out/n.o"]
+        out = subprocess.run(["ninja", "-t", "deps", "out/m.o"], cwd=d, check=True,
+                             stdout=subprocess.PIPE, text=True).stdout.splitlines()
+        assert deps.deps("out/m.o") == [line.strip() for line in out[1:] if line.strip()]
+
+        def affected(*files, final=True):
+            return [t.name() for t in n.affected_targets(
+                [os.path.join(d, f) for f in files], final)]
+
+        assert affected("include/a.h") == ["m"]
+        assert affected("include/b.h") == ["n"]
+        assert sorted(affected("include/common.h")) == ["m", "n"]
+        assert affected("gen.h.in") == ["m"]
+        assert sorted(affected("include/a.h", final=False)) == ["all", "m", "out/m.o"]
+        assert affected("README") == []
+
+        # relative to the current directory
+        cwd = os.getcwd()
+        try:
+            os.chdir(d)
+            assert [t.name() for t in n.affected_targets(["n.c"])] == ["n"]
+        finally:
+            os.chdir(cwd)
+
+        # new headers are picked up after the next build
+        write(os.path.join(d, "n.c"), '#include "a.h"\nint main(void) { return A; }\n')
+        assert n.build(n.target("all"))
+        assert sorted(affected("include/a.h")) == ["m", "n"]
+        assert affected("include/b.h") == []
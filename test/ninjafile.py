@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+""" test ninjafile.py """
+import os
+import subprocess
+import tempfile
+
+import pytest
+
+from build_system_parser.ninja import Ninja
+from build_system_parser.ninjafile import NinjaFile, NinjaFileError, parse_ninjafile
+
+NINJA = """# comment
+cflags = -O2
+ldflags = -lm
+builddir = out
+include rules.ninja
+pool link_pool
+  depth = 1
+
+build $builddir/a.o: cc src/a.c | inc/x.h || gen
+build $builddir/b$ c.o: cc src/b$ c.c
+  cflags = $cflags -g
+build $builddir/liba.a: ar $builddir/a.o $builddir/b$ c.o
+build prog | prog.map: link $builddir/./a.o $builddir/liba.a $
+    |@ check
+  pool = link_pool
+  ldflags = -Wl,-Map,prog.map
+build gen: phony
+build check: phony prog
+subninja sub/build.ninja
+cflags = -O3
+default prog
+"""
+
+RULES = """rule cc
+  command = cc $cflags -c $in -o $out
+  description = CC $out
+rule ar
+  command = ar rcs $out $in
+rule link
+  command = cc -o $out $in $ldflags
+"""
+
+SUB = """cflags = -Os
+rule cc
+  command = clang $cflags -c $in -o $out
+build sub/c.o: cc sub/c.c
+build sub/tool: link sub/c.o
+"""
+
+
+def project(d: str) -> str:
+    """
+    writes the ninja files
+    :return the path of the `build.ninja`
+    """
+    os.makedirs(os.path.join(d, "sub"))
+    for name, content in (("build.ninja", NINJA), ("rules.ninja", RULES),
+                          ("sub/build.ninja", SUB)):
+        with open(os.path.join(d, name), "w", encoding="utf-8") as f:
+            f.write(content)
+    return os.path.join(d, "build.ninja")
+
+
+def test_ninjafile_graph():
+    """ all kinds of inputs and outputs, scopes and escapes """
+    with tempfile.TemporaryDirectory() as d:
+        n = parse_ninjafile(project(d))
+        assert n.files == [os.path.join(d, f) for f in
+                           ("build.ninja", "rules.ninja", "sub/build.ninja")]
+        assert n.targets() == ["out/a.o", "out/b c.o", "out/liba.a", "prog", "prog.map",
+                               "gen", "check", "sub/c.o", "sub/tool"]
+        assert n.roots() == ["prog.map", "sub/tool"]
+        assert n.default_targets() == ["prog"]
+        assert n.pools == {"console": 1, "link_pool": 1}
+        assert n.variable("cflags") == "-O3"
+
+        a = n.edge("out/a.o")
+        assert (a.inputs, a.implicit, a.order_only) == (("src/a.c",), ("inc/x.h",), ("gen",))
+        # the top level variables are looked up once the graph is complete
+        assert a.command() == "cc -O3 -c src/a.c -o out/a.o"
+        assert a.variable("description") == "CC out/a.o"
+        assert n.edge("out/b c.o").command() == "cc -O2 -g -c 'src/b c.c' -o 'out/b c.o'"
+
+        prog = n.edge("prog")
+        assert prog is n.edge("prog.map")
+        assert prog.implicit_outputs == ("prog.map",)
+        assert prog.inputs == ("out/a.o", "out/liba.a")
+        assert prog.validations == ("check",)
+        assert prog.variables == {"pool": "link_pool", "ldflags": "-Wl,-Map,prog.map"}
+        assert prog.command() == "cc -o prog out/a.o out/liba.a -Wl,-Map,prog.map"
+        assert n.edge("gen").rule.name == "phony" and n.edge("gen").command() == ""
+        assert n.edge("src/a.c") is None
+
+        # the rule and the variables of the subninja
+        assert n.edge("sub/c.o").command() == "clang -Os -c sub/c.c -o sub/c.o"
+        assert n.edge("sub/tool").command() == "cc -o sub/tool sub/c.o -lm"
+        # every path is only stored once
+        assert n.edge("out/liba.a").inputs[0] is a.outputs[0]
+
+
+def test_ninjafile_errors():
+    """ invalid ninja files """
+    for text in ("build a: unknown b\n",
+                 "rule r\n  command = x\nbuild a: r\nbuild a: r\n",
+                 "rule r\n  unknown = x\n",
+                 "rule r\n  command = x\nbuild a: r b | c | d\n",
+                 "build a b\n",
+                 "x = $!\n",
+                 "  x = 1\n",
+                 "default unknown\n",
+                 "pool p\n",
+                 "rule r\n  command = x\nbuild a: r\n  pool = unknown\n",
+                 "rule r\n  command = $description\n  description = $command\n"
+                 "build a: r\nc = 1\n"):
+        with pytest.raises(NinjaFileError):
+            n = NinjaFile()
+            n.parse_string(text)
+            for e in n.edges:
+                e.command()
+    with pytest.raises(NinjaFileError, match="<string>:2"):
+        NinjaFile().parse_string("a = 1\nbuild b: c\n")
+    with pytest.raises(NinjaFileError, match="loading"):
+        NinjaFile().parse_string("include missing.ninja\n")
+
+
+def test_ninjafile_ninja():
+    """ the same targets and commands as ninja itself """
+    with tempfile.TemporaryDirectory() as d:
+        path = project(d)
+
+        def tool(*args) -> list:
+            return subprocess.run(["ninja", "-C", d, "-t"] + list(args), check=True,
+                                  stdout=subprocess.PIPE, text=True).stdout.splitlines()
+
+        n = NinjaFile(path)
+        assert sorted(line.split(":")[0] for line in tool("targets", "all")) == \
+            sorted(n.targets())
+        commands = [n.edge(t).command() for t in n.targets()]
+        assert [c for c in tool("commands") if c not in commands] == []
+
+
+def test_ninja_targets():
+    """ `Ninja` knows all outputs, not only the linked ones """
+    with tempfile.TemporaryDirectory() as d:
+        b = Ninja(project(d))
+        assert [t.name() for t in b.targets()][:2] == ["prog.map", "sub/tool"]
+        assert b.target("liba").name() == "out/liba.a"
+        assert b.target("liba").rule == "ar"
+        assert b.target("gen").build_commands() == []
+        # the commands are evaluated on demand
+        assert b.target("prog").build_commands() == []
+        assert b.command(b.target("prog")) == b.manifest().edge("prog").command() != ""
+        assert b.command(b.target("gen")) == ""
+        assert b.target("prog").inputs == ["out/a.o", "out/liba.a"]
+        assert sorted(b.discovery_inputs()) == sorted(b.manifest().files)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+""" test ninjalog.py """
+import os
+import tempfile
+
+from build_system_parser.ninja import Ninja
+from build_system_parser.ninjafile import NinjaFile
+from build_system_parser.ninjalog import NinjaLog, critical_path
+
+from .helpers import write
+
+NINJA = """builddir = out
+rule sleep
+  command = sleep $seconds && touch $out
+build out/a.o: sleep
+  seconds = 0.3
+build out/b.o out/b.d: sleep
+  seconds = 0.1
+build out/prog: sleep out/a.o out/b.o
+  seconds = 0.1
+build all: phony out/prog
+"""
+
+LOG = """# ninja log v5
+0\t100\t0\ta.o\t1
+0\t300\t0\tb.o\t2
+0\t300\t0\tb.d\t2
+300\t350\t0\tprog\t3
+"""
+
+
+def test_ninjalog():
+    """ entries, builds and the analyses """
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, ".ninja_log")
+        log = NinjaLog(path)
+        assert log.update() == []
+
+        write(path, LOG)
+        entries = log.update()
+        assert log.version == 5
+        assert [e.outputs for e in entries] == [["a.o"], ["b.o", "b.d"], ["prog"]]
+        assert log.durations() == {"a.o": 100, "b.o": 300, "b.d": 300, "prog": 50}
+        assert [e.outputs[0] for e in log.slowest(2)] == ["b.o", "a.o"]
+        assert log.parallelism() == [(0, 2), (100, 1), (350, 0)]
+        assert log.average_parallelism() == 450 / 350
+
+        # the second invocation of ninja (the times start again) and a line,
+        # which is not completely written yet
+        write(path, "0\t20\t0\ta.o\t1\n10\t", "a")
+        assert [e.outputs for e in log.update()] == [["a.o"]]
+        assert log.entry("a.o").duration() == 20
+        assert [e.outputs for e in log.last_build()] == [["a.o"]]
+        write(path, "40\t0\tprog\t3\n", "a")
+        assert [e.build for e in log.update()] == [1]
+        assert log.durations()["prog"] == 30
+        assert len(log.entries) == 5
+
+        # a recompacted log is read again
+        os.rename(path, path + ".old")
+        write(path, "# ninja log v7\n0\t5\t0\tprog\t3\n")
+        assert [e.outputs for e in log.update()] == [["prog"]]
+        assert log.durations() == {"prog": 5}
+
+        # a short build followed by a longer one, the second invocation
+        # started (mtime - start) after the end of the first one
+        write(path, "# ninja log v7\n"
+                    "0\t5\t1000000000000\ta.o\t1\n"
+                    "0\t300\t1000020000000\ta.o\t1\n"
+                    "300\t400\t1000320000000\tprog\t3\n"
+                    # the older output of a restat edge
+                    "400\t500\t900000000000\tb.o\t2\n")
+        log = NinjaLog(path)
+        assert [e.build for e in log.update()] == [0, 1, 1, 1]
+        assert [e.outputs for e in log.last_build()] == [["a.o"], ["prog"], ["b.o"]]
+
+        # unknown versions are ignored
+        write(path, "# ninja log v99\n0\t5\t0\tprog\t3\n")
+        log = NinjaLog(path)
+        assert not log.update() and not log.entries
+
+
+def test_critical_path():
+    """ the longest chain weighted by the durations """
+    graph = NinjaFile()
+    graph.parse_string("rule cc\n  command = cc\nbuild a.o: cc\nbuild b.o | b.d: cc\n"
+                       "build prog: cc a.o b.o\nbuild all: phony prog\n"
+                       "build unrelated: cc\n")
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, ".ninja_log")
+        write(path, LOG)
+        log = NinjaLog(path)
+        log.update()
+        assert critical_path(log, graph) == (350, ["b.o", "prog", "all"])
+        assert critical_path(log, graph, ["a.o"]) == (100, ["a.o"])
+        assert critical_path(log, graph, ["unknown"]) == (0, [])
+
+
+def test_ninja_build_log():
+    """ the timings of real builds """
+    with tempfile.TemporaryDirectory() as d:
+        write(os.path.join(d, "build.ninja"), NINJA)
+        n = Ninja(os.path.join(d, "build.ninja"), nr_threads=2)
+        assert n.build(n.target("all"))
+
+        log = n.build_log()
+        assert log.path == n.path / "out" / ".ninja_log"
+        assert sorted(log.durations()) == ["out/a.o", "out/b.d", "out/b.o", "out/prog"]
+        assert log.entry("out/a.o").duration() >= 300
+        assert log.slowest(1)[0].outputs == ["out/a.o"]
+        assert 1 < log.average_parallelism() <= 2
+        total, path = n.critical_path()
+        assert path == ["out/a.o", "out/prog", "all"]
+        assert total >= 400
+
+        os.remove(os.path.join(d, "out", "prog"))
+        assert n.build(n.target("all"))
+        assert [e.outputs for e in n.build_log().last_build()] == [["out/prog"]]
+
+        # a longer build, which does not end before the previous one
+        os.remove(os.path.join(d, "out", "a.o"))
+        assert n.build(n.target("all"))
+        assert [e.outputs for e in n.build_log().last_build()] == \
+            [["out/a.o"], ["out/prog"]]
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+""" test progress.py """
+import asyncio
+import json
+import os
+import tempfile
+
+from build_system_parser.make import Make
+from build_system_parser.ninja import Ninja
+from build_system_parser.progress import ProgressStream, ProgressTracker, \
+    BazelProgressParser, CargoMessageParser, CMakeProgressParser
+
+from .helpers import write
+
+NINJA = """rule sleep
+  command = sleep $seconds && touch $out
+  description = SLEEP $out
+build a: sleep
+  seconds = 0.1
+build b: sleep a
+  seconds = 0.1
+build c: sleep b
+  seconds = 0.1
+build all: phony c
+"""
+
+MAKEFILE = """all: prog
+prog: a.o b.o
+\ttouch prog
+%.o: %.c
+\ttouch $@
+.PHONY: all
+"""
+
+
+def test_ninja_progress():
+    """ an event per edge, with the total of ninja """
+    with tempfile.TemporaryDirectory() as d:
+        write(os.path.join(d, "build.ninja"), NINJA)
+        events = []
+        n = Ninja(os.path.join(d, "build.ninja")).use_progress(events.append)
+        assert n.build(n.target("all"))
+        assert [(e.done, e.total) for e in events] == \
+            [(0, None), (1, 3), (2, 3), (3, 3), (3, 3)]
+        assert events[1].action == "SLEEP a"
+        assert events[1].eta > 0.1
+        assert events[-1].finished and events[-1].success and events[-1].eta == 0
+        assert events[-2].fraction() == 1 and not events[-2].finished
+
+        # nothing to do
+        events.clear()
+        assert n.build(n.target("all"))
+        assert [(e.done, e.finished) for e in events] == [(0, False), (0, True)]
+
+        # the subscribers are removed
+        events.clear()
+        os.remove(os.path.join(d, "c"))
+        assert n.use_progress(None).build(n.target("all"))
+        assert events == []
+        # the status format of the user is kept
+        assert n._build_commands(n.target("all"))[0].env is None
+        assert n.use_progress(events.append)._build_commands(n.target("all"))[0] \
+            .env["NINJA_STATUS"] == "[%f/%t] "
+
+
+def test_make_progress():
+    """ the trace of make, the total is estimated from the Makefile """
+    with tempfile.TemporaryDirectory() as d:
+        write(os.path.join(d, "Makefile"), MAKEFILE)
+        write(os.path.join(d, "a.c"), "")
+        write(os.path.join(d, "b.c"), "")
+        events = []
+        m = Make(os.path.join(d, "Makefile"), d).use_progress(events.append)
+        assert m.build(m.target("all"))
+        assert [(e.done, e.total) for e in events] == \
+            [(0, 3), (1, 3), (2, 3), (3, 3), (3, 3)]
+        assert sorted(e.action for e in events[1:4]) == ["a.o", "b.o", "prog"]
+        assert events[-1].success
+
+        # the failed build is reported, too
+        os.remove(os.path.join(d, "a.c"))
+        os.remove(os.path.join(d, "a.o"))
+        events.clear()
+        assert not m.build(m.target("all"))
+        assert events[-1].finished and events[-1].success is False
+
+
+def test_parsers():
+    """ the output of cargo, bazel and cmake """
+    p = BazelProgressParser()
+    assert not p.parse("INFO: Analyzed target //main:hello (1 packages loaded).")
+    assert p.parse("[1,234 / 5,678] Compiling main/hello.cc; 3s linux-sandbox")
+    assert (p.done, p.total, p.action) == (1234, 5678, "Compiling main/hello.cc; 3s linux-sandbox")
+
+    p = CMakeProgressParser()
+    assert p.parse("[ 50%] Building C object CMakeFiles/a.dir/a.c.o")
+    assert (p.done, p.total) == (50, 100)
+    assert p.parse("[3/4] Linking C executable a")
+    assert (p.done, p.total, p.action) == (3, 4, "Linking C executable a")
+
+    def artifact(name: str) -> str:
+        return json.dumps({"reason": "compiler-artifact", "target": {"name": name}})
+
+    # the total of the last build is exceeded
+    p = CargoMessageParser(1)
+    assert not p.parse("   Compiling libc v0.2.150")
+    assert not p.parse(json.dumps({"reason": "build-finished", "success": True}))
+    assert p.parse(artifact("libc")) and (p.done, p.total) == (1, 1)
+    assert p.parse(artifact("main")) and (p.done, p.total, p.action) == (2, 2, "main")
+
+
+def test_progress_stream():
+    """ the async iterator, also over events of other threads """
+    async def follow():
+        stream = ProgressStream(stall_timeout=0.2)
+        tracker = ProgressTracker("t", BazelProgressParser(), [stream])
+
+        async def build():
+            await asyncio.to_thread(tracker.line, "[1 / 2] a")
+            await asyncio.sleep(0.5)
+            tracker.line("[2 / 2] b")
+            tracker.finish(True)
+
+        task = asyncio.ensure_future(build())
+        events = [e async for e in stream]
+        await task
+        return events
+
+    events = asyncio.run(follow())
+    assert [e.done for e in events if not e.stalled][:3] == [0, 1, 2]
+    assert events[-1].finished
+    stalled = [e for e in events if e.stalled]
+    assert stalled and all(e.done == 1 for e in stalled)
+    assert stalled[0].elapsed >= 0.2
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+""" test schedule.py and `Builder.build_many` """
+import asyncio
+import json
+import os
+import tempfile
+
+from build_system_parser.compile_commands import CompileCommands
+from build_system_parser.make import Make
+from build_system_parser.schedule import JobPool
+
+
+def test_job_pool():
+    """ the jobs must be shared equally and never exceed the budget """
+    async def main():
+        pool = JobPool(8)
+        a = await pool.acquire(4)
+        b = await pool.acquire(3)
+        c = await pool.acquire(1)
+        assert (a, b, c) == (2, 2, 4)
+
+        waiter = asyncio.ensure_future(pool.acquire(1))
+        await asyncio.sleep(0.1)
+        assert not waiter.done()
+        await pool.release(b)
+        assert await waiter == 2
+
+    asyncio.run(main())
+
+
+def test_build_many_parallel():
+    """ builds independent targets concurrently """
+    with tempfile.TemporaryDirectory() as d:
+        data = []
+        for i in range(8):
+            src = os.path.join(d, f"main{i}.c")
+            with open(src, "w", encoding="utf-8") as f:
+                f.write(f"int main(void) {{ return {i}; }}\n")
+            out = os.path.join(d, f"main{i}")
+            data.append({"arguments": ["cc", "-o", out, src], "directory": d,
+                         "file": src, "output": out})
+        file = os.path.join(d, "compile_commands.json")
+        with open(file, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+        c = CompileCommands(file)
+        assert len(c.targets()) == 8
+        results = c.build_many(jobs=4)
+        assert len(results) == 8
+        assert all(r.success for r in results)
+        assert [r.target for r in results] == c.targets()
+        assert all(1 <= r.jobs <= 4 for r in results)
+        assert all(r.wall_time() > 0 for r in results)
+        for i in range(8):
+            assert os.path.isfile(os.path.join(d, f"main{i}"))
+
+
+def test_build_many_sequential():
+    """ builders which share a build tree build one target after another """
+    m = Make("test/make/Makefile")
+    targets = [m.target("simple"), m.target("load")]
+    results = m.build_many(targets, jobs=2)
+    assert [r.success for r in results] == [True, True]
+    assert [r.jobs for r in results] == [2, 2]
+    assert results[0].end <= results[1].start
+
+
+if __name__ == "__main__":
+    test_job_pool()
+    test_build_many_parallel()
+    test_build_many_sequential()
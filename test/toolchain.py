@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+""" test toolchain.py """
+import asyncio
+import os
+import tempfile
+import threading
+
+from build_system_parser import toolchain
+from build_system_parser.cmake import CMake
+from build_system_parser.make import Make
+from build_system_parser.toolchain import ToolchainRegistry, parse_version
+
+TOOL = """#!/bin/sh
+echo "fake tool {}"
+"""
+
+
+def test_parse_version():
+    """ tests the version parser """
+    assert parse_version(["GNU Make 4.3", "Built for x86_64"]) == (4, 3)
+    assert parse_version(["1.13.2.git.kitware.jobserver-pipe-1"]) == (1, 13, 2)
+    assert parse_version(["no version"]) == ()
+
+
+def test_probe_once():
+    """ concurrent builders must share a single probe """
+    with tempfile.TemporaryDirectory() as d:
+        r = ToolchainRegistry(os.path.join(d, "toolchains.json"))
+        old = toolchain.registry()
+        toolchain.use_registry(r)
+        try:
+            versions = []
+
+            def construct():
+                m = Make("test/make/Makefile")
+                assert m.available()
+                versions.append(m.__version__())
+
+            threads = [threading.Thread(target=construct) for _ in range(200)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            assert r.probes == 1
+            assert len(versions) == 200 and len(set(versions)) == 1
+
+            async def main():
+                m = Make("test/make/Makefile")
+                return await asyncio.gather(*[m.aversion() for _ in range(10)])
+
+            assert set(asyncio.run(main())) == set(versions)
+            assert r.probes == 1
+
+            caps = Make("test/make/Makefile").capabilities()
+            assert caps["jobserver"] and caps["jobserver_pipe"]
+            # the jobserver is passed on to the build tool of the generator
+            cmake = CMake("test/cmake/CMakeLists.txt").capabilities()
+            assert "generators" in cmake
+            assert cmake["jobserver_fifo"] == caps["jobserver_fifo"]
+        finally:
+            toolchain.use_registry(old)
+
+
+def test_persistence():
+    """ the probes are persisted, and invalidated if the binary changes """
+    with tempfile.TemporaryDirectory() as d:
+        file = os.path.join(d, "toolchains.json")
+        tool = os.path.join(d, "tool")
+        with open(tool, "w", encoding="utf-8") as f:
+            f.write(TOOL.format("1.0"))
+        os.chmod(tool, 0o755)
+
+        r = ToolchainRegistry(file)
+        t = r.probe([tool, "--version"])
+        assert t.available
+        assert t.version() == (1, 0)
+        assert r.probes == 1
+
+        # a new process reads the persisted probe
+        r = ToolchainRegistry(file)
+        assert r.probe([tool, "--version"]).output == ["fake tool 1.0"]
+        assert r.probes == 0
+
+        with open(tool, "w", encoding="utf-8") as f:
+            f.write(TOOL.format("2.0.1"))
+        os.utime(tool, ns=(1, 1))
+        assert r.probe([tool, "--version"]).version() == (2, 0, 1)
+        assert r.probes == 1
+
+        assert not r.probe([os.path.join(d, "missing"), "--version"]).available
+
+
+if __name__ == "__main__":
+    test_parse_version()
+    test_probe_once()
+    test_persistence()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+""" test watch.py """
+import os
+import shutil
+import tempfile
+import threading
+
+from build_system_parser.bazel import Bazel
+from build_system_parser.cmake import CMake
+from build_system_parser.make import Make
+from build_system_parser.watch import Watcher, TargetEvent, watch
+
+from .helpers import MAKEFILE, write
+
+CMAKELISTS = """cmake_minimum_required(VERSION 3.10)
+project(prog C)
+include(extra.cmake)
+add_executable(prog prog.c)
+"""
+
+
+def events(w: Watcher):
+    """ the events of the next change """
+    return sorted((e.kind, e.target.name()) for e in w.poll(5))
+
+
+def check_make(polling: bool):
+    """ added, changed and removed targets of a Makefile """
+    with tempfile.TemporaryDirectory() as d:
+        write(os.path.join(d, "prog.c"), "int main(void) { return 0; }\n")
+        makefile = os.path.join(d, "Makefile")
+        write(makefile, MAKEFILE)
+        m = Make(d)
+        with Watcher([m], polling=polling, interval=0.01) as w:
+            assert w.backend() == ("polling" if polling else "inotify")
+            assert w.poll(0.05) == []
+
+            write(makefile, MAKEFILE + "\nclean:\n\trm -f prog\n")
+            assert events(w) == [("added", "clean")]
+            assert m.target("clean")
+
+            write(makefile, MAKEFILE + "\nclean:\n\trm -rf prog\n")
+            assert events(w) == [("changed", "clean")]
+
+            # editors replace files
+            write(makefile + ".tmp", MAKEFILE)
+            os.replace(makefile + ".tmp", makefile)
+            assert events(w) == [("removed", "clean")]
+            assert not m.is_valid_target("clean")
+
+            # unrelated files are not watched
+            write(os.path.join(d, "prog.c"), "int main(void) { return 1; }\n")
+            assert w.poll(0.1) == []
+
+
+def test_watch_make():
+    """ inotify backend """
+    check_make(False)
+
+
+def test_watch_make_polling():
+    """ polling backend """
+    check_make(True)
+
+
+def test_watch_bazel():
+    """ only the changed packages are parsed again """
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "stage2")
+        shutil.copytree("test/bazel/stage2", path, symlinks=True)
+        b = Bazel(path)
+        old = {t.name(): t for t in b.targets()}
+
+        with Watcher([b]) as w:
+            os.makedirs(os.path.join(path, "lib", "sub"))
+            write(os.path.join(path, "lib", "sub", "BUILD"),
+                  'cc_library(\n    name = "lib",\n    srcs = ["lib.cc"],\n)\n')
+            assert events(w) == [("added", "lib")]
+            # the targets of the untouched package were not re-created
+            for name, t in old.items():
+                assert b.target(name) is t
+
+            write(os.path.join(path, "lib", "sub", "BUILD"),
+                  'cc_binary(\n    name = "tool",\n    srcs = ["tool.cc"],\n)\n')
+            assert events(w) == [("added", "tool"), ("removed", "lib")]
+
+            shutil.rmtree(os.path.join(path, "lib"))
+            assert events(w) == [("removed", "tool")]
+            assert sorted(t.name() for t in b.targets()) == sorted(old)
+
+
+def test_watch_cmake():
+    """ included CMake files can add targets, too """
+    with tempfile.TemporaryDirectory() as d:
+        write(os.path.join(d, "prog.c"), "int main(void) { return 0; }\n")
+        write(os.path.join(d, "extra.cmake"), "set(X 1)\n")
+        write(os.path.join(d, "CMakeLists.txt"), CMAKELISTS)
+        cm = CMake(d, os.path.join(d, "build"))
+        with Watcher([cm]) as w:
+            write(os.path.join(d, "extra.cmake"), "add_executable(extra prog.c)\n")
+            assert events(w) == [("added", "extra")]
+            assert sorted(t.name() for t in cm.targets()) == ["extra", "prog"]
+
+            write(os.path.join(d, "CMakeLists.txt"),
+                  CMAKELISTS + "add_executable(prog2 prog.c)\n")
+            assert events(w) == [("added", "prog2")]
+            assert cm.build(cm.target("prog2"))
+
+
+def test_watch_background():
+    """ subscribers are notified by the background thread """
+    with tempfile.TemporaryDirectory() as d:
+        write(os.path.join(d, "Makefile"), MAKEFILE)
+        received = []
+        done = threading.Event()
+
+        def callback(e: TargetEvent):
+            received.append(e)
+            done.set()
+
+        w = watch([Make(d)], callback)
+        try:
+            write(os.path.join(d, "Makefile"), MAKEFILE + "\nall: prog\n")
+            assert done.wait(5)
+            assert received[0].kind == TargetEvent.ADDED
+            assert received[0].target.name() == "all"
+        finally:
+            w.close()
+
+
+if __name__ == "__main__":
+    test_watch_make()
+    test_watch_make_polling()
+    test_watch_bazel()
+    test_watch_cmake()
+    test_watch_background()